@@ -8,6 +8,8 @@ class Config:
     # Database configuration
     DATABASE_PATH = os.path.join(os.path.dirname(__file__), 'data', 'penzflow.db')
     
+    DB_BUSY_TIMEOUT = 10  # seconds a connection waits for a write lock
+    
     # Security settings
     SECRET_KEY = 'penzflow_secret_key_change_in_production'
     SESSION_TIMEOUT = 3600  # 1 hour in seconds
@@ -35,6 +37,92 @@ class Config:
     REPORTS_DIR = os.path.join(os.path.dirname(__file__), 'reports')
     BACKUP_DIR = os.path.join(os.path.dirname(__file__), 'backups')
     
+    # Metrics exporter (Prometheus text format on http://METRICS_HOST:METRICS_PORT/metrics)
+    METRICS_ENABLED = True
+    METRICS_HOST = '127.0.0.1'
+    METRICS_PORT = 9464
+    
+    # Audit log (buffered, written in batches to monthly audit_log_YYYYMM tables)
+    AUDIT_BUFFER_SIZE = 10000  # events kept in memory before the oldest are overwritten
+    AUDIT_BATCH_SIZE = 500  # wake the writer early once this many events are queued
+    AUDIT_FLUSH_INTERVAL = 2.0  # seconds
+    AUDIT_RETENTION_MONTHS = 12
+    
+    # Background jobs
+    JOB_WORKERS = 2
+    JOB_MAX_ATTEMPTS = 3
+    JOB_RETRY_BASE_DELAY = 30  # seconds, doubled on each retry
+    JOB_POLL_INTERVAL = 2.0  # seconds
+    JOB_HEARTBEAT_INTERVAL = 30  # seconds
+    JOB_STALE_AFTER = 300  # running jobs without a heartbeat for this long are requeued, or failed once out of attempts
+    SCHEDULER_TICK = 30  # seconds between checks for due schedules
+    
+    # Reporting snapshot (read-only copy used by reports and dashboards)
+    SNAPSHOT_ENABLED = True
+    SNAPSHOT_REFRESH_INTERVAL = 300  # seconds
+    
+    # Analytics (monthly Parquet exports queried with DuckDB)
+    ANALYTICS_DIR = os.path.join(os.path.dirname(__file__), 'data', 'analytics')
+    ANALYTICS_ENGINE = 'auto'  # 'auto', 'sqlite' or 'duckdb'
+    ANALYTICS_ROW_THRESHOLD = 200000  # order items above which 'auto' switches to DuckDB
+    
+    # Cold-data archive (closed records older than the horizon move to yearly Parquet files)
+    ARCHIVE_DIR = os.path.join(os.path.dirname(__file__), 'data', 'archive')
+    ARCHIVE_HORIZON_DAYS = 730
+    ARCHIVE_BATCH_SIZE = 5000
+    ARCHIVE_ROW_GROUP_SIZE = 500  # rows per Parquet row group; customer filters skip whole groups
+    
+    # Document numbers (blocks of values reserved per process from the sequences table)
+    SEQUENCE_BLOCK_SIZE = 50
+    SEQUENCE_BRANCH = ''  # branch code added to numbers, e.g. 'JKT' -> ORD-JKT-00000001
+    
+    # Stock reservations (open orders hold stock; drafts release it after this many hours)
+    RESERVATION_DRAFT_HOURS = 24
+    
+    # Depots (movements and orders that name no location use this one)
+    DEFAULT_LOCATION_CODE = 'MAIN'
+    
+    # Demand forecasting (daily history read, days forecast ahead, season length for Holt-Winters)
+    FORECAST_HISTORY_DAYS = 365
+    FORECAST_HORIZON_DAYS = 28
+    FORECAST_SEASON_DAYS = 7
+    
+    # Replenishment (supplier lead time, and days of forecast demand to cover beyond it)
+    REORDER_LEAD_TIME_DAYS = 7
+    REORDER_COVER_DAYS = 14
+    
+    # Inventory costing: issues valued at the moving average ('average') or from FIFO cost layers ('fifo')
+    COSTING_METHOD = 'average'
+    
+    # Customer segmentation (RFM): customers whose first order is this recent are 'New', whose last
+    # order is older than the inactive horizon are 'Inactive'
+    SEGMENT_NEW_DAYS = 30
+    SEGMENT_INACTIVE_DAYS = 180
+    
+    # Credit checks read limits and exposure from an in-process cache that is dropped on every order and
+    # payment recorded here; figures changed by another process are re-read after this many seconds
+    CREDIT_CACHE_SECONDS = 30
+    
+    # Mobile orders approved together are converted to sales orders in transactions of this many orders
+    APPROVAL_BATCH_SIZE = 500
+    
+    # Stock alert digests (one e-mail per supplier); in development point this at a local SMTP sink,
+    # e.g. `python -m aiosmtpd -n -l localhost:1025`
+    ALERT_MAIL_SERVER = 'localhost'
+    ALERT_MAIL_PORT = 1025
+    ALERT_MAIL_FROM = 'alerts@penzflow.local'
+    ALERT_MAIL_TO = 'purchasing@penzflow.local'
+    
+    # Bulk price updates (uploaded CSVs are kept here for the background job)
+    PRICE_UPDATE_DIR = os.path.join(os.path.dirname(__file__), 'data', 'price_updates')
+    
+    # Offline mobile sync API (HTTP Basic auth with app user credentials)
+    SYNC_ENABLED = True
+    SYNC_HOST = '127.0.0.1'  # bind to 0.0.0.0 (behind TLS) for devices on the network
+    SYNC_PORT = 9465
+    SYNC_MAX_BATCH_RECORDS = 500
+    SYNC_CHANGE_RETENTION_DAYS = 30  # devices with an older cursor get a full download
+    
 class DevelopmentConfig(Config):
     DEBUG = True
     
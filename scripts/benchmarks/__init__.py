@@ -0,0 +1,26 @@
+"""
+Development benchmarks for PenzFlow
+Each module times one feature against generated data, mostly in a scratch
+database, and prints the figures as JSON. They are not part of the app and
+can take minutes and gigabytes of memory at their default sizes. Run them
+from the repository root, overriding any numeric argument:
+
+    python -m scripts.benchmarks.audit --events 50000
+"""
+import argparse
+import inspect
+import json
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path[:0] = [ROOT, os.path.join(ROOT, 'src')]
+
+def run(benchmark):
+    """Call a benchmark with its numeric defaults overridden from the command line and print the result"""
+    parser = argparse.ArgumentParser(description=inspect.getdoc(benchmark))
+    for name, parameter in inspect.signature(benchmark).parameters.items():
+        default = parameter.default
+        if isinstance(default, (int, float)) and not isinstance(default, bool):
+            parser.add_argument(f"--{name.replace('_', '-')}", type=type(default), default=default)
+    print(json.dumps(benchmark(**vars(parser.parse_args())), indent=2, default=str))
@@ -0,0 +1,80 @@
+"""
+Low-stock alert counts
+Compares alert counts from a catalog scan with reading inventory_alerts,
+and the cost the alert trigger adds to stock updates, on a generated
+in-memory catalog.
+"""
+import sqlite3
+import time
+
+from scripts.benchmarks import run
+from database.init_db import alert_level_sql
+
+def benchmark_alerts(products=200000, updates=20000):
+    """Compare alert counts from a catalog scan with the alerts table, and the trigger cost on stock updates"""
+    conn = sqlite3.connect(':memory:')
+    try:
+        cursor = conn.cursor()
+        cursor.execute('''
+            CREATE TABLE products (id INTEGER PRIMARY KEY, stock_quantity INTEGER, min_stock_level INTEGER)
+        ''')
+        cursor.execute("CREATE TABLE inventory_alerts (product_id INTEGER PRIMARY KEY, level TEXT, raised_ts INTEGER, "
+                       "notified_ts INTEGER)")
+        cursor.execute("CREATE INDEX idx_inventory_alerts_level ON inventory_alerts (level)")
+        cursor.executemany("INSERT INTO products VALUES (?, ?, 20)", (
+            (n, 21 + (n * 7919) % 500) for n in range(1, products + 1)))
+        # About 1% of products dip into an alert level
+        cursor.executemany("UPDATE products SET stock_quantity = ? WHERE id = ?", (
+            ((n * 13) % 35, n) for n in range(1, products + 1, 100)))
+        conn.commit()
+        step = max(1, products // updates)
+        moves = [((n * 31) % 60, n) for n in range(1, products + 1, step)]
+
+        def timed(statement, params=None):
+            started = time.perf_counter()
+            if params is None:
+                cursor.execute(statement).fetchall()
+            else:
+                cursor.executemany(statement, params)
+            return time.perf_counter() - started
+
+        scan_sql = f"SELECT level, COUNT(*) FROM (SELECT {alert_level_sql('p')} AS level FROM products p) " \
+                   "WHERE level IS NOT NULL GROUP BY level"
+        scan = timed(scan_sql)
+        updates_plain = timed("UPDATE products SET stock_quantity = ? WHERE id = ?", moves)
+        conn.rollback()
+
+        cursor.execute(f'''
+            CREATE TRIGGER trg_products_update_alert AFTER UPDATE OF stock_quantity, min_stock_level ON products
+            WHEN ({alert_level_sql('NEW')}) IS NOT ({alert_level_sql('OLD')})
+            BEGIN
+                DELETE FROM inventory_alerts WHERE product_id = NEW.id AND ({alert_level_sql('NEW')}) IS NULL;
+                INSERT OR REPLACE INTO inventory_alerts (product_id, level, raised_ts)
+                SELECT NEW.id, {alert_level_sql('NEW')}, 0 WHERE ({alert_level_sql('NEW')}) IS NOT NULL;
+            END
+        ''')
+        cursor.execute(f'''
+            INSERT INTO inventory_alerts (product_id, level, raised_ts)
+            SELECT id, {alert_level_sql('p')}, 0 FROM products p WHERE ({alert_level_sql('p')}) IS NOT NULL
+        ''')
+        conn.commit()
+        table = timed("SELECT level, COUNT(*) FROM inventory_alerts GROUP BY level")
+        updates_triggered = timed("UPDATE products SET stock_quantity = ? WHERE id = ?", moves)
+        conn.commit()
+        consistent = cursor.execute(scan_sql).fetchall() == \
+            cursor.execute("SELECT level, COUNT(*) FROM inventory_alerts GROUP BY level ORDER BY level").fetchall()
+        return {
+            'products': products,
+            'alerts': cursor.execute("SELECT COUNT(*) FROM inventory_alerts").fetchone()[0],
+            'scan_counts_ms': round(scan * 1000, 2),
+            'table_counts_ms': round(table * 1000, 3),
+            'stock_updates': len(moves),
+            'updates_without_trigger_ms': round(updates_plain * 1000, 1),
+            'updates_with_trigger_ms': round(updates_triggered * 1000, 1),
+            'consistent': consistent
+        }
+    finally:
+        conn.close()
+
+if __name__ == '__main__':
+    run(benchmark_alerts)
@@ -0,0 +1,121 @@
+"""
+Report queries on SQLite and DuckDB
+Generates orders, order items and visits in a scratch database (by default
+as many order items as ANALYTICS_ROW_THRESHOLD, where choose_engine()
+switches to DuckDB), exports them to Parquet in a scratch directory, and
+runs every analytics report query on both engines over the whole period
+and over its last month.
+"""
+import os
+import shutil
+import tempfile
+import time
+from datetime import date, timedelta
+
+import numpy as np
+
+from scripts.benchmarks import run
+from config import Config
+from database import init_db
+from database.repository import wib_date_key
+from utils import analytics
+
+def _generate(conn, items, lines, customers, products, salesmen, visits, days, seed):
+    rng = np.random.default_rng(seed)
+    cursor = conn.cursor()
+    cursor.executemany("INSERT INTO customers (name, company) VALUES (?, ?)",
+                       ((f'Bench Customer {n}', f'Bench Company {n % 500}') for n in range(customers)))
+    cursor.executemany("INSERT INTO products (sku, name, category, price, cost, stock_quantity) VALUES (?, ?, ?, ?, ?, ?)",
+                       ((f'BENCH-{n:06d}', f'Bench Product {n}', f'Category {n % 20}', 10000, 8000, 1000)
+                        for n in range(products)))
+    customer_ids = np.array([row[0] for row in cursor.execute("SELECT id FROM customers")])
+    product_ids = np.array([row[0] for row in cursor.execute("SELECT id FROM products")])
+
+    orders = max(1, items // lines)
+    now_ts = int(time.time())
+    order_ts = np.sort(now_ts - rng.integers(0, days * 86400, orders))
+    cursor.execute("SELECT COALESCE(MAX(id), 0) FROM sales_orders")
+    first_id = cursor.fetchone()[0] + 1
+    cursor.executemany('''
+        INSERT INTO sales_orders (id, order_number, customer_id, total_amount, status, payment_method, sales_rep,
+                                  order_ts, order_local_date)
+        VALUES (?, ?, ?, ?, ?, 'cash', ?, ?, ?)
+    ''', ((first_id + n, f'BENCH{first_id + n:09d}', int(customer), lines * 20000, status, f'sales{rep}', int(ts),
+           wib_date_key(int(ts)))
+          for n, (customer, status, rep, ts) in enumerate(zip(
+              rng.choice(customer_ids, orders), np.where(rng.random(orders) < 0.05, 'cancelled', 'completed'),
+              rng.integers(1, salesmen + 1, orders), order_ts))))
+    cursor.executemany("INSERT INTO order_items (order_id, product_id, quantity, unit_price, total_price) "
+                       "VALUES (?, ?, 2, 10000, 20000)",
+                       ((first_id + n // lines, int(product))
+                        for n, product in enumerate(rng.choice(product_ids, orders * lines))))
+    visit_ts = np.sort(now_ts - rng.integers(0, days * 86400, visits))
+    cursor.executemany('''
+        INSERT INTO customer_visits (user_id, customer_id, visit_type, status, duration, visit_ts, visit_local_date)
+        VALUES (1, ?, ?, 'completed', ?, ?, ?)
+    ''', ((int(customer), visit_type, int(duration), int(ts), wib_date_key(int(ts)))
+          for customer, visit_type, duration, ts in zip(
+              rng.choice(customer_ids, visits), rng.choice(['sales_call', 'delivery', 'follow_up', 'complaint'], visits),
+              rng.integers(5, 90, visits), visit_ts)))
+    conn.commit()
+
+def benchmark_engines(items=Config.ANALYTICS_ROW_THRESHOLD, lines=4, customers=5000, products=2000, salesmen=20,
+                      visits=50000, days=730, repeat=3, seed=5):
+    """Best-of-N wall time per query on SQLite and DuckDB over generated data, for the whole period and
+    its last month"""
+    directory = tempfile.mkdtemp(prefix='penzflow_analytics_')
+    path = os.path.join(directory, 'bench.db')
+    saved = init_db.get_db_path, Config.ANALYTICS_DIR, Config.SNAPSHOT_ENABLED
+    init_db.get_db_path = lambda: path
+    Config.ANALYTICS_DIR = os.path.join(directory, 'analytics')
+    # The snapshot copies the configured database file; the scratch one is read directly
+    Config.SNAPSHOT_ENABLED = False
+    try:
+        init_db.init_database()
+        conn = init_db.get_connection()
+        try:
+            started = time.perf_counter()
+            _generate(conn, items, lines, customers, products, salesmen, visits, days, seed)
+            generate_seconds = time.perf_counter() - started
+            order_items, = conn.execute("SELECT COALESCE(MAX(id), 0) FROM order_items").fetchone()
+        finally:
+            conn.close()
+
+        started = time.perf_counter()
+        written = analytics.export_analytics()
+        export_seconds = time.perf_counter() - started
+
+        today = date.today()
+        ranges = {'all': (wib_date_key(today - timedelta(days=days)), wib_date_key(today)),
+                  'month': (wib_date_key(today - timedelta(days=30)), wib_date_key(today))}
+        engines = ['sqlite'] + (['duckdb'] if analytics.duckdb_available() else [])
+        results = []
+        for name in analytics.QUERIES:
+            for label, params in ranges.items():
+                row = {'query': name, 'range': label}
+                for engine in engines:
+                    timings = []
+                    for _ in range(repeat):
+                        started = time.perf_counter()
+                        df, _ = analytics.run_query(name, params, engine)
+                        timings.append(time.perf_counter() - started)
+                    row[f'{engine}_ms'] = round(min(timings) * 1000, 1)
+                    row['rows'] = len(df)
+                if row.get('duckdb_ms'):
+                    row['speedup'] = round(row['sqlite_ms'] / row['duckdb_ms'], 1)
+                results.append(row)
+        return {
+            'order_items': order_items,
+            'row_threshold': Config.ANALYTICS_ROW_THRESHOLD,
+            'engine_chosen': analytics.choose_engine(),
+            'generate_seconds': round(generate_seconds, 2),
+            'export_seconds': round(export_seconds, 2),
+            'partitions_written': written,
+            'queries': results
+        }
+    finally:
+        init_db.get_db_path, Config.ANALYTICS_DIR, Config.SNAPSHOT_ENABLED = saved
+        shutil.rmtree(directory, ignore_errors=True)
+
+if __name__ == '__main__':
+    run(benchmark_engines)
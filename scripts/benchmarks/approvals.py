@@ -0,0 +1,123 @@
+"""
+Approved order conversion
+Converts generated submitted mobile orders to sales orders on a scratch
+WAL database, once in a single transaction and once with a transaction per
+order, and checks the reservations, ledger and sales targets afterwards.
+"""
+import os
+import random
+import sqlite3
+import tempfile
+import time
+
+from scripts.benchmarks import run
+from config import Config
+from database.approvals import convert_batch
+
+def benchmark_conversion(orders=500, lines=4, products=2000, salesmen=20):
+    """Convert generated submitted orders on a scratch database in one transaction and one transaction
+    per order"""
+    directory = tempfile.mkdtemp(prefix='penzflow_approvals_')
+    path = os.path.join(directory, 'bench.db')
+    conn = sqlite3.connect(path, isolation_level=None)
+    try:
+        cursor = conn.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.executescript(f'''
+            CREATE TABLE users (id INTEGER PRIMARY KEY, username TEXT);
+            CREATE TABLE products (id INTEGER PRIMARY KEY, stock_quantity INTEGER, reserved_quantity INTEGER,
+                                   cost INTEGER, average_cost REAL, updated_at TIMESTAMP);
+            CREATE TABLE locations (id INTEGER PRIMARY KEY, code TEXT);
+            CREATE TABLE location_stock (location_id INTEGER, product_id INTEGER, quantity INTEGER,
+                                         reserved_quantity INTEGER DEFAULT 0,
+                                         PRIMARY KEY (location_id, product_id)) WITHOUT ROWID;
+            CREATE TABLE cost_layers (id INTEGER PRIMARY KEY, product_id INTEGER, transaction_id INTEGER,
+                                      received_ts INTEGER, quantity INTEGER, remaining_quantity INTEGER,
+                                      unit_cost REAL);
+            CREATE TABLE inventory_transactions (id INTEGER PRIMARY KEY, product_id INTEGER, transaction_type TEXT,
+                                                 quantity INTEGER, reference_type TEXT, reference_id INTEGER,
+                                                 notes TEXT, created_at TIMESTAMP, balance_after INTEGER,
+                                                 created_ts INTEGER, created_local_date INTEGER, created_by TEXT,
+                                                 location_id INTEGER, unit_cost REAL, cost_amount REAL);
+            CREATE TABLE stock_reservations (id INTEGER PRIMARY KEY, order_type TEXT, order_id INTEGER,
+                                             product_id INTEGER, quantity INTEGER, status TEXT, created_ts INTEGER,
+                                             expires_ts INTEGER, closed_ts INTEGER, created_by TEXT,
+                                             location_id INTEGER);
+            CREATE INDEX idx_stock_reservations_order ON stock_reservations (order_type, order_id);
+            CREATE TABLE mobile_orders (id INTEGER PRIMARY KEY, user_id INTEGER, customer_id INTEGER,
+                                        order_number TEXT, order_date TIMESTAMP, total_amount INTEGER, status TEXT,
+                                        payment_terms TEXT, special_instructions TEXT, order_ts INTEGER,
+                                        order_local_date INTEGER, location_id INTEGER, sales_order_id INTEGER,
+                                        reviewed_by TEXT, reviewed_ts INTEGER, updated_at TIMESTAMP);
+            CREATE TABLE mobile_order_items (id INTEGER PRIMARY KEY, mobile_order_id INTEGER, product_id INTEGER,
+                                             quantity INTEGER, unit_price INTEGER, total_price INTEGER);
+            CREATE INDEX idx_mobile_order_items_order ON mobile_order_items (mobile_order_id);
+            CREATE TABLE sales_orders (id INTEGER PRIMARY KEY, order_number TEXT UNIQUE, customer_id INTEGER,
+                                       order_date TIMESTAMP, total_amount INTEGER, status TEXT, payment_method TEXT,
+                                       sales_rep TEXT, notes TEXT, order_ts INTEGER, order_local_date INTEGER);
+            CREATE TABLE order_items (id INTEGER PRIMARY KEY, order_id INTEGER, product_id INTEGER, quantity INTEGER,
+                                      unit_price INTEGER, total_price INTEGER);
+            CREATE TABLE sales_targets (id INTEGER PRIMARY KEY, user_id INTEGER, start_date DATE, end_date DATE,
+                                        achieved_amount INTEGER DEFAULT 0, status TEXT);
+            INSERT INTO locations VALUES (1, '{Config.DEFAULT_LOCATION_CODE}');
+        ''')
+        cursor.execute("BEGIN")
+        cursor.executemany("INSERT INTO users VALUES (?, ?)", ((n, f'sales{n}') for n in range(1, salesmen + 1)))
+        cursor.executemany("INSERT INTO sales_targets (user_id, start_date, end_date, status) VALUES (?, ?, ?, 'active')",
+                           ((n, '2000-01-01', '2999-12-31') for n in range(1, salesmen + 1)))
+        cursor.executemany("INSERT INTO products VALUES (?, 1000000, 0, 10000, 10000, NULL)",
+                           ((n,) for n in range(1, products + 1)))
+        cursor.execute("INSERT INTO location_stock SELECT 1, id, stock_quantity, 0 FROM products")
+        cursor.execute("INSERT INTO cost_layers SELECT id, id, NULL, 0, stock_quantity, stock_quantity, 10000 FROM products")
+        rng = random.Random(3)
+        now_ts = int(time.time())
+        for order_id in range(1, 2 * orders + 1):
+            cursor.execute('''
+                INSERT INTO mobile_orders (id, user_id, customer_id, order_number, total_amount, status, payment_terms,
+                                           order_ts, order_local_date, location_id)
+                VALUES (?, ?, ?, ?, ?, 'submitted', 'Net 30', ?, 20240101, 1)
+            ''', (order_id, rng.randint(1, salesmen), rng.randint(1, 500), f'MO-{order_id:08d}', lines * 20000, now_ts))
+            for product_id in rng.sample(range(1, products + 1), lines):
+                cursor.execute("INSERT INTO mobile_order_items (mobile_order_id, product_id, quantity, unit_price, "
+                               "total_price) VALUES (?, ?, 2, 10000, 20000)", (order_id, product_id))
+                cursor.execute("INSERT INTO stock_reservations (order_type, order_id, product_id, quantity, status, "
+                               "location_id) VALUES ('mobile_order', ?, ?, 2, 'active', 1)", (order_id, product_id))
+                cursor.execute("UPDATE products SET reserved_quantity = reserved_quantity + 2 WHERE id = ?", (product_id,))
+                cursor.execute("UPDATE location_stock SET reserved_quantity = reserved_quantity + 2 "
+                               "WHERE location_id = 1 AND product_id = ?", (product_id,))
+        cursor.execute("COMMIT")
+
+        started = time.perf_counter()
+        cursor.execute("BEGIN IMMEDIATE")
+        batched = convert_batch(cursor, {n: f'ORD-B{n:08d}' for n in range(1, orders + 1)}, 'benchmark')
+        cursor.execute("COMMIT")
+        batch_seconds = time.perf_counter() - started
+
+        started = time.perf_counter()
+        for n in range(orders + 1, 2 * orders + 1):
+            cursor.execute("BEGIN IMMEDIATE")
+            convert_batch(cursor, {n: f'ORD-B{n:08d}'}, 'benchmark')
+            cursor.execute("COMMIT")
+        single_seconds = time.perf_counter() - started
+
+        reserved, = cursor.execute("SELECT SUM(reserved_quantity) FROM products").fetchone()
+        issued, = cursor.execute("SELECT -SUM(quantity) FROM inventory_transactions").fetchone()
+        achieved, = cursor.execute("SELECT SUM(achieved_amount) FROM sales_targets").fetchone()
+        return {
+            'orders_per_run': orders,
+            'lines_per_order': lines,
+            'one_transaction_seconds': round(batch_seconds, 3),
+            'transaction_per_order_seconds': round(single_seconds, 3),
+            'orders_per_second_batched': round(orders / batch_seconds) if batch_seconds else None,
+            'movements_posted': batched['movements'],
+            'targets_updated': batched['targets_updated'],
+            'consistent': reserved == 0 and issued == 2 * orders * lines * 2 and achieved == 2 * orders * lines * 20000
+        }
+    finally:
+        conn.close()
+        for name in os.listdir(directory):
+            os.remove(os.path.join(directory, name))
+        os.rmdir(directory)
+
+if __name__ == '__main__':
+    run(benchmark_conversion)
@@ -0,0 +1,67 @@
+"""
+Audit log enqueue overhead
+Times log_event(), which only appends to the in-memory buffer, against
+writing every event in its own transaction, and the background writer's
+batched flush of the same events.
+"""
+import os
+import sqlite3
+import tempfile
+import time
+
+from scripts.benchmarks import run
+from config import Config
+from database import init_db
+from utils import audit
+
+def benchmark_audit(events=10000):
+    """Time queueing audit events, writing each in its own transaction, and flushing them in batches"""
+    directory = tempfile.mkdtemp(prefix='penzflow_audit_')
+    path = os.path.join(directory, 'bench.db')
+    conn = sqlite3.connect(path, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.close()
+    init_db.get_db_path = lambda: path
+    audit._buffer.clear()
+    table = audit._table_for(int(time.time()))
+
+    rows = [('bench_event', 'benchmark', 'order', n, f'event {n}') for n in range(events)]
+    enqueued = 0
+    flush_seconds = 0.0
+    started = time.perf_counter()
+    for offset in range(0, events, Config.AUDIT_BATCH_SIZE):
+        batch_started = time.perf_counter()
+        for action, username, entity_type, entity_id, details in rows[offset:offset + Config.AUDIT_BATCH_SIZE]:
+            audit.log_event(action, username, entity_type, entity_id, details)
+        enqueued += time.perf_counter() - batch_started
+        # The writer thread drains the buffer as it fills; here that happens between timed batches
+        flush_started = time.perf_counter()
+        audit.flush_audit_log()
+        flush_seconds += time.perf_counter() - flush_started
+    total_seconds = time.perf_counter() - started
+
+    conn = init_db.get_connection()
+    try:
+        cursor = conn.cursor()
+        started = time.perf_counter()
+        for action, username, entity_type, entity_id, details in rows:
+            cursor.execute(f'''
+                INSERT INTO {table} (created_ts, username, action, entity_type, entity_id, details, status)
+                VALUES (?, ?, ?, ?, ?, ?, 'success')
+            ''', (int(time.time()), username, action, entity_type, str(entity_id), details))
+            conn.commit()
+        direct_seconds = time.perf_counter() - started
+        written, = cursor.execute(f"SELECT COUNT(*) FROM {table}").fetchone()
+    finally:
+        conn.close()
+    return {
+        'events': events,
+        'enqueue_us_per_event': round(enqueued * 1000000 / events, 2),
+        'batched_flush_us_per_event': round(flush_seconds * 1000000 / events, 2),
+        'queued_and_flushed_seconds': round(total_seconds, 3),
+        'transaction_per_event_us': round(direct_seconds * 1000000 / events, 2),
+        'rows_written': written
+    }
+
+if __name__ == '__main__':
+    run(benchmark_audit)
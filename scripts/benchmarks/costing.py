@@ -0,0 +1,80 @@
+"""
+COGS from stored movement costs
+Compares COGS for the last 30 days summed from inventory_transactions'
+stored cost_amount with replaying the moving average over two years of
+generated movements, in memory.
+"""
+import random
+import sqlite3
+import time
+from datetime import date, timedelta
+
+from scripts.benchmarks import run
+from database.repository import wib_date_key
+
+def benchmark_costing(products=1000, movements=50000, seed=7):
+    """COGS for the last 30 days from stored movement costs vs. replaying the moving average over the
+    whole history, on generated movements in memory"""
+    rng = random.Random(seed)
+    conn = sqlite3.connect(':memory:')
+    try:
+        cursor = conn.cursor()
+        cursor.execute('''
+            CREATE TABLE inventory_transactions (id INTEGER PRIMARY KEY, product_id INTEGER, transaction_type TEXT,
+                                                 quantity INTEGER, unit_cost REAL, cost_amount REAL,
+                                                 created_local_date INTEGER)
+        ''')
+        cursor.execute("CREATE INDEX idx_inventory_transactions_date ON inventory_transactions (created_local_date)")
+        start = date.today() - timedelta(days=730)
+        stock, average, rows = {}, {}, []
+        for n in range(movements):
+            product_id = rng.randint(1, products)
+            day = wib_date_key(start + timedelta(days=n * 730 // movements))
+            if stock.get(product_id, 0) < 20 or rng.random() < 0.3:
+                quantity, unit_cost = rng.randint(20, 100), rng.uniform(9000, 11000)
+                held = stock.get(product_id, 0)
+                average[product_id] = (held * average.get(product_id, 0) + quantity * unit_cost) / (held + quantity)
+                rows.append((product_id, 'in', quantity, unit_cost, quantity * unit_cost, day))
+            else:
+                quantity = -rng.randint(1, stock[product_id])
+                rows.append((product_id, 'out', quantity, average[product_id], quantity * average[product_id], day))
+            stock[product_id] = stock.get(product_id, 0) + quantity
+        cursor.executemany('''
+            INSERT INTO inventory_transactions (product_id, transaction_type, quantity, unit_cost, cost_amount,
+                                                created_local_date) VALUES (?, ?, ?, ?, ?, ?)
+        ''', rows)
+        conn.commit()
+        period_start = wib_date_key(date.today() - timedelta(days=30))
+
+        started = time.perf_counter()
+        stored = cursor.execute('''
+            SELECT SUM(-cost_amount) FROM inventory_transactions
+            WHERE transaction_type = 'out' AND created_local_date >= ?
+        ''', (period_start,)).fetchone()[0]
+        stored_seconds = time.perf_counter() - started
+
+        started = time.perf_counter()
+        held, averages, replayed = {}, {}, 0.0
+        for product_id, kind, quantity, unit_cost, _, day in cursor.execute('''
+            SELECT product_id, transaction_type, quantity, unit_cost, cost_amount, created_local_date
+            FROM inventory_transactions ORDER BY id
+        '''):
+            if kind == 'in':
+                on_hand = held.get(product_id, 0)
+                averages[product_id] = (on_hand * averages.get(product_id, 0) + quantity * unit_cost) / (on_hand + quantity)
+            elif day >= period_start:
+                replayed += -quantity * averages[product_id]
+            held[product_id] = held.get(product_id, 0) + quantity
+        replay_seconds = time.perf_counter() - started
+        return {
+            'movements': movements,
+            'stored_cogs_ms': round(stored_seconds * 1000, 2),
+            'replay_cogs_ms': round(replay_seconds * 1000, 1),
+            'cogs': round(stored or 0),
+            'matches_replay': abs((stored or 0) - replayed) < 1
+        }
+    finally:
+        conn.close()
+
+if __name__ == '__main__':
+    run(benchmark_costing)
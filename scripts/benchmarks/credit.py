@@ -0,0 +1,101 @@
+"""
+Credit checks at order time
+Times a credit check that sums the customer's open invoices and credit
+orders against the exposure kept in customer_summary, and the app's own
+credit_figures() and check_credit() with their per-process cache cold and
+warm, on a generated order history in memory.
+"""
+import random
+import sqlite3
+import time
+
+from scripts.benchmarks import run
+from database.credit import _CREDIT_SQL, check_credit, credit_figures, invalidate_credit
+from database.init_db import credit_order_sql
+
+def benchmark_credit_check(customers=5000, orders=1000000, open_share=0.1, checks=5000):
+    """Time a credit check by summing the customer's open invoices and credit orders, from the maintained
+    summary, and through credit_figures()/check_credit() with the in-process cache cold and warm"""
+    conn = sqlite3.connect(':memory:')
+    try:
+        cursor = conn.cursor()
+        cursor.execute("CREATE TABLE customers (id INTEGER PRIMARY KEY, credit_limit INTEGER)")
+        cursor.execute("CREATE TABLE sales_orders (id INTEGER PRIMARY KEY, customer_id INTEGER, total_amount INTEGER, "
+                       "paid_amount INTEGER, status TEXT, order_ts INTEGER)")
+        cursor.execute('''
+            CREATE INDEX idx_sales_orders_open ON sales_orders (customer_id, order_ts, total_amount, paid_amount)
+            WHERE status != 'cancelled' AND paid_amount < total_amount
+        ''')
+        cursor.execute("CREATE TABLE mobile_orders (id INTEGER PRIMARY KEY, customer_id INTEGER, total_amount INTEGER, "
+                       "status TEXT, payment_terms TEXT)")
+        cursor.execute("CREATE INDEX idx_mobile_orders_customer ON mobile_orders (customer_id)")
+        cursor.execute("CREATE TABLE customer_summary (customer_id INTEGER PRIMARY KEY, outstanding_amount INTEGER, "
+                       "credit_order_amount INTEGER)")
+        cursor.executemany("INSERT INTO customers VALUES (?, ?)",
+                           ((n, 500000000) for n in range(1, customers + 1)))
+        rng = random.Random(7)
+        cursor.executemany('''
+            INSERT INTO sales_orders (customer_id, total_amount, paid_amount, status, order_ts) VALUES (?, ?, ?, ?, ?)
+        ''', ((rng.randint(1, customers), 1000000, 0 if rng.random() < open_share else 1000000, 'delivered', n)
+              for n in range(orders)))
+        cursor.executemany('''
+            INSERT INTO mobile_orders (customer_id, total_amount, status, payment_terms) VALUES (?, ?, ?, ?)
+        ''', ((rng.randint(1, customers), 2000000, rng.choice(('submitted', 'approved', 'draft')),
+               rng.choice(('Cash', 'Net 7', 'Net 30'))) for _ in range(orders // 10)))
+        cursor.execute(f'''
+            INSERT INTO customer_summary
+            SELECT c.id,
+                   (SELECT COALESCE(SUM(total_amount - paid_amount), 0) FROM sales_orders so
+                    WHERE so.customer_id = c.id AND so.status != 'cancelled' AND so.paid_amount < so.total_amount),
+                   (SELECT COALESCE(SUM(total_amount), 0) FROM mobile_orders o
+                    WHERE o.customer_id = c.id AND {credit_order_sql('o')})
+            FROM customers c
+        ''')
+        conn.commit()
+        # Most checks at peak are for customers who ordered recently
+        sample = [rng.randint(1, customers // 20) for _ in range(checks)]
+        summed_sql = f'''
+            SELECT c.credit_limit,
+                   (SELECT COALESCE(SUM(total_amount - paid_amount), 0) FROM sales_orders so
+                    WHERE so.customer_id = c.id AND so.status != 'cancelled' AND so.paid_amount < so.total_amount)
+                   + (SELECT COALESCE(SUM(total_amount), 0) FROM mobile_orders o
+                      WHERE o.customer_id = c.id AND {credit_order_sql('o')})
+            FROM customers c WHERE c.id = ?
+        '''
+
+        def timed(lookup):
+            started = time.perf_counter()
+            figures = [lookup(customer_id) for customer_id in sample]
+            return (time.perf_counter() - started) * 1000000 / len(sample), figures
+
+        summed, summed_figures = timed(lambda customer_id: cursor.execute(summed_sql, (customer_id,)).fetchone())
+        maintained, maintained_figures = timed(lambda customer_id: cursor.execute(_CREDIT_SQL, (customer_id,)).fetchone())
+
+        def cold(customer_id):
+            invalidate_credit(customer_id)
+            return credit_figures(cursor, customer_id)
+
+        cold_us, cold_figures = timed(cold)
+        invalidate_credit()
+        for customer_id in set(sample):
+            credit_figures(cursor, customer_id)
+        warm_us, warm_figures = timed(lambda customer_id: credit_figures(cursor, customer_id))
+        # Each passing check adds its amount to the cached exposure, as the summary triggers would
+        check_us, _ = timed(lambda customer_id: check_credit(cursor, customer_id, 1))
+        return {
+            'orders': orders,
+            'checks': checks,
+            'summed_open_invoices_us': round(summed, 1),
+            'maintained_summary_us': round(maintained, 1),
+            'credit_figures_cold_us': round(cold_us, 1),
+            'credit_figures_cached_us': round(warm_us, 2),
+            'check_credit_cached_us': round(check_us, 2),
+            'consistent': summed_figures == maintained_figures == cold_figures == warm_figures
+        }
+    finally:
+        # The cache is per process, keyed by customer id; drop the scratch database's figures
+        invalidate_credit()
+        conn.close()
+
+if __name__ == '__main__':
+    run(benchmark_credit_check)
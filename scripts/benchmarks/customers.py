@@ -0,0 +1,84 @@
+"""
+Customer detail figures
+Compares reading a heavy buyer's order, visit and follow-up figures from
+per-source queries with one customer_summary lookup, and measures what the
+summary triggers add to order inserts, in memory.
+"""
+import sqlite3
+import time
+
+from scripts.benchmarks import run
+from database.init_db import counted_order_sql, create_customer_summary_triggers, open_follow_up_sql
+
+def benchmark_customer_details(customers=2000, orders=200000, heavy_orders=20000, repeat=200):
+    """Time the detail figures of a customer with many orders from per-source queries and from
+    customer_summary, and the trigger cost on order inserts"""
+    conn = sqlite3.connect(':memory:')
+    try:
+        cursor = conn.cursor()
+        cursor.execute("CREATE TABLE customers (id INTEGER PRIMARY KEY, name TEXT)")
+        for table in ('sales_orders', 'mobile_orders'):
+            cursor.execute(f"CREATE TABLE {table} (id INTEGER PRIMARY KEY, customer_id INTEGER, total_amount INTEGER, "
+                           "paid_amount INTEGER DEFAULT 0, status TEXT, order_ts INTEGER)")
+            cursor.execute(f"CREATE INDEX idx_{table}_customer ON {table} (customer_id, order_ts)")
+        cursor.execute("CREATE TABLE customer_visits (id INTEGER PRIMARY KEY, customer_id INTEGER, visit_type TEXT, "
+                       "status TEXT, visit_ts INTEGER)")
+        cursor.execute("CREATE INDEX idx_customer_visits_customer ON customer_visits (customer_id, visit_ts)")
+        cursor.execute("CREATE TABLE sales_activities (id INTEGER PRIMARY KEY, customer_id INTEGER, status TEXT)")
+        cursor.execute("CREATE INDEX idx_sales_activities_customer ON sales_activities (customer_id, status)")
+        cursor.execute('''
+            CREATE TABLE customer_summary (customer_id INTEGER PRIMARY KEY, order_count INTEGER NOT NULL DEFAULT 0,
+                lifetime_value INTEGER NOT NULL DEFAULT 0, last_order_ts INTEGER, last_visit_ts INTEGER,
+                open_follow_ups INTEGER NOT NULL DEFAULT 0, outstanding_amount INTEGER NOT NULL DEFAULT 0)
+        ''')
+        cursor.executemany("INSERT INTO customers VALUES (?, ?)", ((n, f'Customer {n}') for n in range(1, customers + 1)))
+        # Customer 1 is the heavy buyer; the rest share the remaining orders
+        rows = [(1 if n < heavy_orders else 2 + n % (customers - 1), 100000 + n % 997 * 1000,
+                 'cancelled' if n % 50 == 0 else 'delivered', 1700000000 + n * 60) for n in range(orders)]
+        insert = "INSERT INTO sales_orders (customer_id, total_amount, status, order_ts) VALUES (?, ?, ?, ?)"
+        started = time.perf_counter()
+        cursor.executemany(insert, rows)
+        plain = time.perf_counter() - started
+        conn.rollback()
+        cursor.executemany("INSERT INTO customer_visits (customer_id, visit_type, status, visit_ts) VALUES (?, ?, ?, ?)",
+                           ((n % customers + 1, 'follow_up' if n % 4 == 0 else 'sales_call',
+                             'planned' if n % 3 == 0 else 'completed', 1700000000 + n * 600) for n in range(orders // 10)))
+        cursor.executemany("INSERT INTO sales_activities (customer_id, status) VALUES (?, ?)",
+                           ((n % customers + 1, 'pending' if n % 2 else 'completed') for n in range(orders // 10)))
+        create_customer_summary_triggers(cursor)
+        started = time.perf_counter()
+        cursor.executemany(insert, rows)
+        triggered = time.perf_counter() - started
+        conn.commit()
+
+        def timed(statements):
+            started = time.perf_counter()
+            for _ in range(repeat):
+                results = [cursor.execute(statement, (1,)).fetchall() for statement in statements]
+            return (time.perf_counter() - started) / repeat, results
+
+        per_source, _ = timed([
+            f"SELECT COUNT(*), SUM(total_amount), MAX(order_ts) FROM sales_orders o "
+            f"WHERE customer_id = ? AND {counted_order_sql('sales_orders', 'o')}",
+            f"SELECT COUNT(*), SUM(total_amount), MAX(order_ts) FROM mobile_orders o "
+            f"WHERE customer_id = ? AND {counted_order_sql('mobile_orders', 'o')}",
+            "SELECT MAX(visit_ts) FROM customer_visits WHERE customer_id = ? AND status = 'completed'",
+            f"SELECT COUNT(*) FROM customer_visits v WHERE customer_id = ? AND {open_follow_up_sql('customer_visits', 'v')}",
+            f"SELECT COUNT(*) FROM sales_activities a WHERE customer_id = ? AND {open_follow_up_sql('sales_activities', 'a')}"
+        ])
+        summary, (row,) = timed(["SELECT order_count, lifetime_value, last_order_ts, last_visit_ts, open_follow_ups "
+                                 "FROM customer_summary WHERE customer_id = ?"])
+        return {
+            'orders': orders,
+            'heavy_customer_orders': heavy_orders,
+            'per_source_queries_ms': round(per_source * 1000, 3),
+            'summary_lookup_ms': round(summary * 1000, 4),
+            'order_inserts_without_triggers_ms': round(plain * 1000, 1),
+            'order_inserts_with_triggers_ms': round(triggered * 1000, 1),
+            'heavy_customer_summary': row[0]
+        }
+    finally:
+        conn.close()
+
+if __name__ == '__main__':
+    run(benchmark_customer_details)
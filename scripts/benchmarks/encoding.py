@@ -0,0 +1,75 @@
+"""
+Money and date storage encodings
+Compares REAL amounts and text dates, as the schema stored them before
+migration 1, with INTEGER rupiah and YYYYMMDD date keys on generated orders
+in an in-memory database.
+"""
+import sqlite3
+import time
+
+from scripts.benchmarks import run
+
+def benchmark_encoding(rows=200000, repeat=3):
+    """Compare REAL/text storage with INTEGER rupiah/date-key storage on generated orders"""
+    conn = sqlite3.connect(':memory:')
+    try:
+        cursor = conn.cursor()
+        cursor.execute("CREATE TABLE legacy_orders (id INTEGER PRIMARY KEY, total_amount REAL, order_date TIMESTAMP)")
+        cursor.execute("CREATE TABLE encoded_orders (id INTEGER PRIMARY KEY, total_amount INTEGER, order_local_date INTEGER)")
+        cursor.execute("CREATE INDEX idx_legacy_date ON legacy_orders (order_date)")
+        cursor.execute("CREATE INDEX idx_encoded_date ON encoded_orders (order_local_date)")
+
+        # Two years of orders with rupiah amounts that are not exact in binary floating point
+        start = 1672531200  # 2023-01-01 00:00 WIB as naive wall-clock epoch
+        generated = [
+            (i, 10000 + (i * 7919) % 5000000 + 0.1 * (i % 10), start + (i * 317) % (730 * 86400))
+            for i in range(1, rows + 1)
+        ]
+        cursor.executemany(
+            "INSERT INTO legacy_orders VALUES (?, ?, datetime(?, 'unixepoch'))",
+            [(i, amount, ts) for i, amount, ts in generated])
+        cursor.executemany(
+            "INSERT INTO encoded_orders VALUES (?, ?, CAST(strftime('%Y%m%d', ?, 'unixepoch') AS INTEGER))",
+            [(i, round(amount), ts) for i, amount, ts in generated])
+        conn.commit()
+
+        queries = [
+            ('Total revenue',
+             "SELECT SUM(total_amount) FROM legacy_orders",
+             "SELECT SUM(total_amount) FROM encoded_orders", (), ()),
+            ('Revenue for one month',
+             "SELECT SUM(total_amount) FROM legacy_orders WHERE order_date >= ? AND order_date < ?",
+             "SELECT SUM(total_amount) FROM encoded_orders WHERE order_local_date >= ? AND order_local_date < ?",
+             ('2024-03-01', '2024-04-01'), (20240301, 20240401)),
+            ('Daily totals for one month',
+             "SELECT date(order_date), SUM(total_amount) FROM legacy_orders "
+             "WHERE order_date >= ? AND order_date < ? GROUP BY date(order_date)",
+             "SELECT order_local_date, SUM(total_amount) FROM encoded_orders "
+             "WHERE order_local_date >= ? AND order_local_date < ? GROUP BY order_local_date",
+             ('2024-03-01', '2024-04-01'), (20240301, 20240401))
+        ]
+
+        results = []
+        for label, legacy_sql, encoded_sql, legacy_params, encoded_params in queries:
+            timings = {}
+            for name, sql, params in (('legacy', legacy_sql, legacy_params), ('encoded', encoded_sql, encoded_params)):
+                best = None
+                for _ in range(repeat):
+                    started = time.perf_counter()
+                    cursor.execute(sql, params).fetchall()
+                    elapsed = time.perf_counter() - started
+                    best = elapsed if best is None else min(best, elapsed)
+                timings[name] = best
+            results.append({
+                'query': label,
+                'rows': rows,
+                'legacy_ms': round(timings['legacy'] * 1000, 2),
+                'encoded_ms': round(timings['encoded'] * 1000, 2),
+                'speedup': round(timings['legacy'] / timings['encoded'], 1) if timings['encoded'] else None
+            })
+        return results
+    finally:
+        conn.close()
+
+if __name__ == '__main__':
+    run(benchmark_encoding)
@@ -0,0 +1,36 @@
+"""
+Catalog demand forecasting
+Fits a generated catalog, a year of daily demand per product mixing
+seasonal and intermittent products, in memory with forecast_matrix.
+"""
+import time
+
+import numpy as np
+
+from scripts.benchmarks import run
+from utils.forecasting import forecast_matrix
+
+def benchmark_forecasting(products=20000, days=365, horizon=28, seed=7):
+    """Fit a generated catalog (a mix of seasonal and intermittent products) in memory"""
+    rng = np.random.default_rng(seed)
+    base = rng.gamma(2.0, 5.0, size=(products, 1))
+    weekly = 1 + 0.3 * np.sin(2 * np.pi * np.arange(days) / 7)[None, :]
+    matrix = rng.poisson(base * weekly).astype(float)
+    sparse = rng.random(products) < 0.4
+    matrix[sparse] *= rng.random((sparse.sum(), days)) < 0.2
+
+    started = time.perf_counter()
+    forecast, lower, upper, models = forecast_matrix(matrix, horizon)
+    elapsed = time.perf_counter() - started
+    return {
+        'products': products,
+        'days': days,
+        'horizon': horizon,
+        'croston': int((models == 'croston').sum()),
+        'holt_winters': int((models == 'holt_winters').sum()),
+        'seconds': round(elapsed, 2),
+        'products_per_second': round(products / elapsed) if elapsed else None
+    }
+
+if __name__ == '__main__':
+    run(benchmark_forecasting)
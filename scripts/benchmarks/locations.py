@@ -0,0 +1,57 @@
+"""
+Stock queries as the number of depots grows
+Times per-product and per-depot queries on a generated location_stock
+table, with the same primary key and index as the live one, and shows their
+query plans. Depot counts are the location_counts argument.
+"""
+import sqlite3
+import time
+
+from scripts.benchmarks import run
+
+def benchmark_location_queries(location_counts=(10, 100, 500), products=2000, repeat=5):
+    """Time per-product and per-depot stock queries as the number of depots grows, with their query plans"""
+    results = []
+    for locations in location_counts:
+        conn = sqlite3.connect(':memory:')
+        try:
+            cursor = conn.cursor()
+            cursor.execute('''
+                CREATE TABLE location_stock (location_id INTEGER, product_id INTEGER, quantity INTEGER,
+                                             reserved_quantity INTEGER DEFAULT 0,
+                                             PRIMARY KEY (location_id, product_id)) WITHOUT ROWID
+            ''')
+            cursor.execute("CREATE INDEX idx_location_stock_product ON location_stock (product_id, location_id)")
+            cursor.executemany("INSERT INTO location_stock VALUES (?, ?, ?, 0)", (
+                (location, product, (location * 7919 + product * 104729) % 200)
+                for location in range(1, locations + 1) for product in range(1, products + 1)))
+            conn.commit()
+
+            queries = {
+                'product_availability': ('''
+                    SELECT location_id FROM location_stock WHERE product_id = ? AND quantity - reserved_quantity >= ?
+                ''', (products // 2, 100)),
+                'product_total': ("SELECT SUM(quantity) FROM location_stock WHERE product_id = ?", (products // 2,)),
+                'location_total': ("SELECT SUM(quantity) FROM location_stock WHERE location_id = ?", (locations // 2 + 1,)),
+                'location_product': ('''
+                    SELECT quantity FROM location_stock WHERE location_id = ? AND product_id = ?
+                ''', (locations // 2 + 1, products // 2))
+            }
+            row = {'locations': locations, 'rows': locations * products}
+            for name, (sql, params) in queries.items():
+                best = None
+                for _ in range(repeat):
+                    started = time.perf_counter()
+                    cursor.execute(sql, params).fetchall()
+                    elapsed = time.perf_counter() - started
+                    best = elapsed if best is None else min(best, elapsed)
+                plan = ' / '.join(detail for *_, detail in cursor.execute(f"EXPLAIN QUERY PLAN {sql}", params).fetchall())
+                row[f"{name}_ms"] = round(best * 1000, 3)
+                row[f"{name}_plan"] = plan
+            results.append(row)
+        finally:
+            conn.close()
+    return results
+
+if __name__ == '__main__':
+    run(benchmark_location_queries)
@@ -0,0 +1,79 @@
+"""
+Receivables aging
+Runs the aging report over a generated order history by scanning every
+order and through the open-invoice partial index, and times payment
+inserts with the trigger that updates paid_amount, in memory.
+"""
+import random
+import sqlite3
+import time
+
+from scripts.benchmarks import run
+from database.payments import _AGING_SQL, _OPEN_INVOICES_SQL, DAY
+
+def benchmark_aging(orders=1000000, open_share=0.1, customers=5000, payments=2000):
+    """Time the aging report on a generated order history through the open-invoice partial index and by
+    scanning every order, and the trigger cost of payment inserts"""
+    now_ts = int(time.time())
+    conn = sqlite3.connect(':memory:')
+    try:
+        cursor = conn.cursor()
+        cursor.execute("CREATE TABLE customers (id INTEGER PRIMARY KEY, name TEXT)")
+        cursor.execute("CREATE TABLE sales_orders (id INTEGER PRIMARY KEY, customer_id INTEGER, sales_rep TEXT, "
+                       "order_number TEXT, total_amount INTEGER, paid_amount INTEGER DEFAULT 0, status TEXT, "
+                       "order_ts INTEGER)")
+        cursor.execute("CREATE TABLE payments (id INTEGER PRIMARY KEY, sales_order_id INTEGER, amount INTEGER)")
+        cursor.execute('''
+            CREATE TRIGGER trg_payments_insert_order AFTER INSERT ON payments
+            BEGIN
+                UPDATE sales_orders SET paid_amount = COALESCE(paid_amount, 0) + NEW.amount WHERE id = NEW.sales_order_id;
+            END
+        ''')
+        cursor.executemany("INSERT INTO customers VALUES (?, ?)", ((n, f'Customer {n}') for n in range(1, customers + 1)))
+        # Orders spread over two years; all but the open share are paid in full
+        rng = random.Random(5)
+        cursor.executemany('''
+            INSERT INTO sales_orders (customer_id, order_number, total_amount, paid_amount, status, order_ts)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', ((rng.randint(1, customers), f'ORD-{n:08d}', 100000 + n % 997 * 1000,
+               0 if rng.random() < open_share else 100000 + n % 997 * 1000,
+               'delivered', now_ts - (orders - n) * (730 * DAY // orders)) for n in range(orders)))
+        conn.commit()
+
+        def timed(sql, params):
+            started = time.perf_counter()
+            rows = cursor.execute(sql, params).fetchall()
+            return time.perf_counter() - started, rows
+
+        scan, scanned = timed(_AGING_SQL, {'as_of': now_ts})
+        cursor.execute('''
+            CREATE INDEX idx_sales_orders_open ON sales_orders (customer_id, order_ts, total_amount, paid_amount)
+            WHERE status != 'cancelled' AND paid_amount < total_amount
+        ''')
+        indexed, report = timed(_AGING_SQL, {'as_of': now_ts})
+        customer, _ = timed(_OPEN_INVOICES_SQL.format(customer='AND so.customer_id = :customer_id'),
+                            {'as_of': now_ts, 'limit': 500, 'customer_id': 1})
+        open_ids = [row[0] for row in cursor.execute(
+            "SELECT id FROM sales_orders WHERE status != 'cancelled' AND paid_amount < total_amount LIMIT ?",
+            (payments,))]
+        started = time.perf_counter()
+        cursor.executemany("INSERT INTO payments (sales_order_id, amount) VALUES (?, 50000)",
+                           [(order_id,) for order_id in open_ids])
+        conn.commit()
+        payment_seconds = time.perf_counter() - started
+        return {
+            'orders': orders,
+            'open_invoices': sum(row[3] for row in report),
+            'customers_with_balance': len(report),
+            'aging_full_scan_ms': round(scan * 1000, 1),
+            'aging_partial_index_ms': round(indexed * 1000, 1),
+            'customer_open_invoices_ms': round(customer * 1000, 2),
+            'payment_inserts': len(open_ids),
+            'payment_inserts_ms': round(payment_seconds * 1000, 1),
+            'consistent': sorted(scanned) == sorted(report)
+        }
+    finally:
+        conn.close()
+
+if __name__ == '__main__':
+    run(benchmark_aging)
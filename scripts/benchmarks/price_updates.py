@@ -0,0 +1,67 @@
+"""
+Bulk price updates
+Stages and applies a category rule plus a CSV on a generated in-memory
+catalog, with the same per-row change-log trigger as the live products
+table.
+"""
+import sqlite3
+import time
+
+import pandas as pd
+
+from scripts.benchmarks import run
+from utils.price_updates import _apply
+
+def benchmark_price_update(products=100000, categories=50):
+    """Time staging and applying a category rule plus a CSV on a generated in-memory catalog"""
+    conn = sqlite3.connect(':memory:')
+    conn.isolation_level = None
+    try:
+        cursor = conn.cursor()
+        cursor.execute('''
+            CREATE TABLE products (id INTEGER PRIMARY KEY, sku TEXT UNIQUE, name TEXT, category TEXT,
+                                   supplier TEXT, price INTEGER, updated_at TIMESTAMP)
+        ''')
+        cursor.execute('''
+            CREATE TABLE price_updates (id INTEGER PRIMARY KEY, update_key TEXT UNIQUE, description TEXT,
+                                        created_by TEXT, products_changed INTEGER, applied_ts INTEGER)
+        ''')
+        cursor.execute('''
+            CREATE TABLE price_history (id INTEGER PRIMARY KEY, product_id INTEGER, old_price INTEGER,
+                                        new_price INTEGER, update_id INTEGER, changed_by TEXT, changed_ts INTEGER)
+        ''')
+        # Same per-row change-log trigger cost as the live products table
+        cursor.execute("CREATE TABLE change_log (id INTEGER PRIMARY KEY, entity TEXT, record_id INTEGER, operation TEXT, changed_ts INTEGER)")
+        cursor.execute('''
+            CREATE TRIGGER trg_products_update AFTER UPDATE ON products BEGIN
+                INSERT INTO change_log (entity, record_id, operation, changed_ts)
+                VALUES ('products', NEW.id, 'update', CAST(strftime('%s', 'now') AS INTEGER));
+            END
+        ''')
+        cursor.executemany("INSERT INTO products VALUES (?, ?, ?, ?, ?, ?, NULL)", (
+            (i, f"SKU{i:07d}", f"Product {i}", f"Category {i % categories}", f"Supplier {i % 7}",
+             1000 + (i * 7919) % 500000)
+            for i in range(1, products + 1)))
+        csv_rows = pd.DataFrame({'sku': [f"SKU{i:07d}" for i in range(1, products + 1, 10)],
+                                 'price': [5000] * len(range(1, products + 1, 10))})
+        rules = [{'field': 'category', 'value': f"Category {c}", 'kind': 'percent', 'change': 5}
+                 for c in range(categories // 2)]
+
+        started = time.perf_counter()
+        cursor.execute("BEGIN IMMEDIATE")
+        result = _apply(cursor, 'benchmark', rules, csv_rows, 100, 'benchmark', 'benchmark')
+        cursor.execute("COMMIT")
+        elapsed = time.perf_counter() - started
+        return {
+            'products': products,
+            'rules': len(rules),
+            'csv_rows': len(csv_rows),
+            'products_changed': result['changed'],
+            'seconds': round(elapsed, 2),
+            'products_per_second': round(products / elapsed) if elapsed else None
+        }
+    finally:
+        conn.close()
+
+if __name__ == '__main__':
+    run(benchmark_price_update)
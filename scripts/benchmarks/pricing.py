@@ -0,0 +1,89 @@
+"""
+Price-list evaluation
+Prices a cart and a bulk repricing run on a generated catalog with the
+vectorized PriceIndex and with a line-by-line loop over the same index, and
+checks that both give the same prices.
+"""
+import functools
+import time
+
+import numpy as np
+import pandas as pd
+
+from scripts.benchmarks import run
+from utils.pricing import ANY_GROUP, NO_GROUP, PriceIndex
+
+def evaluate_per_line(index, product_ids, quantities, group_codes, date_keys):
+    """Line-by-line reference for PriceIndex.evaluate(); returns the unit prices only"""
+    lines = len(product_ids)
+    group_codes = np.broadcast_to(np.asarray(group_codes), (lines,))
+    date_keys = np.broadcast_to(np.asarray(date_keys), (lines,))
+    prices = []
+    for product_id, quantity, group_code, date_key in zip(product_ids, quantities, group_codes, date_keys):
+        position = int(np.searchsorted(index.product_ids, product_id))
+        base = index.base_prices[position]
+        price = base
+        for rule in range(index.offsets[position], index.offsets[position + 1]):
+            if (index.min_quantity[rule] <= quantity
+                    and index.group_code[rule] in (ANY_GROUP, group_code)
+                    and index.valid_from[rule] <= date_key <= index.valid_to[rule]):
+                fixed = index.fixed_price[rule]
+                price = base * (1 - index.discount[rule] / 100) if np.isnan(fixed) else fixed
+                break
+        prices.append(int(np.floor(price + 0.5)))
+    return np.array(prices, dtype=np.int64)
+
+def benchmark_pricing(products=5000, rules_per_product=3, cart_lines=200, bulk_lines=100000, seed=7):
+    """Vectorized index evaluation versus a per-line loop on a generated catalog"""
+    rng = np.random.default_rng(seed)
+    product_frame = pd.DataFrame({'id': np.arange(1, products + 1),
+                                  'price': rng.integers(1000, 500000, products)})
+    specific = products * rules_per_product
+    rules = pd.DataFrame({
+        'id': np.arange(1, specific + 1),
+        'product_id': np.repeat(product_frame['id'].to_numpy(), rules_per_product).astype(float),
+        'min_quantity': rng.choice([1, 12, 24, 48, 100], specific),
+        'price': np.where(rng.random(specific) < 0.3, rng.integers(1000, 500000, specific), np.nan),
+        'discount_percentage': rng.choice([2.5, 5.0, 7.5, 12.0], specific),
+        'valid_from': np.where(rng.random(specific) < 0.2, 20300101, np.nan),
+        'valid_to': np.nan,
+        'customer_group': rng.choice(np.array(['wholesale', 'modern_trade', None], dtype=object), specific),
+        'priority': rng.integers(0, 3, specific)
+    })
+    # The standard catalog-wide quantity tiers
+    rules = pd.concat([rules, pd.DataFrame({
+        'id': [specific + 1, specific + 2], 'product_id': [np.nan, np.nan], 'min_quantity': [50, 100],
+        'price': [np.nan, np.nan], 'discount_percentage': [10.0, 15.0], 'valid_from': [np.nan, np.nan],
+        'valid_to': [np.nan, np.nan], 'customer_group': [None, None], 'priority': [0, 0]
+    })], ignore_index=True)
+
+    started = time.perf_counter()
+    index = PriceIndex(product_frame, rules)
+    compile_seconds = time.perf_counter() - started
+
+    results = []
+    for label, lines in (('Cart', cart_lines), ('Bulk repricing', bulk_lines)):
+        product_ids = rng.integers(1, products + 1, lines)
+        quantities = rng.integers(1, 150, lines)
+        group_codes = rng.choice([NO_GROUP] + list(index.groups.values()), lines)
+        timings = {}
+        per_line = functools.partial(evaluate_per_line, index)
+        for name, method in (('vectorized', index.evaluate), ('per_line', per_line)):
+            started = time.perf_counter()
+            output = method(product_ids, quantities, group_codes, 20250601)
+            timings[name] = time.perf_counter() - started
+            timings[name + '_prices'] = output[0] if isinstance(output, tuple) else output
+        results.append({
+            'workload': label,
+            'lines': lines,
+            'rules': len(rules),
+            'compile_ms': round(compile_seconds * 1000, 1),
+            'vectorized_ms': round(timings['vectorized'] * 1000, 2),
+            'per_line_ms': round(timings['per_line'] * 1000, 2),
+            'speedup': round(timings['per_line'] / timings['vectorized'], 1) if timings['vectorized'] else None,
+            'same_prices': bool(np.array_equal(timings['vectorized_prices'], timings['per_line_prices']))
+        })
+    return results
+
+if __name__ == '__main__':
+    run(benchmark_pricing)
@@ -0,0 +1,60 @@
+"""
+Catalog reorder query
+Runs the replenishment query over a generated catalog with a forecast
+horizon of demand per product and open purchase orders, in memory.
+"""
+import sqlite3
+import time
+from datetime import datetime, timedelta
+
+from scripts.benchmarks import run
+from config import Config
+from database.purchasing import _REORDER_SQL, _reorder_params
+from database.repository import INDONESIA_TZ, wib_date_key
+
+def benchmark_reorder(products=50000, suppliers=200, repeat=3):
+    """Time the reorder query over a generated catalog with forecasts and open purchase orders in memory"""
+    conn = sqlite3.connect(':memory:')
+    try:
+        cursor = conn.cursor()
+        cursor.executescript('''
+            CREATE TABLE products (id INTEGER PRIMARY KEY, sku TEXT, name TEXT, supplier TEXT, cost INTEGER,
+                                   stock_quantity INTEGER, reserved_quantity INTEGER, min_stock_level INTEGER,
+                                   max_stock_level INTEGER);
+            CREATE TABLE purchase_orders (id INTEGER PRIMARY KEY, status TEXT);
+            CREATE TABLE purchase_order_items (purchase_order_id INTEGER, product_id INTEGER, quantity INTEGER,
+                                               received_quantity INTEGER DEFAULT 0);
+            CREATE INDEX idx_purchase_order_items_product ON purchase_order_items (product_id);
+            CREATE TABLE demand_forecasts (product_id INTEGER, forecast_date INTEGER, quantity REAL,
+                                           PRIMARY KEY (product_id, forecast_date)) WITHOUT ROWID;
+        ''')
+        cursor.executemany("INSERT INTO products VALUES (?, ?, ?, ?, 1000, ?, ?, 20, 200)", (
+            (n, f"SKU{n:06d}", f"Product {n}", f"Supplier {n % suppliers}", (n * 7919) % 150, n % 5)
+            for n in range(1, products + 1)))
+        cursor.execute("INSERT INTO purchase_orders VALUES (1, 'ordered')")
+        cursor.executemany("INSERT INTO purchase_order_items VALUES (1, ?, 50, 0)", (
+            (n,) for n in range(1, products + 1, 10)))
+        today = datetime.now(INDONESIA_TZ).date()
+        days = [wib_date_key(today + timedelta(days=h)) for h in range(1, Config.FORECAST_HORIZON_DAYS + 1)]
+        cursor.executemany("INSERT INTO demand_forecasts VALUES (?, ?, ?)", (
+            (n, day, (n % 13) / 2) for n in range(1, products + 1) for day in days))
+        conn.commit()
+
+        best = None
+        for _ in range(repeat):
+            started = time.perf_counter()
+            lines = cursor.execute(_REORDER_SQL, _reorder_params()).fetchall()
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        return {
+            'products': products,
+            'forecast_rows': products * len(days),
+            'reorder_lines': len(lines),
+            'suppliers': len({line[3] for line in lines}),
+            'seconds': round(best, 3)
+        }
+    finally:
+        conn.close()
+
+if __name__ == '__main__':
+    run(benchmark_reorder)
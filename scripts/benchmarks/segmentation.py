@@ -0,0 +1,95 @@
+"""
+RFM segmentation refreshes
+Times a full refresh over generated orders, an incremental one after a
+share of customers order again, and the vectorized scoring against a
+per-customer loop, in memory.
+"""
+import sqlite3
+import time
+
+import numpy as np
+import pandas as pd
+
+from scripts.benchmarks import run
+from utils.segmentation import DAY, aggregate_rfm, rescore, score_rfm
+
+def benchmark_segmentation(customers=50000, orders=1000000, changed=0.01, seed=11):
+    """Time a full refresh, an incremental one after a share of customers order again, and the
+    vectorized scoring against a per-customer loop"""
+    rng = np.random.default_rng(seed)
+    now_ts = int(time.time())
+    conn = sqlite3.connect(':memory:')
+    try:
+        cursor = conn.cursor()
+        cursor.execute("CREATE TABLE sales_orders (id INTEGER PRIMARY KEY, customer_id INTEGER, total_amount INTEGER, "
+                       "status TEXT, order_ts INTEGER)")
+        cursor.execute("CREATE INDEX idx_sales_orders_customer ON sales_orders (customer_id)")
+        cursor.execute("CREATE TABLE mobile_orders (id INTEGER PRIMARY KEY, customer_id INTEGER, total_amount INTEGER, "
+                       "status TEXT, order_ts INTEGER)")
+        cursor.execute("CREATE INDEX idx_mobile_orders_customer ON mobile_orders (customer_id)")
+        cursor.execute("CREATE TABLE customer_archive_totals (customer_id INTEGER PRIMARY KEY, order_count INTEGER, "
+                       "order_value INTEGER, first_order_ts INTEGER, last_order_ts INTEGER)")
+        cursor.execute('''
+            CREATE TABLE customer_segments (customer_id INTEGER PRIMARY KEY, frequency INTEGER NOT NULL,
+                monetary INTEGER NOT NULL, first_order_ts INTEGER, last_order_ts INTEGER, recency_score INTEGER,
+                frequency_score INTEGER, monetary_score INTEGER, segment TEXT, computed_ts INTEGER)
+        ''')
+        cursor.execute("CREATE TABLE customer_segment_queue (customer_id INTEGER PRIMARY KEY) WITHOUT ROWID")
+        # Half the orders from a few heavy buyers, the rest spread across all customers
+        buyers = np.where(rng.random(orders) < 0.5, np.minimum(rng.zipf(1.6, orders), customers),
+                          rng.integers(1, customers + 1, orders))
+        cursor.executemany("INSERT INTO sales_orders (customer_id, total_amount, status, order_ts) VALUES (?, ?, ?, ?)", zip(
+            buyers.tolist(), rng.integers(50000, 5000000, orders).tolist(),
+            np.where(rng.random(orders) < 0.03, 'cancelled', 'completed').tolist(),
+            (now_ts - rng.integers(0, 730 * DAY, orders)).tolist()))
+        conn.commit()
+
+        started = time.perf_counter()
+        aggregate_rfm(cursor, full=True)
+        rescore(cursor, now_ts)
+        conn.commit()
+        full_seconds = time.perf_counter() - started
+
+        returning = rng.choice(customers, max(1, int(customers * changed)), replace=False) + 1
+        cursor.executemany("INSERT INTO sales_orders (customer_id, total_amount, status, order_ts) VALUES (?, ?, 'completed', ?)",
+                           [(int(c), 250000, now_ts) for c in returning])
+        cursor.executemany("INSERT OR IGNORE INTO customer_segment_queue VALUES (?)", [(int(c),) for c in returning])
+        conn.commit()
+        started = time.perf_counter()
+        aggregated = aggregate_rfm(cursor)
+        written = rescore(cursor, now_ts)
+        conn.commit()
+        incremental_seconds = time.perf_counter() - started
+
+        stored = pd.read_sql_query("SELECT customer_id, frequency, monetary, first_order_ts, last_order_ts "
+                                   "FROM customer_segments", conn)
+        started = time.perf_counter()
+        score_rfm(stored, now_ts)
+        vectorized_seconds = time.perf_counter() - started
+        # Per-customer scoring: percentile of each value looked up against the sorted columns
+        sample = stored.head(2000)
+        columns = {name: np.sort(stored[name].fillna(0).to_numpy()) for name in ('last_order_ts', 'frequency', 'monetary')}
+        started = time.perf_counter()
+        for row in sample.itertuples():
+            for name in columns:
+                value = getattr(row, name)
+                np.searchsorted(columns[name], value, side='right') / len(columns[name])
+        loop_seconds = (time.perf_counter() - started) * len(stored) / max(len(sample), 1)
+        segments = dict(cursor.execute("SELECT segment, COUNT(*) FROM customer_segments GROUP BY segment").fetchall())
+        return {
+            'orders': orders,
+            'customers_with_orders': len(stored),
+            'full_refresh_seconds': round(full_seconds, 2),
+            'customers_reordered': len(returning),
+            'incremental_customers_aggregated': aggregated,
+            'incremental_segments_written': written,
+            'incremental_refresh_seconds': round(incremental_seconds, 3),
+            'vectorized_scoring_ms': round(vectorized_seconds * 1000, 1),
+            'per_customer_scoring_ms_estimated': round(loop_seconds * 1000, 1),
+            'segments': segments
+        }
+    finally:
+        conn.close()
+
+if __name__ == '__main__':
+    run(benchmark_segmentation)
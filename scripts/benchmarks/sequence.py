@@ -0,0 +1,73 @@
+"""
+Document number allocation under concurrency
+Several threads draw numbers from one counter in a scratch WAL database,
+each with its own SequenceAllocator as a separate app process would, and
+the result reports throughput and any duplicate numbers.
+"""
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+
+from scripts.benchmarks import run
+from database import init_db
+from database.sequence import SequenceAllocator
+
+def _run_workers(name, orders, workers, block_size):
+    """Draw the numbers from threads on the configured database; returns the figures"""
+    allocators = [SequenceAllocator(block_size) for _ in range(workers)]
+    results = [[] for _ in range(workers)]
+    per_worker = orders // workers
+
+    def work(index):
+        allocator, values = allocators[index], results[index]
+        for _ in range(per_worker):
+            values.append(allocator.next_value(name))
+
+    threads = [threading.Thread(target=work, args=(index,)) for index in range(workers)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    values = [value for worker_values in results for value in worker_values]
+    conn = init_db.get_connection()
+    try:
+        row = conn.execute("SELECT next_value FROM sequences WHERE name = ?", (name,)).fetchone()
+    finally:
+        conn.close()
+    return {
+        'orders': len(values),
+        'workers': workers,
+        'block_size': allocators[0].block_size,
+        'blocks_reserved': (row[0] - 1) // allocators[0].block_size if row else 0,
+        'duplicates': len(values) - len(set(values)),
+        'seconds': round(elapsed, 3),
+        'orders_per_second': round(len(values) / elapsed) if elapsed else None
+    }
+
+def benchmark_sequence(orders=20000, workers=4, block_size=None):
+    """Hand out numbers from several threads, each with its own allocator as a separate process would"""
+    name = 'BENCH'
+    directory = tempfile.mkdtemp(prefix='penzflow_sequence_')
+    path = os.path.join(directory, 'bench.db')
+    conn = sqlite3.connect(path)
+    try:
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("CREATE TABLE sequences (name TEXT PRIMARY KEY, next_value INTEGER NOT NULL, updated_ts INTEGER)")
+    finally:
+        conn.close()
+    saved = init_db.get_db_path
+    init_db.get_db_path = lambda: path
+    try:
+        return _run_workers(name, orders, workers, block_size)
+    finally:
+        init_db.get_db_path = saved
+        shutil.rmtree(directory, ignore_errors=True)
+
+if __name__ == '__main__':
+    run(benchmark_sequence)
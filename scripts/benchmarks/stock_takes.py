@@ -0,0 +1,88 @@
+"""
+Stock take counting and posting
+Times a count upload, the variance calculation and posting the adjustments
+for a generated catalog on an in-memory database with the ledger's tables.
+"""
+import sqlite3
+import time
+
+import numpy as np
+import pandas as pd
+
+from scripts.benchmarks import run
+from database.ledger import post_stock_batch
+from database.stock_takes import compute_variances
+
+def benchmark_stock_take(products=20000, variance_share=0.1):
+    """Count upload, variance and posting times for a generated catalog on an in-memory database"""
+    conn = sqlite3.connect(':memory:', isolation_level=None)
+    try:
+        cursor = conn.cursor()
+        cursor.executescript('''
+            CREATE TABLE products (id INTEGER PRIMARY KEY, sku TEXT UNIQUE, stock_quantity INTEGER, cost INTEGER,
+                                   average_cost REAL, updated_at TIMESTAMP);
+            CREATE TABLE cost_layers (id INTEGER PRIMARY KEY, product_id INTEGER, transaction_id INTEGER,
+                                      received_ts INTEGER, quantity INTEGER, remaining_quantity INTEGER,
+                                      unit_cost REAL);
+            CREATE TABLE locations (id INTEGER PRIMARY KEY, code TEXT);
+            CREATE TABLE location_stock (location_id INTEGER, product_id INTEGER, quantity INTEGER,
+                                         reserved_quantity INTEGER DEFAULT 0,
+                                         PRIMARY KEY (location_id, product_id)) WITHOUT ROWID;
+            CREATE TABLE inventory_transactions (id INTEGER PRIMARY KEY, product_id INTEGER, transaction_type TEXT,
+                                                 quantity INTEGER, reference_type TEXT, reference_id INTEGER,
+                                                 notes TEXT, created_at TIMESTAMP, balance_after INTEGER,
+                                                 created_ts INTEGER, created_local_date INTEGER, created_by TEXT,
+                                                 location_id INTEGER, unit_cost REAL, cost_amount REAL);
+            CREATE TABLE stock_take_lines (stock_take_id INTEGER, product_id INTEGER, expected_quantity INTEGER,
+                                           counted_quantity INTEGER, unit_cost INTEGER, counted_ts INTEGER,
+                                           PRIMARY KEY (stock_take_id, product_id)) WITHOUT ROWID;
+            INSERT INTO locations VALUES (1, 'MAIN');
+        ''')
+        cursor.executemany("INSERT INTO products VALUES (?, ?, ?, 1000, 1000, NULL)", (
+            (n, f"SKU{n:07d}", (n * 7919) % 300) for n in range(1, products + 1)))
+        cursor.execute("INSERT INTO location_stock SELECT 1, id, stock_quantity, 0 FROM products")
+        cursor.execute("INSERT INTO cost_layers SELECT id, id, NULL, 0, stock_quantity, stock_quantity, 1000 FROM products")
+        cursor.execute("INSERT INTO stock_take_lines SELECT 1, id, stock_quantity, NULL, 1000, NULL FROM products")
+        rng = np.random.default_rng(7)
+        expected = np.array([(n * 7919) % 300 for n in range(1, products + 1)])
+        off = rng.random(products) < variance_share
+        counted = np.where(off, np.maximum(expected + rng.integers(-5, 6, products), 0), expected)
+        counts = pd.DataFrame({'sku': [f"SKU{n:07d}" for n in range(1, products + 1)], 'counted': counted})
+
+        timings = {}
+        started = time.perf_counter()
+        cursor.execute("BEGIN")
+        cursor.execute("CREATE TEMP TABLE stock_take_counts (sku TEXT PRIMARY KEY, counted INTEGER)")
+        cursor.executemany("INSERT INTO temp.stock_take_counts VALUES (?, ?)",
+                           counts.itertuples(index=False, name=None))
+        cursor.execute('''
+            UPDATE stock_take_lines SET counted_quantity = c.counted
+            FROM temp.stock_take_counts c JOIN products p ON p.sku = c.sku
+            WHERE stock_take_lines.product_id = p.id
+        ''')
+        cursor.execute("COMMIT")
+        timings['record_counts_ms'] = round((time.perf_counter() - started) * 1000, 1)
+
+        started = time.perf_counter()
+        lines = compute_variances(pd.DataFrame(cursor.execute(
+            "SELECT product_id, expected_quantity, counted_quantity, unit_cost FROM stock_take_lines").fetchall(),
+            columns=['product_id', 'expected_quantity', 'counted_quantity', 'unit_cost']))
+        lines = lines[lines['variance'] != 0]
+        timings['variances_ms'] = round((time.perf_counter() - started) * 1000, 1)
+
+        started = time.perf_counter()
+        cursor.execute("BEGIN IMMEDIATE")
+        posted = post_stock_batch(cursor, zip(lines['product_id'].tolist(), lines['variance'].astype(int).tolist()),
+                                  'adjustment', 'stock_take', 1, 'benchmark', 'benchmark', 1)
+        cursor.execute("COMMIT")
+        timings['post_ms'] = round((time.perf_counter() - started) * 1000, 1)
+        consistent = cursor.execute('''
+            SELECT COUNT(*) FROM products p JOIN stock_take_lines l ON l.product_id = p.id
+            WHERE p.stock_quantity != l.counted_quantity
+        ''').fetchone()[0] == 0
+        return {'products': products, 'adjustments': posted, **timings, 'consistent': consistent}
+    finally:
+        conn.close()
+
+if __name__ == '__main__':
+    run(benchmark_stock_take)
@@ -0,0 +1,73 @@
+"""
+Low-stock alerts
+inventory_alerts holds one row per product in an alert state. Triggers on
+products insert, move or remove the row only when a stock or minimum
+level change crosses into, between or out of the alert levels, so counts
+and lists read the alerts alone instead of scanning the catalog. Digests
+group the alerts raised since the last digest by supplier, one e-mail per
+supplier.
+"""
+import time
+
+import pandas as pd
+
+from database.init_db import get_connection
+
+ALERT_LEVELS = ('critical', 'low', 'reorder')
+RECOMMENDED_ACTIONS = {'critical': 'Immediate Purchase', 'low': 'Order Soon', 'reorder': 'Consider Reorder'}
+
+def get_alert_counts():
+    """Number of products at each alert level"""
+    conn = get_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT level, COUNT(*) FROM inventory_alerts GROUP BY level")
+        counts = dict.fromkeys(ALERT_LEVELS, 0)
+        counts.update(cursor.fetchall())
+        return counts
+    finally:
+        conn.close()
+
+def get_alerts(level=None, pending_only=False):
+    """Alerted products with their current stock and supplier, most severe first"""
+    conditions, params = [], []
+    if level:
+        conditions.append("a.level = ?")
+        params.append(level)
+    if pending_only:
+        conditions.append("a.notified_ts IS NULL")
+    conn = get_connection()
+    try:
+        return pd.read_sql_query(f'''
+            SELECT a.product_id, a.level, p.sku, p.name AS product, p.stock_quantity, p.min_stock_level,
+                   COALESCE(p.reserved_quantity, 0) AS reserved_quantity, p.supplier, a.raised_ts, a.notified_ts
+            FROM inventory_alerts a JOIN products p ON p.id = a.product_id
+            {'WHERE ' + ' AND '.join(conditions) if conditions else ''}
+            ORDER BY CASE a.level WHEN 'critical' THEN 0 WHEN 'low' THEN 1 ELSE 2 END, p.stock_quantity, p.sku
+        ''', conn, params=params)
+    finally:
+        conn.close()
+
+def build_supplier_digests(pending_only=True):
+    """Alerts grouped per supplier as (supplier, alerts frame, plain-text body), by default only those
+    not yet sent at their current level"""
+    alerts = get_alerts(pending_only=pending_only)
+    digests = []
+    for supplier, lines in alerts.groupby(alerts['supplier'].fillna('No supplier'), sort=True):
+        body = [f"Stock alerts for {supplier}: {len(lines)} products", ""]
+        for line in lines.itertuples():
+            body.append(f"[{line.level.upper()}] {line.sku} {line.product}: {line.stock_quantity} in stock, "
+                        f"min {line.min_stock_level} - {RECOMMENDED_ACTIONS[line.level]}")
+        digests.append((supplier, lines, "\n".join(body)))
+    return digests
+
+def mark_notified(product_ids, notified_ts=None):
+    """Record that these alerts went out in a digest"""
+    notified_ts = notified_ts or int(time.time())
+    conn = get_connection()
+    try:
+        conn.executemany("UPDATE inventory_alerts SET notified_ts = ? WHERE product_id = ?",
+                         [(notified_ts, int(product_id)) for product_id in product_ids])
+        conn.commit()
+    finally:
+        conn.close()
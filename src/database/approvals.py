@@ -0,0 +1,225 @@
+"""
+Mobile order approval
+Submitted field orders wait in the approval queue until a manager approves
+or rejects them, usually many at a time. Approved orders are converted to
+sales orders in transactions of Config.APPROVAL_BATCH_SIZE: the orders and
+their items are inserted set-based from a temp table of the batch, each
+order's reserved stock is issued with one batched ledger posting, the
+reservations are closed together and the salesmen's active sales targets
+are raised by the amount approved. A converted mobile order keeps a link to
+its sales order and stops counting in customer totals and credit exposure,
+which count the sales order instead.
+"""
+import time
+
+import pandas as pd
+
+from config import Config
+from database.credit import invalidate_credit
+from database.init_db import get_connection
+from database.ledger import post_stock_batch
+from database.reservations import InsufficientStockError, release_order_batch, reserve_items
+from database.sequence import next_number
+
+QUEUE_STATUSES = ('submitted', 'approved')
+_IN_QUEUE = "status IN ('submitted', 'approved')"
+
+def get_approval_queue(limit=500):
+    """Orders waiting for approval, oldest first, with the customer's credit position"""
+    conn = get_connection()
+    try:
+        return pd.read_sql_query(f'''
+            SELECT mo.id, mo.order_number, mo.order_date, mo.status, COALESCE(u.username, '-') AS salesman,
+                   mo.customer_id, COALESCE(c.name, '-') AS customer, mo.total_amount, mo.payment_terms,
+                   COALESCE(l.code, '-') AS location,
+                   (SELECT COUNT(*) FROM mobile_order_items i WHERE i.mobile_order_id = mo.id) AS items,
+                   c.credit_limit, COALESCE(s.outstanding_amount, 0) + COALESCE(s.credit_order_amount, 0) AS exposure
+            FROM mobile_orders mo
+            LEFT JOIN users u ON u.id = mo.user_id
+            LEFT JOIN customers c ON c.id = mo.customer_id
+            LEFT JOIN customer_summary s ON s.customer_id = mo.customer_id
+            LEFT JOIN locations l ON l.id = mo.location_id
+            WHERE mo.{_IN_QUEUE}
+            ORDER BY mo.order_ts, mo.id
+            LIMIT ?
+        ''', conn, params=(limit,))
+    finally:
+        conn.close()
+
+def _reserve_unreserved(cursor):
+    """Reserve the stock of batch orders that hold none (submitted before reservations existed); orders
+    that are short leave the batch. Returns [(mobile order number, shortages)]"""
+    cursor.execute('''
+        SELECT b.mobile_order_id, mo.order_number, mo.location_id FROM temp.conversion_batch b
+        JOIN mobile_orders mo ON mo.id = b.mobile_order_id
+        WHERE NOT EXISTS (SELECT 1 FROM stock_reservations r WHERE r.order_type = 'mobile_order'
+                          AND r.order_id = b.mobile_order_id AND r.status = 'active')
+    ''')
+    short = []
+    for order_id, order_number, location_id in cursor.fetchall():
+        cursor.execute("SELECT product_id, quantity FROM mobile_order_items WHERE mobile_order_id = ?", (order_id,))
+        items = [{'product_id': product_id, 'quantity': quantity} for product_id, quantity in cursor.fetchall()]
+        cursor.execute("SAVEPOINT conversion_reserve")
+        try:
+            reserve_items(cursor, 'mobile_order', order_id, items, location_id=location_id)
+        except InsufficientStockError as e:
+            cursor.execute("ROLLBACK TO conversion_reserve")
+            cursor.execute("DELETE FROM temp.conversion_batch WHERE mobile_order_id = ?", (order_id,))
+            short.append((order_number, e.shortages))
+        cursor.execute("RELEASE conversion_reserve")
+    return short
+
+def convert_batch(cursor, numbers, reviewed_by=None):
+    """Approve and convert mobile orders to sales orders on the caller's transaction; numbers maps each
+    mobile order id to its new sales order number. Orders no longer in the queue are skipped. Returns a
+    summary with the (mobile, sales) order numbers converted."""
+    reviewed_ts = int(time.time())
+    cursor.execute('''
+        CREATE TEMP TABLE IF NOT EXISTS conversion_batch (mobile_order_id INTEGER PRIMARY KEY, order_number TEXT,
+                                                          sales_order_id INTEGER)
+    ''')
+    cursor.execute("DELETE FROM temp.conversion_batch")
+    cursor.executemany("INSERT INTO temp.conversion_batch (mobile_order_id, order_number) VALUES (?, ?)",
+                       [(int(order_id), number) for order_id, number in numbers.items()])
+    cursor.execute(f'''
+        DELETE FROM temp.conversion_batch
+        WHERE mobile_order_id NOT IN (SELECT id FROM mobile_orders WHERE {_IN_QUEUE})
+    ''')
+    skipped = cursor.rowcount
+    short = _reserve_unreserved(cursor)
+
+    cursor.execute('''
+        INSERT INTO sales_orders (order_number, customer_id, order_date, total_amount, status, payment_method,
+                                  sales_rep, notes, order_ts, order_local_date)
+        SELECT b.order_number, mo.customer_id, mo.order_date, mo.total_amount, 'shipped', mo.payment_terms,
+               u.username, 'Mobile order ' || mo.order_number || COALESCE(': ' || mo.special_instructions, ''),
+               mo.order_ts, mo.order_local_date
+        FROM temp.conversion_batch b
+        JOIN mobile_orders mo ON mo.id = b.mobile_order_id
+        LEFT JOIN users u ON u.id = mo.user_id
+        ORDER BY b.mobile_order_id
+    ''')
+    converted = cursor.rowcount
+    cursor.execute('''
+        UPDATE temp.conversion_batch
+        SET sales_order_id = (SELECT id FROM sales_orders so WHERE so.order_number = conversion_batch.order_number)
+    ''')
+    cursor.execute('''
+        INSERT INTO order_items (order_id, product_id, quantity, unit_price, total_price)
+        SELECT b.sales_order_id, i.product_id, i.quantity, i.unit_price, i.total_price
+        FROM temp.conversion_batch b JOIN mobile_order_items i ON i.mobile_order_id = b.mobile_order_id
+        ORDER BY b.sales_order_id, i.id
+    ''')
+    items = cursor.rowcount
+
+    # Issue what each order reserved, one posting per order and depot, then close the reservations together
+    cursor.execute('''
+        SELECT b.sales_order_id, r.location_id, r.product_id, SUM(r.quantity)
+        FROM temp.conversion_batch b
+        JOIN stock_reservations r ON r.order_type = 'mobile_order' AND r.order_id = b.mobile_order_id
+                                 AND r.status = 'active'
+        GROUP BY b.sales_order_id, r.location_id, r.product_id
+        ORDER BY b.sales_order_id, r.location_id, r.product_id
+    ''')
+    postings = {}
+    for sales_order_id, location_id, product_id, quantity in cursor.fetchall():
+        postings.setdefault((sales_order_id, location_id), []).append((product_id, -quantity))
+    movements = sum(post_stock_batch(cursor, lines, 'out', 'sales_order', sales_order_id, created_by=reviewed_by,
+                                     location_id=location_id)
+                    for (sales_order_id, location_id), lines in postings.items())
+    cursor.execute("SELECT mobile_order_id FROM temp.conversion_batch")
+    release_order_batch(cursor, 'mobile_order', [row[0] for row in cursor.fetchall()], 'fulfilled')
+
+    cursor.execute('''
+        UPDATE mobile_orders
+        SET status = 'converted', sales_order_id = b.sales_order_id, reviewed_by = ?, reviewed_ts = ?,
+            updated_at = CURRENT_TIMESTAMP
+        FROM temp.conversion_batch b WHERE mobile_orders.id = b.mobile_order_id
+    ''', (reviewed_by, reviewed_ts))
+    cursor.execute('''
+        UPDATE sales_targets SET achieved_amount = COALESCE(achieved_amount, 0) + a.amount
+        FROM (SELECT t.id, SUM(COALESCE(mo.total_amount, 0)) AS amount
+              FROM temp.conversion_batch b
+              JOIN mobile_orders mo ON mo.id = b.mobile_order_id
+              JOIN sales_targets t ON t.user_id = mo.user_id AND t.status = 'active'
+               AND mo.order_local_date BETWEEN CAST(strftime('%Y%m%d', t.start_date) AS INTEGER)
+                                           AND CAST(strftime('%Y%m%d', t.end_date) AS INTEGER)
+              GROUP BY t.id) a
+        WHERE sales_targets.id = a.id
+    ''')
+    targets = cursor.rowcount
+    cursor.execute('''
+        SELECT mo.order_number, b.order_number FROM temp.conversion_batch b
+        JOIN mobile_orders mo ON mo.id = b.mobile_order_id ORDER BY b.mobile_order_id
+    ''')
+    orders = cursor.fetchall()
+    cursor.execute("DELETE FROM temp.conversion_batch")
+    return {'converted': converted, 'orders': orders, 'skipped': skipped, 'short': short, 'items': items,
+            'movements': movements, 'targets_updated': targets}
+
+def approve_mobile_orders(order_ids, reviewed_by=None, progress=None):
+    """Approve mobile orders and convert them to sales orders, one transaction per
+    Config.APPROVAL_BATCH_SIZE orders; returns the combined summary"""
+    started = time.perf_counter()
+    order_ids = sorted({int(order_id) for order_id in order_ids})
+    summary = {'converted': 0, 'orders': [], 'skipped': 0, 'short': [], 'items': 0, 'movements': 0,
+               'targets_updated': 0, 'batches': 0}
+    for offset in range(0, len(order_ids), Config.APPROVAL_BATCH_SIZE):
+        batch = order_ids[offset:offset + Config.APPROVAL_BATCH_SIZE]
+        if progress:
+            progress(offset / len(order_ids), f"Converting orders {offset + 1}-{offset + len(batch)} of {len(order_ids)}")
+        numbers = {order_id: next_number('ORD') for order_id in batch}
+        conn = get_connection()
+        conn.isolation_level = None
+        try:
+            cursor = conn.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
+            try:
+                result = convert_batch(cursor, numbers, reviewed_by)
+                cursor.execute("COMMIT")
+            except Exception:
+                cursor.execute("ROLLBACK")
+                raise
+        finally:
+            conn.close()
+            # Cash-term orders become outstanding once converted
+            invalidate_credit()
+        for key in ('converted', 'skipped', 'items', 'movements', 'targets_updated'):
+            summary[key] += result[key]
+        summary['orders'] += result['orders']
+        summary['short'] += result['short']
+        summary['batches'] += 1
+    summary['seconds'] = round(time.perf_counter() - started, 2)
+    return summary
+
+def reject_mobile_orders(order_ids, reviewed_by=None, notes=None):
+    """Reject mobile orders still in the queue and release their stock in one transaction; returns the
+    number rejected"""
+    order_ids = sorted({int(order_id) for order_id in order_ids})
+    conn = get_connection()
+    conn.isolation_level = None
+    try:
+        cursor = conn.cursor()
+        cursor.execute("BEGIN IMMEDIATE")
+        try:
+            cursor.execute("CREATE TEMP TABLE IF NOT EXISTS rejection_batch (order_id INTEGER PRIMARY KEY)")
+            cursor.execute("DELETE FROM temp.rejection_batch")
+            cursor.executemany("INSERT INTO temp.rejection_batch (order_id) VALUES (?)", [(i,) for i in order_ids])
+            cursor.execute(f'''
+                UPDATE mobile_orders
+                SET status = 'rejected', reviewed_by = ?, reviewed_ts = ?, review_notes = ?,
+                    updated_at = CURRENT_TIMESTAMP
+                WHERE id IN (SELECT order_id FROM temp.rejection_batch) AND {_IN_QUEUE}
+                RETURNING id
+            ''', (reviewed_by, int(time.time()), notes))
+            rejected = [row[0] for row in cursor.fetchall()]
+            release_order_batch(cursor, 'mobile_order', rejected, 'rejected')
+            cursor.execute("DELETE FROM temp.rejection_batch")
+            cursor.execute("COMMIT")
+        except Exception:
+            cursor.execute("ROLLBACK")
+            raise
+    finally:
+        conn.close()
+        invalidate_credit()
+    return len(rejected)
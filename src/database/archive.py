@@ -0,0 +1,197 @@
+"""
+Cold-data archive
+Closed records older than Config.ARCHIVE_HORIZON_DAYS are moved out of the
+hot database into year-partitioned Parquet files under Config.ARCHIVE_DIR.
+The `archived_records` table keeps a compact (table, id, customer, date,
+year) index so history queries know which year files, if any, to read.
+Files are sorted by customer in small row groups, and reads pass their
+filters to the Parquet scan, so a customer's history decodes only the row
+groups that can hold their records.
+"""
+import os
+import time
+from datetime import date, timedelta
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from config import Config
+from database.init_db import counted_order_sql, get_connection
+
+# table: (date column, condition for a closed record, customer column)
+ARCHIVE_TABLES = {
+    'sales_orders': ('order_date', "(status = 'cancelled' OR (status IN ('completed', 'delivered') "
+                                   "AND paid_amount >= total_amount))", 'customer_id'),
+    'customer_visits': ('visit_date', "status IN ('completed', 'cancelled')", 'customer_id'),
+    'sales_activities': ('activity_date', "status IN ('completed', 'cancelled')", 'customer_id'),
+    'attendance': ('date', "check_out_time IS NOT NULL OR status = 'absent'", None)
+}
+
+# Child rows archived together with their parent: child table -> (parent table, foreign key)
+ARCHIVE_CHILDREN = {
+    'order_items': ('sales_orders', 'order_id')
+}
+
+def _year_dir(table, year):
+    return os.path.join(Config.ARCHIVE_DIR, table, str(year))
+
+def _write_batch(table, year, df):
+    """Write one batch as a new file in the year partition (never rewrites existing files)"""
+    directory = _year_dir(table, year)
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"batch_{int(time.time())}_{int(df['id'].min())}.parquet")
+    df.to_parquet(path + '.tmp', index=False, row_group_size=Config.ARCHIVE_ROW_GROUP_SIZE)
+    os.replace(path + '.tmp', path)
+    return path
+
+def _add_archive_totals(cursor, order_ids):
+    """Add counted orders about to leave the hot tables to their customers' archive totals"""
+    cursor.execute(f'''
+        INSERT INTO customer_archive_totals (customer_id, order_count, order_value, first_order_ts, last_order_ts)
+        SELECT customer_id, COUNT(*), SUM(COALESCE(total_amount, 0)), MIN(order_ts), MAX(order_ts)
+        FROM sales_orders o
+        WHERE id IN ({','.join('?' * len(order_ids))}) AND customer_id IS NOT NULL
+          AND {counted_order_sql('sales_orders', 'o')}
+        GROUP BY customer_id
+        ON CONFLICT (customer_id) DO UPDATE SET
+            order_count = order_count + excluded.order_count,
+            order_value = order_value + excluded.order_value,
+            first_order_ts = MIN(COALESCE(first_order_ts, excluded.first_order_ts),
+                                 COALESCE(excluded.first_order_ts, first_order_ts)),
+            last_order_ts = MAX(COALESCE(last_order_ts, excluded.last_order_ts),
+                                COALESCE(excluded.last_order_ts, last_order_ts))
+    ''', order_ids)
+
+def _archive_batch(conn, table, date_column, closed, customer_column, cutoff):
+    """Archive up to ARCHIVE_BATCH_SIZE records of one table; returns the number moved"""
+    customer_select = customer_column or 'NULL'
+    df = pd.read_sql_query(f'''
+        SELECT *, CAST(strftime('%Y', {date_column}) AS INTEGER) AS archive_year,
+               date({date_column}) AS archive_date, {customer_select} AS archive_customer_id
+        FROM {table}
+        WHERE {date_column} < ? AND ({closed})
+        ORDER BY id
+        LIMIT ?
+    ''', conn, params=(cutoff, Config.ARCHIVE_BATCH_SIZE))
+    if df.empty:
+        return 0
+
+    ids = df['id'].astype(int).tolist()
+    placeholders = ','.join('?' * len(ids))
+    index_rows = []
+
+    children = {}
+    for child, (parent, foreign_key) in ARCHIVE_CHILDREN.items():
+        if parent != table:
+            continue
+        child_df = pd.read_sql_query(
+            f"SELECT * FROM {child} WHERE {foreign_key} IN ({placeholders})", conn, params=ids)
+        parents = df.set_index('id')
+        child_df['archive_year'] = child_df[foreign_key].map(parents['archive_year'])
+        child_df['archive_date'] = child_df[foreign_key].map(parents['archive_date'])
+        child_df['archive_customer_id'] = child_df[foreign_key].map(parents['archive_customer_id'])
+        children[child] = (foreign_key, child_df)
+
+    # Files first, then delete: a crash in between leaves a duplicate that readers drop, never a loss
+    for name, frame in [(table, df)] + [(child, child_df) for child, (_, child_df) in children.items()]:
+        # Row group statistics then bound the customers in each group
+        frame = frame.sort_values(['archive_customer_id', 'id'])
+        for year, year_df in frame.groupby('archive_year'):
+            _write_batch(name, int(year), year_df.drop(columns=['archive_year', 'archive_date', 'archive_customer_id']))
+        index_rows.extend(
+            (name, int(row.id), None if pd.isna(row.archive_customer_id) else int(row.archive_customer_id),
+             row.archive_date, int(row.archive_year))
+            for row in frame.itertuples()
+        )
+
+    cursor = conn.cursor()
+    if table == 'sales_orders':
+        _add_archive_totals(cursor, ids)
+    cursor.executemany('''
+        INSERT OR REPLACE INTO archived_records (table_name, record_id, customer_id, record_date, archive_year)
+        VALUES (?, ?, ?, ?, ?)
+    ''', index_rows)
+    for child, (foreign_key, _) in children.items():
+        cursor.execute(f"DELETE FROM {child} WHERE {foreign_key} IN ({placeholders})", ids)
+    cursor.execute(f"DELETE FROM {table} WHERE id IN ({placeholders})", ids)
+    conn.commit()
+    return len(ids)
+
+def archive_cold_data(horizon_days=None, progress=None):
+    """Move closed records older than the horizon to Parquet; returns {table: rows archived}"""
+    horizon_days = horizon_days or Config.ARCHIVE_HORIZON_DAYS
+    cutoff = (date.today() - timedelta(days=horizon_days)).isoformat()
+    archived = {}
+    conn = get_connection()
+    try:
+        for step, (table, (date_column, closed, customer_column)) in enumerate(ARCHIVE_TABLES.items()):
+            if progress:
+                progress(step / len(ARCHIVE_TABLES), f'Archiving {table}')
+            archived[table] = 0
+            while True:
+                moved = _archive_batch(conn, table, date_column, closed, customer_column, cutoff)
+                archived[table] += moved
+                if moved < Config.ARCHIVE_BATCH_SIZE:
+                    break
+    finally:
+        conn.close()
+    return archived
+
+def archived_years(conn, table, start_date=None, end_date=None, customer_id=None):
+    """Archive years holding matching records; empty when the hot tables cover the request"""
+    conditions, params = ["table_name = ?"], [table]
+    if customer_id is not None:
+        conditions.append("customer_id = ?")
+        params.append(customer_id)
+    if start_date:
+        conditions.append("record_date >= ?")
+        params.append(str(start_date))
+    if end_date:
+        conditions.append("record_date <= ?")
+        params.append(str(end_date))
+    cursor = conn.cursor()
+    cursor.execute(f'''
+        SELECT DISTINCT archive_year FROM archived_records WHERE {' AND '.join(conditions)}
+    ''', params)
+    return sorted(row[0] for row in cursor.fetchall())
+
+def read_archived(table, years, **equals):
+    """Archived rows of one table for the given years, optionally filtered by column values (a list
+    matches any of its values); filters are applied by the Parquet scan"""
+    paths = []
+    for year in years:
+        directory = _year_dir(table, year)
+        if os.path.isdir(directory):
+            paths.extend(os.path.join(directory, name) for name in sorted(os.listdir(directory))
+                         if name.endswith('.parquet'))
+    if not paths:
+        return pd.DataFrame()
+
+    condition = None
+    for column, value in equals.items():
+        if value is None:
+            continue
+        term = ds.field(column).isin(list(value)) if isinstance(value, (list, tuple, set)) else ds.field(column) == value
+        condition = term if condition is None else condition & term
+    # Batches can infer different types for a column that was all NULL in one of them
+    schema = pa.unify_schemas([pq.read_schema(path) for path in paths])
+    df = ds.dataset(paths, schema=schema, format='parquet').to_table(filter=condition).to_pandas()
+    return df.drop_duplicates('id', keep='last')
+
+def get_archive_status():
+    """Archived record counts and date span per table"""
+    conn = get_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT table_name, COUNT(*), MIN(record_date), MAX(record_date)
+            FROM archived_records
+            GROUP BY table_name
+            ORDER BY table_name
+        ''')
+        keys = ('table_name', 'records', 'oldest', 'newest')
+        return [dict(zip(keys, row)) for row in cursor.fetchall()]
+    finally:
+        conn.close()
@@ -0,0 +1,190 @@
+"""
+Inventory costing
+Every ledger movement carries its cost: receipts are valued at their unit
+cost (a purchase order line's, else the current average) and move the
+product's moving-average cost incrementally; issues are valued by
+Config.COSTING_METHOD, either at the moving average or by consuming the
+oldest FIFO cost layers. Layers are kept under both methods so the method
+can be switched without a rebuild. Transfers move stock between depots at
+the average without touching cost. Because each movement's value is
+stored in inventory_transactions.cost_amount, inventory value is an
+aggregate over maintained state and COGS for a period is a sum over that
+period's ledger rows rather than a replay of the whole history.
+"""
+import time
+
+import pandas as pd
+
+from config import Config
+from database.init_db import get_connection
+from database.repository import wib_date_key
+
+COSTING_METHODS = ('average', 'fifo')
+
+# Current moving-average cost of a products row; products that never received stock fall back to the list cost
+AVERAGE_COST = "COALESCE(average_cost, cost, 0)"
+
+def average_after_receipt(quantity, receipt_cost):
+    """SQL for a products row's moving average after receiving `quantity` units at `receipt_cost` each (SQL
+    expressions; a NULL receipt cost leaves it unchanged). SET expressions read the row before the update."""
+    return f'''
+        CASE WHEN {receipt_cost} IS NULL THEN average_cost
+             WHEN COALESCE(stock_quantity, 0) <= 0 THEN {receipt_cost}
+             ELSE (stock_quantity * {AVERAGE_COST} + {quantity} * {receipt_cost}) / (stock_quantity + {quantity}) END
+    '''
+
+def _method():
+    if Config.COSTING_METHOD not in COSTING_METHODS:
+        raise ValueError(f"Unknown costing method: {Config.COSTING_METHOD}")
+    return Config.COSTING_METHOD
+
+def is_receipt(quantity, transaction_type):
+    """Whether a movement brings new cost into stock (transfers only move it between depots)"""
+    return quantity > 0 and transaction_type != 'transfer'
+
+def _consume_layers(cursor, product_id, quantity):
+    """Take units from the oldest open layers; returns (cost of the units taken, units no layer covered)"""
+    cursor.execute('''
+        SELECT id, remaining_quantity, unit_cost FROM cost_layers
+        WHERE product_id = ? AND remaining_quantity > 0 ORDER BY id
+    ''', (product_id,))
+    cost, left = 0.0, quantity
+    for layer_id, remaining, unit_cost in cursor.fetchall():
+        if left <= 0:
+            break
+        taken = min(left, remaining)
+        cursor.execute("UPDATE cost_layers SET remaining_quantity = remaining_quantity - ? WHERE id = ?",
+                       (taken, layer_id))
+        cost += taken * unit_cost
+        left -= taken
+    return cost, left
+
+def movement_cost(cursor, product_id, quantity, transaction_type, unit_cost=None):
+    """(unit cost, signed cost amount, receipt cost) of a movement about to be posted, consuming FIFO layers
+    for an issue; receipt cost is the unit cost to average in, None when the movement is not a receipt"""
+    cursor.execute(f"SELECT {AVERAGE_COST} FROM products WHERE id = ?", (product_id,))
+    row = cursor.fetchone()
+    average = row[0] if row else 0
+    if is_receipt(quantity, transaction_type):
+        receipt_cost = float(unit_cost) if unit_cost is not None else average
+        return receipt_cost, quantity * receipt_cost, receipt_cost
+    if quantity >= 0 or transaction_type == 'transfer':
+        return average, quantity * average, None
+    covered, uncovered = _consume_layers(cursor, product_id, -quantity)
+    if _method() == 'fifo':
+        cost = covered + uncovered * average
+    else:
+        cost = -quantity * average
+    return cost / -quantity, -cost, None
+
+def add_cost_layer(cursor, product_id, transaction_id, quantity, unit_cost, received_ts=None):
+    """Open a FIFO layer for a receipt"""
+    cursor.execute('''
+        INSERT INTO cost_layers (product_id, transaction_id, received_ts, quantity, remaining_quantity, unit_cost)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', (product_id, transaction_id, received_ts or int(time.time()), quantity, quantity, unit_cost))
+
+def batch_costs(cursor, transaction_type):
+    """Fill unit_cost, cost_amount and receipt_cost of temp.stock_batch (see ledger.post_stock_batch) before
+    it is posted, consuming FIFO layers for its issues with one window query"""
+    average = "COALESCE(p.average_cost, p.cost, 0)"
+    if transaction_type == 'transfer':
+        cursor.execute(f'''
+            UPDATE temp.stock_batch SET unit_cost = {average}, cost_amount = quantity * {average}
+            FROM products p WHERE p.id = stock_batch.product_id
+        ''')
+        return
+    cursor.execute(f'''
+        UPDATE temp.stock_batch SET receipt_cost = COALESCE(stock_batch.unit_cost, {average}),
+                                    unit_cost = COALESCE(stock_batch.unit_cost, {average}),
+                                    cost_amount = quantity * COALESCE(stock_batch.unit_cost, {average})
+        FROM products p
+        WHERE p.id = stock_batch.product_id AND stock_batch.quantity > 0
+    ''')
+
+    # Units each open layer gives up: what the issue still needs after the older layers of the product
+    cursor.execute("DROP TABLE IF EXISTS temp.stock_batch_layers")
+    cursor.execute('''
+        CREATE TEMP TABLE stock_batch_layers AS
+        SELECT id, product_id, unit_cost, MIN(remaining_quantity, needed - taken_before) AS taken
+        FROM (
+            SELECT l.id, l.product_id, l.unit_cost, l.remaining_quantity, -b.quantity AS needed,
+                   SUM(l.remaining_quantity) OVER (PARTITION BY l.product_id ORDER BY l.id)
+                       - l.remaining_quantity AS taken_before
+            FROM cost_layers l JOIN temp.stock_batch b ON b.product_id = l.product_id
+            WHERE b.quantity < 0 AND l.remaining_quantity > 0
+        )
+        WHERE needed > taken_before
+    ''')
+    cursor.execute('''
+        UPDATE cost_layers SET remaining_quantity = remaining_quantity - t.taken
+        FROM temp.stock_batch_layers t WHERE cost_layers.id = t.id
+    ''')
+    if _method() == 'fifo':
+        issue_cost = f"COALESCE(c.covered_cost, 0) + (-stock_batch.quantity - COALESCE(c.covered, 0)) * {average}"
+    else:
+        issue_cost = f"-stock_batch.quantity * {average}"
+    cursor.execute(f'''
+        UPDATE temp.stock_batch SET cost_amount = -({issue_cost}), unit_cost = ({issue_cost}) / -stock_batch.quantity
+        FROM products p
+        LEFT JOIN (SELECT product_id, SUM(taken) AS covered, SUM(taken * unit_cost) AS covered_cost
+                   FROM temp.stock_batch_layers GROUP BY product_id) c ON c.product_id = p.id
+        WHERE p.id = stock_batch.product_id AND stock_batch.quantity < 0
+    ''')
+    cursor.execute("DROP TABLE temp.stock_batch_layers")
+
+def get_inventory_valuation():
+    """Quantity, moving-average cost and value of every product by both methods"""
+    conn = get_connection()
+    try:
+        return pd.read_sql_query(f'''
+            SELECT p.id AS product_id, p.sku, p.name, p.category, p.stock_quantity, p.cost AS list_cost,
+                   {AVERAGE_COST} AS average_cost,
+                   p.stock_quantity * {AVERAGE_COST} AS average_value,
+                   COALESCE(l.value, 0) AS fifo_value
+            FROM products p
+            LEFT JOIN (SELECT product_id, SUM(remaining_quantity * unit_cost) AS value FROM cost_layers
+                       WHERE remaining_quantity > 0 GROUP BY product_id) l ON l.product_id = p.id
+            ORDER BY p.sku
+        ''', conn)
+    finally:
+        conn.close()
+
+def get_inventory_value_at(as_of):
+    """Total inventory value at the end of a day under the configured method: today's value less the
+    movements booked after that day"""
+    column = 'fifo_value' if _method() == 'fifo' else 'average_value'
+    current = float(get_inventory_valuation()[column].sum())
+    conn = get_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT COALESCE(SUM(cost_amount), 0) FROM inventory_transactions WHERE created_local_date > ?
+        ''', (wib_date_key(as_of),))
+        return current - cursor.fetchone()[0]
+    finally:
+        conn.close()
+
+def get_cogs(start_date, end_date):
+    """Units issued to orders, cost of goods sold, revenue and gross margin per product for a period"""
+    conn = get_connection()
+    try:
+        return pd.read_sql_query('''
+            SELECT p.sku, p.name, p.category, SUM(-t.quantity) AS units, SUM(-t.cost_amount) AS cogs,
+                   SUM(COALESCE(
+                       CASE t.reference_type
+                           WHEN 'sales_order' THEN (SELECT SUM(oi.total_price) FROM order_items oi
+                                                    WHERE oi.order_id = t.reference_id AND oi.product_id = t.product_id)
+                           WHEN 'mobile_order' THEN (SELECT SUM(mi.total_price) FROM mobile_order_items mi
+                                                     WHERE mi.mobile_order_id = t.reference_id
+                                                       AND mi.product_id = t.product_id)
+                       END, 0)) AS revenue
+            FROM inventory_transactions t JOIN products p ON p.id = t.product_id
+            WHERE t.transaction_type = 'out' AND t.created_local_date BETWEEN ? AND ?
+            GROUP BY t.product_id
+            ORDER BY cogs DESC
+        ''', conn, params=(wib_date_key(start_date), wib_date_key(end_date))).assign(
+            gross_margin=lambda df: df['revenue'] - df['cogs'],
+            margin_pct=lambda df: (100 * (df['revenue'] - df['cogs']) / df['revenue'].where(df['revenue'] > 0)).round(1))
+    finally:
+        conn.close()
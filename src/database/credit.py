@@ -0,0 +1,114 @@
+"""
+Customer credit limits
+A customer's exposure is what they owe on sales orders plus their accepted
+mobile orders on credit terms that are not yet invoiced; both are kept in
+customer_summary by triggers, so it is never summed from open invoices.
+Orders on credit are checked against the limit inside their own write
+transaction. Limits and exposure are cached per customer in process: a
+passing check adds its amount to the cached exposure, as the triggers do to
+the summary, and the cache is dropped on payments, status changes, new
+limits and rolled-back orders. Config.CREDIT_CACHE_SECONDS bounds how long
+a figure changed by another process can be served.
+"""
+import threading
+import time
+
+from config import Config
+from database.init_db import get_connection
+from utils.metrics import record_cache
+
+CASH_TERMS = ('', 'Cash')
+
+_CREDIT_SQL = '''
+    SELECT c.credit_limit, COALESCE(s.outstanding_amount, 0) + COALESCE(s.credit_order_amount, 0)
+    FROM customers c LEFT JOIN customer_summary s ON s.customer_id = c.id
+    WHERE c.id = ?
+'''
+
+# customer id: (credit limit, exposure, loaded at)
+_cache = {}
+_cache_lock = threading.Lock()
+# Bumped on every change so a load that raced a write is not stored
+_generation = 0
+
+class CreditLimitError(ValueError):
+    """Raised when an order would take a customer over their credit limit"""
+
+    def __init__(self, customer_id, credit_limit, exposure, amount):
+        self.customer_id = customer_id
+        self.credit_limit = credit_limit
+        self.exposure = exposure
+        self.amount = amount
+        super().__init__(f"Order of {amount} on credit exceeds the available credit of customer {customer_id}: "
+                         f"limit {credit_limit}, exposure {exposure}")
+
+def is_credit_terms(payment_terms):
+    """Whether mobile order payment terms ('Cash', 'Net 7', ...) are on credit"""
+    return (payment_terms or '') not in CASH_TERMS
+
+def _load(cursor, customer_id):
+    generation = _generation
+    row = cursor.execute(_CREDIT_SQL, (customer_id,)).fetchone()
+    entry = (row[0], row[1]) if row else (None, 0)
+    with _cache_lock:
+        if generation == _generation:
+            _cache[customer_id] = entry + (time.monotonic(),)
+    return entry
+
+def credit_figures(cursor, customer_id):
+    """(credit limit or None, exposure) of a customer, from the cache when fresh"""
+    entry = _cache.get(customer_id)
+    if entry is not None and time.monotonic() - entry[2] < Config.CREDIT_CACHE_SECONDS:
+        record_cache('credit', True)
+        return entry[0], entry[1]
+    record_cache('credit', False)
+    return _load(cursor, customer_id)
+
+def check_credit(cursor, customer_id, amount):
+    """Raise CreditLimitError when an amount on credit would take the customer over their limit; call it
+    in the transaction that records the order, and invalidate the customer if that transaction rolls back"""
+    global _generation
+    if customer_id is None or not amount or amount <= 0:
+        return
+    credit_limit, exposure = credit_figures(cursor, customer_id)
+    if credit_limit is not None and exposure + amount > credit_limit:
+        raise CreditLimitError(customer_id, credit_limit, exposure, amount)
+    with _cache_lock:
+        _generation += 1
+        entry = _cache.get(customer_id)
+        if entry is not None:
+            _cache[customer_id] = (entry[0], entry[1] + amount, entry[2])
+
+def invalidate_credit(customer_id=None):
+    """Drop the cached figures of a customer, or of everyone"""
+    global _generation
+    with _cache_lock:
+        _generation += 1
+        if customer_id is None:
+            _cache.clear()
+        else:
+            _cache.pop(customer_id, None)
+
+def get_credit_status(customer_id):
+    """Credit limit, exposure and available credit (None without a limit) of a customer, as a dict"""
+    conn = get_connection()
+    try:
+        credit_limit, exposure = credit_figures(conn.cursor(), customer_id)
+    finally:
+        conn.close()
+    return {'credit_limit': credit_limit, 'exposure': exposure,
+            'available': None if credit_limit is None else credit_limit - exposure}
+
+def set_credit_limit(customer_id, credit_limit):
+    """Set a customer's credit limit in rupiah; None removes it"""
+    if credit_limit is not None and credit_limit < 0:
+        raise ValueError("Credit limit cannot be negative")
+    conn = get_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("UPDATE customers SET credit_limit = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?",
+                       (None if credit_limit is None else int(credit_limit), customer_id))
+        conn.commit()
+    finally:
+        conn.close()
+    invalidate_credit(customer_id)
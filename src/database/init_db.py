@@ -1,6 +1,43 @@
 import sqlite3
 import os
+import time
 from datetime import datetime
+from config import Config
+from utils.metrics import SQL_QUERY_SECONDS
+
+class TimedCursor(sqlite3.Cursor):
+    """Cursor that records statement latency in the metrics registry"""
+
+    def execute(self, sql, parameters=()):
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            SQL_QUERY_SECONDS.observe(time.perf_counter() - start, _statement_kind(sql))
+
+    def executemany(self, sql, seq_of_parameters):
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            SQL_QUERY_SECONDS.observe(time.perf_counter() - start, _statement_kind(sql))
+
+class TimedConnection(sqlite3.Connection):
+    """Connection whose cursors are TimedCursor instances"""
+
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+def _statement_kind(sql):
+    """First SQL keyword, used as a low-cardinality metric label"""
+    words = sql.lstrip().split(None, 1)
+    return words[0].upper() if words else 'EMPTY'
 
 def get_db_path():
     """Get the database file path"""
@@ -9,12 +46,128 @@ def get_db_path():
         os.makedirs(db_dir)
     return os.path.join(db_dir, 'penzflow.db')
 
+def alert_level_sql(row):
+    """Alert level of a products row ('NEW' or 'OLD' in triggers, an alias in queries); NULL when stock is fine"""
+    return f"""CASE WHEN {row}.stock_quantity <= 0 THEN 'critical'
+                WHEN {row}.stock_quantity <= {row}.min_stock_level THEN 'low'
+                WHEN {row}.stock_quantity <= {row}.min_stock_level * 1.5 THEN 'reorder' END"""
+
+def counted_order_sql(table, row):
+    """Whether a sales_orders or mobile_orders row counts towards customer totals ('NEW'/'OLD' in triggers,
+    an alias in queries)"""
+    if table == 'mobile_orders':
+        # Converted orders are counted through the sales order made from them
+        return f"{row}.status NOT IN ('draft', 'rejected', 'expired', 'cancelled', 'converted')"
+    return f"{row}.status != 'cancelled'"
+
+def open_follow_up_sql(table, row):
+    """Whether a customer_visits or sales_activities row is a follow-up still to be done"""
+    if table == 'customer_visits':
+        return f"({row}.visit_type = 'follow_up' AND {row}.status IN ('planned', 'in_progress'))"
+    return f"{row}.status = 'pending'"
+
+def credit_order_sql(row):
+    """Whether a mobile_orders row is an accepted order on credit terms that is not yet invoiced"""
+    return f"({row}.status IN ('submitted', 'approved') AND COALESCE({row}.payment_terms, 'Cash') != 'Cash')"
+
+def latest_order_sql(customer):
+    """Latest counted order time of a customer across sales and mobile orders"""
+    return f"""SELECT MAX(order_ts) FROM (
+                SELECT order_ts FROM sales_orders o WHERE o.customer_id = {customer} AND {counted_order_sql('sales_orders', 'o')}
+                UNION ALL
+                SELECT order_ts FROM mobile_orders o WHERE o.customer_id = {customer} AND {counted_order_sql('mobile_orders', 'o')})"""
+
+def create_customer_summary_triggers(cursor):
+    """Triggers that keep customer_summary in step with orders, visits and activities"""
+    for table in ('sales_orders', 'mobile_orders'):
+        # Sales orders are the invoices: their unpaid part is the customer's outstanding amount
+        if table == 'sales_orders':
+            watched = 'customer_id, status, total_amount, order_ts, paid_amount'
+            add_balance = ("\n                    outstanding_amount = outstanding_amount + "
+                               "COALESCE(NEW.total_amount, 0) - COALESCE(NEW.paid_amount, 0),")
+            remove_balance = (",\n                    outstanding_amount = outstanding_amount - "
+                                  "(COALESCE(OLD.total_amount, 0) - COALESCE(OLD.paid_amount, 0))")
+        else:
+            # Accepted orders on credit terms count towards the credit exposure until invoiced
+            watched = 'customer_id, status, total_amount, order_ts, payment_terms'
+            add_balance = (f"\n                    credit_order_amount = credit_order_amount + CASE WHEN "
+                               f"{credit_order_sql('NEW')} THEN COALESCE(NEW.total_amount, 0) ELSE 0 END,")
+            remove_balance = (f",\n                    credit_order_amount = credit_order_amount - CASE WHEN "
+                                  f"{credit_order_sql('OLD')} THEN COALESCE(OLD.total_amount, 0) ELSE 0 END")
+        add_order = f'''
+                INSERT OR IGNORE INTO customer_summary (customer_id) SELECT NEW.customer_id
+                WHERE NEW.customer_id IS NOT NULL AND {counted_order_sql(table, 'NEW')};
+                UPDATE customer_summary SET order_count = order_count + 1,
+                    lifetime_value = lifetime_value + COALESCE(NEW.total_amount, 0),{add_balance}
+                    last_order_ts = MAX(COALESCE(last_order_ts, NEW.order_ts), COALESCE(NEW.order_ts, last_order_ts))
+                WHERE customer_id = NEW.customer_id AND {counted_order_sql(table, 'NEW')};'''
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_insert_summary AFTER INSERT ON {table}
+            BEGIN{add_order}
+            END
+        ''')
+        # Take the old values out and put the new ones in; only when the customer's latest order stops
+        # counting is its previous latest looked up again
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_update_summary
+            AFTER UPDATE OF {watched} ON {table}
+            BEGIN
+                UPDATE customer_summary SET order_count = order_count - 1,
+                    lifetime_value = lifetime_value - COALESCE(OLD.total_amount, 0){remove_balance}
+                WHERE customer_id = OLD.customer_id AND {counted_order_sql(table, 'OLD')};{add_order}
+                UPDATE customer_summary SET last_order_ts = ({latest_order_sql('OLD.customer_id')})
+                WHERE customer_id = OLD.customer_id AND {counted_order_sql(table, 'OLD')} AND OLD.order_ts >= last_order_ts
+                  AND NOT (NEW.customer_id IS OLD.customer_id AND {counted_order_sql(table, 'NEW')}
+                           AND NEW.order_ts >= OLD.order_ts);
+            END
+        ''')
+    for table, watched in (('customer_visits', 'customer_id, status, visit_type, visit_ts'),
+                           ('sales_activities', 'customer_id, status')):
+        add_follow_up = f'''
+                INSERT OR IGNORE INTO customer_summary (customer_id) SELECT NEW.customer_id
+                WHERE NEW.customer_id IS NOT NULL;
+                UPDATE customer_summary SET open_follow_ups = open_follow_ups + 1
+                WHERE customer_id = NEW.customer_id AND {open_follow_up_sql(table, 'NEW')};'''
+        remove_follow_up = f'''
+                UPDATE customer_summary SET open_follow_ups = open_follow_ups - 1
+                WHERE customer_id = OLD.customer_id AND {open_follow_up_sql(table, 'OLD')};'''
+        if table == 'customer_visits':
+            add_follow_up += '''
+                UPDATE customer_summary
+                SET last_visit_ts = MAX(COALESCE(last_visit_ts, NEW.visit_ts), COALESCE(NEW.visit_ts, last_visit_ts))
+                WHERE customer_id = NEW.customer_id AND NEW.status = 'completed';'''
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_insert_summary AFTER INSERT ON {table}
+            BEGIN{add_follow_up}
+            END
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_update_summary AFTER UPDATE OF {watched} ON {table}
+            BEGIN{remove_follow_up}{add_follow_up}
+            END
+        ''')
+        # The archive only removes closed records, so deletes never change the last visit
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_delete_summary AFTER DELETE ON {table}
+            BEGIN{remove_follow_up}
+            END
+        ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_customers_delete_summary AFTER DELETE ON customers
+        BEGIN
+            DELETE FROM customer_summary WHERE customer_id = OLD.id;
+        END
+    ''')
+
 def init_database():
     """Initialize the database with required tables"""
     db_path = get_db_path()
     conn = sqlite3.connect(db_path)
     cursor = conn.cursor()
     
+    # WAL lets readers and the single writer proceed concurrently (persists in the file)
+    cursor.execute("PRAGMA journal_mode=WAL")
+    
     # Users table
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS users (
@@ -38,7 +191,9 @@ def init_database():
             company TEXT,
             address TEXT,
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            customer_group TEXT, -- pricing group, e.g. 'wholesale'
+            credit_limit INTEGER -- rupiah; NULL means no limit (see database/credit.py)
         )
     ''')
     
@@ -50,14 +205,16 @@ def init_database():
             name TEXT NOT NULL,
             description TEXT,
             category TEXT,
-            price DECIMAL(10,2),
-            cost DECIMAL(10,2),
+            price INTEGER, -- rupiah
+            cost INTEGER, -- rupiah
             stock_quantity INTEGER DEFAULT 0,
             min_stock_level INTEGER DEFAULT 0,
             max_stock_level INTEGER DEFAULT 1000,
             supplier TEXT,
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            reserved_quantity INTEGER DEFAULT 0, -- held by open orders (see database/reservations.py)
+            average_cost REAL -- moving-average unit cost, rupiah (see database/costing.py)
         )
     ''')
     
@@ -68,13 +225,16 @@ def init_database():
             order_number TEXT UNIQUE NOT NULL,
             customer_id INTEGER,
             order_date DATE,
-            total_amount DECIMAL(10,2),
+            total_amount INTEGER, -- rupiah
             status TEXT DEFAULT 'pending',
             payment_method TEXT,
             sales_rep TEXT,
             notes TEXT,
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
             updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            order_ts INTEGER, -- epoch seconds
+            order_local_date INTEGER, -- WIB date as YYYYMMDD
+            paid_amount INTEGER DEFAULT 0, -- rupiah, kept by payments (see database/payments.py)
             FOREIGN KEY (customer_id) REFERENCES customers (id)
         )
     ''')
@@ -86,8 +246,8 @@ def init_database():
             order_id INTEGER,
             product_id INTEGER,
             quantity INTEGER,
-            unit_price DECIMAL(10,2),
-            total_price DECIMAL(10,2),
+            unit_price INTEGER, -- rupiah
+            total_price INTEGER, -- rupiah
             FOREIGN KEY (order_id) REFERENCES sales_orders (id),
             FOREIGN KEY (product_id) REFERENCES products (id)
         )
@@ -98,13 +258,21 @@ def init_database():
         CREATE TABLE IF NOT EXISTS inventory_transactions (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             product_id INTEGER,
-            transaction_type TEXT, -- 'in', 'out', 'adjustment'
-            quantity INTEGER,
+            transaction_type TEXT, -- 'in', 'out', 'adjustment', 'opening'
+            quantity INTEGER, -- signed: negative for stock going out
             reference_type TEXT, -- 'purchase', 'sale', 'adjustment'
             reference_id INTEGER,
             notes TEXT,
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (product_id) REFERENCES products (id)
+            balance_after INTEGER, -- product stock after this movement
+            created_ts INTEGER, -- epoch seconds
+            created_local_date INTEGER, -- WIB date as YYYYMMDD
+            created_by TEXT,
+            location_id INTEGER,
+            unit_cost REAL, -- rupiah per unit moved
+            cost_amount REAL, -- signed value of the movement: receipts at cost, issues at COGS
+            FOREIGN KEY (product_id) REFERENCES products (id),
+            FOREIGN KEY (location_id) REFERENCES locations (id)
         )
     ''')
     
@@ -145,6 +313,8 @@ def init_database():
             duration INTEGER, -- in minutes
             status TEXT DEFAULT 'planned', -- 'planned', 'in_progress', 'completed', 'cancelled'
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            visit_ts INTEGER, -- epoch seconds
+            visit_local_date INTEGER, -- WIB date as YYYYMMDD
             FOREIGN KEY (user_id) REFERENCES users (id),
             FOREIGN KEY (customer_id) REFERENCES customers (id)
         )
@@ -158,8 +328,8 @@ def init_database():
             target_period TEXT, -- 'monthly', 'quarterly', 'yearly'
             start_date DATE,
             end_date DATE,
-            target_amount DECIMAL(15,2),
-            achieved_amount DECIMAL(15,2) DEFAULT 0,
+            target_amount INTEGER, -- rupiah
+            achieved_amount INTEGER DEFAULT 0, -- rupiah
             target_visits INTEGER,
             achieved_visits INTEGER DEFAULT 0,
             target_customers INTEGER,
@@ -215,8 +385,8 @@ def init_database():
             visit_id INTEGER,
             order_number TEXT UNIQUE,
             order_date TIMESTAMP,
-            total_amount DECIMAL(15,2),
-            status TEXT DEFAULT 'draft', -- 'draft', 'submitted', 'approved', 'rejected'
+            total_amount INTEGER, -- rupiah
+            status TEXT DEFAULT 'draft', -- 'draft', 'submitted', 'approved', 'rejected', 'converted'
             payment_terms TEXT,
             delivery_date DATE,
             special_instructions TEXT,
@@ -224,9 +394,18 @@ def init_database():
             tax_percentage DECIMAL(5,2) DEFAULT 11,
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
             updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            order_ts INTEGER, -- epoch seconds
+            order_local_date INTEGER, -- WIB date as YYYYMMDD
+            location_id INTEGER, -- depot the order is fulfilled from
+            sales_order_id INTEGER, -- set when converted (see database/approvals.py)
+            reviewed_by TEXT, -- manager who approved or rejected it
+            reviewed_ts INTEGER,
+            review_notes TEXT,
             FOREIGN KEY (user_id) REFERENCES users (id),
             FOREIGN KEY (customer_id) REFERENCES customers (id),
-            FOREIGN KEY (visit_id) REFERENCES customer_visits (id)
+            FOREIGN KEY (visit_id) REFERENCES customer_visits (id),
+            FOREIGN KEY (location_id) REFERENCES locations (id),
+            FOREIGN KEY (sales_order_id) REFERENCES sales_orders (id)
         )
     ''')
     
@@ -237,9 +416,9 @@ def init_database():
             mobile_order_id INTEGER,
             product_id INTEGER,
             quantity INTEGER,
-            unit_price DECIMAL(15,2),
+            unit_price INTEGER, -- rupiah
             discount_percentage DECIMAL(5,2) DEFAULT 0,
-            total_price DECIMAL(15,2),
+            total_price INTEGER, -- rupiah
             notes TEXT,
             FOREIGN KEY (mobile_order_id) REFERENCES mobile_orders (id),
             FOREIGN KEY (product_id) REFERENCES products (id)
@@ -253,7 +432,7 @@ def init_database():
             user_id INTEGER,
             claim_date DATE,
             expense_type TEXT, -- 'travel', 'meal', 'accommodation', 'fuel', 'other'
-            amount DECIMAL(15,2),
+            amount INTEGER, -- rupiah
             description TEXT,
             receipt_path TEXT,
             status TEXT DEFAULT 'pending', -- 'pending', 'approved', 'rejected', 'paid'
@@ -281,6 +460,552 @@ def init_database():
         )
     ''')
     
+    # Background jobs table
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            job_type TEXT NOT NULL,
+            params TEXT, -- JSON
+            status TEXT DEFAULT 'queued', -- 'queued', 'running', 'succeeded', 'failed', 'cancelled'
+            progress REAL DEFAULT 0,
+            message TEXT,
+            result TEXT, -- JSON
+            error TEXT,
+            attempts INTEGER DEFAULT 0,
+            max_attempts INTEGER DEFAULT 3,
+            run_after INTEGER, -- epoch seconds
+            cancel_requested BOOLEAN DEFAULT 0,
+            worker TEXT,
+            heartbeat_ts INTEGER,
+            created_by TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            started_at TIMESTAMP,
+            finished_at TIMESTAMP
+        )
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, run_after)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_jobs_created_by ON jobs (created_by, id)")
+    
+    # Cron-style schedules for background jobs (evaluated in WIB)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS scheduled_jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT UNIQUE NOT NULL,
+            job_type TEXT NOT NULL,
+            params TEXT, -- JSON
+            cron_spec TEXT NOT NULL, -- 'minute hour day month weekday'
+            enabled BOOLEAN DEFAULT 1,
+            next_run_ts INTEGER, -- epoch seconds
+            last_run_at TIMESTAMP,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS schedule_runs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            schedule_id INTEGER,
+            job_id INTEGER,
+            scheduled_ts INTEGER,
+            FOREIGN KEY (schedule_id) REFERENCES scheduled_jobs (id),
+            FOREIGN KEY (job_id) REFERENCES jobs (id)
+        )
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_schedule_runs_schedule ON schedule_runs (schedule_id, id)")
+    
+    # Analytics export watermarks (last exported id per fact table)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS analytics_exports (
+            fact TEXT PRIMARY KEY,
+            last_id INTEGER DEFAULT 0,
+            partitions_written INTEGER DEFAULT 0,
+            exported_ts INTEGER
+        )
+    ''')
+    
+    # Index of records moved to the cold archive (see database/archive.py)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS archived_records (
+            table_name TEXT NOT NULL,
+            record_id INTEGER NOT NULL,
+            customer_id INTEGER,
+            record_date DATE,
+            archive_year INTEGER,
+            PRIMARY KEY (table_name, record_id)
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_archived_records_customer ON archived_records (table_name, customer_id, record_date)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_archived_records_date ON archived_records (table_name, record_date)")
+    
+    # Document number counters (see database/sequence.py)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS sequences (
+            name TEXT PRIMARY KEY,
+            next_value INTEGER NOT NULL,
+            updated_ts INTEGER
+        )
+    ''')
+    
+    # Price lists: quantity tiers, customer-group prices and effective dates (see utils/pricing.py)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS price_lists (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT UNIQUE NOT NULL,
+            customer_group TEXT, -- NULL applies to every customer
+            priority INTEGER DEFAULT 0,
+            valid_from INTEGER, -- WIB date as YYYYMMDD
+            valid_to INTEGER,
+            active BOOLEAN DEFAULT 1,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS price_list_items (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            price_list_id INTEGER NOT NULL,
+            product_id INTEGER, -- NULL applies to every product
+            min_quantity INTEGER DEFAULT 1,
+            price INTEGER, -- rupiah; fixed price, or
+            discount_percentage DECIMAL(5,2), -- discount off the product price
+            valid_from INTEGER, -- overrides the list's dates
+            valid_to INTEGER,
+            FOREIGN KEY (price_list_id) REFERENCES price_lists (id),
+            FOREIGN KEY (product_id) REFERENCES products (id)
+        )
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_price_list_items_product ON price_list_items (product_id)")
+    # Bumped by every change the compiled price index depends on; stock writes leave it alone
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS price_index_version (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            version INTEGER NOT NULL
+        )
+    ''')
+    cursor.execute("INSERT OR IGNORE INTO price_index_version VALUES (1, 0)")
+    for table, events in (('products', ('INSERT', 'UPDATE OF price', 'DELETE')),
+                          ('price_lists', ('INSERT', 'UPDATE', 'DELETE')),
+                          ('price_list_items', ('INSERT', 'UPDATE', 'DELETE'))):
+        for event in events:
+            cursor.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS trg_{table}_{event.split()[0].lower()}_price_index
+                AFTER {event} ON {table}
+                BEGIN
+                    UPDATE price_index_version SET version = version + 1;
+                END
+            ''')
+    cursor.execute("INSERT OR IGNORE INTO price_lists (name, priority) VALUES ('Standard quantity tiers', 0)")
+    cursor.execute('''
+        INSERT INTO price_list_items (price_list_id, product_id, min_quantity, discount_percentage)
+        SELECT l.id, NULL, tier.min_quantity, tier.discount
+        FROM price_lists l, (SELECT 50 AS min_quantity, 10 AS discount UNION ALL SELECT 100, 15) tier
+        WHERE l.name = 'Standard quantity tiers'
+          AND NOT EXISTS (SELECT 1 FROM price_list_items i WHERE i.price_list_id = l.id)
+    ''')
+    
+    # Bulk price updates and the per-product price history they write (see utils/price_updates.py)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS price_updates (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            update_key TEXT UNIQUE NOT NULL,
+            description TEXT,
+            created_by TEXT,
+            products_changed INTEGER,
+            applied_ts INTEGER
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS price_history (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            product_id INTEGER NOT NULL,
+            old_price INTEGER, -- rupiah
+            new_price INTEGER,
+            update_id INTEGER,
+            changed_by TEXT,
+            changed_ts INTEGER,
+            FOREIGN KEY (product_id) REFERENCES products (id),
+            FOREIGN KEY (update_id) REFERENCES price_updates (id)
+        )
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_price_history_product ON price_history (product_id, id)")
+    
+    # Offline mobile sync: applied client keys and the change feed devices pull from (see utils/sync.py)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS sync_idempotency (
+            idempotency_key TEXT PRIMARY KEY,
+            entity_type TEXT NOT NULL,
+            server_id INTEGER,
+            server_number TEXT,
+            user_id INTEGER,
+            device_id TEXT,
+            received_ts INTEGER
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS change_log (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            entity TEXT NOT NULL,
+            record_id INTEGER NOT NULL,
+            operation TEXT NOT NULL, -- 'insert', 'update', 'delete'
+            changed_ts INTEGER
+        )
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_change_log_entity ON change_log (entity, id)")
+    for table in ('products', 'customers', 'price_lists', 'price_list_items'):
+        for event, row in (('INSERT', 'NEW'), ('UPDATE', 'NEW'), ('DELETE', 'OLD')):
+            cursor.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS trg_{table}_{event.lower()}_change_log
+                AFTER {event} ON {table}
+                BEGIN
+                    INSERT INTO change_log (entity, record_id, operation, changed_ts)
+                    VALUES ('{table}', {row}.id, '{event.lower()}', CAST(strftime('%s', 'now') AS INTEGER));
+                END
+            ''')
+    
+    # Depots, stock per depot and transfers between them (see database/locations.py)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS locations (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            code TEXT UNIQUE NOT NULL,
+            name TEXT NOT NULL,
+            address TEXT,
+            latitude REAL,
+            longitude REAL,
+            active BOOLEAN DEFAULT 1,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    cursor.execute('''
+        INSERT OR IGNORE INTO locations (code, name, address, latitude, longitude)
+        VALUES (?, 'Main Warehouse', 'Jakarta', -6.2088, 106.8456)
+    ''', (Config.DEFAULT_LOCATION_CODE,))
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS location_stock (
+            location_id INTEGER NOT NULL,
+            product_id INTEGER NOT NULL,
+            quantity INTEGER NOT NULL DEFAULT 0,
+            reserved_quantity INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (location_id, product_id),
+            FOREIGN KEY (location_id) REFERENCES locations (id),
+            FOREIGN KEY (product_id) REFERENCES products (id)
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_location_stock_product ON location_stock (product_id, location_id)")
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS stock_transfers (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            transfer_number TEXT UNIQUE NOT NULL,
+            from_location_id INTEGER NOT NULL,
+            to_location_id INTEGER NOT NULL,
+            status TEXT DEFAULT 'completed',
+            notes TEXT,
+            created_by TEXT,
+            created_ts INTEGER,
+            FOREIGN KEY (from_location_id) REFERENCES locations (id),
+            FOREIGN KEY (to_location_id) REFERENCES locations (id)
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS stock_transfer_items (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            transfer_id INTEGER NOT NULL,
+            product_id INTEGER NOT NULL,
+            quantity INTEGER NOT NULL,
+            FOREIGN KEY (transfer_id) REFERENCES stock_transfers (id),
+            FOREIGN KEY (product_id) REFERENCES products (id)
+        )
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_stock_transfer_items_transfer ON stock_transfer_items (transfer_id)")
+    
+    # End-of-day stock balances for stock-at-date queries (see database/ledger.py)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS stock_snapshots (
+            product_id INTEGER NOT NULL,
+            snapshot_date INTEGER NOT NULL, -- WIB date as YYYYMMDD
+            balance INTEGER NOT NULL,
+            last_transaction_id INTEGER, -- newest ledger row included in the balance
+            created_ts INTEGER,
+            PRIMARY KEY (product_id, snapshot_date)
+        ) WITHOUT ROWID
+    ''')
+    
+    # Quantities held for open orders until they ship, are cancelled or (drafts) expire
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS stock_reservations (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            order_type TEXT NOT NULL, -- 'sales_order', 'mobile_order'
+            order_id INTEGER NOT NULL,
+            product_id INTEGER NOT NULL,
+            quantity INTEGER NOT NULL,
+            status TEXT DEFAULT 'active', -- 'active', 'fulfilled', 'released', 'cancelled', 'rejected', 'expired'
+            created_ts INTEGER,
+            expires_ts INTEGER, -- drafts only
+            closed_ts INTEGER,
+            created_by TEXT,
+            location_id INTEGER, -- NULL holds stock at no particular depot
+            FOREIGN KEY (product_id) REFERENCES products (id)
+        )
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_stock_reservations_order ON stock_reservations (order_type, order_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_stock_reservations_active ON stock_reservations (status, expires_ts)")
+    
+    # Nightly demand forecasts per product and day (see utils/forecasting.py)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS demand_forecasts (
+            product_id INTEGER NOT NULL,
+            forecast_date INTEGER NOT NULL, -- WIB date as YYYYMMDD
+            quantity REAL NOT NULL,
+            lower_bound REAL, -- approximate 95% band
+            upper_bound REAL,
+            model TEXT, -- 'croston', 'holt_winters', 'none'
+            generated_ts INTEGER,
+            PRIMARY KEY (product_id, forecast_date)
+        ) WITHOUT ROWID
+    ''')
+    
+    # Purchase orders drafted by the replenishment pass (see database/purchasing.py)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS purchase_orders (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            po_number TEXT UNIQUE NOT NULL,
+            supplier TEXT,
+            status TEXT DEFAULT 'draft', -- 'draft', 'ordered', 'received', 'cancelled'
+            location_id INTEGER, -- depot receiving the goods
+            total_amount INTEGER, -- rupiah at cost
+            notes TEXT,
+            created_by TEXT,
+            created_ts INTEGER,
+            updated_ts INTEGER,
+            FOREIGN KEY (location_id) REFERENCES locations (id)
+        )
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_purchase_orders_status ON purchase_orders (status)")
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS purchase_order_items (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            purchase_order_id INTEGER NOT NULL,
+            product_id INTEGER NOT NULL,
+            quantity INTEGER NOT NULL,
+            received_quantity INTEGER DEFAULT 0,
+            unit_cost INTEGER, -- rupiah
+            line_total INTEGER, -- rupiah
+            reorder_point INTEGER, -- reorder point and stock position when the line was drafted
+            stock_position INTEGER,
+            FOREIGN KEY (purchase_order_id) REFERENCES purchase_orders (id),
+            FOREIGN KEY (product_id) REFERENCES products (id)
+        )
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_purchase_order_items_order ON purchase_order_items (purchase_order_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_purchase_order_items_product ON purchase_order_items (product_id)")
+    
+    # Products in an alert state, kept by triggers on stock and minimum level changes so alert
+    # counts and lists never scan products (see database/alerts.py)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS inventory_alerts (
+            product_id INTEGER PRIMARY KEY,
+            level TEXT NOT NULL, -- 'critical' (out of stock), 'low' (at or below min), 'reorder' (within 1.5x min)
+            raised_ts INTEGER, -- when the product entered this level
+            notified_ts INTEGER, -- last supplier digest that included it at this level
+            FOREIGN KEY (product_id) REFERENCES products (id)
+        )
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_inventory_alerts_level ON inventory_alerts (level)")
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_products_insert_alert AFTER INSERT ON products
+        WHEN ({alert_level_sql('NEW')}) IS NOT NULL
+        BEGIN
+            INSERT OR REPLACE INTO inventory_alerts (product_id, level, raised_ts)
+            VALUES (NEW.id, {alert_level_sql('NEW')}, CAST(strftime('%s', 'now') AS INTEGER));
+        END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_products_update_alert AFTER UPDATE OF stock_quantity, min_stock_level ON products
+        WHEN ({alert_level_sql('NEW')}) IS NOT ({alert_level_sql('OLD')})
+        BEGIN
+            DELETE FROM inventory_alerts WHERE product_id = NEW.id AND ({alert_level_sql('NEW')}) IS NULL;
+            INSERT OR REPLACE INTO inventory_alerts (product_id, level, raised_ts)
+            SELECT NEW.id, {alert_level_sql('NEW')}, CAST(strftime('%s', 'now') AS INTEGER)
+            WHERE ({alert_level_sql('NEW')}) IS NOT NULL;
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_products_delete_alert AFTER DELETE ON products
+        BEGIN
+            DELETE FROM inventory_alerts WHERE product_id = OLD.id;
+        END
+    ''')
+    
+    # FIFO cost layers, one per receipt, consumed oldest first by issues (see database/costing.py)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS cost_layers (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            product_id INTEGER NOT NULL,
+            transaction_id INTEGER, -- receiving ledger row; NULL for the opening layer
+            received_ts INTEGER,
+            quantity INTEGER NOT NULL,
+            remaining_quantity INTEGER NOT NULL,
+            unit_cost REAL NOT NULL, -- rupiah
+            FOREIGN KEY (product_id) REFERENCES products (id)
+        )
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_cost_layers_open ON cost_layers (product_id, id) WHERE remaining_quantity > 0
+    ''')
+    
+    # Stock takes: expected quantities frozen at start, counts and posted variances (see database/stock_takes.py)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS stock_takes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            take_number TEXT UNIQUE NOT NULL,
+            location_id INTEGER NOT NULL,
+            category TEXT, -- NULL counts the whole catalog
+            status TEXT DEFAULT 'counting', -- 'counting', 'posted', 'cancelled'
+            lines INTEGER,
+            variance_units INTEGER,
+            variance_value INTEGER, -- rupiah at cost
+            notes TEXT,
+            created_by TEXT,
+            created_ts INTEGER,
+            posted_by TEXT,
+            posted_ts INTEGER,
+            FOREIGN KEY (location_id) REFERENCES locations (id)
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS stock_take_lines (
+            stock_take_id INTEGER NOT NULL,
+            product_id INTEGER NOT NULL,
+            expected_quantity INTEGER NOT NULL,
+            counted_quantity INTEGER, -- NULL until counted
+            unit_cost INTEGER, -- rupiah
+            counted_ts INTEGER,
+            PRIMARY KEY (stock_take_id, product_id),
+            FOREIGN KEY (stock_take_id) REFERENCES stock_takes (id),
+            FOREIGN KEY (product_id) REFERENCES products (id)
+        ) WITHOUT ROWID
+    ''')
+    
+    # RFM aggregates, scores and segment per customer (see utils/segmentation.py); triggers queue
+    # the customers whose orders were added or changed so refreshes re-aggregate only those
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS customer_segments (
+            customer_id INTEGER PRIMARY KEY,
+            frequency INTEGER NOT NULL, -- orders
+            monetary INTEGER NOT NULL, -- rupiah
+            first_order_ts INTEGER,
+            last_order_ts INTEGER,
+            recency_score INTEGER, -- 1 (least) to 5 (most), quintiles across customers
+            frequency_score INTEGER,
+            monetary_score INTEGER,
+            segment TEXT, -- 'New', 'VIP', 'Regular', 'At Risk', 'Inactive'
+            computed_ts INTEGER, -- when the scores and segment were last written
+            FOREIGN KEY (customer_id) REFERENCES customers (id)
+        )
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_customer_segments_segment ON customer_segments (segment)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_mobile_orders_customer ON mobile_orders (customer_id)")
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS customer_segment_queue (
+            customer_id INTEGER PRIMARY KEY
+        ) WITHOUT ROWID
+    ''')
+    for table in ('sales_orders', 'mobile_orders'):
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_insert_segment AFTER INSERT ON {table}
+            WHEN NEW.customer_id IS NOT NULL
+            BEGIN
+                INSERT OR IGNORE INTO customer_segment_queue (customer_id) VALUES (NEW.customer_id);
+            END
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_update_segment AFTER UPDATE OF customer_id, status, total_amount ON {table}
+            BEGIN
+                INSERT OR IGNORE INTO customer_segment_queue (customer_id)
+                SELECT NEW.customer_id WHERE NEW.customer_id IS NOT NULL
+                UNION SELECT OLD.customer_id WHERE OLD.customer_id IS NOT NULL;
+            END
+        ''')
+    
+    # Per-customer totals for the detail page, kept by triggers on orders, visits and activities so it
+    # loads in one lookup; archived orders stay counted (see repository.get_customer_details). The
+    # triggers read migrated columns, so migration 8 creates them along with the first totals
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS customer_summary (
+            customer_id INTEGER PRIMARY KEY,
+            order_count INTEGER NOT NULL DEFAULT 0,
+            lifetime_value INTEGER NOT NULL DEFAULT 0, -- rupiah
+            last_order_ts INTEGER,
+            last_visit_ts INTEGER, -- last completed visit
+            open_follow_ups INTEGER NOT NULL DEFAULT 0, -- pending activities and planned follow-up visits
+            outstanding_amount INTEGER NOT NULL DEFAULT 0, -- rupiah billed and not yet paid
+            credit_order_amount INTEGER NOT NULL DEFAULT 0, -- rupiah of credit-term mobile orders not yet invoiced
+            FOREIGN KEY (customer_id) REFERENCES customers (id)
+        )
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_sales_activities_customer ON sales_activities (customer_id, status)")
+    # Counted sales orders moved to the cold archive, per customer; the archive adds to it in the transaction
+    # that deletes the orders, so RFM segments count archived orders like customer_summary does
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS customer_archive_totals (
+            customer_id INTEGER PRIMARY KEY,
+            order_count INTEGER NOT NULL DEFAULT 0,
+            order_value INTEGER NOT NULL DEFAULT 0, -- rupiah
+            first_order_ts INTEGER,
+            last_order_ts INTEGER,
+            FOREIGN KEY (customer_id) REFERENCES customers (id)
+        )
+    ''')
+    
+    # Customer payments, one row per order a receipt is applied to; inserting one adds it to the
+    # order's paid amount, which the summary triggers carry into the customer's outstanding amount
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS payments (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            payment_number TEXT NOT NULL, -- shared by the rows of one receipt
+            sales_order_id INTEGER NOT NULL,
+            customer_id INTEGER NOT NULL,
+            amount INTEGER NOT NULL, -- rupiah
+            payment_method TEXT,
+            reference TEXT,
+            notes TEXT,
+            payment_date TIMESTAMP,
+            payment_ts INTEGER, -- epoch seconds
+            payment_local_date INTEGER, -- WIB date as YYYYMMDD
+            created_by TEXT,
+            created_ts INTEGER,
+            FOREIGN KEY (sales_order_id) REFERENCES sales_orders (id),
+            FOREIGN KEY (customer_id) REFERENCES customers (id)
+        )
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_payments_order ON payments (sales_order_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_payments_customer ON payments (customer_id, payment_ts)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_payments_number ON payments (payment_number)")
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_payments_insert_order AFTER INSERT ON payments
+        BEGIN
+            UPDATE sales_orders SET paid_amount = COALESCE(paid_amount, 0) + NEW.amount WHERE id = NEW.sales_order_id;
+        END
+    ''')
+    
+    # Default off-hours report schedules
+    cursor.executemany('''
+        INSERT OR IGNORE INTO scheduled_jobs (name, job_type, params, cron_spec)
+        VALUES (?, ?, ?, ?)
+    ''', [
+        ('Daily sales report', 'generate_report', '{"report": "sales_daily"}', '0 1 * * *'),
+        ('Weekly sales report', 'generate_report', '{"report": "sales_weekly"}', '0 2 * * 1'),
+        ('Daily inventory report', 'generate_report', '{"report": "inventory"}', '30 1 * * *'),
+        ('Daily customer report', 'generate_report', '{"report": "customers"}', '0 3 * * *'),
+        ('Hourly analytics export', 'export_analytics', '{}', '10 * * * *'),
+        ('Monthly cold-data archive', 'archive_cold_data', '{}', '0 4 1 * *'),
+        ('Daily sync change-log cleanup', 'prune_change_log', '{}', '30 4 * * *'),
+        ('Nightly stock balance snapshot', 'snapshot_stock_balances', '{}', '5 0 * * *'),
+        ('Draft order reservation expiry', 'expire_stock_reservations', '{}', '*/15 * * * *'),
+        ('Nightly demand forecast', 'forecast_demand', '{}', '45 0 * * *'),
+        ('Nightly purchase order drafts', 'generate_purchase_orders', '{}', '0 1 * * *'),
+        ('Morning stock alert digest', 'send_alert_digest', '{}', '0 7 * * *'),
+        ('Nightly customer segmentation', 'segment_customers', '{}', '15 3 * * *')
+    ])
+    
     # Insert default admin user if not exists
     cursor.execute("SELECT COUNT(*) FROM users WHERE username = 'admin'")
     if cursor.fetchone()[0] == 0:
@@ -324,6 +1049,10 @@ def init_database():
     
     conn.commit()
     conn.close()
+    
+    # Upgrade databases created by older versions (imported here to avoid a circular import)
+    from database.migrations import run_migrations
+    run_migrations()
 
 def insert_sample_data(cursor):
     """Insert sample data for demonstration"""
@@ -481,4 +1210,5 @@ def insert_sfa_sample_data(cursor):
 def get_connection():
     """Get database connection"""
     db_path = get_db_path()
-    return sqlite3.connect(db_path)
+    # Writers wait for the lock instead of failing with "database is locked"
+    return sqlite3.connect(db_path, timeout=Config.DB_BUSY_TIMEOUT, factory=TimedConnection)
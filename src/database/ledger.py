@@ -0,0 +1,341 @@
+"""
+Inventory ledger
+Every stock movement is one inventory_transactions row carrying the
+product's running balance after it (balance_after), written in the same
+transaction that moves products.stock_quantity and the stock of the
+location it happened at (location_stock). A nightly job stores each
+product's end-of-day balance in stock_snapshots, so stock at a past moment
+is one snapshot plus the newest ledger row after it, and a product's
+movement history is an index range scan instead of a replay of the log.
+Each row also carries the movement's cost (see database/costing.py).
+"""
+from datetime import date, datetime, timedelta
+
+import pandas as pd
+
+from config import Config
+from database.costing import add_cost_layer, average_after_receipt, batch_costs, movement_cost
+from database.init_db import get_connection
+from database.repository import INDONESIA_TZ, timestamp_columns, to_epoch, wib_date_key
+
+MOVEMENT_TYPES = ('in', 'out', 'adjustment', 'opening', 'transfer')
+ADJUSTMENT_TYPES = ('Increase', 'Decrease', 'Set to Value')
+
+# Balance of every product (p) at a cutoff: newest ledger row after the latest
+# usable snapshot, else the snapshot, else the balance before the first ledger
+# row (an opening balance also stands for the time before the ledger began),
+# else the live stock of a product that never moved.
+_BALANCE_AT_SQL = '''
+    COALESCE(
+        (SELECT t.balance_after FROM inventory_transactions t
+         WHERE t.product_id = p.id AND t.created_ts < :cutoff AND t.balance_after IS NOT NULL
+           AND t.id > COALESCE((SELECT s.last_transaction_id FROM stock_snapshots s
+                                WHERE s.product_id = p.id AND s.snapshot_date < :cutoff_date
+                                ORDER BY s.snapshot_date DESC LIMIT 1), 0)
+         ORDER BY t.created_ts DESC, t.id DESC LIMIT 1),
+        (SELECT s.balance FROM stock_snapshots s
+         WHERE s.product_id = p.id AND s.snapshot_date < :cutoff_date
+         ORDER BY s.snapshot_date DESC LIMIT 1),
+        (SELECT CASE WHEN t.transaction_type = 'opening' THEN t.balance_after
+                     ELSE t.balance_after - t.quantity END
+         FROM inventory_transactions t
+         WHERE t.product_id = p.id AND t.balance_after IS NOT NULL
+         ORDER BY t.created_ts, t.id LIMIT 1),
+        p.stock_quantity, 0)
+'''
+
+def _cutoff(as_of):
+    """Exclusive epoch cutoff and its WIB date key; a date means the end of that day"""
+    if as_of is None:
+        cutoff = int(datetime.now(INDONESIA_TZ).timestamp()) + 1
+    elif isinstance(as_of, date) and not isinstance(as_of, datetime):
+        cutoff = to_epoch(as_of + timedelta(days=1))
+    else:
+        cutoff = to_epoch(as_of) + 1
+    return cutoff, wib_date_key(cutoff)
+
+class InsufficientStockError(ValueError):
+    """More stock is asked for than is available; shortages are (product_id, requested, available)"""
+
+    def __init__(self, shortages):
+        self.shortages = shortages
+        super().__init__('insufficient stock for ' + ', '.join(
+            f"product {product_id} ({requested} requested, {available} available)"
+            for product_id, requested, available in shortages))
+
+def default_location_id(cursor):
+    """Location used for movements that do not name one (Config.DEFAULT_LOCATION_CODE)"""
+    cursor.execute("SELECT id FROM locations WHERE code = ?", (Config.DEFAULT_LOCATION_CODE,))
+    row = cursor.fetchone()
+    if row is None:
+        raise ValueError(f"Default location {Config.DEFAULT_LOCATION_CODE} does not exist")
+    return row[0]
+
+def post_stock_movement(cursor, product_id, quantity, transaction_type, reference_type=None, reference_id=None,
+                        notes=None, created_by=None, location_id=None, require_available=False, unit_cost=None):
+    """Apply a signed quantity to a product's stock at a location and record it with its cost on the caller's
+    transaction; returns the product's total balance after the movement. A receipt is valued at unit_cost
+    (the current average when None). With require_available an outgoing movement only applies when the
+    location has that much unreserved stock, else InsufficientStockError."""
+    if transaction_type not in MOVEMENT_TYPES:
+        raise ValueError(f"Unknown movement type: {transaction_type}")
+    quantity = int(quantity)
+    location_id = location_id or default_location_id(cursor)
+    if require_available and quantity < 0:
+        cursor.execute('''
+            UPDATE location_stock SET quantity = quantity + ?
+            WHERE location_id = ? AND product_id = ? AND quantity - reserved_quantity >= ?
+        ''', (quantity, location_id, product_id, -quantity))
+        if cursor.rowcount == 0:
+            cursor.execute('''
+                SELECT quantity - reserved_quantity FROM location_stock WHERE location_id = ? AND product_id = ?
+            ''', (location_id, product_id))
+            row = cursor.fetchone()
+            raise InsufficientStockError([(product_id, -quantity, row[0] if row else 0)])
+    else:
+        cursor.execute('''
+            INSERT INTO location_stock (location_id, product_id, quantity) VALUES (?, ?, ?)
+            ON CONFLICT (location_id, product_id) DO UPDATE SET quantity = quantity + excluded.quantity
+        ''', (location_id, product_id, quantity))
+
+    unit_cost, cost_amount, receipt_cost = movement_cost(cursor, product_id, quantity, transaction_type, unit_cost)
+    stored, created_ts, local_date = timestamp_columns()
+    cursor.execute(f'''
+        UPDATE products SET stock_quantity = COALESCE(stock_quantity, 0) + :quantity,
+                            average_cost = {average_after_receipt(':quantity', ':receipt_cost')},
+                            updated_at = CURRENT_TIMESTAMP
+        WHERE id = :product_id RETURNING stock_quantity
+    ''', {'quantity': quantity, 'receipt_cost': receipt_cost, 'product_id': product_id})
+    row = cursor.fetchone()
+    if row is None:
+        raise ValueError(f"Unknown product: {product_id}")
+    cursor.execute('''
+        INSERT INTO inventory_transactions (product_id, transaction_type, quantity, reference_type, reference_id,
+                                            notes, created_at, balance_after, created_ts, created_local_date,
+                                            created_by, location_id, unit_cost, cost_amount)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', (product_id, transaction_type, quantity, reference_type, reference_id, notes, stored, row[0],
+          created_ts, local_date, created_by, location_id, unit_cost, cost_amount))
+    if receipt_cost is not None:
+        add_cost_layer(cursor, product_id, cursor.lastrowid, quantity, receipt_cost, created_ts)
+    return row[0]
+
+def post_stock_batch(cursor, lines, transaction_type, reference_type=None, reference_id=None, notes=None,
+                     created_by=None, location_id=None):
+    """Set-based counterpart of post_stock_movement for many products at one location on the caller's
+    transaction; lines are (product_id, signed quantity) or (product_id, signed quantity, unit cost of a
+    receipt) with each product once. Returns the movements posted."""
+    if transaction_type not in MOVEMENT_TYPES:
+        raise ValueError(f"Unknown movement type: {transaction_type}")
+    location_id = location_id or default_location_id(cursor)
+    cursor.execute('''
+        CREATE TEMP TABLE IF NOT EXISTS stock_batch (product_id INTEGER PRIMARY KEY, quantity INTEGER,
+                                                     unit_cost REAL, receipt_cost REAL, cost_amount REAL)
+    ''')
+    cursor.execute("DELETE FROM temp.stock_batch")
+    cursor.executemany("INSERT INTO temp.stock_batch (product_id, quantity, unit_cost) VALUES (?, ?, ?)",
+                       [(int(line[0]), int(line[1]), line[2] if len(line) > 2 else None)
+                        for line in lines if int(line[1]) != 0])
+    cursor.execute('''
+        SELECT b.product_id FROM temp.stock_batch b LEFT JOIN products p ON p.id = b.product_id WHERE p.id IS NULL
+    ''')
+    unknown = [row[0] for row in cursor.fetchall()]
+    if unknown:
+        raise ValueError(f"Unknown products: {unknown}")
+
+    batch_costs(cursor, transaction_type)
+
+    # WHERE true keeps the upsert's ON CONFLICT from being parsed as a join constraint
+    cursor.execute('''
+        INSERT INTO location_stock (location_id, product_id, quantity)
+        SELECT ?, product_id, quantity FROM temp.stock_batch WHERE true
+        ON CONFLICT (location_id, product_id) DO UPDATE SET quantity = quantity + excluded.quantity
+    ''', (location_id,))
+    cursor.execute(f'''
+        UPDATE products SET stock_quantity = COALESCE(stock_quantity, 0) + b.quantity,
+                            average_cost = {average_after_receipt('b.quantity', 'b.receipt_cost')},
+                            updated_at = CURRENT_TIMESTAMP
+        FROM temp.stock_batch b WHERE products.id = b.product_id
+    ''')
+    stored, created_ts, local_date = timestamp_columns()
+    cursor.execute("SELECT COALESCE(MAX(id), 0) FROM inventory_transactions")
+    last_id = cursor.fetchone()[0]
+    cursor.execute('''
+        INSERT INTO inventory_transactions (product_id, transaction_type, quantity, reference_type, reference_id,
+                                            notes, created_at, balance_after, created_ts, created_local_date,
+                                            created_by, location_id, unit_cost, cost_amount)
+        SELECT b.product_id, ?, b.quantity, ?, ?, ?, ?, p.stock_quantity, ?, ?, ?, ?, b.unit_cost, b.cost_amount
+        FROM temp.stock_batch b JOIN products p ON p.id = b.product_id
+        ORDER BY b.product_id
+    ''', (transaction_type, reference_type, reference_id, notes, stored, created_ts, local_date, created_by,
+          location_id))
+    posted = cursor.rowcount
+    cursor.execute('''
+        INSERT INTO cost_layers (product_id, transaction_id, received_ts, quantity, remaining_quantity, unit_cost)
+        SELECT t.product_id, t.id, t.created_ts, t.quantity, t.quantity, b.receipt_cost
+        FROM inventory_transactions t JOIN temp.stock_batch b ON b.product_id = t.product_id
+        WHERE t.id > ? AND b.receipt_cost IS NOT NULL
+    ''', (last_id,))
+    cursor.execute("DELETE FROM temp.stock_batch")
+    return posted
+
+def post_stock_movements(movements, created_by=None):
+    """Post several movements (dicts with post_stock_movement's arguments) in one transaction;
+    returns the balances after each"""
+    conn = get_connection()
+    conn.isolation_level = None
+    try:
+        cursor = conn.cursor()
+        cursor.execute("BEGIN IMMEDIATE")
+        try:
+            balances = [post_stock_movement(cursor, created_by=created_by, **movement) for movement in movements]
+            cursor.execute("COMMIT")
+        except Exception:
+            cursor.execute("ROLLBACK")
+            raise
+        return balances
+    finally:
+        conn.close()
+
+def adjust_stock(product_id, adjustment_type, quantity, reason=None, notes=None, created_by=None, location_id=None):
+    """Manual stock adjustment (Increase, Decrease or Set to Value) at a location; returns the new total balance"""
+    if adjustment_type not in ADJUSTMENT_TYPES:
+        raise ValueError(f"Unknown adjustment type: {adjustment_type}")
+    text = f"{reason}: {notes}" if reason and notes else (reason or notes)
+    conn = get_connection()
+    conn.isolation_level = None
+    try:
+        cursor = conn.cursor()
+        cursor.execute("BEGIN IMMEDIATE")
+        try:
+            location_id = location_id or default_location_id(cursor)
+            # Read inside the write lock so a concurrent movement cannot slip between read and set
+            cursor.execute('''
+                SELECT COALESCE((SELECT quantity FROM location_stock WHERE location_id = ? AND product_id = p.id), 0)
+                FROM products p WHERE p.id = ?
+            ''', (location_id, product_id))
+            row = cursor.fetchone()
+            if row is None:
+                raise ValueError(f"Unknown product: {product_id}")
+            delta = {'Increase': quantity, 'Decrease': -quantity, 'Set to Value': quantity - row[0]}[adjustment_type]
+            balance = post_stock_movement(cursor, product_id, delta, 'adjustment', 'adjustment', None, text, created_by,
+                                          location_id)
+            cursor.execute("COMMIT")
+        except Exception:
+            cursor.execute("ROLLBACK")
+            raise
+        return balance
+    finally:
+        conn.close()
+
+def get_stock_at(product_id, as_of=None):
+    """Stock of one product at a moment (a date means its end of day), from at most one snapshot
+    and one ledger row"""
+    cutoff, cutoff_date = _cutoff(as_of)
+    conn = get_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(f"SELECT {_BALANCE_AT_SQL} FROM products p WHERE p.id = :product_id",
+                       {'cutoff': cutoff, 'cutoff_date': cutoff_date, 'product_id': product_id})
+        row = cursor.fetchone()
+        return row[0] if row else None
+    finally:
+        conn.close()
+
+def get_stock_levels_at(as_of=None):
+    """Stock of every product at a moment, with the current stock for comparison"""
+    cutoff, cutoff_date = _cutoff(as_of)
+    conn = get_connection()
+    try:
+        return pd.read_sql_query(f'''
+            SELECT p.id AS product_id, p.sku, p.name, p.category, {_BALANCE_AT_SQL} AS balance,
+                   p.stock_quantity AS current_stock
+            FROM products p ORDER BY p.name
+        ''', conn, params={'cutoff': cutoff, 'cutoff_date': cutoff_date})
+    finally:
+        conn.close()
+
+def get_movement_history(product_id=None, start_date=None, end_date=None, reference_type=None, location_id=None,
+                         limit=200):
+    """Ledger rows with product, location and running balance, newest first"""
+    conditions, params = ['t.balance_after IS NOT NULL'], []
+    if location_id is not None:
+        conditions.append("t.location_id = ?")
+        params.append(location_id)
+    if product_id is not None:
+        conditions.append("t.product_id = ?")
+        params.append(product_id)
+    if start_date:
+        conditions.append("t.created_ts >= ?")
+        params.append(to_epoch(start_date))
+    if end_date:
+        conditions.append("t.created_ts < ?")
+        params.append(_cutoff(end_date)[0])
+    if reference_type:
+        conditions.append("t.reference_type = ?")
+        params.append(reference_type)
+    conn = get_connection()
+    try:
+        return pd.read_sql_query(f'''
+            SELECT t.id, t.created_at, p.sku, p.name AS product, l.code AS location, t.transaction_type, t.quantity,
+                   t.balance_after, t.reference_type, t.reference_id, t.notes, t.created_by
+            FROM inventory_transactions t
+            JOIN products p ON p.id = t.product_id
+            LEFT JOIN locations l ON l.id = t.location_id
+            WHERE {' AND '.join(conditions)}
+            ORDER BY t.created_ts DESC, t.id DESC
+            LIMIT ?
+        ''', conn, params=params + [limit])
+    finally:
+        conn.close()
+
+def get_daily_movements(start_date, end_date=None, product_id=None):
+    """Units in and out per WIB day"""
+    conditions, params = ["created_local_date >= ?"], [wib_date_key(start_date)]
+    if end_date:
+        conditions.append("created_local_date <= ?")
+        params.append(wib_date_key(end_date))
+    if product_id is not None:
+        conditions.append("product_id = ?")
+        params.append(product_id)
+    conn = get_connection()
+    try:
+        daily = pd.read_sql_query(f'''
+            SELECT created_local_date,
+                   SUM(CASE WHEN quantity > 0 AND transaction_type NOT IN ('opening', 'transfer') THEN quantity ELSE 0 END) AS units_in,
+                   SUM(CASE WHEN quantity < 0 AND transaction_type != 'transfer' THEN -quantity ELSE 0 END) AS units_out
+            FROM inventory_transactions
+            WHERE {' AND '.join(conditions)} AND balance_after IS NOT NULL
+            GROUP BY created_local_date ORDER BY created_local_date
+        ''', conn, params=params)
+    finally:
+        conn.close()
+    daily['date'] = pd.to_datetime(daily['created_local_date'].astype(str), format='%Y%m%d')
+    return daily[['date', 'units_in', 'units_out']]
+
+def take_stock_snapshot(day=None):
+    """Store every product's closing balance of a WIB day (yesterday by default); returns the product count"""
+    if day is None:
+        day = datetime.now(INDONESIA_TZ).date() - timedelta(days=1)
+    elif isinstance(day, str):
+        day = date.fromisoformat(day)
+    cutoff, cutoff_date = _cutoff(day)
+    conn = get_connection()
+    try:
+        cursor = conn.cursor()
+        # Built from the previous snapshot plus the day's ledger rows
+        cursor.execute(f'''
+            INSERT OR REPLACE INTO stock_snapshots (product_id, snapshot_date, balance, last_transaction_id, created_ts)
+            SELECT p.id, :snapshot_date, {_BALANCE_AT_SQL},
+                   (SELECT t.id FROM inventory_transactions t
+                    WHERE t.product_id = p.id AND t.created_ts < :cutoff AND t.balance_after IS NOT NULL
+                    ORDER BY t.created_ts DESC, t.id DESC LIMIT 1),
+                   :now
+            FROM products p
+        ''', {'cutoff': cutoff, 'cutoff_date': cutoff_date, 'snapshot_date': wib_date_key(day),
+              'now': int(datetime.now(INDONESIA_TZ).timestamp())})
+        count = cursor.rowcount
+        conn.commit()
+        return count
+    finally:
+        conn.close()
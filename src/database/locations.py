@@ -0,0 +1,211 @@
+"""
+Depots and stock per location
+Stock lives per (location, product) in location_stock, kept in step with
+products.stock_quantity (the total) by the ledger. Transfers move stock
+between depots in one transaction: the outgoing leg only applies when the
+source has that much unreserved stock. Mobile orders are fulfilled from the
+nearest depot that can supply every line, by great-circle distance from
+the customer's last known position. location_stock's primary key
+(location_id, product_id) and the (product_id, location_id) index keep
+per-depot and per-product queries on index ranges however many depots
+there are.
+"""
+import time
+
+import numpy as np
+import pandas as pd
+
+from database.init_db import get_connection
+from database.ledger import post_stock_movement
+from database.sequence import next_number
+
+EARTH_RADIUS_KM = 6371.0
+
+def get_locations(active_only=True):
+    """Depots with coordinates"""
+    conn = get_connection()
+    try:
+        return pd.read_sql_query(f'''
+            SELECT id, code, name, address, latitude, longitude, active FROM locations
+            {'WHERE active = 1' if active_only else ''} ORDER BY code
+        ''', conn)
+    finally:
+        conn.close()
+
+def save_location(code, name, address=None, latitude=None, longitude=None, active=True):
+    """Add a depot or update the one with this code; returns its id"""
+    conn = get_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute('''
+            INSERT INTO locations (code, name, address, latitude, longitude, active) VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT (code) DO UPDATE SET name = excluded.name, address = excluded.address,
+                latitude = excluded.latitude, longitude = excluded.longitude, active = excluded.active
+        ''', (code.strip().upper(), name, address, latitude, longitude, int(active)))
+        cursor.execute("SELECT id FROM locations WHERE code = ?", (code.strip().upper(),))
+        location_id = cursor.fetchone()[0]
+        conn.commit()
+        return location_id
+    finally:
+        conn.close()
+
+def create_transfer(from_location_id, to_location_id, items, created_by=None, notes=None):
+    """Move stock between two depots in one transaction; items are dicts with product_id and quantity.
+    Returns (transfer id, transfer number); raises InsufficientStockError when the source is short."""
+    if from_location_id == to_location_id:
+        raise ValueError("Source and destination must be different locations")
+    lines = [(item['product_id'], int(item['quantity'])) for item in items if int(item['quantity']) > 0]
+    if not lines:
+        raise ValueError("Transfer has no items")
+    transfer_number = next_number('TRF')
+    conn = get_connection()
+    conn.isolation_level = None
+    try:
+        cursor = conn.cursor()
+        cursor.execute("BEGIN IMMEDIATE")
+        try:
+            cursor.execute('''
+                INSERT INTO stock_transfers (transfer_number, from_location_id, to_location_id, status, notes,
+                                             created_by, created_ts)
+                VALUES (?, ?, ?, 'completed', ?, ?, ?)
+            ''', (transfer_number, from_location_id, to_location_id, notes, created_by, int(time.time())))
+            transfer_id = cursor.lastrowid
+            cursor.executemany('''
+                INSERT INTO stock_transfer_items (transfer_id, product_id, quantity) VALUES (?, ?, ?)
+            ''', [(transfer_id, product_id, quantity) for product_id, quantity in lines])
+            for product_id, quantity in lines:
+                post_stock_movement(cursor, product_id, -quantity, 'transfer', 'transfer', transfer_id, notes,
+                                    created_by, from_location_id, require_available=True)
+                post_stock_movement(cursor, product_id, quantity, 'transfer', 'transfer', transfer_id, notes,
+                                    created_by, to_location_id)
+            cursor.execute("COMMIT")
+        except Exception:
+            cursor.execute("ROLLBACK")
+            raise
+    finally:
+        conn.close()
+    return transfer_id, transfer_number
+
+def get_transfers(limit=50):
+    """Recent transfers with their locations and item counts, newest first"""
+    conn = get_connection()
+    try:
+        return pd.read_sql_query('''
+            SELECT t.id, t.transfer_number, f.code AS from_location, d.code AS to_location,
+                   (SELECT COUNT(*) FROM stock_transfer_items i WHERE i.transfer_id = t.id) AS items,
+                   (SELECT SUM(quantity) FROM stock_transfer_items i WHERE i.transfer_id = t.id) AS units,
+                   t.status, t.notes, t.created_by, t.created_ts
+            FROM stock_transfers t
+            JOIN locations f ON f.id = t.from_location_id
+            JOIN locations d ON d.id = t.to_location_id
+            ORDER BY t.id DESC LIMIT ?
+        ''', conn, params=(limit,))
+    finally:
+        conn.close()
+
+def get_location_stock(location_id=None, product_id=None):
+    """Quantity, reserved and available stock per location and product"""
+    conditions, params = [], []
+    if location_id is not None:
+        conditions.append("ls.location_id = ?")
+        params.append(location_id)
+    if product_id is not None:
+        conditions.append("ls.product_id = ?")
+        params.append(product_id)
+    conn = get_connection()
+    try:
+        return pd.read_sql_query(f'''
+            SELECT l.code AS location, p.sku, p.name AS product, ls.quantity, ls.reserved_quantity,
+                   ls.quantity - ls.reserved_quantity AS available_quantity, ls.location_id, ls.product_id
+            FROM location_stock ls
+            JOIN locations l ON l.id = ls.location_id
+            JOIN products p ON p.id = ls.product_id
+            {'WHERE ' + ' AND '.join(conditions) if conditions else ''}
+            ORDER BY l.code, p.name
+        ''', conn, params=params)
+    finally:
+        conn.close()
+
+def get_location_summary():
+    """Products, units and stock value at moving-average cost per depot"""
+    conn = get_connection()
+    try:
+        return pd.read_sql_query('''
+            SELECT l.code, l.name, COUNT(ls.product_id) AS products, COALESCE(SUM(ls.quantity), 0) AS units,
+                   COALESCE(SUM(ls.reserved_quantity), 0) AS reserved, COALESCE(SUM(ls.quantity * COALESCE(p.average_cost, p.cost, 0)), 0) AS value
+            FROM locations l
+            LEFT JOIN location_stock ls ON ls.location_id = l.id AND ls.quantity != 0
+            LEFT JOIN products p ON p.id = ls.product_id
+            WHERE l.active = 1
+            GROUP BY l.id ORDER BY l.code
+        ''', conn)
+    finally:
+        conn.close()
+
+def _customer_position(cursor, customer_id):
+    cursor.execute('''
+        SELECT latitude, longitude FROM customer_visits
+        WHERE customer_id = ? AND latitude IS NOT NULL AND longitude IS NOT NULL
+        ORDER BY visit_ts DESC, id DESC LIMIT 1
+    ''', (customer_id,))
+    return cursor.fetchone()
+
+def get_customer_position(customer_id):
+    """(latitude, longitude) of the customer's most recent visit with a GPS fix, or None"""
+    conn = get_connection()
+    try:
+        return _customer_position(conn.cursor(), customer_id)
+    finally:
+        conn.close()
+
+def _distances_km(latitudes, longitudes, latitude, longitude):
+    """Great-circle (haversine) distances from one point to many"""
+    lat1, lon1 = np.radians(latitude), np.radians(longitude)
+    lat2, lon2 = np.radians(np.asarray(latitudes, dtype=float)), np.radians(np.asarray(longitudes, dtype=float))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+def _nearest_locations(cursor, items, latitude=None, longitude=None):
+    """Active depots that can supply every line first, nearest first"""
+    quantities = {}
+    for item in items:
+        quantities[item['product_id']] = quantities.get(item['product_id'], 0) + int(item['quantity'])
+    cursor.execute("SELECT id, code, name, latitude, longitude FROM locations WHERE active = 1")
+    locations = pd.DataFrame(cursor.fetchall(), columns=['id', 'code', 'name', 'latitude', 'longitude'])
+    if locations.empty:
+        return locations.assign(distance_km=[], can_fulfil=[], short_lines=[])
+
+    # One index range per ordered product, independent of the number of depots
+    short = pd.Series(len(quantities), index=locations['id'])
+    for product_id, quantity in quantities.items():
+        cursor.execute('''
+            SELECT location_id FROM location_stock
+            WHERE product_id = ? AND quantity - reserved_quantity >= ?
+        ''', (product_id, quantity))
+        supplying = [row[0] for row in cursor.fetchall()]
+        short.loc[short.index.intersection(supplying)] -= 1
+    locations['short_lines'] = locations['id'].map(short).to_numpy()
+    locations['can_fulfil'] = locations['short_lines'] == 0
+
+    if latitude is not None and longitude is not None:
+        locations['distance_km'] = _distances_km(locations['latitude'], locations['longitude'],
+                                                 latitude, longitude).round(1)
+    else:
+        locations['distance_km'] = np.nan
+    return locations.sort_values(['can_fulfil', 'distance_km', 'code'], ascending=[False, True, True],
+                                 na_position='last', ignore_index=True)
+
+def nearest_locations(items, latitude=None, longitude=None):
+    """Depots ranked for an order: those that can supply every line first, then by distance"""
+    conn = get_connection()
+    try:
+        return _nearest_locations(conn.cursor(), items, latitude, longitude)
+    finally:
+        conn.close()
+
+def pick_location(cursor, items, customer_id=None):
+    """Nearest depot that can supply every line of an order on the caller's transaction, or None"""
+    position = _customer_position(cursor, customer_id) if customer_id is not None else None
+    ranked = _nearest_locations(cursor, items, *(position or (None, None)))
+    fulfilling = ranked[ranked['can_fulfil']]
+    return int(fulfilling.iloc[0]['id']) if not fulfilling.empty else None
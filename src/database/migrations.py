@@ -0,0 +1,371 @@
+"""
+Schema migrations for existing databases
+init_database() creates the current schema for new installs; migrations
+bring older files up to date. The applied version is kept in
+PRAGMA user_version and every migration is safe to run on a database that
+already has the new shape.
+"""
+import re
+import time
+
+import pandas as pd
+
+from config import Config
+from database.archive import read_archived
+from database.init_db import (alert_level_sql, counted_order_sql, create_customer_summary_triggers, credit_order_sql,
+                              get_connection, open_follow_up_sql)
+
+WIB_OFFSET_SECONDS = 7 * 3600
+
+# Money columns stored as whole rupiah
+MONEY_COLUMNS = {
+    'products': ('price', 'cost'),
+    'sales_orders': ('total_amount',),
+    'order_items': ('unit_price', 'total_price'),
+    'mobile_orders': ('total_amount',),
+    'mobile_order_items': ('unit_price', 'total_price'),
+    'sales_targets': ('target_amount', 'achieved_amount'),
+    'expense_claims': ('amount',)
+}
+
+# table: (source timestamp column, epoch column, WIB YYYYMMDD column)
+TIME_COLUMNS = {
+    'sales_orders': ('order_date', 'order_ts', 'order_local_date'),
+    'mobile_orders': ('order_date', 'order_ts', 'order_local_date'),
+    'customer_visits': ('visit_date', 'visit_ts', 'visit_local_date')
+}
+
+TIME_INDEXES = (
+    "CREATE INDEX IF NOT EXISTS idx_sales_orders_local_date ON sales_orders (order_local_date)",
+    "CREATE INDEX IF NOT EXISTS idx_sales_orders_customer_date ON sales_orders (customer_id, order_local_date)",
+    "CREATE INDEX IF NOT EXISTS idx_order_items_order ON order_items (order_id)",
+    "CREATE INDEX IF NOT EXISTS idx_mobile_orders_user_date ON mobile_orders (user_id, order_local_date)",
+    "CREATE INDEX IF NOT EXISTS idx_customer_visits_user_date ON customer_visits (user_id, visit_local_date)"
+)
+
+def _columns(cursor, table):
+    cursor.execute(f"PRAGMA table_info({table})")
+    return {row[1]: row[2] for row in cursor.fetchall()}
+
+def _rebuild_with_integer_money(cursor, table, money_columns):
+    """Recreate a table with INTEGER money columns (SQLite cannot ALTER a column type)"""
+    columns = _columns(cursor, table)
+    if all(columns.get(column, '').upper() == 'INTEGER' for column in money_columns):
+        return False
+
+    cursor.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (table,))
+    create_sql = cursor.fetchone()[0]
+    cursor.execute('''
+        SELECT sql FROM sqlite_master WHERE tbl_name = ? AND type IN ('index', 'trigger') AND sql IS NOT NULL
+    ''', (table,))
+    dependents = [row[0] for row in cursor.fetchall()]
+
+    for column in money_columns:
+        create_sql = re.sub(rf'(\b{column}\s+)DECIMAL\(\s*\d+\s*,\s*\d+\s*\)', r'\1INTEGER', create_sql)
+    create_sql = re.sub(rf'CREATE TABLE\s+(IF NOT EXISTS\s+)?"?{table}"?', f'CREATE TABLE {table}_new', create_sql, count=1)
+
+    names = list(columns)
+    select = ', '.join(f"CAST(ROUND({name}) AS INTEGER)" if name in money_columns else name for name in names)
+    cursor.execute(create_sql)
+    cursor.execute(f"INSERT INTO {table}_new ({', '.join(names)}) SELECT {select} FROM {table}")
+    cursor.execute(f"DROP TABLE {table}")
+    cursor.execute(f"ALTER TABLE {table}_new RENAME TO {table}")
+    for sql in dependents:
+        cursor.execute(sql)
+    return True
+
+def _migrate_money_and_time(cursor):
+    """Integer rupiah money columns; epoch and WIB date-key columns with indexes"""
+    for table, money_columns in MONEY_COLUMNS.items():
+        _rebuild_with_integer_money(cursor, table, money_columns)
+
+    for table, (source, epoch_column, date_column) in TIME_COLUMNS.items():
+        existing = _columns(cursor, table)
+        for column in (epoch_column, date_column):
+            if column not in existing:
+                cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} INTEGER")
+        # Stored timestamps are naive WIB wall-clock values
+        cursor.execute(f'''
+            UPDATE {table}
+            SET {epoch_column} = CAST(strftime('%s', {source}) AS INTEGER) - {WIB_OFFSET_SECONDS},
+                {date_column} = CAST(strftime('%Y%m%d', {source}) AS INTEGER)
+            WHERE {epoch_column} IS NULL AND {source} IS NOT NULL
+        ''')
+
+    for sql in TIME_INDEXES:
+        cursor.execute(sql)
+
+def _add_customer_group(cursor):
+    """Pricing group column on customers"""
+    if 'customer_group' not in _columns(cursor, 'customers'):
+        cursor.execute("ALTER TABLE customers ADD COLUMN customer_group TEXT")
+
+def _add_stock_ledger(cursor):
+    """Running balance and time columns on inventory_transactions, with an opening balance per product"""
+    existing = _columns(cursor, 'inventory_transactions')
+    for column, kind in (('balance_after', 'INTEGER'), ('created_ts', 'INTEGER'),
+                         ('created_local_date', 'INTEGER'), ('created_by', 'TEXT')):
+        if column not in existing:
+            cursor.execute(f"ALTER TABLE inventory_transactions ADD COLUMN {column} {kind}")
+    # Older rows used the CURRENT_TIMESTAMP default, which is UTC
+    cursor.execute(f'''
+        UPDATE inventory_transactions
+        SET created_ts = CAST(strftime('%s', created_at) AS INTEGER),
+            created_local_date = CAST(strftime('%Y%m%d', created_at, '+{WIB_OFFSET_SECONDS} seconds') AS INTEGER)
+        WHERE created_ts IS NULL AND created_at IS NOT NULL
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_inventory_transactions_product ON inventory_transactions (product_id, created_ts)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_inventory_transactions_date ON inventory_transactions (created_local_date)")
+
+    # Older rows carry no balance; the ledger starts from today's stock
+    now = int(time.time())
+    cursor.execute(f'''
+        INSERT INTO inventory_transactions (product_id, transaction_type, quantity, reference_type, notes, created_at,
+                                            balance_after, created_ts, created_local_date, created_by)
+        SELECT id, 'opening', COALESCE(stock_quantity, 0), 'opening', 'Opening balance',
+               datetime(?, 'unixepoch', '+{WIB_OFFSET_SECONDS} seconds'), COALESCE(stock_quantity, 0), ?,
+               CAST(strftime('%Y%m%d', ?, 'unixepoch', '+{WIB_OFFSET_SECONDS} seconds') AS INTEGER), 'system'
+        FROM products p
+        WHERE NOT EXISTS (SELECT 1 FROM inventory_transactions t
+                          WHERE t.product_id = p.id AND t.balance_after IS NOT NULL)
+    ''', (now, now, now))
+
+def _add_reserved_quantity(cursor):
+    """Quantity held by open orders on products"""
+    if 'reserved_quantity' not in _columns(cursor, 'products'):
+        cursor.execute("ALTER TABLE products ADD COLUMN reserved_quantity INTEGER DEFAULT 0")
+
+def _add_locations(cursor):
+    """Location columns on movements, reservations and mobile orders; existing stock moves to the default depot
+    (open reservations stay unlocated)"""
+    for table in ('inventory_transactions', 'stock_reservations', 'mobile_orders'):
+        if 'location_id' not in _columns(cursor, table):
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN location_id INTEGER")
+    cursor.execute("SELECT id FROM locations WHERE code = ?", (Config.DEFAULT_LOCATION_CODE,))
+    location_id = cursor.fetchone()[0]
+    cursor.execute('''
+        INSERT INTO location_stock (location_id, product_id, quantity)
+        SELECT ?, id, COALESCE(stock_quantity, 0) FROM products p
+        WHERE NOT EXISTS (SELECT 1 FROM location_stock ls WHERE ls.product_id = p.id)
+    ''', (location_id,))
+    cursor.execute("UPDATE inventory_transactions SET location_id = ? WHERE location_id IS NULL", (location_id,))
+
+def _add_inventory_alerts(cursor):
+    """Alerts for products already in an alert state when the alert triggers were added"""
+    cursor.execute(f'''
+        INSERT OR IGNORE INTO inventory_alerts (product_id, level, raised_ts)
+        SELECT id, {alert_level_sql('p')}, CAST(strftime('%s', 'now') AS INTEGER) FROM products p
+        WHERE ({alert_level_sql('p')}) IS NOT NULL
+    ''')
+
+def _add_costing(cursor):
+    """Cost columns; the moving average and one opening FIFO layer per product start from the list cost"""
+    if 'average_cost' not in _columns(cursor, 'products'):
+        cursor.execute("ALTER TABLE products ADD COLUMN average_cost REAL")
+    existing = _columns(cursor, 'inventory_transactions')
+    for column in ('unit_cost', 'cost_amount'):
+        if column not in existing:
+            cursor.execute(f"ALTER TABLE inventory_transactions ADD COLUMN {column} REAL")
+    cursor.execute("UPDATE products SET average_cost = COALESCE(cost, 0) WHERE average_cost IS NULL")
+    cursor.execute('''
+        INSERT INTO cost_layers (product_id, received_ts, quantity, remaining_quantity, unit_cost)
+        SELECT id, ?, stock_quantity, stock_quantity, COALESCE(cost, 0) FROM products p
+        WHERE stock_quantity > 0 AND NOT EXISTS (SELECT 1 FROM cost_layers l WHERE l.product_id = p.id)
+    ''', (int(time.time()),))
+
+def _add_customer_summary(cursor):
+    """Customer totals from the orders, visits and activities already in the database, and the triggers that
+    keep them from then on"""
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_customer_visits_customer ON customer_visits (customer_id, visit_ts)")
+    cursor.execute(f'''
+        INSERT OR REPLACE INTO customer_summary (customer_id, order_count, lifetime_value, last_order_ts,
+                                                 last_visit_ts, open_follow_ups)
+        SELECT c.id, COALESCE(o.orders, 0), COALESCE(o.value, 0), o.last_ts, v.last_ts,
+               COALESCE(v.open, 0) + COALESCE(a.open, 0)
+        FROM customers c
+        LEFT JOIN (
+            SELECT customer_id, COUNT(*) AS orders, SUM(COALESCE(total_amount, 0)) AS value, MAX(order_ts) AS last_ts
+            FROM (SELECT customer_id, total_amount, order_ts FROM sales_orders o
+                  WHERE {counted_order_sql('sales_orders', 'o')}
+                  UNION ALL
+                  SELECT customer_id, total_amount, order_ts FROM mobile_orders o
+                  WHERE {counted_order_sql('mobile_orders', 'o')})
+            GROUP BY customer_id
+        ) o ON o.customer_id = c.id
+        LEFT JOIN (
+            SELECT customer_id, MAX(CASE WHEN status = 'completed' THEN visit_ts END) AS last_ts,
+                   SUM({open_follow_up_sql('customer_visits', 'v')}) AS open
+            FROM customer_visits v GROUP BY customer_id
+        ) v ON v.customer_id = c.id
+        LEFT JOIN (
+            SELECT customer_id, SUM({open_follow_up_sql('sales_activities', 'a')}) AS open
+            FROM sales_activities a GROUP BY customer_id
+        ) a ON a.customer_id = c.id
+    ''')
+    create_customer_summary_triggers(cursor)
+
+def _add_payments(cursor):
+    """Paid amount per order and the open-invoice index. Orders already completed count as settled before
+    the payments ledger; the summary triggers are recreated to carry paid amounts into the outstanding
+    balance"""
+    if 'paid_amount' not in _columns(cursor, 'sales_orders'):
+        cursor.execute("ALTER TABLE sales_orders ADD COLUMN paid_amount INTEGER DEFAULT 0")
+    cursor.execute("UPDATE sales_orders SET paid_amount = COALESCE(total_amount, 0) WHERE status = 'completed'")
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_sales_orders_open ON sales_orders (customer_id, order_ts, total_amount, paid_amount)
+        WHERE status != 'cancelled' AND paid_amount < total_amount
+    ''')
+    for table in ('sales_orders', 'mobile_orders'):
+        for event in ('insert', 'update'):
+            cursor.execute(f"DROP TRIGGER IF EXISTS trg_{table}_{event}_summary")
+    create_customer_summary_triggers(cursor)
+    cursor.execute(f'''
+        UPDATE customer_summary SET outstanding_amount = COALESCE((
+            SELECT SUM(COALESCE(o.total_amount, 0) - o.paid_amount) FROM sales_orders o
+            WHERE o.customer_id = customer_summary.customer_id AND {counted_order_sql('sales_orders', 'o')}), 0)
+    ''')
+
+def _add_credit_limits(cursor):
+    """Customer credit limits and the credit-term mobile orders counted in the summary; the mobile order
+    summary triggers are recreated to maintain it"""
+    if 'credit_limit' not in _columns(cursor, 'customers'):
+        cursor.execute("ALTER TABLE customers ADD COLUMN credit_limit INTEGER")
+    if 'credit_order_amount' not in _columns(cursor, 'customer_summary'):
+        cursor.execute("ALTER TABLE customer_summary ADD COLUMN credit_order_amount INTEGER NOT NULL DEFAULT 0")
+    for event in ('insert', 'update'):
+        cursor.execute(f"DROP TRIGGER IF EXISTS trg_mobile_orders_{event}_summary")
+    create_customer_summary_triggers(cursor)
+    cursor.execute(f'''
+        UPDATE customer_summary SET credit_order_amount = COALESCE((
+            SELECT SUM(COALESCE(o.total_amount, 0)) FROM mobile_orders o
+            WHERE o.customer_id = customer_summary.customer_id AND {credit_order_sql('o')}), 0)
+    ''')
+
+def _add_mobile_order_review(cursor):
+    """Review and conversion columns of mobile orders; the mobile order summary triggers are recreated so
+    converted orders count through their sales order"""
+    columns = _columns(cursor, 'mobile_orders')
+    for column, kind in (('sales_order_id', 'INTEGER'), ('reviewed_by', 'TEXT'), ('reviewed_ts', 'INTEGER'),
+                         ('review_notes', 'TEXT')):
+        if column not in columns:
+            cursor.execute(f"ALTER TABLE mobile_orders ADD COLUMN {column} {kind}")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_mobile_orders_sales_order ON mobile_orders (sales_order_id)")
+    # Approval queue of field orders waiting for a manager (see database/approvals.py)
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_mobile_orders_queue ON mobile_orders (order_ts)
+        WHERE status IN ('submitted', 'approved')
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_mobile_order_items_order ON mobile_order_items (mobile_order_id)")
+    for event in ('insert', 'update'):
+        cursor.execute(f"DROP TRIGGER IF EXISTS trg_mobile_orders_{event}_summary")
+    create_customer_summary_triggers(cursor)
+
+def _add_customer_archive_totals(cursor):
+    """Per-customer totals of the orders already archived, read back from the archive files; customer
+    totals are rebuilt to include them (the summary missed orders archived before it existed) and the
+    customers are queued for segmentation"""
+    cursor.execute("SELECT DISTINCT archive_year FROM archived_records WHERE table_name = 'sales_orders'")
+    archived = read_archived('sales_orders', [row[0] for row in cursor.fetchall()])
+    if not archived.empty:
+        archived = archived[archived['customer_id'].notna() & (archived['status'] != 'cancelled')]
+        # Orders archived before the epoch columns existed only carry their WIB order date
+        order_ts = archived['order_ts'] if 'order_ts' in archived else pd.Series(float('nan'), index=archived.index)
+        dates = pd.to_datetime(archived['order_date'], errors='coerce')
+        order_ts = order_ts.fillna((dates - pd.Timestamp(0)) // pd.Timedelta(seconds=1) - WIB_OFFSET_SECONDS)
+        totals = archived.assign(order_ts=order_ts, total_amount=archived['total_amount'].fillna(0).round()).groupby(
+            'customer_id').agg(orders=('id', 'count'), value=('total_amount', 'sum'),
+                               first_ts=('order_ts', 'min'), last_ts=('order_ts', 'max'))
+        cursor.executemany('''
+            INSERT OR REPLACE INTO customer_archive_totals (customer_id, order_count, order_value, first_order_ts,
+                                                            last_order_ts)
+            VALUES (?, ?, ?, ?, ?)
+        ''', [(int(customer_id), int(row.orders), int(row.value),
+               None if pd.isna(row.first_ts) else int(row.first_ts), None if pd.isna(row.last_ts) else int(row.last_ts))
+              for customer_id, row in totals.iterrows()])
+
+    cursor.execute("DROP TABLE IF EXISTS temp.order_totals")
+    cursor.execute(f'''
+        CREATE TEMP TABLE order_totals AS
+        SELECT customer_id, SUM(orders) AS orders, SUM(value) AS value, MAX(last_ts) AS last_ts
+        FROM (SELECT customer_id, 1 AS orders, COALESCE(total_amount, 0) AS value, order_ts AS last_ts
+              FROM sales_orders o WHERE {counted_order_sql('sales_orders', 'o')}
+              UNION ALL
+              SELECT customer_id, 1, COALESCE(total_amount, 0), order_ts FROM mobile_orders o
+              WHERE {counted_order_sql('mobile_orders', 'o')}
+              UNION ALL
+              SELECT customer_id, order_count, order_value, last_order_ts FROM customer_archive_totals)
+        WHERE customer_id IS NOT NULL
+        GROUP BY customer_id
+    ''')
+    cursor.execute("CREATE UNIQUE INDEX temp.idx_order_totals_customer ON order_totals (customer_id)")
+    cursor.execute("INSERT OR IGNORE INTO customer_summary (customer_id) SELECT customer_id FROM order_totals")
+    cursor.execute('''
+        UPDATE customer_summary SET
+            order_count = COALESCE((SELECT orders FROM order_totals t WHERE t.customer_id = customer_summary.customer_id), 0),
+            lifetime_value = COALESCE((SELECT value FROM order_totals t WHERE t.customer_id = customer_summary.customer_id), 0),
+            last_order_ts = (SELECT last_ts FROM order_totals t WHERE t.customer_id = customer_summary.customer_id)
+    ''')
+    cursor.execute("DROP TABLE temp.order_totals")
+    cursor.execute("INSERT OR IGNORE INTO customer_segment_queue (customer_id) SELECT customer_id FROM customer_archive_totals")
+
+def _reset_analytics_exports(cursor):
+    """GPS days were dated by their UTC day; the watermarks are cleared so the next export rewrites
+    every month of every fact"""
+    cursor.execute("DELETE FROM analytics_exports")
+
+def _add_visit_date_index(cursor):
+    """Index on the visit date key alone, for date-range reports across all salesmen"""
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_customer_visits_local_date ON customer_visits (visit_local_date)")
+
+MIGRATIONS = [
+    (1, _migrate_money_and_time),
+    (2, _add_customer_group),
+    (3, _add_stock_ledger),
+    (4, _add_reserved_quantity),
+    (5, _add_locations),
+    (6, _add_inventory_alerts),
+    (7, _add_costing),
+    (8, _add_customer_summary),
+    (9, _add_payments),
+    (10, _add_credit_limits),
+    (11, _add_mobile_order_review),
+    (12, _add_customer_archive_totals),
+    (13, _reset_analytics_exports),
+    (14, _add_visit_date_index),
+]
+
+def run_migrations():
+    """Apply pending migrations, each in its own transaction; returns the schema version"""
+    conn = get_connection()
+    conn.isolation_level = None
+    try:
+        cursor = conn.cursor()
+        cursor.execute("PRAGMA user_version")
+        version = cursor.fetchone()[0]
+        # Table rebuilds must not rewrite references in other tables while the old table is gone
+        cursor.execute("PRAGMA legacy_alter_table = ON")
+        for target, migrate in MIGRATIONS:
+            if target <= version:
+                continue
+            cursor.execute("BEGIN IMMEDIATE")
+            try:
+                migrate(cursor)
+                cursor.execute(f"PRAGMA user_version = {target}")
+                cursor.execute("COMMIT")
+            except Exception:
+                cursor.execute("ROLLBACK")
+                raise
+            version = target
+        return version
+    finally:
+        conn.close()
+
+def get_schema_version():
+    """Schema version recorded in PRAGMA user_version"""
+    conn = get_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("PRAGMA user_version")
+        return cursor.fetchone()[0]
+    finally:
+        conn.close()
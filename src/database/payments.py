@@ -0,0 +1,158 @@
+"""
+Payments and receivables
+Sales orders are the invoices. A receipt is applied to one order, or to a
+customer's open orders oldest first, and stored as one payments row per
+order under a shared payment number. A trigger adds each row to the order's
+paid_amount and the customer summary triggers carry that into the
+customer's outstanding amount, so balances are never summed on read.
+Open invoices (not cancelled, not fully paid) have their own partial index,
+so aging reads only those however much paid history the table holds.
+"""
+import time
+
+import pandas as pd
+
+from database.credit import invalidate_credit
+from database.init_db import get_connection
+from database.repository import timestamp_columns, to_rupiah
+from database.sequence import next_number
+
+DAY = 86400
+AGING_BUCKETS = {'current': 'Current (0-30)', 'days_31_60': '31-60 Days', 'days_61_90': '61-90 Days',
+                 'over_90': '90+ Days'}
+
+# Must match the predicate of idx_sales_orders_open (which covers the aging columns) for the planner to use it
+OPEN_INVOICE_SQL = "so.status != 'cancelled' AND so.paid_amount < so.total_amount"
+
+def payment_status_sql(row):
+    """'paid', 'partial' or 'unpaid' for a sales_orders row or alias"""
+    return f"""CASE WHEN {row}.paid_amount >= {row}.total_amount THEN 'paid'
+                WHEN {row}.paid_amount > 0 THEN 'partial' ELSE 'unpaid' END"""
+
+_AGING_SQL = f'''
+    WITH open_invoices AS (
+        SELECT so.customer_id, so.total_amount - so.paid_amount AS outstanding,
+               (:as_of - COALESCE(so.order_ts, :as_of)) / {DAY} AS age_days
+        FROM sales_orders so WHERE {OPEN_INVOICE_SQL}
+    ), aging AS (
+        SELECT customer_id, COUNT(*) AS invoices,
+               SUM(CASE WHEN age_days <= 30 THEN outstanding ELSE 0 END) AS current,
+               SUM(CASE WHEN age_days BETWEEN 31 AND 60 THEN outstanding ELSE 0 END) AS days_31_60,
+               SUM(CASE WHEN age_days BETWEEN 61 AND 90 THEN outstanding ELSE 0 END) AS days_61_90,
+               SUM(CASE WHEN age_days > 90 THEN outstanding ELSE 0 END) AS over_90,
+               SUM(outstanding) AS outstanding, MAX(age_days) AS oldest_days,
+               RANK() OVER (ORDER BY SUM(outstanding) DESC) AS rank,
+               ROUND(100.0 * SUM(outstanding) / SUM(SUM(outstanding)) OVER (), 1) AS share_pct
+        FROM open_invoices GROUP BY customer_id
+    )
+    SELECT a.rank, a.customer_id, COALESCE(c.name, '-') AS customer, a.invoices, a.current, a.days_31_60,
+           a.days_61_90, a.over_90, a.outstanding, a.share_pct, a.oldest_days
+    FROM aging a LEFT JOIN customers c ON c.id = a.customer_id
+    ORDER BY a.rank
+'''
+
+# Running balance per customer, oldest invoice first
+_OPEN_INVOICES_SQL = f'''
+    SELECT so.id, so.order_number, so.customer_id, COALESCE(c.name, '-') AS customer, so.sales_rep, so.order_ts,
+           so.total_amount, so.paid_amount, so.total_amount - so.paid_amount AS outstanding,
+           {payment_status_sql('so')} AS payment_status,
+           (:as_of - COALESCE(so.order_ts, :as_of)) / {DAY} AS age_days,
+           SUM(so.total_amount - so.paid_amount) OVER (
+               PARTITION BY so.customer_id ORDER BY so.order_ts, so.id) AS customer_balance
+    FROM sales_orders so LEFT JOIN customers c ON c.id = so.customer_id
+    WHERE {OPEN_INVOICE_SQL} {{customer}}
+    ORDER BY so.order_ts, so.id
+    LIMIT :limit
+'''
+
+def get_aging_report(as_of_ts=None):
+    """Open invoice amounts per customer in current/31-60/61-90/90+ day buckets, largest balance first"""
+    conn = get_connection()
+    try:
+        return pd.read_sql_query(_AGING_SQL, conn, params={'as_of': as_of_ts or int(time.time())})
+    finally:
+        conn.close()
+
+def get_open_invoices(customer_id=None, limit=500, as_of_ts=None):
+    """Unpaid and part-paid orders, oldest first, with each customer's running balance"""
+    params = {'as_of': as_of_ts or int(time.time()), 'limit': limit, 'customer_id': customer_id}
+    conn = get_connection()
+    try:
+        return pd.read_sql_query(_OPEN_INVOICES_SQL.format(
+            customer='AND so.customer_id = :customer_id' if customer_id else ''), conn, params=params)
+    finally:
+        conn.close()
+
+def get_payments(customer_id=None, limit=500):
+    """Recorded payment rows with their order, newest first"""
+    conn = get_connection()
+    try:
+        return pd.read_sql_query(f'''
+            SELECT p.payment_number, p.payment_date, COALESCE(c.name, '-') AS customer,
+                   COALESCE(so.order_number, '#' || p.sales_order_id) AS order_number, p.amount,
+                   p.payment_method, p.reference, p.notes, p.created_by
+            FROM payments p
+            -- Paid-off orders may have moved to the archive
+            LEFT JOIN sales_orders so ON so.id = p.sales_order_id
+            LEFT JOIN customers c ON c.id = p.customer_id
+            {'WHERE p.customer_id = :customer_id' if customer_id else ''}
+            ORDER BY p.payment_ts DESC, p.id DESC
+            LIMIT :limit
+        ''', conn, params={'customer_id': customer_id, 'limit': limit})
+    finally:
+        conn.close()
+
+def insert_payments(cursor, payment_number, customer_id, allocations, payment_method=None, payment_date=None,
+                    reference=None, notes=None, created_by=None):
+    """Insert one payments row per (sales order id, amount) on the caller's cursor/transaction"""
+    stored_date, payment_ts, local_date = timestamp_columns(payment_date)
+    created_ts = int(time.time())
+    cursor.executemany('''
+        INSERT INTO payments (payment_number, sales_order_id, customer_id, amount, payment_method, reference, notes,
+                              payment_date, payment_ts, payment_local_date, created_by, created_ts)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', [(payment_number, order_id, customer_id, amount, payment_method, reference, notes, stored_date, payment_ts,
+           local_date, created_by, created_ts) for order_id, amount in allocations])
+
+def record_payment(customer_id, amount, payment_method=None, payment_date=None, reference=None, notes=None,
+                   created_by=None, sales_order_id=None):
+    """Apply a receipt to one order, or to the customer's open orders oldest first, in one transaction;
+    returns (payment number, [(sales order id, amount)]). Raises ValueError when the amount exceeds what
+    is outstanding."""
+    amount = to_rupiah(amount)
+    if not amount or amount <= 0:
+        raise ValueError("Payment amount must be positive")
+    payment_number = next_number('PAY')
+
+    conn = get_connection()
+    conn.isolation_level = None
+    try:
+        cursor = conn.cursor()
+        cursor.execute("BEGIN IMMEDIATE")
+        try:
+            cursor.execute(f'''
+                SELECT so.id, so.total_amount - so.paid_amount FROM sales_orders so
+                WHERE so.customer_id = ? AND {OPEN_INVOICE_SQL} {'AND so.id = ?' if sales_order_id else ''}
+                ORDER BY so.order_ts, so.id
+            ''', (customer_id, sales_order_id) if sales_order_id else (customer_id,))
+            open_invoices = cursor.fetchall()
+            outstanding = sum(balance for _, balance in open_invoices)
+            if amount > outstanding:
+                raise ValueError(f"Payment of {amount} exceeds the outstanding {outstanding}")
+            allocations, remaining = [], amount
+            for order_id, balance in open_invoices:
+                if remaining <= 0:
+                    break
+                applied = min(balance, remaining)
+                allocations.append((order_id, applied))
+                remaining -= applied
+            insert_payments(cursor, payment_number, customer_id, allocations, payment_method, payment_date,
+                            reference, notes, created_by)
+            cursor.execute("COMMIT")
+        except Exception:
+            cursor.execute("ROLLBACK")
+            raise
+    finally:
+        conn.close()
+    invalidate_credit(customer_id)
+    return payment_number, allocations
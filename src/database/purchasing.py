@@ -0,0 +1,204 @@
+"""
+Replenishment and purchase orders
+Reorder quantities for the whole catalog come from one query: each
+product's position (stock + inbound on open purchase orders - reserved) is
+compared with its reorder point, the higher of min_stock_level and the
+forecast demand over the supplier lead time, and topped up to the higher of
+max_stock_level and the forecast over lead time plus REORDER_COVER_DAYS.
+Lines are grouped by supplier into draft purchase orders with set-based
+INSERT ... SELECT statements in one transaction. Open drafts count as
+inbound, so running the pass again only orders what is still missing.
+Receiving a purchase order posts its outstanding quantities to the ledger.
+"""
+import time
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+from config import Config
+from database.init_db import get_connection
+from database.ledger import default_location_id, post_stock_movement
+from database.repository import INDONESIA_TZ, wib_date_key
+from database.sequence import next_number
+
+OPEN_STATUSES = ('draft', 'ordered')
+PO_STATUSES = ('draft', 'ordered', 'received', 'cancelled')
+
+# Forecasts are stored to 3 decimals, so adding 0.999 and truncating rounds them up
+_REORDER_SQL = '''
+    WITH inbound AS (
+        SELECT i.product_id, SUM(i.quantity - i.received_quantity) AS quantity
+        FROM purchase_order_items i JOIN purchase_orders po ON po.id = i.purchase_order_id
+        WHERE po.status IN ('draft', 'ordered')
+        GROUP BY i.product_id
+    ), demand AS (
+        SELECT product_id,
+               CAST(SUM(CASE WHEN forecast_date <= :lead_end THEN quantity ELSE 0 END) + 0.999 AS INTEGER) AS lead_time,
+               CAST(SUM(CASE WHEN forecast_date <= :cover_end THEN quantity ELSE 0 END) + 0.999 AS INTEGER) AS cover
+        FROM demand_forecasts
+        GROUP BY product_id
+    ), positions AS (
+        SELECT p.id AS product_id, p.sku, p.name, p.supplier, COALESCE(p.cost, 0) AS unit_cost,
+               p.stock_quantity, COALESCE(p.reserved_quantity, 0) AS reserved, COALESCE(ib.quantity, 0) AS inbound,
+               p.stock_quantity + COALESCE(ib.quantity, 0) - COALESCE(p.reserved_quantity, 0) AS position,
+               MAX(COALESCE(p.min_stock_level, 0), COALESCE(d.lead_time, 0)) AS reorder_point,
+               MAX(COALESCE(p.max_stock_level, 0), COALESCE(d.cover, 0)) AS target,
+               COALESCE(d.lead_time, 0) AS lead_time_demand
+        FROM products p
+        LEFT JOIN inbound ib ON ib.product_id = p.id
+        LEFT JOIN demand d ON d.product_id = p.id
+    )
+    SELECT product_id, sku, name, supplier, unit_cost, stock_quantity, reserved, inbound, position,
+           reorder_point, target, lead_time_demand, target - position AS quantity
+    FROM positions
+    WHERE position <= reorder_point AND target > position
+'''
+
+def _reorder_params():
+    today = datetime.now(INDONESIA_TZ).date()
+    return {
+        'lead_end': wib_date_key(today + timedelta(days=Config.REORDER_LEAD_TIME_DAYS)),
+        'cover_end': wib_date_key(today + timedelta(days=Config.REORDER_LEAD_TIME_DAYS + Config.REORDER_COVER_DAYS))
+    }
+
+def get_reorder_suggestions():
+    """Products at or below their reorder point with the quantity to order, by supplier"""
+    conn = get_connection()
+    try:
+        return pd.read_sql_query(f"{_REORDER_SQL} ORDER BY supplier, sku", conn, params=_reorder_params())
+    finally:
+        conn.close()
+
+def generate_purchase_orders(created_by=None, progress=None):
+    """Create one draft purchase order per supplier for everything below its reorder point;
+    returns a summary with the new PO numbers"""
+    started = time.perf_counter()
+    params = _reorder_params()
+    conn = get_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(f"SELECT DISTINCT supplier FROM ({_REORDER_SQL}) WHERE supplier IS NOT NULL", params)
+        suppliers = [row[0] for row in cursor.fetchall()]
+    finally:
+        conn.close()
+    if progress:
+        progress(0.3, f"{len(suppliers)} suppliers to order from")
+
+    # A supplier that only falls below its reorder point after the numbers are drawn is picked up by the next run
+    numbers = [(supplier, next_number('PO')) for supplier in suppliers]
+    now = int(time.time())
+    conn = get_connection()
+    conn.isolation_level = None
+    try:
+        cursor = conn.cursor()
+        cursor.execute("BEGIN IMMEDIATE")
+        try:
+            cursor.execute("CREATE TEMP TABLE reorder_lines AS " + _REORDER_SQL, params)
+            cursor.execute("CREATE TEMP TABLE reorder_numbers (supplier TEXT PRIMARY KEY, po_number TEXT)")
+            cursor.executemany("INSERT INTO reorder_numbers VALUES (?, ?)", numbers)
+            cursor.execute('''
+                INSERT INTO purchase_orders (po_number, supplier, status, location_id, total_amount, created_by,
+                                             created_ts, updated_ts)
+                SELECT n.po_number, n.supplier, 'draft', ?, SUM(r.quantity * r.unit_cost), ?, ?, ?
+                FROM reorder_numbers n JOIN reorder_lines r ON r.supplier = n.supplier
+                GROUP BY n.supplier
+            ''', (default_location_id(cursor), created_by, now, now))
+            cursor.execute('''
+                INSERT INTO purchase_order_items (purchase_order_id, product_id, quantity, unit_cost, line_total,
+                                                  reorder_point, stock_position)
+                SELECT po.id, r.product_id, r.quantity, r.unit_cost, r.quantity * r.unit_cost,
+                       r.reorder_point, r.position
+                FROM reorder_lines r
+                JOIN reorder_numbers n ON n.supplier = r.supplier
+                JOIN purchase_orders po ON po.po_number = n.po_number
+            ''')
+            lines = cursor.rowcount
+            cursor.execute("SELECT COUNT(*) FROM reorder_lines WHERE supplier IS NULL")
+            without_supplier = cursor.fetchone()[0]
+            cursor.execute('''
+                SELECT po.po_number FROM purchase_orders po JOIN reorder_numbers n ON n.po_number = po.po_number
+                ORDER BY po.po_number
+            ''')
+            created = [row[0] for row in cursor.fetchall()]
+            cursor.execute("DROP TABLE temp.reorder_lines")
+            cursor.execute("DROP TABLE temp.reorder_numbers")
+            cursor.execute("COMMIT")
+        except Exception:
+            cursor.execute("ROLLBACK")
+            raise
+    finally:
+        conn.close()
+    return {
+        'purchase_orders': created,
+        'lines': lines,
+        'without_supplier': without_supplier,
+        'seconds': round(time.perf_counter() - started, 2)
+    }
+
+def get_purchase_orders(status=None, limit=100):
+    """Purchase orders with their line counts, newest first"""
+    conn = get_connection()
+    try:
+        return pd.read_sql_query(f'''
+            SELECT po.id, po.po_number, po.supplier, po.status, l.code AS location,
+                   (SELECT COUNT(*) FROM purchase_order_items i WHERE i.purchase_order_id = po.id) AS items,
+                   (SELECT SUM(quantity) FROM purchase_order_items i WHERE i.purchase_order_id = po.id) AS units,
+                   po.total_amount, po.created_by, po.created_ts, po.updated_ts
+            FROM purchase_orders po
+            LEFT JOIN locations l ON l.id = po.location_id
+            {'WHERE po.status = :status' if status else ''}
+            ORDER BY po.id DESC LIMIT :limit
+        ''', conn, params={'status': status, 'limit': limit})
+    finally:
+        conn.close()
+
+def get_purchase_order_items(purchase_order_id):
+    """Lines of one purchase order"""
+    conn = get_connection()
+    try:
+        return pd.read_sql_query('''
+            SELECT i.id, p.sku, p.name AS product, i.quantity, i.received_quantity, i.unit_cost, i.line_total,
+                   i.reorder_point, i.stock_position, i.product_id
+            FROM purchase_order_items i JOIN products p ON p.id = i.product_id
+            WHERE i.purchase_order_id = ? ORDER BY p.sku
+        ''', conn, params=(purchase_order_id,))
+    finally:
+        conn.close()
+
+def update_purchase_order_status(purchase_order_id, status, username=None):
+    """Move a purchase order to another status; receiving posts its outstanding quantities to the
+    ledger at its location, valued at the line costs, in the same transaction"""
+    if status not in PO_STATUSES:
+        raise ValueError(f"Unknown purchase order status: {status}")
+    conn = get_connection()
+    conn.isolation_level = None
+    try:
+        cursor = conn.cursor()
+        cursor.execute("BEGIN IMMEDIATE")
+        try:
+            cursor.execute("SELECT status, location_id FROM purchase_orders WHERE id = ?", (purchase_order_id,))
+            row = cursor.fetchone()
+            if row is None:
+                raise ValueError(f"Unknown purchase order: {purchase_order_id}")
+            if row[0] not in OPEN_STATUSES:
+                raise ValueError(f"Purchase order is already {row[0]}")
+            if status == 'received':
+                cursor.execute('''
+                    SELECT product_id, quantity - received_quantity, unit_cost FROM purchase_order_items
+                    WHERE purchase_order_id = ? AND quantity > received_quantity
+                ''', (purchase_order_id,))
+                for product_id, quantity, unit_cost in cursor.fetchall():
+                    post_stock_movement(cursor, product_id, quantity, 'in', 'purchase_order', purchase_order_id,
+                                        None, username, row[1], unit_cost=unit_cost)
+                cursor.execute('''
+                    UPDATE purchase_order_items SET received_quantity = quantity WHERE purchase_order_id = ?
+                ''', (purchase_order_id,))
+            cursor.execute('''
+                UPDATE purchase_orders SET status = ?, updated_ts = ? WHERE id = ?
+            ''', (status, int(time.time()), purchase_order_id))
+            cursor.execute("COMMIT")
+        except Exception:
+            cursor.execute("ROLLBACK")
+            raise
+    finally:
+        conn.close()
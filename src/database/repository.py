@@ -0,0 +1,360 @@
+"""
+Repository layer between pages and storage
+Money is stored as whole rupiah (INTEGER) and timestamps additionally as
+epoch seconds plus a WIB YYYYMMDD date key; values are converted here so
+pages keep working with dates and amounts. History queries span the hot
+database and the cold archive, which is only read when the
+archived_records index says the request reaches into it.
+"""
+from datetime import date, datetime
+from decimal import ROUND_HALF_UP, Decimal
+
+import pandas as pd
+import pytz
+
+from database.archive import archived_years, read_archived
+from database.credit import check_credit, invalidate_credit, is_credit_terms
+from database.init_db import get_connection
+from database.sequence import next_number
+
+INDONESIA_TZ = pytz.timezone('Asia/Jakarta')
+
+ORDER_COLUMNS = ['id', 'order_number', 'order_date', 'customer_id', 'customer', 'sales_rep', 'status',
+                 'payment_method', 'total_amount', 'items', 'source']
+
+def to_rupiah(amount):
+    """Whole rupiah as int (half-up), None stays None"""
+    if amount is None:
+        return None
+    return int(Decimal(str(amount)).quantize(Decimal('1'), rounding=ROUND_HALF_UP))
+
+def _to_wib_datetime(value):
+    if isinstance(value, (int, float)):
+        return datetime.fromtimestamp(value, INDONESIA_TZ)
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    elif not isinstance(value, datetime):
+        value = datetime(value.year, value.month, value.day)
+    # Naive values are WIB wall-clock time, as stored throughout the app
+    return INDONESIA_TZ.localize(value) if value.tzinfo is None else value.astimezone(INDONESIA_TZ)
+
+def to_epoch(value):
+    """Epoch seconds for a date, datetime, ISO string or epoch (naive values are WIB)"""
+    if value is None:
+        return None
+    return int(_to_wib_datetime(value).timestamp())
+
+def wib_date_key(value):
+    """WIB calendar date as an int YYYYMMDD, used for indexed range filters"""
+    if value is None:
+        return None
+    if isinstance(value, date) and not isinstance(value, datetime):
+        day = value
+    else:
+        day = _to_wib_datetime(value).date()
+    return day.year * 10000 + day.month * 100 + day.day
+
+def from_date_key(key):
+    """date for a YYYYMMDD key"""
+    return date(key // 10000, key // 100 % 100, key % 100)
+
+def _filters(column_map, **values):
+    conditions, params = [], []
+    for key, value in values.items():
+        if value is None:
+            continue
+        column, operator = column_map[key]
+        conditions.append(f"{column} {operator} ?")
+        params.append(value)
+    return conditions, params
+
+def _in_date_range(df, column, start_date, end_date):
+    """Rows whose date (first 10 characters of the stored value) lies in the range"""
+    dates = df[column].astype(str).str[:10]
+    mask = pd.Series(True, index=df.index)
+    if start_date:
+        mask &= dates >= str(start_date)
+    if end_date:
+        mask &= dates <= str(end_date)
+    return df[mask]
+
+def get_order_history(start_date=None, end_date=None, customer_id=None, sales_rep=None, status=None):
+    """Sales orders with customer name and item count, newest first, including archived orders"""
+    conditions, params = _filters({
+        'start_date': ('so.order_local_date', '>='),
+        'end_date': ('so.order_local_date', '<='),
+        'customer_id': ('so.customer_id', '='),
+        'sales_rep': ('so.sales_rep', '='),
+        'status': ('so.status', '=')
+    }, start_date=wib_date_key(start_date), end_date=wib_date_key(end_date), customer_id=customer_id,
+        sales_rep=sales_rep, status=status)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+
+    conn = get_connection()
+    try:
+        hot = pd.read_sql_query(f'''
+            SELECT so.id, so.order_number, so.order_date, so.customer_id, c.name AS customer,
+                   so.sales_rep, so.status, so.payment_method, so.total_amount,
+                   (SELECT COUNT(*) FROM order_items oi WHERE oi.order_id = so.id) AS items,
+                   'live' AS source
+            FROM sales_orders so
+            LEFT JOIN customers c ON c.id = so.customer_id
+            {where}
+        ''', conn, params=params)
+
+        years = archived_years(conn, 'sales_orders', start_date, end_date, customer_id)
+        if not years:
+            return hot.sort_values(['order_date', 'id'], ascending=False, ignore_index=True)
+        customers = dict(conn.execute("SELECT id, name FROM customers").fetchall())
+    finally:
+        conn.close()
+
+    cold = read_archived('sales_orders', years, customer_id=customer_id, sales_rep=sales_rep, status=status)
+    if not cold.empty:
+        cold = _in_date_range(cold, 'order_date', start_date, end_date)
+        items = read_archived('order_items', years, order_id=cold['id'].tolist())
+        counts = items.groupby('order_id').size() if not items.empty else pd.Series(dtype=int)
+        cold = cold.assign(
+            customer=cold['customer_id'].map(customers),
+            items=cold['id'].map(counts).fillna(0).astype(int),
+            source='archive'
+        )
+
+    history = pd.concat([hot, cold.reindex(columns=ORDER_COLUMNS)], ignore_index=True)
+    # A record can briefly exist in both places if archiving was interrupted; the live row wins
+    history = history.drop_duplicates('id', keep='first')
+    return history.sort_values(['order_date', 'id'], ascending=False, ignore_index=True)
+
+def get_customer_orders(customer_id, start_date=None, end_date=None):
+    """Order history of one customer, including archived orders"""
+    return get_order_history(start_date, end_date, customer_id=customer_id)
+
+def get_customer_activities(customer_id, start_date=None, end_date=None):
+    """Visits and sales activities for one customer, newest first, including archived ones"""
+    sources = (
+        ('customer_visits', 'visit_date', 'visit_type', 'purpose', 'Visit', 'visit_local_date'),
+        ('sales_activities', 'activity_date', 'activity_type', 'subject', 'Activity', None)
+    )
+    frames = []
+    conn = get_connection()
+    try:
+        for table, date_column, type_column, subject_column, kind, key_column in sources:
+            if key_column:
+                range_column, start_value, end_value = key_column, wib_date_key(start_date), wib_date_key(end_date)
+            else:
+                range_column = f'date({date_column})'
+                start_value = str(start_date) if start_date else None
+                end_value = str(end_date) if end_date else None
+            conditions, params = _filters({
+                'customer_id': ('customer_id', '='),
+                'start_date': (range_column, '>='),
+                'end_date': (range_column, '<=')
+            }, customer_id=customer_id, start_date=start_value, end_date=end_value)
+            frames.append(pd.read_sql_query(f'''
+                SELECT id, {date_column} AS date, '{kind}' AS kind, {type_column} AS type,
+                       {subject_column} AS subject, status, 'live' AS source
+                FROM {table}
+                WHERE {' AND '.join(conditions)}
+            ''', conn, params=params))
+
+            years = archived_years(conn, table, start_date, end_date, customer_id)
+            cold = read_archived(table, years, customer_id=customer_id)
+            if not cold.empty:
+                cold = _in_date_range(cold, date_column, start_date, end_date)
+                frames.append(pd.DataFrame({
+                    'id': cold['id'], 'date': cold[date_column], 'kind': kind, 'type': cold[type_column],
+                    'subject': cold[subject_column], 'status': cold['status'], 'source': 'archive'
+                }))
+    finally:
+        conn.close()
+
+    activities = pd.concat(frames, ignore_index=True)
+    activities = activities.drop_duplicates(['kind', 'id'], keep='first')
+    return activities.sort_values('date', ascending=False, ignore_index=True)
+
+def get_customer(customer_id):
+    """Customer profile row as a dict, or None"""
+    conn = get_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT id, name, email, phone, company, address, created_at FROM customers WHERE id = ?
+        ''', (customer_id,))
+        row = cursor.fetchone()
+    finally:
+        conn.close()
+    if row is None:
+        return None
+    return dict(zip(('id', 'name', 'email', 'phone', 'company', 'address', 'created_at'), row))
+
+CUSTOMER_DETAIL_COLUMNS = ('id', 'name', 'email', 'phone', 'company', 'address', 'created_at', 'order_count',
+                           'lifetime_value', 'last_order_ts', 'last_visit_ts', 'open_follow_ups',
+                           'outstanding_amount', 'credit_limit', 'credit_order_amount', 'segment')
+
+def get_customer_details(customer_id):
+    """Profile, trigger-maintained totals and RFM segment of one customer in one lookup, as a dict or None"""
+    conn = get_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT c.id, c.name, c.email, c.phone, c.company, c.address, c.created_at,
+                   COALESCE(s.order_count, 0), COALESCE(s.lifetime_value, 0), s.last_order_ts, s.last_visit_ts,
+                   COALESCE(s.open_follow_ups, 0), COALESCE(s.outstanding_amount, 0), c.credit_limit,
+                   COALESCE(s.credit_order_amount, 0), g.segment
+            FROM customers c
+            LEFT JOIN customer_summary s ON s.customer_id = c.id
+            LEFT JOIN customer_segments g ON g.customer_id = c.id
+            WHERE c.id = ?
+        ''', (customer_id,))
+        row = cursor.fetchone()
+    finally:
+        conn.close()
+    if row is None:
+        return None
+    return dict(zip(CUSTOMER_DETAIL_COLUMNS, row))
+
+def get_products():
+    """Product catalog for order entry"""
+    conn = get_connection()
+    try:
+        return pd.read_sql_query('''
+            SELECT id, sku, name, category, price, stock_quantity, reserved_quantity,
+                   stock_quantity - COALESCE(reserved_quantity, 0) AS available_quantity,
+                   min_stock_level, max_stock_level
+            FROM products ORDER BY name
+        ''', conn)
+    finally:
+        conn.close()
+
+def get_catalog_values():
+    """Distinct categories and suppliers in the catalog, for rule pickers"""
+    conn = get_connection()
+    try:
+        cursor = conn.cursor()
+        values = {}
+        for field in ('category', 'supplier'):
+            cursor.execute(f"SELECT DISTINCT {field} FROM products WHERE {field} IS NOT NULL ORDER BY 1")
+            values[field] = [row[0] for row in cursor.fetchall()]
+        return values
+    finally:
+        conn.close()
+
+def timestamp_columns(value=None):
+    """Stored WIB wall-clock value, epoch seconds and date key for a timestamp (now when None)"""
+    if value is None:
+        value = datetime.now(INDONESIA_TZ).replace(tzinfo=None, microsecond=0)
+    elif isinstance(value, str):
+        value = date.fromisoformat(value) if len(value) == 10 else datetime.fromisoformat(value)
+    if isinstance(value, datetime) and value.tzinfo is not None:
+        value = value.astimezone(INDONESIA_TZ).replace(tzinfo=None)
+    return str(value), to_epoch(value), wib_date_key(value)
+
+def create_sales_order(customer_id, items, sales_rep=None, payment_method=None, status='pending',
+                       order_date=None, total_amount=None, notes=None, paid_amount=0):
+    """Insert an order and its items, reserve their stock and record any amount paid up front in one
+    transaction; the number is assigned here, at save time. Items are dicts with product_id, quantity and
+    unit_price. Returns (order id, order number); raises InsufficientStockError when a product is short and
+    CreditLimitError when the unpaid part takes the customer over their credit limit."""
+    # Imported here to avoid a circular import (the ledger uses this module's time helpers)
+    from database.payments import insert_payments
+    from database.reservations import reserve_items
+    order_number = next_number('ORD')
+    paid_amount = to_rupiah(paid_amount) or 0
+    payment_number = next_number('PAY') if paid_amount > 0 else None
+    stored_date, order_ts, local_date = timestamp_columns(order_date)
+    lines = [(item.get('product_id'), int(item['quantity']), to_rupiah(item['unit_price']),
+              to_rupiah(item['unit_price'] * item['quantity'])) for item in items]
+    if total_amount is None:
+        total_amount = sum(line[3] for line in lines)
+
+    conn = get_connection()
+    conn.isolation_level = None
+    try:
+        cursor = conn.cursor()
+        cursor.execute("BEGIN IMMEDIATE")
+        try:
+            if status != 'cancelled':
+                check_credit(cursor, customer_id, to_rupiah(total_amount) - paid_amount)
+            cursor.execute('''
+                INSERT INTO sales_orders (order_number, customer_id, order_date, total_amount, status,
+                                          payment_method, sales_rep, notes, order_ts, order_local_date)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (order_number, customer_id, stored_date, to_rupiah(total_amount), status, payment_method,
+                  sales_rep, notes, order_ts, local_date))
+            order_id = cursor.lastrowid
+            cursor.executemany('''
+                INSERT INTO order_items (order_id, product_id, quantity, unit_price, total_price)
+                VALUES (?, ?, ?, ?, ?)
+            ''', [(order_id,) + line for line in lines])
+            reserve_items(cursor, 'sales_order', order_id, items, created_by=sales_rep)
+            if payment_number:
+                insert_payments(cursor, payment_number, customer_id, [(order_id, paid_amount)], payment_method,
+                                order_date, created_by=sales_rep)
+            cursor.execute("COMMIT")
+        except Exception:
+            cursor.execute("ROLLBACK")
+            invalidate_credit(customer_id)
+            raise
+    finally:
+        conn.close()
+    return order_id, order_number
+
+def insert_mobile_order(cursor, order_number, user_id, customer_id, items, status='submitted', order_date=None,
+                        total_amount=None, payment_terms=None, special_instructions=None, discount_percentage=0,
+                        tax_percentage=11, visit_id=None, delivery_date=None, location_id=None):
+    """Insert a field-sales order and its items and reserve their stock on the caller's cursor/transaction;
+    returns the order id. Items are dicts with product_id, quantity, unit_price and optional discount
+    (percent). Without a location the nearest depot that can supply every line is used. Drafts hold their
+    stock for Config.RESERVATION_DRAFT_HOURS. Submitted orders on credit terms are checked against the
+    customer's credit limit (CreditLimitError); callers invalidate the customer's credit if they roll back."""
+    # Imported here to avoid a circular import, as in create_sales_order
+    from database.locations import pick_location
+    from database.reservations import draft_expiry_ts, reserve_items
+    stored_date, order_ts, local_date = timestamp_columns(order_date)
+    lines = [(item.get('product_id'), int(item['quantity']), to_rupiah(item['unit_price']),
+              item.get('discount', 0),
+              to_rupiah(item['unit_price'] * item['quantity'] * (1 - item.get('discount', 0) / 100)))
+             for item in items]
+    if total_amount is None:
+        total_amount = sum(line[4] for line in lines)
+    if status == 'submitted' and is_credit_terms(payment_terms):
+        check_credit(cursor, customer_id, to_rupiah(total_amount))
+    if location_id is None:
+        location_id = pick_location(cursor, items, customer_id)
+
+    cursor.execute('''
+        INSERT INTO mobile_orders (user_id, customer_id, visit_id, order_number, order_date, total_amount, status,
+                                   payment_terms, delivery_date, special_instructions, discount_percentage,
+                                   tax_percentage, order_ts, order_local_date, location_id)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', (user_id, customer_id, visit_id, order_number, stored_date, to_rupiah(total_amount), status,
+          payment_terms, delivery_date, special_instructions, discount_percentage, tax_percentage,
+          order_ts, local_date, location_id))
+    order_id = cursor.lastrowid
+    cursor.executemany('''
+        INSERT INTO mobile_order_items (mobile_order_id, product_id, quantity, unit_price, discount_percentage,
+                                        total_price)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', [(order_id,) + line for line in lines])
+    reserve_items(cursor, 'mobile_order', order_id, items, draft_expiry_ts() if status == 'draft' else None,
+                  location_id=location_id)
+    return order_id
+
+def create_mobile_order(user_id, customer_id, items, **fields):
+    """Insert a field-sales order in its own transaction; returns (order id, order number)"""
+    order_number = next_number('MO')
+    conn = get_connection()
+    conn.isolation_level = None
+    try:
+        cursor = conn.cursor()
+        cursor.execute("BEGIN IMMEDIATE")
+        try:
+            order_id = insert_mobile_order(cursor, order_number, user_id, customer_id, items, **fields)
+            cursor.execute("COMMIT")
+        except Exception:
+            cursor.execute("ROLLBACK")
+            invalidate_credit(customer_id)
+            raise
+    finally:
+        conn.close()
+    return order_id, order_number
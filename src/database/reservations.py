@@ -0,0 +1,240 @@
+"""
+Stock reservations
+Submitting an order reserves its quantities against products.stock_quantity
+with one conditional UPDATE per product (`... WHERE stock_quantity -
+reserved_quantity >= ?`) inside the order's write transaction, so two
+salesmen racing for the last units cannot both succeed: the loser's UPDATE
+matches no row and the whole order rolls back. Shipping an order turns its
+reservations into ledger movements; cancelling releases them, and drafts
+that are never submitted release theirs when they expire.
+"""
+import time
+
+import pandas as pd
+
+from config import Config
+from database.credit import check_credit, invalidate_credit, is_credit_terms
+from database.init_db import get_connection
+from database.ledger import InsufficientStockError, post_stock_movement
+from utils.metrics import counter
+
+RESERVATION_RESULTS = counter(
+    'penzflow_stock_reservations_total', 'Order reservation attempts by result', ['result'])
+
+ORDER_TABLES = {'sales_order': 'sales_orders', 'mobile_order': 'mobile_orders'}
+FULFIL_STATUSES = ('shipped', 'delivered', 'completed')
+RELEASE_STATUSES = ('cancelled', 'rejected', 'expired')
+
+def _quantities(items):
+    """Total quantity per product of order lines"""
+    totals = {}
+    for item in items:
+        if item.get('product_id') is not None:
+            totals[item['product_id']] = totals.get(item['product_id'], 0) + int(item['quantity'])
+    return totals
+
+def reserve_items(cursor, order_type, order_id, items, expires_ts=None, created_by=None, location_id=None):
+    """Reserve the order's quantities on the caller's write transaction, at one location when given;
+    raises InsufficientStockError (and the caller rolls back) when any product is short"""
+    shortages = []
+    now = int(time.time())
+    for product_id, quantity in sorted(_quantities(items).items()):
+        if location_id is not None:
+            cursor.execute('''
+                UPDATE location_stock SET reserved_quantity = reserved_quantity + ?
+                WHERE location_id = ? AND product_id = ? AND quantity - reserved_quantity >= ?
+            ''', (quantity, location_id, product_id, quantity))
+            if cursor.rowcount == 0:
+                cursor.execute('''
+                    SELECT quantity - reserved_quantity FROM location_stock WHERE location_id = ? AND product_id = ?
+                ''', (location_id, product_id))
+                row = cursor.fetchone()
+                shortages.append((product_id, quantity, row[0] if row else 0))
+                continue
+        cursor.execute('''
+            UPDATE products SET reserved_quantity = COALESCE(reserved_quantity, 0) + ?
+            WHERE id = ? AND COALESCE(stock_quantity, 0) - COALESCE(reserved_quantity, 0) >= ?
+        ''', (quantity, product_id, quantity))
+        if cursor.rowcount == 0:
+            cursor.execute('''
+                SELECT COALESCE(stock_quantity, 0) - COALESCE(reserved_quantity, 0) FROM products WHERE id = ?
+            ''', (product_id,))
+            row = cursor.fetchone()
+            shortages.append((product_id, quantity, row[0] if row else 0))
+            continue
+        cursor.execute('''
+            INSERT INTO stock_reservations (order_type, order_id, product_id, quantity, status, created_ts,
+                                            expires_ts, created_by, location_id)
+            VALUES (?, ?, ?, ?, 'active', ?, ?, ?, ?)
+        ''', (order_type, order_id, product_id, quantity, now, expires_ts, created_by, location_id))
+    if shortages:
+        RESERVATION_RESULTS.inc(1, 'insufficient')
+        raise InsufficientStockError(shortages)
+    RESERVATION_RESULTS.inc(1, 'reserved')
+
+def release_reservations(cursor, order_type, order_id, status='released'):
+    """Give an order's active reservations back to available stock; returns the number released"""
+    cursor.execute('''
+        UPDATE products
+        SET reserved_quantity = MAX(0, reserved_quantity - r.quantity)
+        FROM (SELECT product_id, SUM(quantity) AS quantity FROM stock_reservations
+              WHERE order_type = ? AND order_id = ? AND status = 'active' GROUP BY product_id) r
+        WHERE products.id = r.product_id
+    ''', (order_type, order_id))
+    cursor.execute('''
+        UPDATE location_stock
+        SET reserved_quantity = MAX(0, reserved_quantity - r.quantity)
+        FROM (SELECT location_id, product_id, SUM(quantity) AS quantity FROM stock_reservations
+              WHERE order_type = ? AND order_id = ? AND status = 'active' AND location_id IS NOT NULL
+              GROUP BY location_id, product_id) r
+        WHERE location_stock.location_id = r.location_id AND location_stock.product_id = r.product_id
+    ''', (order_type, order_id))
+    cursor.execute('''
+        UPDATE stock_reservations SET status = ?, closed_ts = ?
+        WHERE order_type = ? AND order_id = ? AND status = 'active'
+    ''', (status, int(time.time()), order_type, order_id))
+    return cursor.rowcount
+
+def release_order_batch(cursor, order_type, order_ids, status='released'):
+    """Set-based release_reservations for many orders of one type; returns the number of reservations closed"""
+    cursor.execute("CREATE TEMP TABLE IF NOT EXISTS reservation_batch (order_id INTEGER PRIMARY KEY)")
+    cursor.execute("DELETE FROM temp.reservation_batch")
+    cursor.executemany("INSERT OR IGNORE INTO temp.reservation_batch (order_id) VALUES (?)",
+                       [(int(order_id),) for order_id in order_ids])
+    active = "order_type = ? AND status = 'active' AND order_id IN (SELECT order_id FROM temp.reservation_batch)"
+    cursor.execute(f'''
+        UPDATE products
+        SET reserved_quantity = MAX(0, reserved_quantity - r.quantity)
+        FROM (SELECT product_id, SUM(quantity) AS quantity FROM stock_reservations WHERE {active}
+              GROUP BY product_id) r
+        WHERE products.id = r.product_id
+    ''', (order_type,))
+    cursor.execute(f'''
+        UPDATE location_stock
+        SET reserved_quantity = MAX(0, reserved_quantity - r.quantity)
+        FROM (SELECT location_id, product_id, SUM(quantity) AS quantity FROM stock_reservations
+              WHERE {active} AND location_id IS NOT NULL GROUP BY location_id, product_id) r
+        WHERE location_stock.location_id = r.location_id AND location_stock.product_id = r.product_id
+    ''', (order_type,))
+    cursor.execute(f"UPDATE stock_reservations SET status = ?, closed_ts = ? WHERE {active}",
+                   (status, int(time.time()), order_type))
+    closed = cursor.rowcount
+    cursor.execute("DELETE FROM temp.reservation_batch")
+    return closed
+
+def fulfil_reservations(cursor, order_type, order_id, created_by=None):
+    """Turn an order's active reservations into outgoing ledger movements at their location (the default
+    location when none was reserved); returns the number fulfilled"""
+    cursor.execute('''
+        SELECT product_id, location_id, SUM(quantity) FROM stock_reservations
+        WHERE order_type = ? AND order_id = ? AND status = 'active' GROUP BY product_id, location_id
+    ''', (order_type, order_id))
+    for product_id, location_id, quantity in cursor.fetchall():
+        cursor.execute('''
+            UPDATE products SET reserved_quantity = MAX(0, reserved_quantity - ?) WHERE id = ?
+        ''', (quantity, product_id))
+        if location_id is not None:
+            cursor.execute('''
+                UPDATE location_stock SET reserved_quantity = MAX(0, reserved_quantity - ?)
+                WHERE location_id = ? AND product_id = ?
+            ''', (quantity, location_id, product_id))
+        post_stock_movement(cursor, product_id, -quantity, 'out', order_type, order_id, None, created_by, location_id)
+    cursor.execute('''
+        UPDATE stock_reservations SET status = 'fulfilled', closed_ts = ?
+        WHERE order_type = ? AND order_id = ? AND status = 'active'
+    ''', (int(time.time()), order_type, order_id))
+    return cursor.rowcount
+
+def update_order_status(order_type, order_id, status, username=None):
+    """Change an order's status and settle its reservations in the same transaction:
+    shipping fulfils them, cancelling releases them and submitting a draft keeps them without expiry.
+    A mobile-order draft on credit terms is checked against the customer's credit limit when submitted."""
+    table = ORDER_TABLES[order_type]
+    conn = get_connection()
+    conn.isolation_level = None
+    try:
+        cursor = conn.cursor()
+        cursor.execute("BEGIN IMMEDIATE")
+        try:
+            if order_type == 'mobile_order' and status in ('submitted', 'approved'):
+                cursor.execute("SELECT customer_id, total_amount, payment_terms, status FROM mobile_orders WHERE id = ?",
+                               (order_id,))
+                row = cursor.fetchone()
+                if row and row[3] == 'draft' and is_credit_terms(row[2]):
+                    check_credit(cursor, row[0], row[1])
+            cursor.execute(f"UPDATE {table} SET status = ? WHERE id = ?", (status, order_id))
+            if cursor.rowcount == 0:
+                raise ValueError(f"Unknown {order_type}: {order_id}")
+            if status in FULFIL_STATUSES:
+                fulfil_reservations(cursor, order_type, order_id, username)
+            elif status in RELEASE_STATUSES:
+                release_reservations(cursor, order_type, order_id, status)
+            else:
+                cursor.execute('''
+                    UPDATE stock_reservations SET expires_ts = NULL
+                    WHERE order_type = ? AND order_id = ? AND status = 'active'
+                ''', (order_type, order_id))
+            cursor.execute("COMMIT")
+        except Exception:
+            cursor.execute("ROLLBACK")
+            raise
+    finally:
+        conn.close()
+        invalidate_credit()
+
+def draft_expiry_ts():
+    """Expiry for the reservations of an order saved as a draft"""
+    return int(time.time()) + Config.RESERVATION_DRAFT_HOURS * 3600
+
+def expire_reservations(now=None):
+    """Release reservations past their expiry and mark their draft orders expired; returns the order count"""
+    now = now or int(time.time())
+    conn = get_connection()
+    conn.isolation_level = None
+    try:
+        cursor = conn.cursor()
+        cursor.execute("BEGIN IMMEDIATE")
+        try:
+            cursor.execute('''
+                SELECT DISTINCT order_type, order_id FROM stock_reservations
+                WHERE status = 'active' AND expires_ts IS NOT NULL AND expires_ts < ?
+            ''', (now,))
+            orders = cursor.fetchall()
+            for order_type, order_id in orders:
+                release_reservations(cursor, order_type, order_id, 'expired')
+                cursor.execute(f'''
+                    UPDATE {ORDER_TABLES[order_type]} SET status = 'expired' WHERE id = ? AND status = 'draft'
+                ''', (order_id,))
+            cursor.execute("COMMIT")
+        except Exception:
+            cursor.execute("ROLLBACK")
+            raise
+        return len(orders)
+    finally:
+        conn.close()
+
+def get_reservations(product_id=None, status='active', limit=200):
+    """Reservations with order numbers, newest first"""
+    conditions, params = [], []
+    if product_id is not None:
+        conditions.append("r.product_id = ?")
+        params.append(product_id)
+    if status:
+        conditions.append("r.status = ?")
+        params.append(status)
+    conn = get_connection()
+    try:
+        return pd.read_sql_query(f'''
+            SELECT r.id, r.order_type, COALESCE(so.order_number, mo.order_number) AS order_number,
+                   p.sku, p.name AS product, l.code AS location, r.quantity, r.status, r.created_ts, r.expires_ts,
+                   r.created_by
+            FROM stock_reservations r
+            JOIN products p ON p.id = r.product_id
+            LEFT JOIN locations l ON l.id = r.location_id
+            LEFT JOIN sales_orders so ON r.order_type = 'sales_order' AND so.id = r.order_id
+            LEFT JOIN mobile_orders mo ON r.order_type = 'mobile_order' AND mo.id = r.order_id
+            {'WHERE ' + ' AND '.join(conditions) if conditions else ''}
+            ORDER BY r.id DESC LIMIT ?
+        ''', conn, params=params + [limit])
+    finally:
+        conn.close()
@@ -0,0 +1,131 @@
+"""
+Read-only reporting snapshot
+Reports and dashboards read from a periodically refreshed copy of the live
+database so long analytical queries never hold read transactions on the
+file field sales are writing to (which would block WAL checkpoints).
+"""
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from datetime import datetime
+from urllib.request import pathname2url
+
+import pytz
+
+from config import Config
+from database.init_db import TimedConnection, get_connection, get_db_path
+from utils.metrics import histogram, record_cache
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_REFRESH_SECONDS = histogram(
+    'penzflow_snapshot_refresh_seconds', 'Time taken to refresh the reporting snapshot')
+
+INDONESIA_TZ = pytz.timezone('Asia/Jakarta')
+
+_thread = None
+_thread_lock = threading.Lock()
+# On-demand refresh started by a reader that found the snapshot stale
+_background = None
+_refresh_lock = threading.Lock()
+
+def get_snapshot_path():
+    """Snapshot file next to the live database"""
+    root, extension = os.path.splitext(get_db_path())
+    return f"{root}_snapshot{extension}"
+
+def refresh_snapshot():
+    """Copy the live database into a new snapshot file and swap it in atomically"""
+    path = get_snapshot_path()
+    with _refresh_lock, SNAPSHOT_REFRESH_SECONDS.time():
+        # A temp file of its own, so refreshes in other processes cannot swap in this one's partial copy
+        fd, temp_path = tempfile.mkstemp(prefix=os.path.basename(path) + '.', suffix='.tmp',
+                                         dir=os.path.dirname(path))
+        os.close(fd)
+        try:
+            source = sqlite3.connect(get_db_path())
+            target = sqlite3.connect(temp_path)
+            try:
+                # Copy in chunks so writers are only paused briefly between steps
+                source.backup(target, pages=1024)
+                # Read-only connections cannot create a -shm file, so the copy must not be in WAL mode
+                target.execute("PRAGMA journal_mode=DELETE")
+            finally:
+                target.close()
+                source.close()
+            # Readers holding the old file keep reading it until they close their connection
+            os.replace(temp_path, path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+    return os.path.getmtime(path)
+
+def get_snapshot_time():
+    """Epoch seconds of the current snapshot, or None if none has been taken"""
+    try:
+        return os.path.getmtime(get_snapshot_path())
+    except OSError:
+        return None
+
+def get_snapshot_connection():
+    """Read-only connection to the reporting snapshot (live database if snapshots are disabled)"""
+    if not Config.SNAPSHOT_ENABLED:
+        return get_connection()
+
+    taken = get_snapshot_time()
+    stale = taken is None or time.time() - taken > 2 * Config.SNAPSHOT_REFRESH_INTERVAL
+    record_cache('snapshot', not stale)
+    if taken is None:
+        refresh_snapshot()
+    elif stale:
+        # No refresher thread is keeping the copy current: serve it as it is and refresh it for later readers
+        _refresh_in_background()
+    uri = f"file:{pathname2url(get_snapshot_path())}?mode=ro"
+    return sqlite3.connect(uri, uri=True, factory=TimedConnection)
+
+def snapshot_caption():
+    """Human-readable freshness line for pages reading from the snapshot"""
+    if not Config.SNAPSHOT_ENABLED:
+        return "🟢 Live data"
+    taken = get_snapshot_time()
+    if taken is None:
+        return "📸 Reporting snapshot not taken yet"
+    age_minutes = int((time.time() - taken) // 60)
+    taken_at = datetime.fromtimestamp(taken, INDONESIA_TZ).strftime('%d-%m-%Y %H:%M WIB')
+    interval_minutes = max(1, Config.SNAPSHOT_REFRESH_INTERVAL // 60)
+    return (f"📸 Reporting snapshot from {taken_at} ({age_minutes} min ago, "
+            f"refreshed every {interval_minutes} min)")
+
+def _refresh_logged():
+    try:
+        refresh_snapshot()
+    except Exception:
+        logger.exception("Snapshot refresh error")
+
+def _refresh_in_background():
+    """Refresh the snapshot on a separate thread unless an on-demand refresh is already running"""
+    global _background
+    with _thread_lock:
+        if _background is None or not _background.is_alive():
+            _background = threading.Thread(target=_refresh_logged, name='snapshot-refresh', daemon=True)
+            _background.start()
+
+def _refresher_loop():
+    while True:
+        _refresh_logged()
+        time.sleep(Config.SNAPSHOT_REFRESH_INTERVAL)
+
+def start_snapshot_refresher():
+    """Start the snapshot refresher thread once per process"""
+    global _thread
+    if not Config.SNAPSHOT_ENABLED:
+        return None
+    with _thread_lock:
+        if _thread is None:
+            _thread = threading.Thread(target=_refresher_loop, name='snapshot-refresher', daemon=True)
+            _thread.start()
+    return _thread
@@ -0,0 +1,226 @@
+"""
+Stock takes (cycle counts)
+Starting a stock take freezes the expected quantity of every product in
+scope at one depot into stock_take_lines. Counts arrive in bulk, from a
+CSV or a pasted scanner log, and are applied with one set-based UPDATE
+per upload. Variances are counted minus frozen expected quantities,
+computed for the whole session at once, and posting books them as
+adjustments in one transaction with set-based ledger statements. Because
+variances are measured against the freeze, sales and receipts during the
+count are kept rather than overwritten.
+"""
+import io
+import time
+
+import numpy as np
+import pandas as pd
+
+from database.init_db import get_connection
+from database.ledger import default_location_id, post_stock_batch
+from database.sequence import next_number
+
+STOCK_TAKE_STATUSES = ('counting', 'posted', 'cancelled')
+
+def start_stock_take(location_id=None, category=None, created_by=None, notes=None):
+    """Open a stock take at a depot (the default one when None), optionally for one category, freezing
+    expected quantities; returns (stock take id, number, lines)"""
+    take_number = next_number('STK')
+    conn = get_connection()
+    conn.isolation_level = None
+    try:
+        cursor = conn.cursor()
+        cursor.execute("BEGIN IMMEDIATE")
+        try:
+            location_id = location_id or default_location_id(cursor)
+            cursor.execute('''
+                INSERT INTO stock_takes (take_number, location_id, category, status, notes, created_by, created_ts)
+                VALUES (?, ?, ?, 'counting', ?, ?, ?)
+            ''', (take_number, location_id, category, notes, created_by, int(time.time())))
+            stock_take_id = cursor.lastrowid
+            cursor.execute('''
+                INSERT INTO stock_take_lines (stock_take_id, product_id, expected_quantity, unit_cost)
+                SELECT ?, p.id, COALESCE(ls.quantity, 0), COALESCE(p.average_cost, p.cost, 0)
+                FROM products p
+                LEFT JOIN location_stock ls ON ls.location_id = ? AND ls.product_id = p.id
+                WHERE ? IS NULL OR p.category = ?
+            ''', (stock_take_id, location_id, category, category))
+            lines = cursor.rowcount
+            cursor.execute("UPDATE stock_takes SET lines = ? WHERE id = ?", (lines, stock_take_id))
+            cursor.execute("COMMIT")
+        except Exception:
+            cursor.execute("ROLLBACK")
+            raise
+    finally:
+        conn.close()
+    return stock_take_id, take_number, lines
+
+def read_count_csv(data):
+    """(sku, counted) rows from CSV bytes or text; a repeated SKU adds up"""
+    if isinstance(data, bytes):
+        data = data.decode('utf-8-sig')
+    df = pd.read_csv(io.StringIO(data), dtype={'sku': str})
+    df.columns = [column.strip().lower() for column in df.columns]
+    if 'quantity' in df.columns and 'counted' not in df.columns:
+        df = df.rename(columns={'quantity': 'counted'})
+    missing = {'sku', 'counted'} - set(df.columns)
+    if missing:
+        raise ValueError(f"CSV is missing column(s): {', '.join(sorted(missing))}")
+    df = df[['sku', 'counted']].dropna(subset=['sku'])
+    df['sku'] = df['sku'].str.strip()
+    counted = pd.to_numeric(df['counted'], errors='coerce')
+    invalid = df.loc[counted.isna() | (counted < 0), 'sku'].tolist()
+    if invalid:
+        raise ValueError(f"Invalid count for SKU(s): {', '.join(invalid[:10])}")
+    df['counted'] = counted.round().astype(int)
+    return df.groupby('sku', as_index=False, sort=False)['counted'].sum()
+
+def read_scanner_input(text):
+    """(sku, counted) from scanner output: one scan per line, either a bare SKU (one unit) or
+    'SKU,quantity' / 'SKU quantity'"""
+    rows = []
+    for line in text.splitlines():
+        parts = line.replace(',', ' ').replace('\t', ' ').split()
+        if not parts:
+            continue
+        if len(parts) > 2 or (len(parts) == 2 and not parts[1].isdigit()):
+            raise ValueError(f"Unreadable scan: {line.strip()}")
+        rows.append((parts[0], int(parts[1]) if len(parts) == 2 else 1))
+    df = pd.DataFrame(rows, columns=['sku', 'counted'])
+    return df.groupby('sku', as_index=False, sort=False)['counted'].sum()
+
+def record_counts(stock_take_id, counts, mode='set'):
+    """Apply counted quantities (sku, counted) to an open stock take in one statement: 'set' replaces the
+    count, 'add' adds to it (repeated scanner uploads). Returns (lines updated, SKUs not in the stock take)."""
+    if mode not in ('set', 'add'):
+        raise ValueError(f"Unknown count mode: {mode}")
+    conn = get_connection()
+    conn.isolation_level = None
+    try:
+        cursor = conn.cursor()
+        cursor.execute("BEGIN IMMEDIATE")
+        try:
+            _require_open(cursor, stock_take_id)
+            cursor.execute("DROP TABLE IF EXISTS temp.stock_take_counts")
+            cursor.execute("CREATE TEMP TABLE stock_take_counts (sku TEXT PRIMARY KEY, counted INTEGER)")
+            cursor.executemany("INSERT INTO temp.stock_take_counts VALUES (?, ?)",
+                               counts[['sku', 'counted']].itertuples(index=False, name=None))
+            counted = "COALESCE(stock_take_lines.counted_quantity, 0) + c.counted" if mode == 'add' else "c.counted"
+            cursor.execute(f'''
+                UPDATE stock_take_lines SET counted_quantity = {counted}, counted_ts = ?
+                FROM temp.stock_take_counts c JOIN products p ON p.sku = c.sku
+                WHERE stock_take_lines.stock_take_id = ? AND stock_take_lines.product_id = p.id
+            ''', (int(time.time()), stock_take_id))
+            updated = cursor.rowcount
+            cursor.execute('''
+                SELECT c.sku FROM temp.stock_take_counts c
+                WHERE NOT EXISTS (SELECT 1 FROM stock_take_lines l JOIN products p ON p.id = l.product_id
+                                  WHERE l.stock_take_id = ? AND p.sku = c.sku)
+                ORDER BY c.sku
+            ''', (stock_take_id,))
+            unknown = [row[0] for row in cursor.fetchall()]
+            cursor.execute("DROP TABLE temp.stock_take_counts")
+            cursor.execute("COMMIT")
+        except Exception:
+            cursor.execute("ROLLBACK")
+            raise
+    finally:
+        conn.close()
+    return updated, unknown
+
+def _require_open(cursor, stock_take_id):
+    cursor.execute("SELECT status FROM stock_takes WHERE id = ?", (stock_take_id,))
+    row = cursor.fetchone()
+    if row is None:
+        raise ValueError(f"Unknown stock take: {stock_take_id}")
+    if row[0] != 'counting':
+        raise ValueError(f"Stock take is already {row[0]}")
+
+def compute_variances(lines, uncounted_as_zero=False):
+    """Variance columns for stock take lines in one vectorized pass; uncounted lines have no variance
+    unless uncounted_as_zero"""
+    expected = lines['expected_quantity'].to_numpy(dtype=float)
+    counted = lines['counted_quantity'].to_numpy(dtype=float)
+    if uncounted_as_zero:
+        counted = np.where(np.isnan(counted), 0, counted)
+    variance = counted - expected
+    lines = lines.assign(variance=variance, variance_value=variance * lines['unit_cost'].to_numpy(dtype=float))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        lines['variance_pct'] = np.where(expected > 0, variance / expected * 100, np.nan).round(1)
+    return lines
+
+def get_stock_take_lines(stock_take_id, uncounted_as_zero=False):
+    """Lines of a stock take with their variances"""
+    conn = get_connection()
+    try:
+        lines = pd.read_sql_query('''
+            SELECT l.product_id, p.sku, p.name AS product, p.category, l.expected_quantity, l.counted_quantity,
+                   l.unit_cost, l.counted_ts
+            FROM stock_take_lines l JOIN products p ON p.id = l.product_id
+            WHERE l.stock_take_id = ? ORDER BY p.sku
+        ''', conn, params=(stock_take_id,))
+    finally:
+        conn.close()
+    return compute_variances(lines, uncounted_as_zero)
+
+def get_stock_takes(limit=50):
+    """Recent stock takes with their progress, newest first"""
+    conn = get_connection()
+    try:
+        return pd.read_sql_query('''
+            SELECT t.id, t.take_number, l.code AS location, t.category, t.status, t.lines,
+                   (SELECT COUNT(*) FROM stock_take_lines s
+                    WHERE s.stock_take_id = t.id AND s.counted_quantity IS NOT NULL) AS counted,
+                   t.variance_units, t.variance_value, t.created_by, t.created_ts, t.posted_by, t.posted_ts
+            FROM stock_takes t LEFT JOIN locations l ON l.id = t.location_id
+            ORDER BY t.id DESC LIMIT ?
+        ''', conn, params=(limit,))
+    finally:
+        conn.close()
+
+def post_stock_take(stock_take_id, posted_by=None, uncounted_as_zero=False):
+    """Book every variance of a stock take as one adjustment per product in a single transaction;
+    returns the number of adjustments and their net units and value"""
+    conn = get_connection()
+    conn.isolation_level = None
+    try:
+        cursor = conn.cursor()
+        cursor.execute("BEGIN IMMEDIATE")
+        try:
+            _require_open(cursor, stock_take_id)
+            cursor.execute("SELECT take_number, location_id FROM stock_takes WHERE id = ?", (stock_take_id,))
+            take_number, location_id = cursor.fetchone()
+            lines = compute_variances(pd.DataFrame(cursor.execute('''
+                SELECT product_id, expected_quantity, counted_quantity, unit_cost FROM stock_take_lines
+                WHERE stock_take_id = ?
+            ''', (stock_take_id,)).fetchall(), columns=['product_id', 'expected_quantity', 'counted_quantity',
+                                                         'unit_cost']), uncounted_as_zero)
+            lines = lines[lines['variance'].notna() & (lines['variance'] != 0)]
+            adjustments = post_stock_batch(
+                cursor, zip(lines['product_id'].tolist(), lines['variance'].astype(int).tolist()), 'adjustment',
+                'stock_take', stock_take_id, f"Stock take {take_number}", posted_by, location_id)
+            variance_units = int(lines['variance'].sum())
+            variance_value = int(round(lines['variance_value'].sum()))
+            cursor.execute('''
+                UPDATE stock_takes SET status = 'posted', posted_by = ?, posted_ts = ?, variance_units = ?,
+                                       variance_value = ?
+                WHERE id = ?
+            ''', (posted_by, int(time.time()), variance_units, variance_value, stock_take_id))
+            cursor.execute("COMMIT")
+        except Exception:
+            cursor.execute("ROLLBACK")
+            raise
+    finally:
+        conn.close()
+    return {'take_number': take_number, 'adjustments': adjustments, 'variance_units': variance_units,
+            'variance_value': variance_value}
+
+def cancel_stock_take(stock_take_id):
+    """Close a stock take without posting anything"""
+    conn = get_connection()
+    try:
+        cursor = conn.cursor()
+        _require_open(cursor, stock_take_id)
+        cursor.execute("UPDATE stock_takes SET status = 'cancelled' WHERE id = ?", (stock_take_id,))
+        conn.commit()
+    finally:
+        conn.close()
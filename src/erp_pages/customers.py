@@ -2,6 +2,23 @@ import streamlit as st
 import pandas as pd
 from utils.helpers import format_currency
 from utils.translations import t
+from database.init_db import get_connection
+from database.repository import (INDONESIA_TZ, get_customer_activities, get_customer_details,
+                                 get_customer_orders)
+from database.payments import get_open_invoices, get_payments
+from database.credit import set_credit_limit
+from utils.audit import log_event
+from datetime import datetime
+
+def get_customer_options():
+    """Customer names mapped to ids for the details selector"""
+    conn = get_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT name, id FROM customers ORDER BY name")
+        return {f"{name} (#{customer_id})": customer_id for name, customer_id in cursor.fetchall()}
+    finally:
+        conn.close()
 
 def show_customers():
     """Customer Management Page"""
@@ -65,6 +82,13 @@ def show_customers():
         
         st.dataframe(filtered_df, use_container_width=True)
         
+        # Full history (live and archived) for a customer on record
+        customer_options = get_customer_options()
+        if customer_options:
+            selected_customer = st.selectbox("View customer details", ["-"] + list(customer_options))
+            if selected_customer != "-":
+                show_customer_details(customer_options[selected_customer])
+        
         # Customer actions
         col1, col2, col3, col4 = st.columns(4)
         with col1:
@@ -141,33 +165,119 @@ def show_customers():
                 else:
                     st.error(f"❌ {t('error')}: Please fill in store name, owner name, and phone")
 
+def format_ts(ts):
+    """Epoch seconds as a WIB date and time, '-' when missing"""
+    return datetime.fromtimestamp(ts, INDONESIA_TZ).strftime('%d-%m-%Y %H:%M') if ts else '-'
+
 def show_customer_details(customer_id):
     """Show detailed customer information"""
-    st.subheader(f"Customer Details - ID: {customer_id}")
+    # Profile and totals come from one lookup; order and activity history load on request
+    customer = get_customer_details(customer_id)
+    if customer is None:
+        st.warning(f"Customer {customer_id} not found")
+        return
+    st.subheader(f"Customer Details - {customer['name']}")
     
     # Customer info tabs
     tab1, tab2, tab3, tab4 = st.tabs(["Profile", "Orders", "Payments", "Activities"])
     
     with tab1:
-        col1, col2 = st.columns(2)
+        col1, col2, col3 = st.columns(3)
         with col1:
             st.write("**Basic Information**")
-            st.write("Name: Budi Santoso")
-            st.write("Email: budi@techcorp.co.id")
-            st.write("Phone: +62812-3456-7890")
-            st.write("Company: PT. Tech Corp")
+            st.write(f"Name: {customer['name']}")
+            st.write(f"Email: {customer['email'] or '-'}")
+            st.write(f"Phone: {customer['phone'] or '-'}")
+            st.write(f"Company: {customer['company'] or '-'}")
+            st.write(f"Segment: {customer['segment'] or '-'}")
         
         with col2:
             st.write("**Statistics**")
-            st.metric("Total Orders", "15")
-            st.metric("Total Spent", format_currency(81000000, 'IDR'))
-            st.metric("Average Order", format_currency(5400000, 'IDR'))
+            st.metric("Total Orders", customer['order_count'])
+            st.metric("Lifetime Value", format_currency(customer['lifetime_value'], 'IDR'))
+            st.metric("Average Order", format_currency(
+                customer['lifetime_value'] / customer['order_count'] if customer['order_count'] else 0, 'IDR'))
+        
+        with col3:
+            st.write("**Activity**")
+            st.metric("Outstanding", format_currency(customer['outstanding_amount'], 'IDR'))
+            st.metric("Open Follow-ups", customer['open_follow_ups'])
+            st.write(f"Last Order: {format_ts(customer['last_order_ts'])}")
+            st.write(f"Last Visit: {format_ts(customer['last_visit_ts'])}")
     
     with tab2:
-        st.write("Recent orders will be displayed here")
+        if not customer['order_count']:
+            st.info("No orders yet")
+        elif st.checkbox(f"Load order history ({customer['order_count']} orders)", key=f"orders_{customer_id}"):
+            orders = get_customer_orders(customer_id)
+            st.dataframe(pd.DataFrame({
+                'Order ID': orders['order_number'],
+                'Date': orders['order_date'].astype(str).str[:10],
+                'Items': orders['items'],
+                'Total': [format_currency(amount or 0, 'IDR') for amount in orders['total_amount']],
+                'Status': orders['status'],
+                'Source': orders['source']
+            }), use_container_width=True)
     
     with tab3:
-        st.write("Payment history will be displayed here")
+        exposure = customer['outstanding_amount'] + customer['credit_order_amount']
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            st.metric("Credit Limit", format_currency(customer['credit_limit'], 'IDR')
+                      if customer['credit_limit'] is not None else "No limit")
+        with col2:
+            st.metric("Exposure", format_currency(exposure, 'IDR'))
+            st.caption(f"Includes {format_currency(customer['credit_order_amount'], 'IDR')} in credit orders not yet invoiced")
+        with col3:
+            if customer['credit_limit'] is not None:
+                st.metric("Available Credit", format_currency(customer['credit_limit'] - exposure, 'IDR'))
+        with st.form(f"credit_limit_{customer_id}"):
+            no_limit = st.checkbox("No credit limit", value=customer['credit_limit'] is None)
+            credit_limit = st.number_input(t("credit_limit") + " (IDR)", min_value=0, step=500000,
+                                           value=customer['credit_limit'] or 0)
+            if st.form_submit_button("Save Credit Limit"):
+                set_credit_limit(customer_id, None if no_limit else credit_limit)
+                log_event('credit_limit_updated', st.session_state.get('username'), 'customer', customer_id,
+                          'no limit' if no_limit else str(credit_limit))
+                st.success("✅ Credit limit saved")
+                st.rerun()
+        
+        if st.checkbox("Load payments and open invoices", key=f"payments_{customer_id}"):
+            invoices = get_open_invoices(customer_id)
+            if len(invoices):
+                st.write("**Open Invoices**")
+                st.dataframe(pd.DataFrame({
+                    'Order ID': invoices['order_number'],
+                    'Total': [format_currency(value, 'IDR') for value in invoices['total_amount']],
+                    'Outstanding': [format_currency(value, 'IDR') for value in invoices['outstanding']],
+                    'Days Outstanding': invoices['age_days'],
+                    'Status': invoices['payment_status']
+                }), use_container_width=True)
+            payments = get_payments(customer_id)
+            if len(payments):
+                st.write("**Payments**")
+                st.dataframe(pd.DataFrame({
+                    'Payment': payments['payment_number'],
+                    'Date': payments['payment_date'].astype(str).str[:10],
+                    'Order ID': payments['order_number'],
+                    'Amount': [format_currency(value, 'IDR') for value in payments['amount']],
+                    'Method': payments['payment_method'].fillna('-'),
+                    'Reference': payments['reference'].fillna('-')
+                }), use_container_width=True)
+            elif not len(invoices):
+                st.info("No payments recorded")
     
     with tab4:
-        st.write("Customer activities and interactions will be displayed here")
+        if st.checkbox("Load visits and activities", key=f"activities_{customer_id}"):
+            activities = get_customer_activities(customer_id)
+            if len(activities):
+                st.dataframe(pd.DataFrame({
+                    'Date': activities['date'].astype(str).str[:16],
+                    'Kind': activities['kind'],
+                    'Type': activities['type'],
+                    'Subject': activities['subject'],
+                    'Status': activities['status'],
+                    'Source': activities['source']
+                }), use_container_width=True)
+            else:
+                st.info("No visits or activities recorded")
@@ -1,42 +1,91 @@
 import streamlit as st
 import pandas as pd
 import plotly.express as px
-from datetime import datetime
+from datetime import date, timedelta
 from utils.helpers import format_currency
+from database.repository import wib_date_key
+from database.snapshot import get_snapshot_connection, snapshot_caption
+
+def load_dashboard_data():
+    """Headline metrics, monthly sales and top products from the reporting snapshot"""
+    conn = get_snapshot_connection()
+    try:
+        cursor = conn.cursor()
+        today = date.today()
+        month_start = today.replace(day=1)
+        months_back = today.year * 12 + today.month - 1 - 11
+        trend_start = date(months_back // 12, months_back % 12 + 1, 1)
+        cursor.execute('''
+            SELECT
+                (SELECT COALESCE(SUM(total_amount), 0) FROM sales_orders WHERE status != 'cancelled'),
+                (SELECT COALESCE(SUM(total_amount), 0) FROM sales_orders
+                 WHERE status != 'cancelled' AND order_local_date >= ?),
+                (SELECT COUNT(DISTINCT customer_id) FROM sales_orders
+                 WHERE status != 'cancelled' AND order_local_date >= ?),
+                (SELECT COUNT(*) FROM products WHERE stock_quantity > 0),
+                (SELECT COUNT(*) FROM sales_orders WHERE status = 'pending')
+        ''', (wib_date_key(month_start), wib_date_key(today - timedelta(days=90))))
+        keys = ('total_sales', 'sales_this_month', 'active_customers', 'products_in_stock', 'pending_orders')
+        metrics = dict(zip(keys, cursor.fetchone()))
+        
+        df_trend = pd.read_sql_query('''
+            SELECT printf('%04d-%02d', order_local_date / 10000, order_local_date / 100 % 100) AS month,
+                   SUM(total_amount) AS sales
+            FROM sales_orders
+            WHERE status != 'cancelled' AND order_local_date >= ?
+            GROUP BY order_local_date / 100
+            ORDER BY order_local_date / 100
+        ''', conn, params=(wib_date_key(trend_start),))
+        
+        df_top = pd.read_sql_query('''
+            SELECT p.name AS product, SUM(oi.quantity) AS quantity
+            FROM order_items oi
+            JOIN sales_orders so ON so.id = oi.order_id
+            JOIN products p ON p.id = oi.product_id
+            WHERE so.status != 'cancelled'
+            GROUP BY p.id
+            ORDER BY quantity DESC
+            LIMIT 5
+        ''', conn)
+    finally:
+        conn.close()
+    return metrics, df_trend, df_top
 
 def show_dashboard():
     """Main ERP Dashboard"""
     st.header("📈 Dashboard Overview")
     
+    st.caption(snapshot_caption())
+    
+    metrics, df_trend, df_top = load_dashboard_data()
+    
     # Key Metrics
     col1, col2, col3, col4 = st.columns(4)
     
     with col1:
         st.metric(
             label="Total Sales",
-            value=format_currency(1875450000, 'IDR'),  # ~$125,430 converted to IDR
-            delta="12.5%"
+            value=format_currency(metrics['total_sales'], 'IDR'),
+            delta=f"{format_currency(metrics['sales_this_month'], 'IDR')} this month"
         )
     
     with col2:
         st.metric(
             label="Active Customers",
-            value="1,234",
-            delta="8.2%"
+            value=f"{metrics['active_customers']:,}",
+            help="Customers with an order in the last 90 days"
         )
     
     with col3:
         st.metric(
             label="Products in Stock",
-            value="456",
-            delta="-2.1%"
+            value=f"{metrics['products_in_stock']:,}"
         )
     
     with col4:
         st.metric(
             label="Pending Orders",
-            value="23",
-            delta="5.0%"
+            value=f"{metrics['pending_orders']:,}"
         )
     
     st.markdown("---")
@@ -46,18 +95,17 @@ def show_dashboard():
     
     with col1:
         st.subheader("Sales Trend")
-        # Sample data for sales trend
-        dates = pd.date_range(start='2024-01-01', end='2024-12-31', freq='M')
-        sales = [18000000, 22500000, 20250000, 27000000, 24750000, 28500000, 31500000, 27750000, 25500000, 33000000, 30750000, 37500000]
-        
-        fig = px.line(x=dates, y=sales, title="Monthly Sales Trend")
-        fig.update_layout(xaxis_title="Month", yaxis_title="Sales (IDR)")
-        st.plotly_chart(fig, use_container_width=True)
+        if len(df_trend):
+            fig = px.line(df_trend, x='month', y='sales', title="Monthly Sales Trend")
+            fig.update_layout(xaxis_title="Month", yaxis_title="Sales (IDR)")
+            st.plotly_chart(fig, use_container_width=True)
+        else:
+            st.info("No sales in the last 12 months.")
     
     with col2:
         st.subheader("Top Products")
-        products = ['Laptop Pro', 'Wireless Mouse', 'USB Cable', 'Monitor Stand', 'Keyboard']
-        sales_data = [45, 30, 15, 7, 3]
-        
-        fig = px.pie(values=sales_data, names=products, title="Top Selling Products")
-        st.plotly_chart(fig, use_container_width=True)
+        if len(df_top):
+            fig = px.pie(df_top, values='quantity', names='product', title="Top Selling Products")
+            st.plotly_chart(fig, use_container_width=True)
+        else:
+            st.info("No products sold yet.")
@@ -1,13 +1,30 @@
 import streamlit as st
 import pandas as pd
 import plotly.express as px
+import plotly.graph_objects as go
+from datetime import date, timedelta
 from utils.helpers import format_currency
+from utils.audit import log_event
+from database.ledger import (ADJUSTMENT_TYPES, adjust_stock, get_daily_movements, get_movement_history,
+                             get_stock_at, get_stock_levels_at)
+from database.repository import get_catalog_values, get_products
+from database.reservations import get_reservations
+from database.locations import (create_transfer, get_location_stock, get_location_summary, get_locations,
+                                get_transfers, save_location)
+from database.alerts import RECOMMENDED_ACTIONS, get_alert_counts, get_alerts
+from database.stock_takes import (cancel_stock_take, get_stock_take_lines, get_stock_takes, post_stock_take,
+                                  read_count_csv, read_scanner_input, record_counts, start_stock_take)
+from database.purchasing import (PO_STATUSES, get_purchase_order_items, get_purchase_orders, get_reorder_suggestions,
+                                 update_purchase_order_status)
+from utils.forecasting import get_product_demand, get_product_forecast
+from erp_pages.jobs import show_jobs_panel, start_job
 
 def show_inventory():
     """Inventory Management Page"""
     st.header("📊 Inventory Management")
     
-    tab1, tab2, tab3, tab4 = st.tabs(["Stock Overview", "Stock Movements", "Adjustments", "Alerts"])
+    tab1, tab2, tab3, tab_locations, tab_purchasing, tab4 = st.tabs(["Stock Overview", "Stock Movements", "Adjustments",
+                                                                     "Locations", "Purchase Orders", "Alerts"])
     
     with tab1:
         # Inventory summary
@@ -60,10 +77,10 @@ def show_inventory():
         col1, col2, col3, col4 = st.columns(4)
         with col1:
             if st.button("📦 Stock Take", use_container_width=True):
-                st.info("Stock take feature coming soon!")
+                st.session_state.show_stock_take = not st.session_state.get('show_stock_take', False)
         with col2:
             if st.button("📋 Generate PO", use_container_width=True):
-                st.info("Purchase order generation coming soon!")
+                start_job('generate_purchase_orders', {'created_by': st.session_state.get('username')})
         with col3:
             if st.button("📊 Stock Report", use_container_width=True):
                 st.info("Stock report feature coming soon!")
@@ -76,124 +93,469 @@ def show_inventory():
                     file_name="inventory.csv",
                     mime="text/csv"
                 )
-    
-    with tab2:
-        st.subheader("Stock Movements")
         
-        # Sample stock movements
-        movements_data = {
-            'Date': ['2024-01-20', '2024-01-19', '2024-01-18', '2024-01-17', '2024-01-16'],
-            'Product': ['Laptop Pro', 'Wireless Mouse', 'USB Cable', 'Monitor Stand', 'Keyboard'],
-            'Type': ['Sale', 'Purchase', 'Sale', 'Adjustment', 'Sale'],
-            'Quantity': [-2, +50, -10, -1, -3],
-            'Reference': ['ORD001', 'PO001', 'ORD002', 'ADJ001', 'ORD003'],
-            'Balance': [25, 150, 200, 5, 80]
-        }
+        show_jobs_panel(['generate_purchase_orders'])
         
-        df_movements = pd.DataFrame(movements_data)
-        st.dataframe(df_movements, use_container_width=True)
+        if st.session_state.get('show_stock_take'):
+            st.markdown("---")
+            show_stock_take()
+    
+    with tab2:
+        show_stock_movements()
+    
+    with tab3:
+        show_stock_adjustments()
+    
+    with tab_locations:
+        show_locations()
+    
+    with tab_purchasing:
+        show_purchase_orders()
+    
+    with tab4:
+        show_inventory_alerts()
+
+def show_inventory_alerts():
+    """Products in an alert state, read from the trigger-maintained alerts table"""
+    st.subheader("Inventory Alerts")
+    
+    # Alert summary
+    counts = get_alert_counts()
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.error(f"**Critical Alerts: {counts['critical']}**")
+    with col2:
+        st.warning(f"**Low Stock Alerts: {counts['low']}**")
+    with col3:
+        st.info(f"**Reorder Alerts: {counts['reorder']}**")
+    
+    # Detailed alerts
+    level = st.selectbox("Level", ['All', 'critical', 'low', 'reorder'], key="alerts_level")
+    alerts = get_alerts(None if level == 'All' else level)
+    if alerts.empty:
+        st.success("✅ No products in an alert state")
+    else:
+        priorities = {'critical': '🔴 Critical', 'low': '🟡 Low Stock', 'reorder': '🔵 Reorder'}
+        df_alerts = pd.DataFrame({
+            'Priority': alerts['level'].map(priorities),
+            'Product': alerts['product'],
+            'SKU': alerts['sku'],
+            'Current Stock': alerts['stock_quantity'],
+            'Min Level': alerts['min_stock_level'],
+            'Recommended Action': alerts['level'].map(RECOMMENDED_ACTIONS),
+            'Supplier': alerts['supplier'],
+            'Notified': alerts['notified_ts'].notna().map({True: '✅', False: '-'})
+        })
+        st.dataframe(df_alerts, use_container_width=True)
+    
+    # Alert actions
+    col1, col2 = st.columns(2)
+    with col1:
+        if st.button("📧 Send Alert Emails", use_container_width=True):
+            start_job('send_alert_digest')
+    with col2:
+        if st.button("📋 Generate Purchase Orders", use_container_width=True):
+            start_job('generate_purchase_orders', {'created_by': st.session_state.get('username')})
+    show_jobs_panel(['send_alert_digest'])
+
+def show_stock_movements():
+    """Ledger of stock movements with running balances and stock as of a date"""
+    st.subheader("Stock Movements")
+    
+    products = get_products()
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        product_name = st.selectbox("Product", ["All"] + products['name'].tolist(), key="movement_product")
+    with col2:
+        start_date = st.date_input("From", value=date.today() - timedelta(days=30), key="movement_from")
+    with col3:
+        end_date = st.date_input("To", value=date.today(), key="movement_to")
+    
+    product = products[products['name'] == product_name].iloc[0] if product_name != "All" else None
+    product_id = int(product['id']) if product is not None else None
+    
+    movements = get_movement_history(product_id, start_date, end_date)
+    if movements.empty:
+        st.info("No stock movements in this period")
+    else:
+        st.dataframe(movements.rename(columns={
+            'created_at': 'Date', 'sku': 'SKU', 'product': 'Product', 'transaction_type': 'Type',
+            'quantity': 'Quantity', 'balance_after': 'Balance', 'reference_type': 'Reference',
+            'reference_id': 'Reference ID', 'notes': 'Notes', 'created_by': 'By'
+        }).drop(columns=['id']), use_container_width=True)
         
         # Movement chart
         st.subheader("Stock Movement Trend")
-        movement_chart_data = pd.DataFrame({
-            'Date': pd.date_range('2024-01-01', periods=20, freq='D'),
-            'In': [10, 0, 50, 0, 20, 0, 0, 30, 0, 15, 0, 40, 0, 0, 25, 0, 10, 0, 35, 0],
-            'Out': [5, 8, 3, 12, 6, 9, 4, 7, 10, 2, 11, 6, 8, 5, 3, 9, 7, 12, 4, 8]
-        })
-        
-        fig_movement = px.line(movement_chart_data, x='Date', y=['In', 'Out'], 
-                              title="Daily Stock Movements (In vs Out)")
+        daily = get_daily_movements(start_date, end_date, product_id)
+        fig_movement = px.line(daily.rename(columns={'date': 'Date', 'units_in': 'In', 'units_out': 'Out'}),
+                               x='Date', y=['In', 'Out'], title="Daily Stock Movements (In vs Out)")
         st.plotly_chart(fig_movement, use_container_width=True)
     
-    with tab3:
-        st.subheader("Stock Adjustments")
+    st.markdown("---")
+    st.subheader("Stock as of Date")
+    as_of = st.date_input("Closing stock on", value=date.today() - timedelta(days=1), key="stock_as_of")
+    levels = get_stock_levels_at(as_of)
+    levels['change'] = levels['current_stock'] - levels['balance']
+    st.dataframe(levels.rename(columns={
+        'sku': 'SKU', 'name': 'Product', 'category': 'Category', 'balance': f"Stock on {as_of}",
+        'current_stock': 'Current Stock', 'change': 'Change Since'
+    }).drop(columns=['product_id']), use_container_width=True)
+    
+    if product is not None:
+        st.markdown("---")
+        show_stock_details(product['sku'])
+
+def show_stock_adjustments():
+    """Manual adjustment form posting to the stock ledger"""
+    st.subheader("Stock Adjustments")
+    
+    products = get_products()
+    locations = get_locations()
+    location_names = dict(zip(locations['code'] + ' - ' + locations['name'], locations['id']))
+    with st.form("stock_adjustment"):
+        col1, col2 = st.columns(2)
+        with col1:
+            product = st.selectbox("Product", products['name'].tolist())
+            adjustment_type = st.selectbox("Adjustment Type", list(ADJUSTMENT_TYPES))
+            location = st.selectbox("Location", list(location_names))
+        
+        with col2:
+            quantity = st.number_input("Quantity", min_value=0, value=1)
+            reason = st.selectbox("Reason", ["Damaged", "Lost", "Found", "Correction", "Other"])
+        
+        notes = st.text_area("Notes", placeholder="Detailed explanation for the adjustment")
+        st.caption("Moving stock between depots? Use a transfer in the Locations tab.")
         
-        # Create adjustment form
-        with st.form("stock_adjustment"):
+        if st.form_submit_button("Submit Adjustment", use_container_width=True):
+            product_id = int(products.loc[products['name'] == product, 'id'].iloc[0])
+            try:
+                balance = adjust_stock(product_id, adjustment_type, int(quantity), reason, notes or None,
+                                       st.session_state.get('username'), int(location_names[location]))
+                log_event('stock_adjustment', st.session_state.get('username'), 'product', product_id,
+                          {'type': adjustment_type, 'quantity': int(quantity), 'reason': reason, 'balance': balance})
+                st.success(f"✅ Total stock of '{product}' is now {balance}")
+            except ValueError as e:
+                st.error(f"❌ {e}")
+    
+    st.markdown("---")
+    
+    # Recent adjustments
+    st.subheader("Recent Adjustments")
+    adjustments = get_movement_history(reference_type='adjustment', limit=20)
+    if adjustments.empty:
+        st.info("No adjustments recorded yet")
+    else:
+        st.dataframe(adjustments[['created_at', 'product', 'quantity', 'balance_after', 'notes', 'created_by']].rename(columns={
+            'created_at': 'Date', 'product': 'Product', 'quantity': 'Quantity', 'balance_after': 'Balance',
+            'notes': 'Reason', 'created_by': 'By'
+        }), use_container_width=True)
+
+def show_stock_take():
+    """Stock take sessions: freeze expected stock, bulk-enter counts and post the variances"""
+    st.subheader("📦 Stock Take")
+    
+    takes = get_stock_takes()
+    open_takes = takes[takes['status'] == 'counting']
+    with st.expander("Start a Stock Take", expanded=open_takes.empty):
+        locations = get_locations()
+        location_names = dict(zip(locations['code'] + ' - ' + locations['name'], locations['id']))
+        with st.form("stock_take_start"):
             col1, col2 = st.columns(2)
             with col1:
-                product = st.selectbox("Product", ["Laptop Pro", "Wireless Mouse", "USB Cable", "Monitor Stand", "Keyboard"])
-                adjustment_type = st.selectbox("Adjustment Type", ["Increase", "Decrease", "Set to Value"])
-            
+                location = st.selectbox("Location", list(location_names), key="stock_take_location")
             with col2:
-                quantity = st.number_input("Quantity", min_value=0, value=1)
-                reason = st.selectbox("Reason", ["Damaged", "Lost", "Found", "Correction", "Transfer", "Other"])
-            
-            notes = st.text_area("Notes", placeholder="Detailed explanation for the adjustment")
-            
-            if st.form_submit_button("Submit Adjustment", use_container_width=True):
-                st.success(f"✅ Stock adjustment for '{product}' submitted successfully!")
+                category = st.selectbox("Category", ['All'] + get_catalog_values()['category'])
+            notes = st.text_input("Notes", key="stock_take_notes")
+            if st.form_submit_button("Freeze Expected Stock and Start", use_container_width=True):
+                stock_take_id, take_number, lines = start_stock_take(
+                    int(location_names[location]), None if category == 'All' else category,
+                    st.session_state.get('username'), notes or None)
+                log_event('stock_take_started', st.session_state.get('username'), 'stock_take', stock_take_id,
+                          f"{take_number}: {lines} products at {location}")
+                st.success(f"✅ {take_number} started with {lines} products")
+                st.rerun()
+    
+    if open_takes.empty:
+        st.info("No stock take in progress")
+    else:
+        take_numbers = dict(zip(open_takes['take_number'], open_takes['id']))
+        selected = st.selectbox("Stock Take", list(take_numbers))
+        stock_take_id = int(take_numbers[selected])
         
-        st.markdown("---")
+        col1, col2 = st.columns(2)
+        with col1:
+            upload = st.file_uploader("Counts CSV (columns: sku, counted)", type=['csv'], key="stock_take_csv")
+            if upload is not None and st.button("Load Counts"):
+                try:
+                    updated, unknown = record_counts(stock_take_id, read_count_csv(upload.getvalue()), 'set')
+                    st.success(f"✅ {updated} counts loaded")
+                    if unknown:
+                        st.warning(f"Not in this stock take: {', '.join(unknown[:20])}")
+                except ValueError as e:
+                    st.error(f"❌ {e}")
+        with col2:
+            # A form so scanning does not rerun the page per line
+            with st.form("stock_take_scans", clear_on_submit=True):
+                scans = st.text_area("Scanner Input", height=150,
+                                     placeholder="One scan per line: SKU, or SKU,quantity")
+                if st.form_submit_button("Add Scans", use_container_width=True) and scans.strip():
+                    try:
+                        updated, unknown = record_counts(stock_take_id, read_scanner_input(scans), 'add')
+                        st.success(f"✅ {updated} products updated")
+                        if unknown:
+                            st.warning(f"Not in this stock take: {', '.join(unknown[:20])}")
+                    except ValueError as e:
+                        st.error(f"❌ {e}")
         
-        # Recent adjustments
-        st.subheader("Recent Adjustments")
-        adjustments_data = {
-            'Date': ['2024-01-20', '2024-01-18', '2024-01-15'],
-            'Product': ['Monitor Stand', 'Laptop Pro', 'USB Cable'],
-            'Type': ['Decrease', 'Decrease', 'Increase'],
-            'Quantity': [-1, -1, +25],
-            'Reason': ['Damaged', 'Lost', 'Found'],
-            'By': ['Admin', 'Manager', 'Staff']
-        }
+        uncounted_as_zero = st.checkbox("Treat uncounted products as zero", value=False)
+        lines = get_stock_take_lines(stock_take_id, uncounted_as_zero)
+        differences = lines[lines['variance'].fillna(0) != 0]
+        col1, col2, col3, col4 = st.columns(4)
+        with col1:
+            st.metric("Counted", f"{lines['counted_quantity'].notna().sum()} / {len(lines)}")
+        with col2:
+            st.metric("Variances", len(differences))
+        with col3:
+            st.metric("Net Units", int(differences['variance'].sum()))
+        with col4:
+            st.metric("Net Value (Cost)", format_currency(differences['variance_value'].sum(), 'IDR'))
+        st.dataframe(differences[['sku', 'product', 'expected_quantity', 'counted_quantity', 'variance',
+                                  'variance_pct', 'variance_value']], use_container_width=True)
         
-        df_adjustments = pd.DataFrame(adjustments_data)
-        st.dataframe(df_adjustments, use_container_width=True)
+        col1, col2 = st.columns(2)
+        with col1:
+            if st.button("✅ Post Variances", use_container_width=True):
+                try:
+                    result = post_stock_take(stock_take_id, st.session_state.get('username'), uncounted_as_zero)
+                    log_event('stock_take_posted', st.session_state.get('username'), 'stock_take', stock_take_id,
+                              result)
+                    st.success(f"✅ {selected}: {result['adjustments']} adjustments posted")
+                except ValueError as e:
+                    st.error(f"❌ {e}")
+        with col2:
+            if st.button("❌ Cancel Stock Take", use_container_width=True):
+                cancel_stock_take(stock_take_id)
+                st.rerun()
     
-    with tab4:
-        st.subheader("Inventory Alerts")
-        
-        # Alert summary
+    if not takes.empty:
+        st.markdown("**Recent Stock Takes**")
+        st.dataframe(takes.drop(columns=['id', 'created_ts', 'posted_ts']), use_container_width=True)
+
+def show_locations():
+    """Stock per depot, transfers between depots and depot setup"""
+    st.subheader("Stock by Location")
+    
+    summary = get_location_summary()
+    col1, col2 = st.columns([3, 2])
+    with col1:
+        st.dataframe(pd.DataFrame({
+            'Location': summary['code'] + ' - ' + summary['name'],
+            'Products': summary['products'],
+            'Units': summary['units'],
+            'Reserved': summary['reserved'],
+            'Value (Cost)': [format_currency(value, 'IDR') for value in summary['value']]
+        }), use_container_width=True)
+    with col2:
+        fig = px.pie(summary, values='units', names='code', title="Units by Location")
+        st.plotly_chart(fig, use_container_width=True)
+    
+    stock = get_location_stock()
+    if not stock.empty:
+        matrix = stock.pivot_table(index='product', columns='location', values='available_quantity',
+                                   aggfunc='sum', fill_value=0)
+        st.markdown("**Available Stock (Product × Location)**")
+        st.dataframe(matrix, use_container_width=True)
+    
+    st.markdown("---")
+    st.subheader("🚚 Transfer Stock")
+    locations = get_locations()
+    location_names = dict(zip(locations['code'] + ' - ' + locations['name'], locations['id']))
+    products = get_products()
+    if len(location_names) < 2:
+        st.info("Add a second location below to transfer stock between depots")
+    else:
+        with st.form("stock_transfer"):
+            col1, col2 = st.columns(2)
+            with col1:
+                from_location = st.selectbox("From", list(location_names))
+                product = st.selectbox("Product", products['name'].tolist(), key="transfer_product")
+            with col2:
+                to_location = st.selectbox("To", list(location_names), index=1)
+                quantity = st.number_input("Quantity", min_value=1, value=1, key="transfer_quantity")
+            notes = st.text_input("Notes", key="transfer_notes")
+            
+            if st.form_submit_button("Transfer", use_container_width=True):
+                product_id = int(products.loc[products['name'] == product, 'id'].iloc[0])
+                try:
+                    transfer_id, transfer_number = create_transfer(
+                        int(location_names[from_location]), int(location_names[to_location]),
+                        [{'product_id': product_id, 'quantity': int(quantity)}],
+                        st.session_state.get('username'), notes or None)
+                    log_event('stock_transfer', st.session_state.get('username'), 'stock_transfer', transfer_id,
+                              f"{transfer_number}: {quantity} x {product} {from_location} -> {to_location}")
+                    st.success(f"✅ {transfer_number}: {quantity} x {product} moved to {to_location}")
+                except ValueError as e:
+                    st.error(f"❌ {e}")
+    
+    transfers = get_transfers()
+    if not transfers.empty:
+        st.markdown("**Recent Transfers**")
+        st.dataframe(transfers.drop(columns=['id', 'created_ts']), use_container_width=True)
+    
+    st.markdown("---")
+    with st.expander("🏭 Add or Update Location"):
+        with st.form("location_form"):
+            col1, col2 = st.columns(2)
+            with col1:
+                code = st.text_input("Code", placeholder="e.g. SBY")
+                name = st.text_input("Name", placeholder="e.g. Surabaya Depot")
+                address = st.text_input("Address")
+            with col2:
+                latitude = st.number_input("Latitude", value=-6.2088, format="%.6f")
+                longitude = st.number_input("Longitude", value=106.8456, format="%.6f")
+                active = st.checkbox("Active", value=True)
+            if st.form_submit_button("Save Location", use_container_width=True):
+                if code and name:
+                    save_location(code, name, address or None, latitude, longitude, active)
+                    st.success(f"✅ Location {code.upper()} saved")
+                else:
+                    st.error("❌ Code and name are required")
+        st.dataframe(get_locations(active_only=False), use_container_width=True)
+
+def show_purchase_orders():
+    """Reorder suggestions and the purchase orders drafted from them"""
+    st.subheader("Reorder Suggestions")
+    st.caption("Stock + inbound - reserved against the higher of the min/max levels and forecast demand")
+    
+    suggestions = get_reorder_suggestions()
+    if suggestions.empty:
+        st.success("✅ Every product is above its reorder point")
+    else:
         col1, col2, col3 = st.columns(3)
         with col1:
-            st.error("**Critical Alerts: 3**")
+            st.metric("Products to Reorder", len(suggestions))
         with col2:
-            st.warning("**Low Stock Alerts: 8**")
+            st.metric("Suppliers", suggestions['supplier'].nunique())
         with col3:
-            st.info("**Reorder Alerts: 5**")
-        
-        # Detailed alerts
-        alerts_data = {
-            'Priority': ['🔴 Critical', '🟡 Low Stock', '🟡 Low Stock', '🔵 Reorder', '🔵 Reorder'],
-            'Product': ['Monitor Stand', 'Wireless Headset', 'Power Bank', 'Laptop Pro', 'USB Cable'],
-            'Current Stock': [5, 8, 12, 25, 200],
-            'Min Level': [20, 15, 25, 10, 100],
-            'Recommended Action': ['Immediate Purchase', 'Order Soon', 'Order Soon', 'Consider Reorder', 'Monitor'],
-            'Supplier': ['OfficeSupply Ltd', 'AudioTech', 'PowerCorp', 'TechSupplier Inc', 'CableCorp']
-        }
+            st.metric("Value (Cost)", format_currency((suggestions['quantity'] * suggestions['unit_cost']).sum(), 'IDR'))
+        st.dataframe(suggestions[['supplier', 'sku', 'name', 'stock_quantity', 'inbound', 'reserved', 'position',
+                                  'reorder_point', 'target', 'quantity']], use_container_width=True)
+    
+    if st.button("📋 Generate Purchase Orders", key="purchase_orders_generate"):
+        start_job('generate_purchase_orders', {'created_by': st.session_state.get('username')})
+    show_jobs_panel(['generate_purchase_orders'])
+    
+    st.markdown("---")
+    st.subheader("Purchase Orders")
+    status = st.selectbox("Status", ['All'] + list(PO_STATUSES), key="purchase_orders_status")
+    orders = get_purchase_orders(None if status == 'All' else status)
+    if orders.empty:
+        st.info("No purchase orders")
+    else:
+        st.dataframe(orders.drop(columns=['id', 'created_ts', 'updated_ts']), use_container_width=True)
         
-        df_alerts = pd.DataFrame(alerts_data)
-        st.dataframe(df_alerts, use_container_width=True)
+        order_numbers = dict(zip(orders['po_number'], orders['id']))
+        selected = st.selectbox("Purchase Order", list(order_numbers), key="purchase_orders_selected")
+        purchase_order_id = int(order_numbers[selected])
+        st.dataframe(get_purchase_order_items(purchase_order_id).drop(columns=['id', 'product_id']),
+                     use_container_width=True)
         
-        # Alert actions
-        col1, col2 = st.columns(2)
-        with col1:
-            if st.button("📧 Send Alert Emails", use_container_width=True):
-                st.success("Alert emails sent to purchasing team!")
-        with col2:
-            if st.button("📋 Generate Purchase Orders", use_container_width=True):
-                st.info("Automatic PO generation feature coming soon!")
+        current = orders.loc[orders['id'] == purchase_order_id, 'status'].iloc[0]
+        if current in ('draft', 'ordered'):
+            col1, col2, col3 = st.columns(3)
+            actions = {}
+            with col1:
+                actions['ordered'] = current == 'draft' and st.button("📤 Mark Ordered", use_container_width=True)
+            with col2:
+                actions['received'] = st.button("📥 Receive", use_container_width=True)
+            with col3:
+                actions['cancelled'] = st.button("❌ Cancel", use_container_width=True)
+            for new_status, clicked in actions.items():
+                if clicked:
+                    try:
+                        update_purchase_order_status(purchase_order_id, new_status, st.session_state.get('username'))
+                        log_event('purchase_order_status_changed', st.session_state.get('username'),
+                                  'purchase_order', purchase_order_id, f"{selected}: {current} -> {new_status}")
+                        st.success(f"✅ {selected} is now {new_status}")
+                    except ValueError as e:
+                        st.error(f"❌ {e}")
 
 def show_stock_details(product_sku):
     """Show detailed stock information for a specific product"""
     st.subheader(f"Stock Details - {product_sku}")
     
+    products = get_products()
+    product = products[products['sku'] == product_sku].iloc[0]
+    product_id = int(product['id'])
+    
     tab1, tab2, tab3 = st.tabs(["Current Status", "Movement History", "Forecasting"])
     
     with tab1:
+        month_ago = get_stock_at(product_id, date.today() - timedelta(days=30))
         col1, col2 = st.columns(2)
         with col1:
-            st.metric("Current Stock", "25")
-            st.metric("Available Stock", "23")
-            st.metric("Reserved Stock", "2")
+            st.metric("Current Stock", int(product['stock_quantity']),
+                      int(product['stock_quantity'] - month_ago) if month_ago is not None else None)
+            st.metric("Available Stock", int(product['available_quantity']))
+            st.metric("Reserved Stock", int(product['reserved_quantity'] or 0))
         
         with col2:
-            st.metric("Min Level", "10")
-            st.metric("Max Level", "100")
-            st.metric("Reorder Point", "15")
+            st.metric("Stock 30 Days Ago", month_ago)
+            st.metric("Min Level", product['min_stock_level'])
+            st.metric("Max Level", product['max_stock_level'])
+        
+        by_location = get_location_stock(product_id=product_id)
+        if not by_location.empty:
+            st.markdown("**Stock by Location**")
+            st.dataframe(by_location[['location', 'quantity', 'reserved_quantity', 'available_quantity']],
+                         use_container_width=True)
+        
+        reservations = get_reservations(product_id)
+        if not reservations.empty:
+            st.markdown("**Open Reservations**")
+            st.dataframe(reservations[['order_number', 'quantity', 'created_by', 'expires_ts']], use_container_width=True)
     
     with tab2:
-        st.write("Detailed movement history will be displayed here")
+        history = get_movement_history(product_id, limit=500)
+        if history.empty:
+            st.info("No movements recorded for this product")
+        else:
+            fig = px.line(history.sort_values('id'), x='created_at', y='balance_after', line_shape='hv',
+                          title="Stock Balance", labels={'created_at': 'Date', 'balance_after': 'Balance'})
+            st.plotly_chart(fig, use_container_width=True)
+            st.dataframe(history[['created_at', 'transaction_type', 'quantity', 'balance_after',
+                                  'reference_type', 'reference_id', 'notes', 'created_by']],
+                         use_container_width=True)
     
     with tab3:
-        st.write("Stock forecasting and demand planning will be displayed here")
+        demand = get_product_demand(product_id)
+        forecast = get_product_forecast(product_id)
+        if forecast.empty:
+            st.info("No forecast yet; it is generated nightly or with Refresh Forecasts below")
+        else:
+            next_week = forecast['quantity'].head(7).sum()
+            daily = forecast['quantity'].mean()
+            col1, col2, col3, col4 = st.columns(4)
+            with col1:
+                st.metric("Model", forecast['model'].iloc[0].replace('_', '-').title())
+            with col2:
+                st.metric("Next 7 Days", f"{next_week:,.0f}")
+            with col3:
+                st.metric(f"Next {len(forecast)} Days", f"{forecast['quantity'].sum():,.0f}")
+            with col4:
+                st.metric("Days of Cover", f"{product['available_quantity'] / daily:,.0f}" if daily > 0 else "-")
+            
+            fig = go.Figure()
+            fig.add_trace(go.Scatter(x=forecast['date'], y=forecast['upper_bound'], line=dict(width=0),
+                                     showlegend=False, hoverinfo='skip'))
+            fig.add_trace(go.Scatter(x=forecast['date'], y=forecast['lower_bound'], line=dict(width=0),
+                                     fill='tonexty', fillcolor='rgba(31, 119, 180, 0.2)', name='95% band'))
+            fig.add_trace(go.Scatter(x=demand['date'], y=demand['quantity'], name='Ordered', mode='lines'))
+            fig.add_trace(go.Scatter(x=forecast['date'], y=forecast['quantity'], name='Forecast',
+                                     mode='lines', line=dict(dash='dash')))
+            fig.update_layout(title="Daily Demand and Forecast", xaxis_title="Date", yaxis_title="Units")
+            st.plotly_chart(fig, use_container_width=True)
+        
+        if st.button("🔄 Refresh Forecasts"):
+            start_job('forecast_demand')
+        show_jobs_panel(['forecast_demand'])
@@ -0,0 +1,70 @@
+import os
+import streamlit as st
+from utils.jobs import cancel_job, enqueue_job, get_jobs
+
+STATUS_ICONS = {
+    'queued': '⏳ Queued',
+    'running': '🔄 Running',
+    'succeeded': '✅ Done',
+    'failed': '❌ Failed',
+    'cancelled': '🚫 Cancelled'
+}
+
+JOB_LABELS = {
+    'export_sales_report': 'Sales Report Export',
+    'email_report': 'Email Report',
+    'backup_database': 'Database Backup',
+    'generate_purchase_orders': 'Purchase Order Generation',
+    'generate_report': 'Scheduled Report',
+    'export_analytics': 'Analytics Export',
+    'archive_cold_data': 'Cold-Data Archive',
+    'prune_change_log': 'Sync Change-Log Cleanup',
+    'bulk_price_update': 'Bulk Price Update',
+    'snapshot_stock_balances': 'Stock Balance Snapshot',
+    'expire_stock_reservations': 'Reservation Expiry',
+    'forecast_demand': 'Demand Forecast',
+    'send_alert_digest': 'Stock Alert Digest',
+    'segment_customers': 'Customer Segmentation'
+}
+
+def start_job(job_type, params=None, label=None):
+    """Queue a background job for the current user and confirm it in the UI"""
+    job_id = enqueue_job(job_type, params, created_by=st.session_state.get('username'))
+    st.success(f"✅ {label or JOB_LABELS.get(job_type, job_type)} started in the background (job #{job_id})")
+    return job_id
+
+def show_jobs_panel(job_types=None, title="🗂️ My Background Jobs", limit=10):
+    """Show the current user's recent jobs with progress, results and cancel buttons"""
+    jobs = get_jobs(created_by=st.session_state.get('username'), job_types=job_types, limit=limit)
+    if not jobs:
+        return
+
+    with st.expander(title, expanded=any(job['status'] in ('queued', 'running') for job in jobs)):
+        if st.button("🔄 Refresh", key=f"refresh_jobs_{title}"):
+            st.rerun()
+
+        for job in jobs:
+            col1, col2, col3 = st.columns([3, 2, 1])
+
+            with col1:
+                st.write(f"**#{job['id']} {JOB_LABELS.get(job['job_type'], job['job_type'])}**")
+                st.caption(f"{job['created_at']} · {job['message'] or ''}")
+                if job['status'] == 'running':
+                    st.progress(job['progress'] or 0.0)
+                if job['status'] == 'failed' and job['error']:
+                    st.caption(f"⚠️ {job['error']}")
+
+            with col2:
+                st.write(STATUS_ICONS.get(job['status'], job['status']))
+                result = job['result'] or {}
+                path = result.get('path')
+                if job['status'] == 'succeeded' and path and os.path.exists(path):
+                    with open(path, 'rb') as f:
+                        st.download_button("📥 Download", data=f.read(), file_name=os.path.basename(path),
+                                           key=f"download_job_{job['id']}")
+
+            with col3:
+                if job['status'] in ('queued', 'running'):
+                    if st.button("🚫", key=f"cancel_job_{job['id']}", help="Cancel job"):
+                        cancel_job(job['id'])
+                        st.rerun()
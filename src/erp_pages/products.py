@@ -1,8 +1,17 @@
 import streamlit as st
 import pandas as pd
+import uuid
 from datetime import datetime
-from utils.helpers import format_currency
+from utils.helpers import INDONESIA_TZ, format_currency
 from utils.translations import t
+from utils.audit import log_event
+from utils.pricing import (add_price_rule, delete_price_rule, get_customer_groups,
+                           get_price_lists, get_price_rules, save_price_list, set_customer_group)
+from database.repository import get_products, get_catalog_values
+from utils.price_updates import (describe_update, get_price_updates, preview_price_update, read_price_csv,
+                                 save_upload)
+from erp_pages.jobs import show_jobs_panel, start_job
+from erp_pages.customers import get_customer_options
 
 def show_products():
     """Product Management Page for FMCG Business"""
@@ -59,7 +68,7 @@ def show_products():
                 st.info("Stock report feature coming soon!")
         with col2:
             if st.button("🏷️ Update Prices"):
-                st.info("Price update feature coming soon!")
+                st.session_state.show_price_update = not st.session_state.get('show_price_update', False)
         with col3:
             if st.button("📦 Restock Alert"):
                 st.info("Restock management feature coming soon!")
@@ -73,6 +82,10 @@ def show_products():
                     mime="text/csv"
                 )
     
+        
+        if st.session_state.get('show_price_update'):
+            show_bulk_price_update()
+    
     with tab2:
         st.subheader(t("add_product"))
         
@@ -180,19 +193,85 @@ def show_products():
         # Pricing tier management
         st.markdown("---")
         st.subheader("Pricing Tier Rules")
+        st.caption("Rules are applied in price-list priority order; product rules beat catalog-wide ones, "
+                   "customer-group lists beat lists for everyone, and the highest reached tier wins")
         
-        pricing_rules = {
-            'Tier': ['Unit Price', 'Bulk Price', 'Wholesale Price'],
-            'Min Quantity': [1, 50, 100],
-            'Discount %': ['0%', '10%', '20%'],
-            'Description': ['Single unit purchase', 'Bulk purchase discount', 'Wholesale/distributor price']
-        }
-        
-        df_pricing = pd.DataFrame(pricing_rules)
-        st.dataframe(df_pricing, use_container_width=True)
+        rules = get_price_rules()
+        if not rules.empty:
+            st.dataframe(pd.DataFrame({
+                'Price List': rules['price_list'],
+                'Customer Group': rules['customer_group'].fillna('All customers'),
+                'Priority': rules['priority'],
+                'Product': rules['product'],
+                'Min Quantity': rules['min_quantity'],
+                'Price': rules['price'].map(lambda v: format_currency(v, 'IDR') if pd.notna(v) else '-'),
+                'Discount %': rules['discount_percentage'].map(lambda v: f"{v:g}%" if pd.notna(v) else '-'),
+                'Valid': [f"{from_key or '…'} – {to_key or '…'}" for from_key, to_key in
+                          zip(rules['valid_from'].fillna(0).astype(int), rules['valid_to'].fillna(0).astype(int))]
+            }), use_container_width=True)
         
-        if st.button("🔧 Configure Pricing Rules"):
-            st.info("Advanced pricing configuration feature coming soon!")
+        with st.expander("🔧 Configure Pricing Rules"):
+            price_lists = {p['name']: p for p in get_price_lists()}
+            catalog = get_products()
+            products_by_name = dict(zip(catalog['name'], catalog['id']))
+            
+            with st.form("price_rule"):
+                col1, col2 = st.columns(2)
+                with col1:
+                    list_name = st.selectbox("Price List", list(price_lists) + ["➕ New price list"])
+                    new_list_name = st.text_input("New List Name")
+                    customer_group = st.text_input("Customer Group (new list, empty = all customers)")
+                    priority = st.number_input("Priority (new list)", min_value=0, value=0)
+                with col2:
+                    rule_product = st.selectbox("Product", ["All products"] + list(products_by_name))
+                    min_quantity = st.number_input("Minimum Quantity", min_value=1, value=1)
+                    rule_kind = st.radio("Rule", ["Discount %", "Fixed price (IDR)"], horizontal=True)
+                    rule_value = st.number_input("Value", min_value=0.0, value=0.0)
+                    valid_dates = st.date_input("Valid From / To (optional)", value=())
+                
+                if st.form_submit_button("💾 Save Rule"):
+                    if list_name == "➕ New price list":
+                        if not new_list_name:
+                            st.error("❌ Enter a name for the new price list")
+                            st.stop()
+                        price_list_id = save_price_list(new_list_name, customer_group or None, int(priority))
+                    else:
+                        price_list_id = price_lists[list_name]['id']
+                    dates = list(valid_dates) + [None, None]
+                    add_price_rule(
+                        price_list_id, products_by_name.get(rule_product), int(min_quantity),
+                        price=int(rule_value) if rule_kind.startswith("Fixed") else None,
+                        discount_percentage=rule_value if rule_kind.startswith("Discount") else None,
+                        valid_from=dates[0], valid_to=dates[1])
+                    log_event('price_rule_added', st.session_state.get('username'), 'price_list', price_list_id,
+                              f"{rule_product} from {int(min_quantity)}: {rule_kind} {rule_value:g}")
+                    st.success("✅ Pricing rule saved")
+                    st.rerun()
+            
+            if not rules.empty:
+                col1, col2 = st.columns([3, 1])
+                with col1:
+                    rule_labels = {f"#{r.id} {r.price_list} / {r.product} ≥ {r.min_quantity}": r.id
+                                   for r in rules.itertuples()}
+                    rule_to_delete = st.selectbox("Remove Rule", list(rule_labels))
+                with col2:
+                    if st.button("🗑️ Remove"):
+                        delete_price_rule(rule_labels[rule_to_delete])
+                        log_event('price_rule_removed', st.session_state.get('username'), 'price_list_item',
+                                  rule_labels[rule_to_delete])
+                        st.rerun()
+            
+            st.markdown("**Customer Groups**")
+            customers = get_customer_options()
+            col1, col2, col3 = st.columns([2, 2, 1])
+            with col1:
+                group_customer = st.selectbox("Customer", list(customers), key="group_customer")
+            with col2:
+                group_name = st.selectbox("Group", ["(none)"] + get_customer_groups(), key="group_name")
+            with col3:
+                if st.button("Assign"):
+                    set_customer_group(customers[group_customer], None if group_name == "(none)" else group_name)
+                    st.success(f"✅ {group_customer} → {group_name}")
     
     with tab4:
         st.subheader("Product Categories")
@@ -284,3 +363,102 @@ def show_products():
     
     with tab4:
         st.write("Supplier information and purchase history will be displayed here")
+
+def show_bulk_price_update():
+    """Preview and apply catalog-wide price changes from rules or a CSV"""
+    st.markdown("---")
+    st.subheader("🏷️ Bulk Price Update")
+    st.caption("Rules apply in order; prices in the CSV (columns: sku, price) override rule results")
+    
+    catalog = get_catalog_values()
+    if 'price_update_rules' not in st.session_state:
+        st.session_state.price_update_rules = []
+    
+    col1, col2, col3, col4, col5 = st.columns([2, 3, 2, 2, 1])
+    with col1:
+        rule_field = st.selectbox("Apply to", ["category", "supplier"], format_func=str.title)
+    with col2:
+        rule_value = st.selectbox("Value", catalog[rule_field])
+    with col3:
+        rule_kind = st.selectbox("Change", ["percent", "amount"],
+                                 format_func=lambda k: "Percentage" if k == 'percent' else "Amount (IDR)")
+    with col4:
+        rule_change = st.number_input("By", value=0.0, step=1.0)
+    with col5:
+        st.write("")
+        if st.button("➕", key="add_price_update_rule") and rule_value and rule_change:
+            st.session_state.price_update_rules.append(
+                {'field': rule_field, 'value': rule_value, 'kind': rule_kind, 'change': rule_change})
+            st.rerun()
+    
+    rules = st.session_state.price_update_rules
+    if rules:
+        st.write("Rules: " + describe_update(rules))
+        if st.button("Clear Rules"):
+            st.session_state.price_update_rules = []
+            st.rerun()
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        uploaded = st.file_uploader("Price file (CSV)", type=['csv'])
+    with col2:
+        round_to = st.selectbox("Round new prices to", [1, 100, 500, 1000],
+                                format_func=lambda r: "Exact rupiah" if r == 1 else f"Nearest {format_currency(r, 'IDR')}")
+    
+    csv_rows = None
+    if uploaded is not None:
+        try:
+            csv_rows = read_price_csv(uploaded.getvalue())
+        except ValueError as e:
+            st.error(f"❌ {e}")
+            return
+    
+    if not rules and csv_rows is None:
+        return
+    
+    diff, summary = preview_price_update(rules, csv_rows, round_to, limit=500)
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("Products Changing", f"{summary['changed']:,}")
+    with col2:
+        st.metric("Total Price Difference", format_currency(summary['total_difference'], 'IDR'))
+    with col3:
+        st.metric("Unknown SKUs", len(summary['unknown_skus']))
+    if summary['unknown_skus']:
+        st.warning(f"Not in the catalog (ignored): {', '.join(summary['unknown_skus'][:20])}")
+    if not diff.empty:
+        st.dataframe(pd.DataFrame({
+            'SKU': diff['sku'], 'Product': diff['name'], 'Category': diff['category'],
+            'Old Price': diff['old_price'].map(lambda v: format_currency(v, 'IDR')),
+            'New Price': diff['new_price'].map(lambda v: format_currency(v, 'IDR')),
+            'Change': diff['change_pct'].map(lambda v: f"{v:+.2f}%" if pd.notna(v) else '-')
+        }), use_container_width=True)
+        if summary['changed'] > len(diff):
+            st.caption(f"Showing the first {len(diff)} of {summary['changed']:,} changes")
+    
+    if summary['changed'] and st.button(f"✅ Apply {summary['changed']:,} Price Changes", type="primary"):
+        username = st.session_state.get('username')
+        params = {
+            'update_key': uuid.uuid4().hex,
+            'rules': rules,
+            'round_to': round_to,
+            'description': describe_update(rules, uploaded.name if uploaded else None, round_to),
+            'created_by': username
+        }
+        if uploaded is not None:
+            params['csv_path'] = save_upload(uploaded.getvalue())
+        start_job('bulk_price_update', params)
+        log_event('price_update_started', username, 'price_update', params['update_key'], params['description'])
+        st.session_state.price_update_rules = []
+    
+    show_jobs_panel(['bulk_price_update'])
+    
+    updates = get_price_updates(10)
+    if updates:
+        with st.expander("Recent Price Updates"):
+            st.dataframe(pd.DataFrame([{
+                'When': datetime.fromtimestamp(u['applied_ts'], INDONESIA_TZ).strftime('%d-%m-%Y %H:%M'),
+                'By': u['created_by'] or '-',
+                'Update': u['description'],
+                'Products Changed': u['products_changed']
+            } for u in updates]), use_container_width=True)
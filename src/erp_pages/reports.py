@@ -3,11 +3,62 @@ import pandas as pd
 import plotly.express as px
 from datetime import datetime, date
 from utils.helpers import format_currency
+from utils.reporting import build_report, load_report_summary, REPORT_TITLES
+from utils.analytics import get_export_status, run_query
+from database.costing import get_cogs, get_inventory_value_at
+from database.repository import wib_date_key
+from database.snapshot import refresh_snapshot, snapshot_caption
+from utils.segmentation import get_customer_segments, get_segment_counts
+from erp_pages.jobs import show_jobs_panel, start_job
+
+def get_report_summary(name):
+    """Cached summary from the scheduled run, computed live only if none exists yet"""
+    summary = load_report_summary(name)
+    if summary is None:
+        _, summary = build_report(name)
+        st.caption(f"⚙️ {REPORT_TITLES[name]} computed from the reporting snapshot (no scheduled run yet)")
+    else:
+        st.caption(f"📦 {REPORT_TITLES[name]} precomputed at {summary['generated_at']}")
+    return summary
+
+ENGINE_LABELS = {'duckdb': '🦆 DuckDB over Parquet', 'sqlite': '🗄️ SQLite snapshot'}
+
+def run_report_query(name, start_date, end_date):
+    """Run an analytics query for the selected period and note which engine answered it"""
+    df, engine = run_query(name, (wib_date_key(start_date), wib_date_key(end_date)))
+    st.caption(f"Engine: {ENGINE_LABELS.get(engine, engine)}")
+    return df
+
+def show_analytics_engine():
+    """Export status and manual export"""
+    with st.expander("⚙️ Analytics Engine"):
+        status = get_export_status()
+        if status:
+            st.dataframe(pd.DataFrame([{
+                'Table': row['fact'],
+                'Exported Up To ID': row['last_id'],
+                'Partitions Written': row['partitions_written'],
+                'Exported At': datetime.fromtimestamp(row['exported_ts']).strftime('%d-%m-%Y %H:%M') if row['exported_ts'] else '-'
+            } for row in status]), use_container_width=True)
+        else:
+            st.info("No Parquet export yet; reports run on the SQLite snapshot.")
+        
+        if st.button("📦 Export to Parquet Now"):
+            start_job('export_analytics')
+        show_jobs_panel(['export_analytics'])
 
 def show_reports():
     """Reports & Analytics Page"""
     st.header("📋 Reports & Analytics")
     
+    col1, col2 = st.columns([4, 1])
+    with col1:
+        st.caption(snapshot_caption())
+    with col2:
+        if st.button("🔄 Refresh Snapshot", use_container_width=True):
+            refresh_snapshot()
+            st.rerun()
+    
     tab1, tab2, tab3 = st.tabs(["Sales Reports", "Inventory Reports", "Customer Reports"])
     
     with tab1:
@@ -20,73 +71,174 @@ def show_reports():
         with col2:
             end_date = st.date_input("End Date", value=date.today())
         
-        # Sales metrics
+        # Sales metrics (last 7 days, precomputed by the weekly report)
+        weekly = get_report_summary('sales_weekly')
         col1, col2, col3 = st.columns(3)
         with col1:
-            st.metric("Total Revenue", format_currency(678450000, 'IDR'), "15.2%")
+            st.metric("Total Revenue (7 days)", format_currency(weekly['revenue'], 'IDR'))
         with col2:
-            st.metric("Orders Completed", "156", "8.7%")
+            st.metric("Orders Completed", weekly['completed_orders'])
         with col3:
-            st.metric("Average Order Value", format_currency(4350000, 'IDR'), "12.1%")
+            st.metric("Average Order Value", format_currency(weekly['average_order_value'], 'IDR'))
         
         # Sales chart
-        dates = pd.date_range(start=start_date, end=end_date, freq='D')[:30]
-        sales = [1200 + i*50 + (i%7)*200 for i in range(len(dates))]
+        daily = get_report_summary('sales_daily')
+        df_trend = pd.DataFrame(daily['trend'])
+        if len(df_trend):
+            fig = px.line(df_trend, x='date', y='revenue', title="Daily Sales Trend (Last 30 Days)")
+            st.plotly_chart(fig, use_container_width=True)
+        else:
+            st.info("No sales in the last 30 days.")
         
-        fig = px.line(x=dates, y=sales, title="Daily Sales Trend")
-        st.plotly_chart(fig, use_container_width=True)
+        # Selected period
+        st.markdown("**Selected Period**")
+        df_monthly = run_report_query('sales_by_month', start_date, end_date)
+        if len(df_monthly):
+            fig = px.bar(df_monthly, x='order_month', y='revenue', title="Monthly Revenue (Selected Period)")
+            fig.update_layout(xaxis_title="Month", yaxis_title="Revenue (IDR)")
+            st.plotly_chart(fig, use_container_width=True)
+            df_reps = run_report_query('sales_by_rep', start_date, end_date)
+            st.dataframe(pd.DataFrame({
+                'Salesman': df_reps['sales_rep'].fillna('-'),
+                'Orders': df_reps['orders'],
+                'Revenue': [format_currency(v, 'IDR') for v in df_reps['revenue']]
+            }), use_container_width=True)
+        else:
+            st.info("No sales in the selected period.")
         
         # Export option
         col1, col2, col3 = st.columns(3)
         with col1:
             if st.button("📤 Export Sales Report"):
-                st.info("Sales report export feature coming soon!")
+                start_job('export_sales_report', {'start_date': str(start_date), 'end_date': str(end_date)})
         with col2:
             if st.button("📊 Generate Dashboard"):
                 st.info("Dashboard generation feature coming soon!")
         with col3:
             if st.button("📧 Email Report"):
-                st.info("Email report feature coming soon!")
+                start_job('email_report', {'start_date': str(start_date), 'end_date': str(end_date)})
+        
+        show_jobs_panel(['export_sales_report', 'email_report'])
     
     with tab2:
         st.subheader("Inventory Analysis")
         
-        # Inventory turnover
-        products = ['Laptop Pro', 'Wireless Mouse', 'USB Cable', 'Monitor Stand']
-        turnover = [12, 8, 15, 6]
+        inventory = get_report_summary('inventory')
         
-        fig = px.bar(x=products, y=turnover, title="Inventory Turnover Rate")
-        fig.update_layout(xaxis_title="Products", yaxis_title="Turnover Rate")
-        st.plotly_chart(fig, use_container_width=True)
+        # Inventory turnover
+        df_turnover = pd.DataFrame(inventory['turnover'])
+        if len(df_turnover):
+            fig = px.bar(df_turnover, x='name', y='turnover', title="Inventory Turnover Rate (30 Days)")
+            fig.update_layout(xaxis_title="Products", yaxis_title="Turnover Rate")
+            st.plotly_chart(fig, use_container_width=True)
         
         # Stock level analysis
-        stock_data = {
-            'Product': ['Laptop Pro', 'Wireless Mouse', 'USB Cable', 'Monitor Stand', 'Keyboard'],
-            'Current Stock': [25, 150, 200, 5, 80],
-            'Optimal Stock': [50, 200, 300, 75, 100],
-            'Status': ['⚠️ Below Optimal', '✅ Good', '✅ Good', '❌ Critical', '✅ Good']
-        }
-        
-        df_stock = pd.DataFrame(stock_data)
+        status_labels = {'Good': '✅ Good', 'Low': '⚠️ Below Minimum', 'Out of Stock': '❌ Critical'}
+        df_stock = pd.DataFrame([{
+            'Product': row['name'],
+            'Current Stock': row['stock_quantity'],
+            'Min Level': row['min_stock_level'],
+            'Optimal Stock': row['max_stock_level'],
+            'Status': status_labels.get(row['status'], row['status'])
+        } for row in inventory['stock']])
         st.dataframe(df_stock, use_container_width=True)
+        
+        # Valuation and margin for the period chosen on the Sales tab
+        st.markdown(f"**Valuation and Gross Margin ({start_date} – {end_date})**")
+        cogs = get_cogs(start_date, end_date)
+        col1, col2, col3, col4 = st.columns(4)
+        with col1:
+            st.metric(f"Inventory Value ({inventory.get('valuation_method', 'average').upper()})",
+                      format_currency(inventory['total_value'], 'IDR'))
+        with col2:
+            st.metric(f"Inventory Value at {end_date}", format_currency(get_inventory_value_at(end_date), 'IDR'))
+        with col3:
+            st.metric("COGS", format_currency(cogs['cogs'].sum(), 'IDR'))
+        with col4:
+            revenue = cogs['revenue'].sum()
+            st.metric("Gross Margin", format_currency(revenue - cogs['cogs'].sum(), 'IDR'),
+                      f"{(revenue - cogs['cogs'].sum()) / revenue * 100:.1f}%" if revenue else None)
+        if len(cogs):
+            st.dataframe(pd.DataFrame({
+                'Product': cogs['name'],
+                'Units Issued': cogs['units'],
+                'Revenue': [format_currency(v, 'IDR') for v in cogs['revenue']],
+                'COGS': [format_currency(v, 'IDR') for v in cogs['cogs']],
+                'Margin %': cogs['margin_pct']
+            }), use_container_width=True)
+        
+        # Product performance for the period chosen on the Sales tab
+        st.markdown(f"**Product Performance ({start_date} – {end_date})**")
+        df_products = run_report_query('product_performance', start_date, end_date)
+        if len(df_products):
+            st.dataframe(pd.DataFrame({
+                'Product': df_products['product'],
+                'Category': df_products['category'],
+                'Units Sold': df_products['units_sold'],
+                'Revenue': [format_currency(v, 'IDR') for v in df_products['revenue']],
+                'Turnover': df_products['turnover']
+            }), use_container_width=True)
+        else:
+            st.info("No products sold in the selected period.")
     
     with tab3:
         st.subheader("Customer Analytics")
         
-        # Customer segments
-        segments = ['New', 'Regular', 'VIP', 'Inactive']
-        counts = [45, 120, 25, 15]
+        # Customer segments (RFM, stored by the nightly segmentation job)
+        counts, computed_ts, queued = get_segment_counts()
+        if sum(counts.values()):
+            fig = px.pie(values=list(counts.values()), names=list(counts.keys()), title="Customer Segments")
+            st.plotly_chart(fig, use_container_width=True)
+            st.caption(f"📦 Segments computed at {datetime.fromtimestamp(computed_ts).strftime('%d-%m-%Y %H:%M')}"
+                       f" · {queued} customers with new orders waiting for the next refresh")
+        else:
+            st.info("No customer segments yet; run the segmentation to compute them.")
         
-        fig = px.pie(values=counts, names=segments, title="Customer Segments")
-        st.plotly_chart(fig, use_container_width=True)
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            segment = st.selectbox("Segment", ['All'] + list(counts.keys()))
+        with col2:
+            if st.button("🔄 Refresh Segments"):
+                start_job('segment_customers')
+        with col3:
+            if st.button("♻️ Full Recompute"):
+                start_job('segment_customers', {'full': True})
+        df_segments = get_customer_segments(None if segment == 'All' else segment)
+        if len(df_segments):
+            st.dataframe(pd.DataFrame({
+                'Customer': df_segments['customer'],
+                'Segment': df_segments['segment'],
+                'Orders': df_segments['frequency'],
+                'Total Value': [format_currency(v, 'IDR') for v in df_segments['monetary']],
+                'Last Order': pd.to_datetime(df_segments['last_order_ts'], unit='s', utc=True)
+                    .dt.tz_convert('Asia/Jakarta').dt.strftime('%d-%m-%Y'),
+                'R/F/M': df_segments['recency_score'].astype(str) + '/' + df_segments['frequency_score'].astype(str)
+                    + '/' + df_segments['monetary_score'].astype(str)
+            }), use_container_width=True)
+        show_jobs_panel(['segment_customers'])
         
         # Customer performance
-        customer_data = {
-            'Customer': ['PT. Teknologi Maju', 'CV. Bisnis Sukses', 'UD. Perdagangan Jaya', 'PT. Solusi Digital'],
-            'Total Orders': [12, 8, 15, 6],
-            'Total Value': [format_currency(150000000, 'IDR'), format_currency(80000000, 'IDR'), format_currency(200000000, 'IDR'), format_currency(60000000, 'IDR')],
-            'Last Order': ['2024-01-15', '2024-01-10', '2024-01-18', '2024-01-08']
-        }
-        
-        df_customers = pd.DataFrame(customer_data)
+        customers = get_report_summary('customers')
+        df_customers = pd.DataFrame([{
+            'Customer': row['name'],
+            'Total Orders': row['total_orders'],
+            'Total Value': format_currency(row['total_value'] or 0, 'IDR'),
+            'Last Order': row['last_order'] or '-'
+        } for row in customers['top_customers']])
         st.dataframe(df_customers, use_container_width=True)
+        
+        # Customer revenue for the period chosen on the Sales tab
+        st.markdown(f"**Customer Revenue ({start_date} – {end_date})**")
+        df_period = run_report_query('customer_analytics', start_date, end_date)
+        if len(df_period):
+            st.dataframe(pd.DataFrame({
+                'Customer': df_period['customer'],
+                'Company': df_period['company'],
+                'Orders': df_period['orders'],
+                'Revenue': [format_currency(v, 'IDR') for v in df_period['revenue']],
+                'Last Order': df_period['last_order']
+            }), use_container_width=True)
+        else:
+            st.info("No customer orders in the selected period.")
+    
+    show_analytics_engine()
@@ -1,7 +1,17 @@
 import streamlit as st
 import pandas as pd
+import plotly.express as px
 from utils.helpers import format_currency
 from utils.translations import t
+from utils.metrics import ORDERS_CREATED
+from utils.audit import log_event
+from erp_pages.jobs import show_jobs_panel, start_job
+from database.repository import create_sales_order, get_order_history, get_products
+from database.reservations import InsufficientStockError, update_order_status
+from database.credit import CreditLimitError
+from database.payments import AGING_BUCKETS, get_aging_report, get_open_invoices, record_payment
+from utils.pricing import quote_price
+from erp_pages.customers import get_customer_options
 from datetime import datetime, date, timedelta
 
 def show_sales():
@@ -105,16 +115,12 @@ def show_create_sale():
     
     with col1:
         sale_date = st.date_input(t("sale_date"), value=date.today())
-        order_id = st.text_input("Order ID", value=f"PF{datetime.now().strftime('%Y%m%d%H%M')}", disabled=True)
+        # The number is taken from the order sequence when the order is saved
+        st.text_input("Order ID", value="Assigned on save", disabled=True)
     
     with col2:
-        # Customer selection with FMCG customers
-        customers = [
-            "Toko Sari Rasa", "Warung Maju Jaya", "Supermarket Harapan", 
-            "Toko Berkah", "Minimarket Sejahtera", "Toko Makmur",
-            "Warung Bu Siti", "Toko Sembako Jaya", "Minimarket Rezeki"
-        ]
-        customer = st.selectbox(t("customer"), customers)
+        customers = get_customer_options()
+        customer = st.selectbox(t("customer"), list(customers))
     
     with col3:
         # Salesman selection
@@ -130,53 +136,29 @@ def show_create_sale():
     if 'sale_items' not in st.session_state:
         st.session_state.sale_items = []
     
-    # Product catalog with FMCG products
-    products_catalog = {
-        "Aqua 600ml": {"price": 3000, "category": "Beverages"},
-        "Aqua 1L": {"price": 5000, "category": "Beverages"},
-        "Aqua Galon 19L": {"price": 25000, "category": "Beverages"},
-        "Indomie Goreng": {"price": 3500, "category": "Food"},
-        "Indomie Soto": {"price": 3500, "category": "Food"},
-        "Chitato BBQ 68g": {"price": 8000, "category": "Snacks"},
-        "Chitato Sapi Panggang 68g": {"price": 8000, "category": "Snacks"},
-        "Gula Pasir 1kg": {"price": 15000, "category": "Groceries"},
-        "Beras Premium 5kg": {"price": 75000, "category": "Groceries"},
-        "Minyak Goreng 2L": {"price": 32000, "category": "Groceries"}
-    }
+    products = get_products().set_index('name')
     
     # Add item interface
     col1, col2, col3, col4 = st.columns([3, 1, 2, 1])
     with col1:
-        new_product = st.selectbox("Select Product", list(products_catalog.keys()), key="new_product")
+        new_product = st.selectbox("Select Product", list(products.index), key="new_product")
     with col2:
         new_quantity = st.number_input(t("quantity"), min_value=1, value=1, key="new_quantity")
     with col3:
         if new_product:
-            unit_price = products_catalog[new_product]["price"]
+            # Price lists decide quantity tiers and customer-group prices
+            price, unit_price = quote_price(int(products.loc[new_product, 'id']), new_quantity,
+                                            customers.get(customer), sale_date)
             st.write(f"Unit Price: {format_currency(unit_price, 'IDR')}")
-            
-            # Tiered pricing for bulk orders
-            if new_quantity >= 100:
-                bulk_price = int(unit_price * 0.85)  # 15% discount
-                st.write(f"Bulk Price: {format_currency(bulk_price, 'IDR')}")
-            elif new_quantity >= 50:
-                bulk_price = int(unit_price * 0.9)   # 10% discount
-                st.write(f"Bulk Price: {format_currency(bulk_price, 'IDR')}")
-            else:
-                bulk_price = unit_price
+            if price != unit_price:
+                st.write(f"Your Price: {format_currency(price, 'IDR')}")
+            st.caption(f"Available: {int(products.loc[new_product, 'available_quantity'])}")
     with col4:
         if st.button(f"➕ {t('add_item')}", key="add_item_btn"):
             if new_product and new_quantity > 0:
-                # Calculate price based on quantity
-                if new_quantity >= 100:
-                    price = int(unit_price * 0.85)
-                elif new_quantity >= 50:
-                    price = int(unit_price * 0.9)
-                else:
-                    price = unit_price
-                
                 item = {
                     'product': new_product,
+                    'product_id': int(products.loc[new_product, 'id']),
                     'quantity': new_quantity,
                     'unit_price': price,
                     'subtotal': price * new_quantity
@@ -273,11 +255,38 @@ def show_create_sale():
         # Handle form submissions
         if submit_order:
             if customer and salesman and st.session_state.sale_items:
-                st.success(f"✅ {t('sale_created')} Order ID: {order_id}")
-                st.balloons()
-                # Clear the items after successful creation
-                st.session_state.sale_items = []
-                st.rerun()
+                order_items = [
+                    {'product_id': item['product_id'], 'quantity': item['quantity'], 'unit_price': item['unit_price']}
+                    for item in st.session_state.sale_items
+                ]
+                # Amounts paid at the counter go into the payments ledger with the order
+                if payment_status == t("paid"):
+                    paid_now = total
+                elif payment_status == t("partial"):
+                    paid_now = min(paid_amount, total)
+                else:
+                    paid_now = 0
+                try:
+                    _, order_id = create_sales_order(
+                        customers[customer], order_items, sales_rep=salesman, payment_method=payment_method,
+                        order_date=sale_date, total_amount=total, notes=special_instructions or None,
+                        paid_amount=paid_now)
+                except InsufficientStockError as e:
+                    names = products.reset_index().set_index('id')['name']
+                    for product_id, requested, available in e.shortages:
+                        st.error(f"❌ {names.get(product_id, product_id)}: {requested} requested, only {available} available")
+                except CreditLimitError as e:
+                    st.error(f"❌ Credit limit exceeded: {format_currency(e.exposure, 'IDR')} outstanding of "
+                             f"{format_currency(e.credit_limit, 'IDR')}; take payment now or record one first")
+                else:
+                    ORDERS_CREATED.inc(1, 'sales')
+                    log_event('order_created', st.session_state.get('username'), 'sales_order', order_id,
+                              f"{customer} / {len(st.session_state.sale_items)} items")
+                    st.success(f"✅ {t('sale_created')} Order ID: {order_id}")
+                    st.balloons()
+                    # Clear the items after successful creation
+                    st.session_state.sale_items = []
+                    st.rerun()
             else:
                 st.error(f"❌ {t('error')}: Please fill customer, salesman, and add at least one item")
         
@@ -286,104 +295,138 @@ def show_create_sale():
             st.rerun()
 
 def show_outstanding_payments():
-    """Show customers with outstanding payments"""
+    """Receivables aging per customer, open invoices and payment recording"""
     st.subheader("💳 Outstanding Payments")
     
-    # Outstanding payments data
-    outstanding_data = {
-        'Customer': ['Warung Maju Jaya', 'Supermarket Harapan', 'Minimarket Sejahtera'],
-        'Order ID': ['PF002', 'PF003', 'PF005'],
-        'Order Date': ['2024-01-16', '2024-01-17', '2024-01-19'],
-        'Total Amount': [
-            format_currency(1320000, 'IDR'),
-            format_currency(5420000, 'IDR'),
-            format_currency(3150000, 'IDR')
-        ],
-        'Paid Amount': [
-            format_currency(800000, 'IDR'),
-            format_currency(0, 'IDR'),
-            format_currency(1650000, 'IDR')
-        ],
-        'Outstanding': [
-            format_currency(520000, 'IDR'),
-            format_currency(5420000, 'IDR'),
-            format_currency(1500000, 'IDR')
-        ],
-        'Days Overdue': [5, 8, 2],
-        'Salesman': ['Ahmad Rahman', 'Sari Wulandari', 'Dewi Kusuma']
-    }
-    
-    df_outstanding = pd.DataFrame(outstanding_data)
-    st.dataframe(df_outstanding, use_container_width=True)
-    
-    # Outstanding summary
-    col1, col2, col3 = st.columns(3)
-    with col1:
-        total_outstanding = 520000 + 5420000 + 1500000
-        st.metric("Total Outstanding", format_currency(total_outstanding, 'IDR'))
-    with col2:
-        st.metric("Overdue Orders", len(df_outstanding))
-    with col3:
-        avg_overdue = sum([5, 8, 2]) / len(df_outstanding)
-        st.metric("Avg Days Overdue", f"{avg_overdue:.1f}")
+    # Aging buckets by days since the order date, from the open-invoice index
+    aging = get_aging_report()
+    if aging.empty:
+        st.success("✅ No outstanding invoices")
+    else:
+        col1, col2, col3, col4 = st.columns(4)
+        with col1:
+            st.metric("Total Outstanding", format_currency(aging['outstanding'].sum(), 'IDR'))
+        with col2:
+            st.metric("Open Invoices", int(aging['invoices'].sum()))
+        with col3:
+            overdue = aging['days_31_60'].sum() + aging['days_61_90'].sum() + aging['over_90'].sum()
+            st.metric("Over 30 Days", format_currency(overdue, 'IDR'))
+        with col4:
+            st.metric("90+ Days", format_currency(aging['over_90'].sum(), 'IDR'))
+        
+        buckets = pd.DataFrame({'Bucket': list(AGING_BUCKETS.values()),
+                                'Outstanding': [aging[column].sum() for column in AGING_BUCKETS]})
+        fig = px.bar(buckets, x='Bucket', y='Outstanding', title="Receivables Aging")
+        st.plotly_chart(fig, use_container_width=True)
+        
+        st.markdown("**Aging by Customer**")
+        df_aging = pd.DataFrame({'Customer': aging['customer'], 'Invoices': aging['invoices']})
+        for column, label in AGING_BUCKETS.items():
+            df_aging[label] = [format_currency(value, 'IDR') for value in aging[column]]
+        df_aging['Total'] = [format_currency(value, 'IDR') for value in aging['outstanding']]
+        df_aging['Share %'] = aging['share_pct']
+        df_aging['Oldest (days)'] = aging['oldest_days']
+        st.dataframe(df_aging, use_container_width=True)
+        
+        st.markdown("**Open Invoices (oldest first)**")
+        invoices = get_open_invoices()
+        st.dataframe(pd.DataFrame({
+            'Order ID': invoices['order_number'],
+            'Customer': invoices['customer'],
+            'Salesman': invoices['sales_rep'].fillna('-'),
+            'Total Amount': [format_currency(value, 'IDR') for value in invoices['total_amount']],
+            'Paid Amount': [format_currency(value, 'IDR') for value in invoices['paid_amount']],
+            'Outstanding': [format_currency(value, 'IDR') for value in invoices['outstanding']],
+            'Customer Balance': [format_currency(value, 'IDR') for value in invoices['customer_balance']],
+            'Days Outstanding': invoices['age_days'],
+            'Status': invoices['payment_status']
+        }), use_container_width=True)
     
     # Quick payment recording
     st.markdown("---")
     st.subheader("📝 Record Payment")
     
-    with st.form("record_payment"):
-        col1, col2, col3 = st.columns(3)
-        
-        with col1:
-            payment_customer = st.selectbox("Customer", df_outstanding['Customer'].tolist())
-            payment_amount = st.number_input("Payment Amount (IDR)", min_value=0, value=0)
-        
-        with col2:
-            payment_date = st.date_input("Payment Date", value=date.today())
-            payment_method = st.selectbox("Payment Method", ["Cash", "Bank Transfer", "Check"])
-        
-        with col3:
-            payment_notes = st.text_area("Payment Notes", placeholder="Reference number, notes, etc.")
+    if aging.empty:
+        st.info("Nothing to collect.")
+    else:
+        debtors = dict(zip(aging['customer'] + ' (#' + aging['customer_id'].astype(str) + ')', aging['customer_id']))
+        payment_customer = st.selectbox("Customer", list(debtors), key="payment_customer")
+        customer_invoices = get_open_invoices(int(debtors[payment_customer]))
+        invoice_options = {"Oldest invoices first": None}
+        invoice_options.update({
+            f"{row.order_number} ({format_currency(row.outstanding, 'IDR')} outstanding)": int(row.id)
+            for row in customer_invoices.itertuples()})
         
-        if st.form_submit_button("� Record Payment", use_container_width=True):
-            if payment_customer and payment_amount > 0:
-                st.success(f"✅ Payment of {format_currency(payment_amount, 'IDR')} recorded for {payment_customer}")
-            else:
-                st.error("❌ Please select customer and enter payment amount")
+        with st.form("record_payment"):
+            col1, col2, col3 = st.columns(3)
+            
+            with col1:
+                payment_invoice = st.selectbox("Apply To", list(invoice_options))
+                payment_amount = st.number_input("Payment Amount (IDR)", min_value=0, value=0)
+            
+            with col2:
+                payment_date = st.date_input("Payment Date", value=date.today())
+                payment_method = st.selectbox("Payment Method", ["Cash", "Bank Transfer", "Check"])
+            
+            with col3:
+                payment_reference = st.text_input("Reference", placeholder="Transfer or check number")
+                payment_notes = st.text_area("Payment Notes", placeholder="Notes")
+            
+            if st.form_submit_button("💾 Record Payment", use_container_width=True):
+                if payment_amount > 0:
+                    try:
+                        payment_number, allocations = record_payment(
+                            int(debtors[payment_customer]), payment_amount, payment_method, payment_date,
+                            payment_reference or None, payment_notes or None, st.session_state.get('username'),
+                            invoice_options[payment_invoice])
+                    except ValueError as e:
+                        st.error(f"❌ {e}")
+                    else:
+                        log_event('payment_recorded', st.session_state.get('username'), 'payment', payment_number,
+                                  f"{payment_customer} / {payment_amount} over {len(allocations)} orders")
+                        st.success(f"✅ Payment {payment_number} of {format_currency(payment_amount, 'IDR')} "
+                                   f"recorded for {payment_customer}")
+                        st.rerun()
+                else:
+                    st.error("❌ Please enter a payment amount")
 
 def show_order_history():
     """Show complete order history with detailed information"""
     st.subheader("📚 Order History")
     
-    # Comprehensive order history
-    history_data = {
-        'Order ID': ['PF001', 'PF002', 'PF003', 'PF004', 'PF005', 'PF006', 'PF007', 'PF008'],
-        'Date': ['2024-01-15', '2024-01-16', '2024-01-17', '2024-01-18', '2024-01-19', '2024-01-20', '2024-01-21', '2024-01-22'],
-        'Customer': ['Toko Sari Rasa', 'Warung Maju Jaya', 'Supermarket Harapan', 'Toko Berkah', 
-                    'Minimarket Sejahtera', 'Toko Makmur', 'Warung Bu Siti', 'Toko Sembako Jaya'],
-        'Salesman': ['Budi Santoso', 'Ahmad Rahman', 'Sari Wulandari', 'Budi Santoso', 
-                    'Dewi Kusuma', 'Ahmad Rahman', 'Rizki Pratama', 'Sari Wulandari'],
-        'Items': ['5 items', '3 items', '8 items', '2 items', '6 items', '4 items', '3 items', '7 items'],
-        'Total': [
-            format_currency(2750000, 'IDR'), format_currency(1320000, 'IDR'), format_currency(5420000, 'IDR'),
-            format_currency(890000, 'IDR'), format_currency(3150000, 'IDR'), format_currency(1680000, 'IDR'),
-            format_currency(2100000, 'IDR'), format_currency(4320000, 'IDR')
-        ],
-        'Status': ['✅ Delivered', '🚚 Shipped', '⏳ Processing', '✅ Delivered', 
-                  '🚚 Shipped', '✅ Delivered', '⏳ Processing', '📋 Confirmed'],
-        'Payment': ['✅ Paid', '⏳ Partial', '🔴 Unpaid', '✅ Paid', '⏳ Partial', '✅ Paid', '✅ Paid', '✅ Paid']
-    }
+    # Date range decides whether archived orders are read as well
+    col1, col2 = st.columns(2)
+    with col1:
+        history_from = st.date_input("From", value=date.today() - timedelta(days=365), key="history_from")
+    with col2:
+        history_to = st.date_input("To", value=date.today(), key="history_to")
     
-    df_history = pd.DataFrame(history_data)
+    orders = get_order_history(history_from, history_to)
+    status_labels = {
+        'delivered': '✅ Delivered', 'completed': '✅ Completed', 'shipped': '🚚 Shipped',
+        'processing': '⏳ Processing', 'confirmed': '📋 Confirmed', 'pending': '⏳ Pending',
+        'cancelled': '❌ Cancelled'
+    }
+    df_history = pd.DataFrame({
+        'Order ID': orders['order_number'],
+        'Date': orders['order_date'].astype(str).str[:10],
+        'Customer': orders['customer'].fillna('-'),
+        'Salesman': orders['sales_rep'].fillna('-'),
+        'Items': [f"{count} items" for count in orders['items']],
+        'Total': [format_currency(amount or 0, 'IDR') for amount in orders['total_amount']],
+        'Status': [status_labels.get(status, status) for status in orders['status']]
+    })
+    if (orders['source'] == 'archive').any():
+        st.caption(f"📦 Includes {(orders['source'] == 'archive').sum()} archived orders")
     
     # Filters for history
     col1, col2, col3 = st.columns(3)
     with col1:
-        history_customer = st.selectbox("Filter by Customer", ["All"] + list(df_history['Customer'].unique()))
+        history_customer = st.selectbox("Filter by Customer", ["All"] + sorted(df_history['Customer'].unique()))
     with col2:
-        history_salesman = st.selectbox("Filter by Salesman", ["All"] + list(df_history['Salesman'].unique()))
+        history_salesman = st.selectbox("Filter by Salesman", ["All"] + sorted(df_history['Salesman'].unique()))
     with col3:
-        history_status = st.selectbox("Filter by Status", ["All", "Delivered", "Shipped", "Processing", "Confirmed"])
+        history_status = st.selectbox("Filter by Status", ["All"] + sorted(set(status_labels.values())))
     
     # Apply filters
     filtered_history = df_history
@@ -392,10 +435,31 @@ def show_order_history():
     if history_salesman != "All":
         filtered_history = filtered_history[filtered_history['Salesman'] == history_salesman]
     if history_status != "All":
-        filtered_history = filtered_history[filtered_history['Status'].str.contains(history_status)]
+        filtered_history = filtered_history[filtered_history['Status'] == history_status]
     
     st.dataframe(filtered_history, use_container_width=True)
     
+    # Status changes settle stock reservations: shipping takes the stock, cancelling releases it
+    open_orders = orders[(orders['source'] != 'archive') & ~orders['status'].isin(['completed', 'delivered', 'cancelled'])]
+    if not open_orders.empty:
+        with st.expander("🔄 Update Order Status"):
+            col1, col2, col3 = st.columns([2, 2, 1])
+            with col1:
+                order_numbers = dict(zip(open_orders['order_number'], open_orders['id']))
+                status_order = st.selectbox("Order", list(order_numbers), key="status_order")
+            with col2:
+                new_status = st.selectbox("New Status", ['confirmed', 'processing', 'shipped', 'delivered',
+                                                         'completed', 'cancelled'],
+                                          format_func=lambda status: status_labels[status], key="status_new")
+            with col3:
+                if st.button("Update", use_container_width=True, key="status_update"):
+                    update_order_status('sales_order', int(order_numbers[status_order]), new_status,
+                                        st.session_state.get('username'))
+                    log_event('order_status_changed', st.session_state.get('username'), 'sales_order',
+                              int(order_numbers[status_order]), f"{status_order} -> {new_status}")
+                    st.success(f"✅ {status_order} is now {status_labels[new_status]}")
+                    st.rerun()
+    
     # Export functionality
     col1, col2, col3 = st.columns(3)
     with col1:
@@ -409,7 +473,9 @@ def show_order_history():
             )
     with col2:
         if st.button("📊 Generate Report"):
-            st.info("Detailed report generation feature coming soon!")
+            start_job('export_sales_report')
     with col3:
-        if st.button("📧 Email Report"):
-            st.info("Email report feature coming soon!")
+        if st.button("📧 Email Report", key="history_email_report"):
+            start_job('email_report')
+    
+    show_jobs_panel(['export_sales_report', 'email_report'])
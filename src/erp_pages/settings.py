@@ -2,6 +2,14 @@ import streamlit as st
 import pandas as pd
 from datetime import datetime
 from utils.translations import t, get_current_language, set_language
+from utils.audit import get_audit_events, log_event
+from utils.helpers import INDONESIA_TZ
+from database.migrations import get_schema_version
+from database.sequence import get_sequence_status
+from utils.sync import get_sync_status
+from config import Config
+from utils.scheduler import get_schedules, get_schedule_runs, run_schedule_now, set_schedule_enabled
+from erp_pages.jobs import show_jobs_panel, start_job
 
 def show_settings():
     """Settings Management Page"""
@@ -23,6 +31,8 @@ def show_settings():
             fiscal_year_start = st.selectbox("Fiscal Year Start", ["January", "April", "July", "October"])
             
             if st.form_submit_button(t("save")):
+                log_event('settings_updated', st.session_state.get('username'), 'settings', 'general',
+                          f"company={company_name}, currency={currency}, tax_rate={tax_rate}")
                 st.success(f"{t('success')}!")
     
     with tab4:
@@ -49,6 +59,7 @@ def show_settings():
                 new_lang = lang_options[selected_lang]
                 if new_lang != current_lang:
                     set_language(new_lang)
+                    log_event('settings_updated', st.session_state.get('username'), 'settings', 'language', new_lang)
                     st.success(f"✅ {t('language')} berhasil diubah / Language successfully changed!")
                     st.rerun()
                 else:
@@ -113,6 +124,7 @@ def show_settings():
             
             if st.form_submit_button("Add User"):
                 if new_username and new_name and new_email and new_password:
+                    log_event('user_added', st.session_state.get('username'), 'user', new_username, new_role)
                     st.success(f"User '{new_username}' added successfully!")
                 else:
                     st.error("Please fill in all required fields")
@@ -136,25 +148,124 @@ def show_settings():
         st.markdown("---")
         st.subheader("System Maintenance")
         
-        col1, col2, col3 = st.columns(3)
+        col1, col2, col3, col4 = st.columns(4)
         with col1:
             if st.button("🔄 Clear Cache"):
                 st.success("Cache cleared successfully!")
         with col2:
             if st.button("📊 Database Stats"):
-                st.info("Database statistics feature coming soon!")
+                st.info(f"Schema version: {get_schema_version()}")
         with col3:
             if st.button("📤 Export Data"):
                 st.info("Data export feature coming soon!")
+        with col4:
+            if st.button("💾 Backup Database"):
+                start_job('backup_database')
+                log_event('backup_requested', st.session_state.get('username'))
+        
+        show_jobs_panel(['backup_database'])
+        
+        with st.expander("📶 Mobile Sync"):
+            st.caption(f"Devices push offline orders, visits and activities to POST /sync/push and pull catalog "
+                       f"changes from GET /sync/pull on port {Config.SYNC_PORT}"
+                       + ("" if Config.SYNC_ENABLED else " (disabled)"))
+            sync_status = get_sync_status()
+            st.write(f"Change-log cursor: {sync_status['cursor']}")
+            if sync_status['received']:
+                st.dataframe(pd.DataFrame([{
+                    'Entity': r['entity'],
+                    'Records (24h)': r['records'],
+                    'Devices': r['devices'],
+                    'Last Received': datetime.fromtimestamp(r['last_received_ts'], INDONESIA_TZ).strftime('%d-%m-%Y %H:%M')
+                } for r in sync_status['received']]), use_container_width=True)
+            else:
+                st.info("No records received in the last 24 hours")
+        
+        with st.expander("🔢 Document Number Sequences"):
+            sequences = get_sequence_status()
+            if sequences:
+                st.dataframe(pd.DataFrame([{
+                    'Sequence': s['name'],
+                    'Next Block Starts At': s['next_value'],
+                    'Last Reserved': datetime.fromtimestamp(s['updated_ts'], INDONESIA_TZ).strftime('%d-%m-%Y %H:%M') if s['updated_ts'] else '-'
+                } for s in sequences]), use_container_width=True)
+            else:
+                st.info("No document numbers allocated yet")
+        
+        # Scheduled jobs
+        st.subheader("Scheduled Reports")
+        schedules = get_schedules()
+        if schedules:
+            df_schedules = pd.DataFrame([{
+                'Name': s['name'],
+                'Schedule (WIB)': s['cron_spec'],
+                'Enabled': '✅' if s['enabled'] else '⏸️',
+                'Next Run': datetime.fromtimestamp(s['next_run_ts'], INDONESIA_TZ).strftime('%d-%m-%Y %H:%M') if s['next_run_ts'] else '-',
+                'Last Run (UTC)': s['last_run_at'] or '-',
+                'Last Success (UTC)': s['last_success_at'] or '-'
+            } for s in schedules])
+            st.dataframe(df_schedules, use_container_width=True)
+            
+            col1, col2, col3 = st.columns([2, 1, 1])
+            with col1:
+                schedule_names = {s['name']: s for s in schedules}
+                selected_schedule = schedule_names[st.selectbox("Schedule", list(schedule_names.keys()))]
+            with col2:
+                if st.button("▶️ Run Now", use_container_width=True):
+                    job_id = run_schedule_now(selected_schedule['id'], st.session_state.get('username'))
+                    st.success(f"✅ {selected_schedule['name']} queued (job #{job_id})")
+            with col3:
+                toggle_label = "⏸️ Disable" if selected_schedule['enabled'] else "▶️ Enable"
+                if st.button(toggle_label, use_container_width=True):
+                    set_schedule_enabled(selected_schedule['id'], not selected_schedule['enabled'])
+                    log_event('schedule_toggled', st.session_state.get('username'), 'schedule',
+                              selected_schedule['id'], toggle_label)
+                    st.rerun()
+            
+            runs = get_schedule_runs(limit=20)
+            if runs:
+                st.markdown("**Run History**")
+                df_runs = pd.DataFrame([{
+                    'Schedule': r['name'],
+                    'Triggered': datetime.fromtimestamp(r['scheduled_ts'], INDONESIA_TZ).strftime('%d-%m-%Y %H:%M'),
+                    'Status': r['status'] or '-',
+                    'Started (UTC)': r['started_at'] or '-',
+                    'Finished (UTC)': r['finished_at'] or '-',
+                    'Error': r['error'] or ''
+                } for r in runs])
+                st.dataframe(df_runs, use_container_width=True)
         
         # System logs
         st.subheader("Recent System Activity")
-        log_data = {
-            'Timestamp': ['2024-01-20 10:30:15', '2024-01-20 09:45:22', '2024-01-20 08:15:45'],
-            'User': ['admin', 'budi.santoso', 'sari.wulandari'],
-            'Action': ['Settings updated', 'Order created', 'Customer visit logged'],
-            'Status': ['✅ Success', '✅ Success', '✅ Success']
-        }
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            log_user = st.text_input("Filter by User", placeholder="username")
+        with col2:
+            log_action = st.selectbox("Filter by Action", [
+                "All", "login", "logout", "order_created", "mobile_order_submitted", "visit_check_in",
+                "attendance_check_in", "attendance_check_out", "sync_push", "stock_adjustment",
+                "order_status_changed", "stock_transfer", "purchase_order_status_changed", "stock_take_started",
+                "stock_take_posted", "payment_recorded", "credit_limit_updated", "mobile_orders_approved",
+                "mobile_orders_rejected", "settings_updated", "user_added"
+            ])
+        with col3:
+            log_limit = st.number_input("Rows", min_value=10, max_value=1000, value=50, step=10)
+        
+        events = get_audit_events(
+            username=log_user or None,
+            action=None if log_action == "All" else log_action,
+            limit=int(log_limit)
+        )
         
-        df_logs = pd.DataFrame(log_data)
-        st.dataframe(df_logs, use_container_width=True)
+        if events:
+            df_logs = pd.DataFrame([{
+                'Timestamp': datetime.fromtimestamp(ts, INDONESIA_TZ).strftime('%d-%m-%Y %H:%M:%S WIB'),
+                'User': username or '-',
+                'Action': action,
+                'Entity': f"{entity_type or ''} {entity_id or ''}".strip() or '-',
+                'Details': details or '',
+                'Status': '✅ Success' if status == 'success' else f"❌ {status.title()}"
+            } for ts, username, action, entity_type, entity_id, details, status in events])
+            st.dataframe(df_logs, use_container_width=True)
+        else:
+            st.info("No audit events recorded yet.")
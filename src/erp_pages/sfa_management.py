@@ -2,29 +2,162 @@ import streamlit as st
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
+from datetime import date
 from utils.helpers import format_currency
+from utils.audit import log_event
+from database.approvals import approve_mobile_orders, get_approval_queue, reject_mobile_orders
+from database.repository import wib_date_key
+from database.snapshot import get_snapshot_connection, snapshot_caption
+
+def load_team_data():
+    """Per-salesman targets, attendance and activity for the current month from the reporting snapshot"""
+    month_start = date.today().replace(day=1).isoformat()
+    month_key = wib_date_key(date.today().replace(day=1))
+    conn = get_snapshot_connection()
+    try:
+        df_team = pd.read_sql_query('''
+            SELECT u.id AS user_id, u.username AS salesman,
+                   COALESCE(t.target_amount, 0) AS target_amount,
+                   COALESCE(t.achieved_amount, 0) AS achieved_amount,
+                   COALESCE(t.target_visits, 0) AS target_visits,
+                   (SELECT COUNT(*) FROM customer_visits v
+                    WHERE v.user_id = u.id AND v.visit_local_date >= ?) AS visits,
+                   (SELECT COUNT(DISTINCT v.customer_id) FROM customer_visits v
+                    WHERE v.user_id = u.id AND v.visit_local_date >= ?) AS active_customers
+            FROM users u
+            LEFT JOIN sales_targets t ON t.id = (
+                SELECT id FROM sales_targets
+                WHERE user_id = u.id AND target_period = 'monthly' AND status = 'active'
+                  AND start_date <= date('now') AND end_date >= date('now')
+                ORDER BY start_date DESC LIMIT 1
+            )
+            WHERE u.role = 'salesman'
+            ORDER BY u.username
+        ''', conn, params=(month_key, month_key))
+        
+        df_attendance = pd.read_sql_query('''
+            SELECT u.username AS salesman,
+                   COUNT(DISTINCT a.date) AS days_present,
+                   AVG((julianday(a.check_in_time) - julianday(date(a.check_in_time))) * 24) AS avg_check_in,
+                   AVG((julianday(a.check_out_time) - julianday(a.check_in_time)) * 24) AS avg_hours
+            FROM users u
+            LEFT JOIN attendance a ON a.user_id = u.id AND a.date >= ? AND a.status != 'absent'
+            WHERE u.role = 'salesman'
+            GROUP BY u.id
+            ORDER BY u.username
+        ''', conn, params=(month_start,))
+        
+        df_activity = pd.read_sql_query('''
+            SELECT u.username AS salesman,
+                   (SELECT COUNT(*) FROM sales_activities a WHERE a.user_id = u.id
+                    AND a.activity_type = 'call' AND a.activity_date >= ?) AS calls,
+                   (SELECT COUNT(*) FROM sales_activities a WHERE a.user_id = u.id
+                    AND a.activity_type = 'email' AND a.activity_date >= ?) AS emails,
+                   (SELECT COUNT(*) FROM sales_activities a WHERE a.user_id = u.id
+                    AND a.activity_type = 'meeting' AND a.activity_date >= ?) AS meetings,
+                   (SELECT COUNT(*) FROM mobile_orders o WHERE o.user_id = u.id
+                    AND o.status != 'draft' AND o.order_local_date >= ?) AS orders,
+                   (SELECT COUNT(*) FROM customer_visits v WHERE v.user_id = u.id
+                    AND v.visit_local_date >= ?) AS visits
+            FROM users u
+            WHERE u.role = 'salesman'
+            ORDER BY u.username
+        ''', conn, params=(month_start, month_start, month_start, month_key, month_key))
+    finally:
+        conn.close()
+    return df_team, df_attendance, df_activity
+
+def _format_hours(hours):
+    if pd.isna(hours):
+        return '-'
+    return f"{int(hours):02d}:{int(round((hours % 1) * 60)) % 60:02d}"
+
+def show_order_approvals():
+    """Queue of submitted mobile orders with bulk approve (convert to sales orders) and reject"""
+    st.subheader("Mobile Order Approvals")
+    
+    queue = get_approval_queue()
+    if queue.empty:
+        st.info("No mobile orders waiting for approval.")
+    else:
+        over_limit = queue['credit_limit'].notna() & (queue['exposure'] > queue['credit_limit'])
+        select_all = st.checkbox(f"Select all {len(queue)} orders", key="approval_select_all")
+        edited = st.data_editor(pd.DataFrame({
+            'Select': [select_all] * len(queue),
+            'Order #': queue['order_number'],
+            'Date': queue['order_date'].astype(str).str[:10],
+            'Salesman': queue['salesman'],
+            'Customer': queue['customer'],
+            'Items': queue['items'],
+            'Total': [format_currency(value or 0, 'IDR') for value in queue['total_amount']],
+            'Terms': queue['payment_terms'].fillna('-'),
+            'Depot': queue['location'],
+            'Credit': ['⚠️ Over limit' if over else '-' if pd.isna(limit) else format_currency(limit - exposure, 'IDR')
+                       for over, limit, exposure in zip(over_limit, queue['credit_limit'], queue['exposure'])]
+        }), column_config={'Select': st.column_config.CheckboxColumn("Select", default=False)},
+            disabled=['Order #', 'Date', 'Salesman', 'Customer', 'Items', 'Total', 'Terms', 'Depot', 'Credit'],
+            hide_index=True, use_container_width=True,
+            # A new key after each approval or rejection so ticks never carry over to a changed queue
+            key=f"approval_queue_{st.session_state.get('approval_round', 0)}")
+        selected = queue.loc[edited['Select'].to_numpy(), 'id'].tolist()
+        st.caption(f"{len(selected)} selected, "
+                   f"{format_currency(queue.loc[edited['Select'].to_numpy(), 'total_amount'].sum(), 'IDR')}")
+        
+        notes = st.text_input("Rejection reason", key="approval_notes")
+        col1, col2 = st.columns(2)
+        with col1:
+            if st.button("✅ Approve & Convert Selected", use_container_width=True, disabled=not selected):
+                progress = st.progress(0.0)
+                result = approve_mobile_orders(selected, st.session_state.get('username'),
+                                               progress=lambda share, text: progress.progress(share, text=text))
+                progress.empty()
+                st.session_state.approval_round = st.session_state.get('approval_round', 0) + 1
+                log_event('mobile_orders_approved', st.session_state.get('username'), 'mobile_order', None,
+                          f"{result['converted']} converted to sales orders")
+                st.success(f"✅ {result['converted']} orders converted to sales orders in {result['seconds']}s")
+                for order_number, shortages in result['short']:
+                    st.error(f"❌ {order_number}: not enough stock for {len(shortages)} product(s)")
+                if result['skipped']:
+                    st.warning(f"{result['skipped']} orders were no longer waiting for approval")
+        with col2:
+            if st.button("❌ Reject Selected", use_container_width=True, disabled=not selected):
+                rejected = reject_mobile_orders(selected, st.session_state.get('username'), notes or None)
+                st.session_state.approval_round = st.session_state.get('approval_round', 0) + 1
+                log_event('mobile_orders_rejected', st.session_state.get('username'), 'mobile_order', None,
+                          f"{rejected} rejected" + (f": {notes}" if notes else ''))
+                st.success(f"✅ {rejected} orders rejected and their stock released")
 
 def show_sfa_management():
     """SFA Management for Administrators and Managers"""
     st.header("📊 SFA Management")
     
-    tab1, tab2, tab3, tab4 = st.tabs(["Team Overview", "Sales Performance", "Attendance Reports", "Activity Tracking"])
+    st.caption(snapshot_caption())
+    
+    df_team, df_attendance, df_activity = load_team_data()
+    if df_team.empty:
+        st.info("No salesmen found.")
+        return
+    salesmen = df_team['salesman'].tolist()
+    
+    tab1, tab2, tab3, tab4, tab5 = st.tabs(["Team Overview", "Sales Performance", "Attendance Reports", "Activity Tracking",
+                                            "Order Approvals"])
     
     with tab1:
         st.subheader("Sales Team Overview")
         
+        achievement_pct = (df_team['achieved_amount'] / df_team['target_amount'].where(df_team['target_amount'] > 0) * 100).fillna(0)
         team_performance = {
-            'Salesman': ['Budi Santoso', 'Sari Wulandari', 'Ahmad Rahman'],
-            'Monthly Target': [format_currency(50000000, 'IDR'), format_currency(45000000, 'IDR'), format_currency(40000000, 'IDR')],
-            'Achievement': [format_currency(35000000, 'IDR'), format_currency(42000000, 'IDR'), format_currency(30000000, 'IDR')],
-            'Achievement %': ['70%', '93%', '75%'],
-            'Visits This Month': ['15/20', '18/18', '12/16'],
-            'Active Customers': ['12', '15', '10'],
-            'Status': ['🟡 On Track', '✅ Excellent', '🟡 Needs Support']
+            'Salesman': salesmen,
+            'Monthly Target': [format_currency(v, 'IDR') for v in df_team['target_amount']],
+            'Achievement': [format_currency(v, 'IDR') for v in df_team['achieved_amount']],
+            'Achievement %': [f"{v:.0f}%" for v in achievement_pct],
+            'Visits This Month': [f"{v}/{t}" for v, t in zip(df_team['visits'], df_team['target_visits'])],
+            'Active Customers': df_team['active_customers'].astype(str).tolist(),
+            'Status': ['✅ Excellent' if v >= 90 else '🟡 On Track' if v >= 70 else '🔴 Needs Support' for v in achievement_pct]
         }
         
-        df_team = pd.DataFrame(team_performance)
-        st.dataframe(df_team, use_container_width=True)
+        df_team_display = pd.DataFrame(team_performance)
+        st.dataframe(df_team_display, use_container_width=True)
         
         # Team actions
         col1, col2, col3 = st.columns(3)
@@ -42,9 +175,8 @@ def show_sfa_management():
         st.subheader("Sales Performance Analytics")
         
         # Team performance chart
-        salesmen = ['Budi Santoso', 'Sari Wulandari', 'Ahmad Rahman']
-        targets = [50000000, 45000000, 40000000]
-        achievements = [35000000, 42000000, 30000000]
+        targets = df_team['target_amount'].tolist()
+        achievements = df_team['achieved_amount'].tolist()
         
         fig = go.Figure(data=[
             go.Bar(name='Target', x=salesmen, y=targets, marker_color='lightblue'),
@@ -63,33 +195,36 @@ def show_sfa_management():
         # Performance metrics
         col1, col2, col3 = st.columns(3)
         
+        team_target = sum(targets)
+        team_achievement = sum(achievements)
         with col1:
-            st.metric("Team Target", format_currency(135000000, 'IDR'))
+            st.metric("Team Target", format_currency(team_target, 'IDR'))
         with col2:
-            st.metric("Team Achievement", format_currency(107000000, 'IDR'))
+            st.metric("Team Achievement", format_currency(team_achievement, 'IDR'))
         with col3:
-            st.metric("Team Performance", "79%", "5% above average")
+            st.metric("Team Performance", f"{team_achievement / team_target * 100:.0f}%" if team_target else "-")
     
     with tab3:
         st.subheader("Attendance Reports")
         
+        # Working days so far this month (Monday-Friday)
+        today = date.today()
+        working_days = sum(1 for day in range(1, today.day + 1) if today.replace(day=day).weekday() < 5) or 1
+        attendance_data = (df_attendance['days_present'] / working_days * 100).round().clip(upper=100).tolist()
+        
         attendance_summary = {
-            'Salesman': ['Budi Santoso', 'Sari Wulandari', 'Ahmad Rahman'],
-            'Days Present': ['20/22', '21/22', '18/22'],
-            'Attendance %': ['91%', '95%', '82%'],
-            'Avg Check-in': ['08:30', '08:25', '08:45'],
-            'Avg Hours/Day': ['8.5', '8.7', '8.2'],
-            'Field Time %': ['75%', '80%', '70%']
+            'Salesman': df_attendance['salesman'].tolist(),
+            'Days Present': [f"{v}/{working_days}" for v in df_attendance['days_present']],
+            'Attendance %': [f"{v:.0f}%" for v in attendance_data],
+            'Avg Check-in': [_format_hours(v) for v in df_attendance['avg_check_in']],
+            'Avg Hours/Day': ['-' if pd.isna(v) else f"{v:.1f}" for v in df_attendance['avg_hours']]
         }
         
-        df_attendance = pd.DataFrame(attendance_summary)
-        st.dataframe(df_attendance, use_container_width=True)
+        df_attendance_display = pd.DataFrame(attendance_summary)
+        st.dataframe(df_attendance_display, use_container_width=True)
         
         # Attendance chart
-        attendance_data = [91, 95, 82]
-        colors = ['orange' if x < 90 else 'green' for x in attendance_data]
-        
-        fig = px.bar(x=salesmen, y=attendance_data, title="Team Attendance Percentage", 
+        fig = px.bar(x=df_attendance['salesman'], y=attendance_data, title="Team Attendance Percentage", 
                      color=attendance_data, color_continuous_scale='RdYlGn')
         fig.update_layout(xaxis_title="Sales Team", yaxis_title="Attendance %")
         st.plotly_chart(fig, use_container_width=True)
@@ -97,13 +232,14 @@ def show_sfa_management():
     with tab4:
         st.subheader("Activity Tracking")
         
+        conversion = (df_activity['orders'] / df_activity['visits'].where(df_activity['visits'] > 0) * 100).fillna(0)
         activity_summary = {
-            'Salesman': ['Budi Santoso', 'Sari Wulandari', 'Ahmad Rahman'],
-            'Calls Made': ['45', '52', '38'],
-            'Emails Sent': ['23', '31', '19'],
-            'Meetings': ['12', '15', '10'],
-            'Orders Created': ['8', '11', '6'],
-            'Conversion Rate': ['18%', '21%', '16%']
+            'Salesman': df_activity['salesman'].tolist(),
+            'Calls Made': df_activity['calls'].astype(str).tolist(),
+            'Emails Sent': df_activity['emails'].astype(str).tolist(),
+            'Meetings': df_activity['meetings'].astype(str).tolist(),
+            'Orders Created': df_activity['orders'].astype(str).tolist(),
+            'Conversion Rate': [f"{v:.0f}%" for v in conversion]
         }
         
         df_activities = pd.DataFrame(activity_summary)
@@ -111,14 +247,9 @@ def show_sfa_management():
         
         # Activity performance chart
         activities = ['Calls', 'Emails', 'Meetings', 'Orders']
-        budi_data = [45, 23, 12, 8]
-        sari_data = [52, 31, 15, 11]
-        ahmad_data = [38, 19, 10, 6]
-        
         fig = go.Figure(data=[
-            go.Bar(name='Budi Santoso', x=activities, y=budi_data),
-            go.Bar(name='Sari Wulandari', x=activities, y=sari_data),
-            go.Bar(name='Ahmad Rahman', x=activities, y=ahmad_data)
+            go.Bar(name=row['salesman'], x=activities, y=[row['calls'], row['emails'], row['meetings'], row['orders']])
+            for _, row in df_activity.iterrows()
         ])
         
         fig.update_layout(
@@ -129,3 +260,6 @@ def show_sfa_management():
         )
         
         st.plotly_chart(fig, use_container_width=True)
+    
+    with tab5:
+        show_order_approvals()
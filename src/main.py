@@ -7,13 +7,20 @@ import plotly.graph_objects as go
 import pytz
 import sys
 import os
+import uuid
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 # Database and utilities
 from database.init_db import init_database
+from database.snapshot import start_snapshot_refresher
 from utils.auth import check_login, login_user, logout_user
 from utils.helpers import format_currency
 from utils.translations import init_language, get_current_language, set_language, t
+from utils.metrics import PAGE_RENDER_SECONDS, start_metrics_server, touch_session
+from utils.audit import start_audit_writer
+from utils.jobs import start_job_workers
+from utils.scheduler import start_scheduler
+from utils.sync import start_sync_server
 from config import Config
 
 # ERP Pages
@@ -49,6 +56,16 @@ st.set_page_config(
 init_database()
 init_language()
 
+# Metrics exporter runs once per process; reruns reuse the running server
+if Config.METRICS_ENABLED:
+    start_metrics_server(Config.METRICS_HOST, Config.METRICS_PORT, Config.SESSION_TIMEOUT)
+start_audit_writer()
+start_job_workers()
+start_scheduler()
+start_snapshot_refresher()
+if Config.SYNC_ENABLED:
+    start_sync_server(Config.SYNC_HOST, Config.SYNC_PORT)
+
 # Custom CSS for better UI
 st.markdown("""
 <style>
@@ -77,6 +94,9 @@ def main():
     # Check if user is logged in
     if 'logged_in' not in st.session_state:
         st.session_state.logged_in = False
+    if 'session_id' not in st.session_state:
+        st.session_state.session_id = uuid.uuid4().hex
+    touch_session(st.session_state.session_id)
     
     if not st.session_state.logged_in:
         show_login_page()
@@ -176,7 +196,11 @@ def show_main_app():
     
     actual_page = page_mapping.get(page, page)
     
-    # Main content based on selected page
+    with PAGE_RENDER_SECONDS.time(actual_page):
+        render_page(actual_page)
+
+def render_page(actual_page):
+    """Render the selected page by its routing key"""
     if actual_page == "Dashboard":
         show_dashboard()
     elif actual_page == "SFA Dashboard":
@@ -4,6 +4,8 @@ import plotly.express as px
 from datetime import datetime, date, timedelta
 from utils.helpers import format_currency
 from database.init_db import get_connection
+from utils.metrics import CHECKINS
+from utils.audit import log_event
 
 def show_sfa_dashboard():
     """SFA Dashboard for Sales Team"""
@@ -66,6 +68,8 @@ def show_sfa_dashboard():
         col_a, col_b, col_c = st.columns(3)
         with col_a:
             if st.button("🎯 Check In", use_container_width=True):
+                CHECKINS.inc(1, 'attendance')
+                log_event('attendance_check_in', st.session_state.get('username'))
                 st.success("✅ Checked in successfully!")
         with col_b:
             if st.button("📍 Add Visit", use_container_width=True):
@@ -166,11 +170,14 @@ def show_attendance():
         
         with col1:
             if st.button("🟢 Check In", use_container_width=True):
+                CHECKINS.inc(1, 'attendance')
+                log_event('attendance_check_in', st.session_state.get('username'))
                 st.success("✅ Checked in successfully at " + datetime.now().strftime("%H:%M:%S"))
                 st.balloons()
         
         with col2:
             if st.button("🔴 Check Out", use_container_width=True):
+                log_event('attendance_check_out', st.session_state.get('username'))
                 st.success("✅ Checked out successfully at " + datetime.now().strftime("%H:%M:%S"))
         
         # Manual entry form
@@ -190,6 +197,7 @@ def show_attendance():
             notes = st.text_area("Notes", placeholder="Additional explanation")
             
             if st.form_submit_button("Submit Manual Entry"):
+                log_event('attendance_manual_entry', st.session_state.get('username'), details=f"{entry_date} ({reason})")
                 st.success("✅ Manual attendance entry submitted for approval!")
     
     with tab2:
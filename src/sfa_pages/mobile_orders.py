@@ -2,6 +2,15 @@ import streamlit as st
 import pandas as pd
 from datetime import datetime, date
 from utils.helpers import format_currency
+from utils.metrics import ORDERS_CREATED
+from utils.audit import log_event
+from database.credit import CreditLimitError, get_credit_status, is_credit_terms
+from database.repository import create_mobile_order, get_products
+from database.reservations import InsufficientStockError
+from database.locations import get_customer_position, nearest_locations
+from config import Config
+from utils.pricing import quote_price
+from erp_pages.customers import get_customer_options
 
 def show_mobile_orders():
     """Mobile Order Management for Field Sales"""
@@ -15,10 +24,8 @@ def show_mobile_orders():
         # Order header - Customer and basic info
         col1, col2 = st.columns(2)
         with col1:
-            customer = st.selectbox(
-                "Select Customer",
-                ["PT. Teknologi Maju", "CV. Bisnis Sukses", "UD. Perdagangan Jaya", "PT. Solusi Digital", "New Customer"]
-            )
+            customers = get_customer_options()
+            customer = st.selectbox("Select Customer", list(customers) + ["New Customer"])
             if customer == "New Customer":
                 new_customer_name = st.text_input("Customer Name")
                 new_customer_phone = st.text_input("Phone Number")
@@ -26,6 +33,11 @@ def show_mobile_orders():
         with col2:
             order_date = st.date_input("Order Date", value=date.today())
             payment_terms = st.selectbox("Payment Terms", ["Cash", "Net 7", "Net 15", "Net 30"])
+            if is_credit_terms(payment_terms) and customers.get(customer):
+                credit = get_credit_status(customers[customer])
+                if credit['credit_limit'] is not None:
+                    st.caption(f"Available credit: {format_currency(credit['available'], 'IDR')} "
+                               f"of {format_currency(credit['credit_limit'], 'IDR')}")
         
         # Visit reference
         visit_ref = st.selectbox("Link to Visit", ["Current Visit", "Standalone Order", "Follow-up Visit"])
@@ -41,23 +53,16 @@ def show_mobile_orders():
         col1, col2, col3, col4, col5 = st.columns([3, 1, 2, 2, 1])
         
         with col1:
-            product = st.selectbox("Product", ["Laptop Pro", "Wireless Mouse", "USB Cable", "Monitor Stand", "Keyboard"])
+            products = get_products().set_index('name')
+            product = st.selectbox("Product", list(products.index))
         with col2:
             quantity = st.number_input("Qty", min_value=1, value=1)
         with col3:
-            # Auto-fill price based on product
-            if product == "Laptop Pro":
-                unit_price = 14999000
-            elif product == "Wireless Mouse":
-                unit_price = 449000
-            elif product == "USB Cable":
-                unit_price = 149000
-            elif product == "Monitor Stand":
-                unit_price = 749000
-            else:
-                unit_price = 1199000
+            # Price lists decide quantity tiers and customer-group prices
+            unit_price, _ = quote_price(int(products.loc[product, 'id']), quantity, customers.get(customer), order_date)
             
             st.write(f"Unit Price: {format_currency(unit_price, 'IDR')}")
+            st.caption(f"Available: {int(products.loc[product, 'available_quantity'])}")
         with col4:
             discount = st.number_input("Discount %", min_value=0.0, max_value=50.0, value=0.0, step=0.5)
         with col5:
@@ -65,6 +70,7 @@ def show_mobile_orders():
                 item_total = unit_price * quantity * (1 - discount/100)
                 st.session_state.mobile_order_items.append({
                     'product': product,
+                    'product_id': int(products.loc[product, 'id']),
                     'quantity': quantity,
                     'unit_price': unit_price,
                     'discount': discount,
@@ -116,6 +122,20 @@ def show_mobile_orders():
                     st.metric("Tax", format_currency(tax_amount, 'IDR'))
                     st.metric("**Final Total**", format_currency(final_total, 'IDR'))
                 
+                # Depot: nearest to the customer's last visit among those that can supply every line
+                position = get_customer_position(customers[customer]) if customers.get(customer) else None
+                depots = nearest_locations(st.session_state.mobile_order_items, *(position or (None, None)))
+                if not depots.empty:
+                    depot_labels = {
+                        row['id']: f"{row['code']} - {row['name']}"
+                                   + (f" ({row['distance_km']:.1f} km)" if pd.notna(row['distance_km']) else '')
+                                   + ('' if row['can_fulfil'] else f" ⚠️ {row['short_lines']} line(s) short")
+                        for _, row in depots.iterrows()
+                    }
+                    location_id = st.selectbox("Fulfil From", list(depot_labels), format_func=depot_labels.get)
+                else:
+                    location_id = None
+                
                 # Order notes
                 special_instructions = st.text_area("Special Instructions", placeholder="Delivery notes, customer requirements, etc.")
                 
@@ -123,14 +143,45 @@ def show_mobile_orders():
                 col1, col2, col3 = st.columns(3)
                 
                 with col1:
-                    if st.button("💾 Save as Draft", use_container_width=True):
-                        st.info("Order saved as draft!")
+                    save_draft = st.button("💾 Save as Draft", use_container_width=True)
                 
                 with col2:
-                    if st.button("📤 Submit Order", use_container_width=True):
-                        st.success("✅ Order submitted successfully!")
-                        st.balloons()
-                        # Clear items after submission
+                    submit_order = st.button("📤 Submit Order", use_container_width=True)
+                
+                if save_draft or submit_order:
+                    order_items = [
+                        {'product_id': item['product_id'], 'quantity': item['quantity'],
+                         'unit_price': item['unit_price'], 'discount': item['discount']}
+                        for item in st.session_state.mobile_order_items
+                    ]
+                    try:
+                        # Both reserve stock; a draft's reservation expires if it is never submitted
+                        order_id, order_number = create_mobile_order(
+                            st.session_state.get('user_id'), customers.get(customer), order_items,
+                            status='draft' if save_draft else 'submitted',
+                            order_date=order_date, total_amount=final_total, payment_terms=payment_terms,
+                            special_instructions=special_instructions or None,
+                            discount_percentage=additional_discount, tax_percentage=tax_rate,
+                            location_id=int(location_id) if location_id is not None else None)
+                    except InsufficientStockError as e:
+                        names = products.reset_index().set_index('id')['name']
+                        for product_id, requested, available in e.shortages:
+                            st.error(f"❌ {names.get(product_id, product_id)}: {requested} requested, only {available} available")
+                    except CreditLimitError as e:
+                        st.error(f"❌ Credit limit exceeded: {format_currency(e.exposure, 'IDR')} outstanding of "
+                                 f"{format_currency(e.credit_limit, 'IDR')}; pay with cash or record a payment first")
+                    else:
+                        if save_draft:
+                            log_event('mobile_order_drafted', st.session_state.get('username'), 'mobile_order',
+                                      order_id, f"{order_number} / {customer}")
+                            st.info(f"Order {order_number} saved as draft; stock is held for {Config.RESERVATION_DRAFT_HOURS} hours")
+                        else:
+                            ORDERS_CREATED.inc(1, 'mobile')
+                            log_event('mobile_order_submitted', st.session_state.get('username'), 'mobile_order',
+                                      order_id, f"{order_number} / {customer} / {len(st.session_state.mobile_order_items)} items")
+                            st.success(f"✅ Order {order_number} submitted successfully!")
+                            st.balloons()
+                        # Clear items after saving
                         st.session_state.mobile_order_items = []
                 
                 with col3:
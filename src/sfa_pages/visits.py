@@ -2,6 +2,8 @@ import streamlit as st
 import pandas as pd
 from datetime import datetime, date, timedelta
 from utils.helpers import format_currency
+from utils.metrics import CHECKINS
+from utils.audit import log_event
 
 def show_customer_visits():
     """Customer Visit Management"""
@@ -48,6 +50,8 @@ def show_customer_visits():
                 with col4:
                     if row['Action'] == 'Check In':
                         if st.button(f"📍 Check In", key=f"checkin_{idx}"):
+                            CHECKINS.inc(1, 'visit')
+                            log_event('visit_check_in', st.session_state.get('username'), 'customer', details=row['Customer'])
                             st.success(f"Checked in at {row['Customer']}")
                     elif row['Action'] == 'Start':
                         if st.button(f"▶️ Start Visit", key=f"start_{idx}"):
@@ -0,0 +1,289 @@
+"""
+Columnar analytics backend for Reports
+Fact tables are exported incrementally from the reporting snapshot to
+monthly Parquet files under Config.ANALYTICS_DIR. Report queries are
+written once against logical tables (orders, order_items, visits,
+gps_days, products, customers) and run on DuckDB over the Parquet files,
+or on SQLite directly when the data is small or DuckDB is not installed.
+"""
+import os
+import re
+import time
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+from config import Config
+from database.init_db import get_connection
+from database.snapshot import get_snapshot_connection
+from utils.metrics import histogram
+
+ANALYTICS_QUERY_SECONDS = histogram(
+    'penzflow_analytics_query_seconds', 'Report query latency by engine', ('engine', 'query'))
+
+def _date_sql(key):
+    """'YYYY-MM-DD' text of a WIB YYYYMMDD date key"""
+    return f"printf('%04d-%02d-%02d', {key} / 10000, {key} / 100 % 100, {key} % 100)"
+
+def _month_sql(key):
+    """'YYYY-MM' text of a WIB YYYYMMDD date key"""
+    return f"printf('%04d-%02d', {key} / 10000, {key} / 100 % 100)"
+
+# Partitioned facts: (id column used as watermark, YYYYMMDD date key partitioned by month, columns, source)
+FACTS = {
+    'orders': ('so.id', 'so.order_local_date', f'''
+        so.id AS order_id, so.order_number, so.customer_id, so.sales_rep, so.status,
+        so.payment_method, so.total_amount, so.order_local_date,
+        {_date_sql('so.order_local_date')} AS order_date, {_month_sql('so.order_local_date')} AS order_month
+    ''', 'sales_orders so'),
+    'order_items': ('oi.id', 'so.order_local_date', f'''
+        oi.id AS item_id, oi.order_id, oi.product_id, oi.quantity,
+        oi.unit_price, oi.total_price,
+        so.customer_id, so.status, so.order_local_date, {_date_sql('so.order_local_date')} AS order_date,
+        {_month_sql('so.order_local_date')} AS order_month
+    ''', 'order_items oi JOIN sales_orders so ON so.id = oi.order_id'),
+    'visits': ('v.id', 'v.visit_local_date', f'''
+        v.id AS visit_id, v.user_id, v.customer_id, v.visit_type, v.status, v.duration, v.visit_local_date,
+        {_date_sql('v.visit_local_date')} AS visit_date, {_month_sql('v.visit_local_date')} AS visit_month
+    ''', 'customer_visits v'),
+    # Raw fixes are summarised per salesman per day before writing (Parquet only). GPS fixes carry no
+    # date key; their timestamp is the UTC CURRENT_TIMESTAMP default, so the WIB day is derived from it
+    'gps_days': ('g.id', "CAST(strftime('%Y%m%d', g.timestamp, '+7 hours') AS INTEGER)", '''
+        g.id, g.user_id, g.latitude, g.longitude, g.timestamp, date(g.timestamp, '+7 hours') AS day
+    ''', 'gps_tracking g')
+}
+
+# Small dimensions are rewritten in full on every export
+DIMENSIONS = {
+    'products': '''
+        SELECT id AS product_id, sku, name, category, supplier, stock_quantity,
+               price, cost
+        FROM products
+    ''',
+    'customers': 'SELECT id AS customer_id, name, company FROM customers'
+}
+
+# The same SQL runs on both engines; {table} placeholders resolve per engine. Date ranges filter on the
+# YYYYMMDD key so SQLite can use its index and DuckDB can skip row groups
+QUERIES = {
+    'sales_by_month': '''
+        SELECT order_month, SUM(total_amount) AS revenue, COUNT(*) AS orders,
+               AVG(total_amount) AS average_order_value
+        FROM {orders}
+        WHERE status != 'cancelled' AND order_local_date BETWEEN ? AND ?
+        GROUP BY order_month
+        ORDER BY order_month
+    ''',
+    'sales_by_rep': '''
+        SELECT sales_rep, SUM(total_amount) AS revenue, COUNT(*) AS orders
+        FROM {orders}
+        WHERE status != 'cancelled' AND order_local_date BETWEEN ? AND ?
+        GROUP BY sales_rep
+        ORDER BY revenue DESC
+    ''',
+    'product_performance': '''
+        SELECT p.name AS product, p.category, SUM(i.quantity) AS units_sold,
+               SUM(i.total_price) AS revenue,
+               ROUND(CAST(SUM(i.quantity) AS REAL) / NULLIF(MAX(p.stock_quantity), 0), 2) AS turnover
+        FROM {order_items} i
+        JOIN {products} p ON p.product_id = i.product_id
+        WHERE i.status != 'cancelled' AND i.order_local_date BETWEEN ? AND ?
+        GROUP BY p.name, p.category
+        ORDER BY revenue DESC
+    ''',
+    'customer_analytics': '''
+        SELECT c.name AS customer, c.company, COUNT(*) AS orders, SUM(o.total_amount) AS revenue,
+               MAX(o.order_date) AS last_order
+        FROM {orders} o
+        JOIN {customers} c ON c.customer_id = o.customer_id
+        WHERE o.status != 'cancelled' AND o.order_local_date BETWEEN ? AND ?
+        GROUP BY c.name, c.company
+        ORDER BY revenue DESC
+    ''',
+    'visit_activity': '''
+        SELECT visit_month, visit_type, COUNT(*) AS visits, AVG(duration) AS average_duration
+        FROM {visits}
+        WHERE visit_local_date BETWEEN ? AND ?
+        GROUP BY visit_month, visit_type
+        ORDER BY visit_month, visit_type
+    '''
+}
+
+# Logical tables as SQLite subqueries over the snapshot
+SQLITE_SOURCES = {
+    **{name: f"(SELECT {columns} FROM {source})"
+       for name, (_, _, columns, source) in FACTS.items() if name != 'gps_days'},
+    **{name: f"({select})" for name, select in DIMENSIONS.items()}
+}
+
+def _table_dir(name):
+    return os.path.join(Config.ANALYTICS_DIR, name)
+
+def _write_parquet(df, path):
+    # Write then rename so a concurrent DuckDB scan never sees a partial file
+    df.to_parquet(path + '.tmp', index=False)
+    os.replace(path + '.tmp', path)
+
+def _partition_name(month):
+    """File name of a YYYYMM month partition"""
+    return f"{month // 100:04d}-{month % 100:02d}.parquet"
+
+def _gps_day_summary(points):
+    """Points, first/last fix and travelled kilometres per salesman per day"""
+    if points.empty:
+        return pd.DataFrame(columns=['user_id', 'day', 'points', 'first_fix', 'last_fix', 'distance_km'])
+    points = points.sort_values(['user_id', 'timestamp'])
+    lat = np.radians(points['latitude'].to_numpy(dtype=float))
+    lon = np.radians(points['longitude'].to_numpy(dtype=float))
+    same_track = (points['user_id'].to_numpy()[1:] == points['user_id'].to_numpy()[:-1]) & \
+                 (points['day'].to_numpy()[1:] == points['day'].to_numpy()[:-1])
+    a = np.sin(np.diff(lat) / 2) ** 2 + np.cos(lat[:-1]) * np.cos(lat[1:]) * np.sin(np.diff(lon) / 2) ** 2
+    step_km = np.where(same_track, 2 * 6371.0 * np.arcsin(np.sqrt(np.clip(a, 0, 1))), 0.0)
+    points['step_km'] = np.concatenate([[0.0], np.nan_to_num(step_km)])
+    return points.groupby(['user_id', 'day'], as_index=False).agg(
+        points=('id', 'count'), first_fix=('timestamp', 'min'), last_fix=('timestamp', 'max'),
+        distance_km=('step_km', 'sum'))
+
+def _get_watermarks(conn):
+    cursor = conn.cursor()
+    cursor.execute("SELECT fact, last_id FROM analytics_exports")
+    return dict(cursor.fetchall())
+
+def export_analytics(progress=None):
+    """Export new fact rows to monthly Parquet partitions; returns {fact: partitions written}"""
+    live = get_connection()
+    try:
+        watermarks = _get_watermarks(live)
+    finally:
+        live.close()
+
+    # Months that can still change (status updates) are always rewritten
+    today = date.today()
+    open_months = {int(today.strftime('%Y%m')), int((today.replace(day=1) - timedelta(days=1)).strftime('%Y%m'))}
+
+    written, new_watermarks = {}, {}
+    conn = get_snapshot_connection()
+    try:
+        cursor = conn.cursor()
+        steps = len(FACTS) + 1
+        for step, (fact, (id_column, date_key, columns, source)) in enumerate(FACTS.items()):
+            if progress:
+                progress(step / steps, f'Exporting {fact}')
+            last_id = watermarks.get(fact, 0)
+            # Ids rather than times mark new rows: offline orders can arrive days after their order time
+            cursor.execute(f"SELECT DISTINCT {date_key} / 100 FROM {source} WHERE {id_column} > ?", (last_id,))
+            months = {row[0] for row in cursor.fetchall() if row[0]} | open_months
+            cursor.execute(f"SELECT MAX({id_column}) FROM {source}")
+            max_id = cursor.fetchone()[0] or 0
+
+            os.makedirs(_table_dir(fact), exist_ok=True)
+            written[fact] = 0
+            for month in sorted(months):
+                df = pd.read_sql_query(
+                    f"SELECT {columns} FROM {source} WHERE {date_key} BETWEEN ? AND ?",
+                    conn, params=(month * 100 + 1, month * 100 + 31))
+                if fact == 'gps_days':
+                    df = _gps_day_summary(df)
+                path = os.path.join(_table_dir(fact), _partition_name(month))
+                if df.empty:
+                    if os.path.exists(path):
+                        os.remove(path)
+                    continue
+                _write_parquet(df, path)
+                written[fact] += 1
+            new_watermarks[fact] = (max_id, written[fact])
+
+        if progress:
+            progress(len(FACTS) / steps, 'Exporting dimensions')
+        for name, select in DIMENSIONS.items():
+            os.makedirs(_table_dir(name), exist_ok=True)
+            _write_parquet(pd.read_sql_query(select, conn), os.path.join(_table_dir(name), 'all.parquet'))
+    finally:
+        conn.close()
+
+    live = get_connection()
+    try:
+        live.executemany('''
+            INSERT INTO analytics_exports (fact, last_id, partitions_written, exported_ts)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT(fact) DO UPDATE SET last_id = excluded.last_id,
+                partitions_written = excluded.partitions_written, exported_ts = excluded.exported_ts
+        ''', [(fact, max_id, count, int(time.time())) for fact, (max_id, count) in new_watermarks.items()])
+        live.commit()
+    finally:
+        live.close()
+    return written
+
+def get_export_status():
+    """Last export time and watermark per fact"""
+    conn = get_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT fact, last_id, partitions_written, exported_ts FROM analytics_exports ORDER BY fact")
+        keys = ('fact', 'last_id', 'partitions_written', 'exported_ts')
+        return [dict(zip(keys, row)) for row in cursor.fetchall()]
+    finally:
+        conn.close()
+
+def _duckdb():
+    try:
+        import duckdb
+        return duckdb
+    except ImportError:
+        return None
+
+def _parquet_ready(names=('orders', 'order_items', 'products', 'customers')):
+    return all(os.path.isdir(_table_dir(name)) and any(f.endswith('.parquet') for f in os.listdir(_table_dir(name)))
+               for name in names)
+
+def duckdb_available():
+    """True when DuckDB is installed and Parquet data has been exported"""
+    return _duckdb() is not None and _parquet_ready()
+
+def choose_engine():
+    """DuckDB above ANALYTICS_ROW_THRESHOLD order items, SQLite otherwise"""
+    if Config.ANALYTICS_ENGINE != 'auto':
+        return Config.ANALYTICS_ENGINE
+    if not duckdb_available():
+        return 'sqlite'
+    conn = get_snapshot_connection()
+    try:
+        cursor = conn.cursor()
+        # MAX(id) is an index lookup; COUNT(*) would scan the whole table
+        cursor.execute("SELECT COALESCE(MAX(id), 0) FROM order_items")
+        rows = cursor.fetchone()[0]
+    finally:
+        conn.close()
+    return 'duckdb' if rows >= Config.ANALYTICS_ROW_THRESHOLD else 'sqlite'
+
+def _duckdb_sources():
+    sources = {}
+    for name in list(FACTS) + list(DIMENSIONS):
+        pattern = os.path.join(_table_dir(name), '*.parquet').replace("'", "''")
+        sources[name] = f"read_parquet('{pattern}')"
+    return sources
+
+def run_query(name, params=(), engine=None):
+    """Run a named report query; returns (DataFrame, engine used)"""
+    engine = engine or choose_engine()
+    sql = QUERIES[name]
+    # A table with no exported partitions yet cannot be scanned by DuckDB
+    if engine == 'duckdb' and not _parquet_ready(set(re.findall(r'\{(\w+)\}', sql))):
+        engine = 'sqlite'
+    with ANALYTICS_QUERY_SECONDS.time(engine, name):
+        if engine == 'duckdb':
+            duckdb = _duckdb()
+            conn = duckdb.connect()
+            try:
+                df = conn.execute(sql.format(**_duckdb_sources()), list(params)).df()
+            finally:
+                conn.close()
+        else:
+            conn = get_snapshot_connection()
+            try:
+                df = pd.read_sql_query(sql.format(**SQLITE_SOURCES), conn, params=list(params))
+            finally:
+                conn.close()
+    return df, engine
+
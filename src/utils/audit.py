@@ -0,0 +1,200 @@
+"""
+Append-only audit trail for PenzFlow
+Events are queued in an in-memory ring buffer and written in batches by a
+background thread into monthly tables (audit_log_YYYYMM).
+"""
+import atexit
+import logging
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+import pytz
+
+from config import Config
+from database.init_db import get_connection
+from utils.metrics import counter
+
+logger = logging.getLogger(__name__)
+
+INDONESIA_TZ = pytz.timezone('Asia/Jakarta')
+TABLE_PREFIX = 'audit_log_'
+
+AUDIT_EVENTS = counter(
+    'penzflow_audit_events_total', 'Audit events by outcome', ('result',))
+
+_buffer = deque(maxlen=Config.AUDIT_BUFFER_SIZE)
+_wakeup = threading.Event()
+_flush_lock = threading.Lock()
+_known_tables = set()
+_writer = None
+_writer_lock = threading.Lock()
+_last_retention_run = 0.0
+
+def log_event(action, username=None, entity_type=None, entity_id=None, details=None, status='success'):
+    """Queue an audit event; never blocks on the database"""
+    if len(_buffer) == _buffer.maxlen:
+        # The ring buffer overwrites the oldest event when the writer falls behind
+        AUDIT_EVENTS.inc(1, 'dropped')
+    _buffer.append((
+        int(time.time()), username, action, entity_type,
+        None if entity_id is None else str(entity_id), details, status
+    ))
+    if len(_buffer) >= Config.AUDIT_BATCH_SIZE:
+        _wakeup.set()
+
+def _table_for(timestamp):
+    """Monthly table name for an epoch timestamp (WIB calendar)"""
+    return TABLE_PREFIX + datetime.fromtimestamp(timestamp, INDONESIA_TZ).strftime('%Y%m')
+
+def _ensure_table(cursor, table):
+    if table in _known_tables:
+        return
+    cursor.execute(f'''
+        CREATE TABLE IF NOT EXISTS {table} (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            created_ts INTEGER NOT NULL, -- epoch seconds
+            username TEXT,
+            action TEXT NOT NULL,
+            entity_type TEXT,
+            entity_id TEXT,
+            details TEXT,
+            status TEXT DEFAULT 'success'
+        )
+    ''')
+    cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_created ON {table} (created_ts)")
+    cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_user ON {table} (username, created_ts)")
+    cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_action ON {table} (action, created_ts)")
+    _known_tables.add(table)
+
+def flush_audit_log():
+    """Write all buffered events; returns the number written"""
+    with _flush_lock:
+        events = []
+        while True:
+            try:
+                events.append(_buffer.popleft())
+            except IndexError:
+                break
+        if not events:
+            return 0
+
+        by_table = {}
+        for event in events:
+            by_table.setdefault(_table_for(event[0]), []).append(event)
+
+        conn = get_connection()
+        try:
+            cursor = conn.cursor()
+            for table, rows in by_table.items():
+                _ensure_table(cursor, table)
+                cursor.executemany(f'''
+                    INSERT INTO {table} (created_ts, username, action, entity_type, entity_id, details, status)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                ''', rows)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            # Put the batch back (oldest first) so the next flush retries it
+            _buffer.extendleft(reversed(events))
+            raise
+        finally:
+            conn.close()
+
+        AUDIT_EVENTS.inc(len(events), 'written')
+        return len(events)
+
+def _list_tables(cursor):
+    cursor.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name LIKE ? ORDER BY name",
+        (TABLE_PREFIX + '%',)
+    )
+    return [row[0] for row in cursor.fetchall()]
+
+def apply_retention(months=None):
+    """Drop monthly tables older than the retention window; returns dropped names"""
+    months = Config.AUDIT_RETENTION_MONTHS if months is None else months
+    now = datetime.now(INDONESIA_TZ)
+    month_index = now.year * 12 + now.month - 1 - months
+    oldest_kept = TABLE_PREFIX + f"{month_index // 12:04d}{month_index % 12 + 1:02d}"
+
+    conn = get_connection()
+    try:
+        cursor = conn.cursor()
+        dropped = [table for table in _list_tables(cursor) if table <= oldest_kept]
+        for table in dropped:
+            cursor.execute(f"DROP TABLE IF EXISTS {table}")
+            _known_tables.discard(table)
+        conn.commit()
+    finally:
+        conn.close()
+    return dropped
+
+def get_audit_events(username=None, action=None, start_ts=None, end_ts=None, limit=100):
+    """Newest-first audit events, reading only the monthly tables in range"""
+    flush_audit_log()
+
+    conn = get_connection()
+    try:
+        cursor = conn.cursor()
+        tables = _list_tables(cursor)
+        if start_ts is not None:
+            tables = [t for t in tables if t >= _table_for(start_ts)]
+        if end_ts is not None:
+            tables = [t for t in tables if t <= _table_for(end_ts)]
+
+        conditions, params = [], []
+        if username:
+            conditions.append("username = ?")
+            params.append(username)
+        if action:
+            conditions.append("action = ?")
+            params.append(action)
+        if start_ts is not None:
+            conditions.append("created_ts >= ?")
+            params.append(int(start_ts))
+        if end_ts is not None:
+            conditions.append("created_ts <= ?")
+            params.append(int(end_ts))
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+
+        events = []
+        # Walk months newest first and stop once the limit is filled
+        for table in reversed(tables):
+            cursor.execute(f'''
+                SELECT created_ts, username, action, entity_type, entity_id, details, status
+                FROM {table} {where}
+                ORDER BY created_ts DESC, id DESC
+                LIMIT ?
+            ''', params + [limit - len(events)])
+            events.extend(cursor.fetchall())
+            if len(events) >= limit:
+                break
+        return events
+    finally:
+        conn.close()
+
+def _writer_loop():
+    global _last_retention_run
+    while True:
+        _wakeup.wait(Config.AUDIT_FLUSH_INTERVAL)
+        _wakeup.clear()
+        try:
+            flush_audit_log()
+            if time.time() - _last_retention_run > 86400:
+                apply_retention()
+                _last_retention_run = time.time()
+        except Exception:
+            # Failed batches go back into the buffer and are retried on the next wakeup
+            logger.exception("Audit writer error")
+
+def start_audit_writer():
+    """Start the background writer once per process"""
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = threading.Thread(target=_writer_loop, name='audit-writer', daemon=True)
+            _writer.start()
+            atexit.register(flush_audit_log)
+    return _writer
@@ -2,6 +2,8 @@ import streamlit as st
 import sqlite3
 from datetime import datetime
 from database.init_db import get_connection
+from utils.metrics import LOGINS, end_session
+from utils.audit import log_event
 
 def check_login():
     """Check if user is logged in"""
@@ -35,17 +37,26 @@ def login_user(username, password):
             st.session_state.user_role = user[2]
             
             conn.close()
+            LOGINS.inc(1, 'success')
+            log_event('login', username, 'user', user[0])
             return True
         
         conn.close()
+        LOGINS.inc(1, 'failure')
+        log_event('login', username, status='failed')
         return False
         
     except Exception as e:
+        LOGINS.inc(1, 'error')
         st.error(f"Login error: {str(e)}")
         return False
 
 def logout_user():
     """Log out the current user"""
+    if 'username' in st.session_state:
+        log_event('logout', st.session_state.username)
+    if 'session_id' in st.session_state:
+        end_session(st.session_state.session_id)
     keys_to_remove = ['logged_in', 'user_id', 'username', 'user_role']
     for key in keys_to_remove:
         if key in st.session_state:
@@ -0,0 +1,227 @@
+"""
+Batch demand forecasting
+Daily units ordered (sales and submitted mobile orders) for every product
+are read with one query into a products x days NumPy matrix. Each product
+is classified by its average demand interval: intermittent products get
+Croston's method (Syntetos-Boylan corrected), the rest additive
+Holt-Winters with a weekly season, its smoothing parameters picked per
+product from a small grid by in-sample error. Both models step through time
+once with every product (and every grid point) in the same arrays, so the
+whole catalog is one pass of vector operations rather than a fit per SKU.
+Forecasts with approximate 95% bands are stored in demand_forecasts by a
+nightly job.
+"""
+import time
+from datetime import datetime, timedelta
+from itertools import product as grid
+
+import numpy as np
+import pandas as pd
+
+from config import Config
+from database.init_db import get_connection
+from database.repository import INDONESIA_TZ, wib_date_key
+from utils.metrics import histogram
+
+FORECAST_SECONDS = histogram(
+    'penzflow_forecast_seconds', 'Time to fit and store demand forecasts for the catalog')
+
+# Average demand interval above which demand counts as intermittent (Syntetos-Boylan)
+INTERMITTENT_ADI = 1.32
+CROSTON_ALPHA = 0.1
+HW_ALPHAS = (0.1, 0.3, 0.5)
+HW_BETAS = (0.01, 0.1)
+HW_GAMMAS = (0.05, 0.2)
+Z_95 = 1.96
+
+def _today():
+    return datetime.now(INDONESIA_TZ).date()
+
+def load_daily_demand(days=None, end_date=None, product_id=None):
+    """Units ordered per product per WIB day up to end_date (today by default), of one product only when
+    product_id is given; returns (product ids, first date, products x days matrix)"""
+    days = days or Config.FORECAST_HISTORY_DAYS
+    end = end_date or _today()
+    start = end - timedelta(days=days - 1)
+    conn = get_connection()
+    try:
+        if product_id is None:
+            product_ids = pd.read_sql_query("SELECT id FROM products ORDER BY id", conn)['id'].to_numpy(dtype=np.int64)
+            sales_filter = mobile_filter = ''
+        else:
+            product_ids = np.array([product_id], dtype=np.int64)
+            sales_filter, mobile_filter = 'AND oi.product_id = :product_id', 'AND mi.product_id = :product_id'
+        demand = pd.read_sql_query(f'''
+            SELECT product_id, day, SUM(quantity) AS quantity FROM (
+                SELECT oi.product_id, so.order_local_date AS day, oi.quantity
+                FROM order_items oi JOIN sales_orders so ON so.id = oi.order_id
+                WHERE so.order_local_date BETWEEN :start AND :end AND so.status != 'cancelled' {sales_filter}
+                UNION ALL
+                SELECT mi.product_id, mo.order_local_date, mi.quantity
+                FROM mobile_order_items mi JOIN mobile_orders mo ON mo.id = mi.mobile_order_id
+                WHERE mo.order_local_date BETWEEN :start AND :end
+                  AND mo.status NOT IN ('draft', 'rejected', 'expired', 'cancelled', 'converted') {mobile_filter}
+            )
+            WHERE product_id IS NOT NULL
+            GROUP BY product_id, day
+        ''', conn, params={'start': wib_date_key(start), 'end': wib_date_key(end), 'product_id': product_id})
+    finally:
+        conn.close()
+
+    matrix = np.zeros((len(product_ids), days))
+    if not demand.empty:
+        rows = np.searchsorted(product_ids, demand['product_id'].to_numpy(dtype=np.int64))
+        known = (rows < len(product_ids)) & (product_ids[np.minimum(rows, len(product_ids) - 1)] == demand['product_id'])
+        day_dates = pd.to_datetime(demand['day'].astype(str), format='%Y%m%d')
+        columns = (day_dates - pd.Timestamp(start)).dt.days.to_numpy()
+        np.add.at(matrix, (rows[known], columns[known]), demand['quantity'].to_numpy(dtype=float)[known])
+    return product_ids, start, matrix
+
+def classify(matrix):
+    """Boolean mask of intermittent rows (average interval between demand days above INTERMITTENT_ADI)"""
+    demand_days = (matrix > 0).sum(axis=1)
+    adi = np.where(demand_days > 0, matrix.shape[1] / np.maximum(demand_days, 1), np.inf)
+    return adi > INTERMITTENT_ADI
+
+def croston(matrix, horizon, alpha=CROSTON_ALPHA):
+    """Croston/SBA for every row at once; returns (forecast, residual std), forecast is products x horizon"""
+    n, periods = matrix.shape
+    size = np.zeros(n)
+    interval = np.ones(n)
+    since = np.ones(n)
+    seen = np.zeros(n, dtype=bool)
+    sse = np.zeros(n)
+    for t in range(periods):
+        y = matrix[:, t]
+        rate = np.where(seen, size / interval * (1 - alpha / 2), 0.0)
+        sse += np.where(seen, (y - rate) ** 2, 0.0)
+        demand = y > 0
+        first = demand & ~seen
+        size = np.where(first, y, np.where(demand, size + alpha * (y - size), size))
+        interval = np.where(first, since, np.where(demand, interval + alpha * (since - interval), interval))
+        since = np.where(demand, 1.0, since + 1)
+        seen |= demand
+    rate = np.where(seen, size / interval * (1 - alpha / 2), 0.0)
+    sigma = np.sqrt(sse / periods)
+    return np.repeat(rate[:, None], horizon, axis=1), sigma
+
+def holt_winters(matrix, horizon, season=None, alphas=HW_ALPHAS, betas=HW_BETAS, gammas=HW_GAMMAS):
+    """Additive Holt-Winters for every row and every grid point at once, keeping each row's best
+    parameters by in-sample squared error; returns (forecast, residual std, alpha)"""
+    season = season or Config.FORECAST_SEASON_DAYS
+    n, periods = matrix.shape
+    if periods < 2 * season:
+        raise ValueError(f"Holt-Winters needs at least {2 * season} days of history")
+    params = np.array(list(grid(alphas, betas, gammas)))
+    alpha, beta, gamma = (params[:, i][:, None] for i in range(3))
+
+    first = matrix[:, :season].mean(axis=1)
+    level = np.tile(first, (len(params), 1))
+    trend = np.tile((matrix[:, season:2 * season].mean(axis=1) - first) / season, (len(params), 1))
+    seasonal = np.tile(matrix[:, :season] - first[:, None], (len(params), 1, 1))
+    sse = np.zeros((len(params), n))
+    for t in range(season, periods):
+        i = t % season
+        error = matrix[:, t] - (level + trend + seasonal[:, :, i])
+        sse += error ** 2
+        level = level + trend + alpha * error
+        trend = trend + alpha * beta * error
+        seasonal[:, :, i] += gamma * (1 - alpha) * error
+
+    best = sse.argmin(axis=0)
+    rows = np.arange(n)
+    level, trend, seasonal = level[best, rows], trend[best, rows], seasonal[best, rows]
+    steps = np.arange(1, horizon + 1)
+    forecast = level[:, None] + steps[None, :] * trend[:, None] + seasonal[:, (periods + steps - 1) % season]
+    sigma = np.sqrt(sse[best, rows] / (periods - season))
+    return forecast, sigma, params[best, 0]
+
+def forecast_matrix(matrix, horizon=None):
+    """Forecast, lower and upper bands (products x horizon) and the model name per row"""
+    horizon = horizon or Config.FORECAST_HORIZON_DAYS
+    n = matrix.shape[0]
+    forecast = np.zeros((n, horizon))
+    spread = np.zeros((n, horizon))
+    models = np.full(n, 'none', dtype=object)
+    steps = np.arange(1, horizon + 1)
+
+    active = matrix.sum(axis=1) > 0
+    intermittent = active & classify(matrix)
+    smooth = active & ~intermittent
+    if intermittent.any():
+        rows = np.flatnonzero(intermittent)
+        forecast[rows], sigma = croston(matrix[rows], horizon)
+        spread[rows] = Z_95 * sigma[:, None] * np.sqrt(1 + (steps[None, :] - 1) * CROSTON_ALPHA ** 2)
+        models[rows] = 'croston'
+    if smooth.any():
+        rows = np.flatnonzero(smooth)
+        forecast[rows], sigma, alpha = holt_winters(matrix[rows], horizon)
+        # Simple-exponential-smoothing variance growth; ignores the trend and season terms
+        spread[rows] = Z_95 * sigma[:, None] * np.sqrt(1 + (steps[None, :] - 1) * alpha[:, None] ** 2)
+        models[rows] = 'holt_winters'
+    forecast = np.maximum(forecast, 0)
+    return forecast, np.maximum(forecast - spread, 0), forecast + spread, models
+
+def refresh_forecasts(progress=None):
+    """Fit every product and replace the stored forecasts; returns a summary"""
+    started = time.perf_counter()
+    product_ids, _, matrix = load_daily_demand()
+    if progress:
+        progress(0.3, f"Fitting {len(product_ids)} products")
+    forecast, lower, upper, models = forecast_matrix(matrix)
+    horizon = forecast.shape[1]
+    first_day = _today() + timedelta(days=1)
+    day_keys = np.array([wib_date_key(first_day + timedelta(days=h)) for h in range(horizon)])
+    generated_ts = int(time.time())
+    if progress:
+        progress(0.7, 'Storing forecasts')
+
+    rows = zip(np.repeat(product_ids, horizon).tolist(), np.tile(day_keys, len(product_ids)).tolist(),
+               forecast.round(3).ravel().tolist(), lower.round(3).ravel().tolist(), upper.round(3).ravel().tolist(),
+               np.repeat(models, horizon).tolist(), [generated_ts] * forecast.size)
+    conn = get_connection()
+    conn.isolation_level = None
+    try:
+        cursor = conn.cursor()
+        cursor.execute("BEGIN IMMEDIATE")
+        try:
+            cursor.execute("DELETE FROM demand_forecasts")
+            cursor.executemany('''
+                INSERT INTO demand_forecasts (product_id, forecast_date, quantity, lower_bound, upper_bound, model,
+                                              generated_ts)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', rows)
+            cursor.execute("COMMIT")
+        except Exception:
+            cursor.execute("ROLLBACK")
+            raise
+    finally:
+        conn.close()
+    elapsed = time.perf_counter() - started
+    FORECAST_SECONDS.observe(elapsed)
+    return {
+        'products': len(product_ids),
+        'croston': int((models == 'croston').sum()),
+        'holt_winters': int((models == 'holt_winters').sum()),
+        'no_demand': int((models == 'none').sum()),
+        'horizon_days': horizon,
+        'seconds': round(elapsed, 2)
+    }
+
+def get_product_forecast(product_id):
+    """Stored forecast of one product with its bands, by date"""
+    conn = get_connection()
+    try:
+        forecast = pd.read_sql_query('''
+            SELECT forecast_date, quantity, lower_bound, upper_bound, model, generated_ts
+            FROM demand_forecasts WHERE product_id = ? ORDER BY forecast_date
+        ''', conn, params=(product_id,))
+    finally:
+        conn.close()
+    forecast['date'] = pd.to_datetime(forecast['forecast_date'].astype(str), format='%Y%m%d')
+    return forecast
+
+def get_product_demand(product_id, days=90):
+    """Daily units ordered of one product over the last days, zeros included"""
+    _, start, matrix = load_daily_demand(days, product_id=product_id)
+    return pd.DataFrame({'date': pd.date_range(start, periods=days, freq='D'), 'quantity': matrix[0]})
@@ -2,6 +2,7 @@ import streamlit as st
 from datetime import datetime
 import pandas as pd
 import pytz
+from database.sequence import next_number
 
 # Indonesian timezone
 INDONESIA_TZ = pytz.timezone('Asia/Jakarta')
@@ -51,10 +52,9 @@ def format_phone(phone):
     else:
         return phone
 
-def generate_order_number():
-    """Generate unique order number"""
-    timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
-    return f"ORD{timestamp}"
+def generate_order_number(prefix='ORD', branch=None):
+    """Generate unique order number from the block-allocated sequence"""
+    return next_number(prefix, branch)
 
 def generate_sku(category, sequence):
     """Generate SKU for products"""
@@ -0,0 +1,351 @@
+"""
+Background job runner for PenzFlow
+Jobs are persisted in the `jobs` table and executed by a pool of worker
+threads, so long-running work (exports, backups, purchase orders) runs off
+the Streamlit script and survives browser reloads.
+"""
+import json
+import logging
+import os
+import threading
+import time
+
+from config import Config
+from database.init_db import get_connection
+from utils.metrics import counter
+
+logger = logging.getLogger(__name__)
+
+JOBS_FINISHED = counter(
+    'penzflow_jobs_finished_total', 'Background jobs by type and final status', ('job_type', 'status'))
+
+ACTIVE_STATUSES = ('queued', 'running')
+
+_handlers = {}
+_workers = []
+_workers_lock = threading.Lock()
+_wakeup = threading.Event()
+_running = set()
+_running_lock = threading.Lock()
+
+class JobCancelled(Exception):
+    """Raised inside a handler when the user cancelled the job"""
+
+class JobFailed(Exception):
+    """Raise from a handler to fail the job without retrying"""
+
+def register_job(job_type):
+    """Decorator registering a handler: handler(ctx, params) -> JSON-serialisable result"""
+    def decorator(func):
+        _handlers[job_type] = func
+        return func
+    return decorator
+
+class JobContext:
+    """Handle passed to job handlers for progress reporting and cancellation"""
+
+    def __init__(self, job_id, job_type, attempt):
+        self.job_id = job_id
+        self.job_type = job_type
+        self.attempt = attempt
+
+    def progress(self, fraction, message=None):
+        """Store progress (0..1) and a status message; raises JobCancelled if cancelled"""
+        conn = get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute('''
+                UPDATE jobs SET progress = ?, message = COALESCE(?, message), heartbeat_ts = ?
+                WHERE id = ?
+            ''', (max(0.0, min(1.0, fraction)), message, int(time.time()), self.job_id))
+            cursor.execute("SELECT cancel_requested FROM jobs WHERE id = ?", (self.job_id,))
+            cancelled = cursor.fetchone()[0]
+            conn.commit()
+        finally:
+            conn.close()
+        if cancelled:
+            raise JobCancelled()
+
+    def check_cancelled(self):
+        """Raise JobCancelled if cancellation was requested"""
+        conn = get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT cancel_requested FROM jobs WHERE id = ?", (self.job_id,))
+            cancelled = cursor.fetchone()[0]
+        finally:
+            conn.close()
+        if cancelled:
+            raise JobCancelled()
+
+def enqueue_job(job_type, params=None, created_by=None, max_attempts=None, delay=0):
+    """Queue a job and return its id"""
+    if job_type not in _handlers:
+        _load_handlers()
+    if job_type not in _handlers:
+        raise ValueError(f"Unknown job type: {job_type}")
+
+    conn = get_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute('''
+            INSERT INTO jobs (job_type, params, status, max_attempts, run_after, created_by)
+            VALUES (?, ?, 'queued', ?, ?, ?)
+        ''', (
+            job_type, json.dumps(params or {}),
+            max_attempts or Config.JOB_MAX_ATTEMPTS,
+            int(time.time()) + delay, created_by
+        ))
+        job_id = cursor.lastrowid
+        conn.commit()
+    finally:
+        conn.close()
+    _wakeup.set()
+    return job_id
+
+def cancel_job(job_id):
+    """Cancel a queued job immediately or ask a running one to stop"""
+    conn = get_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute('''
+            UPDATE jobs SET status = 'cancelled', finished_at = CURRENT_TIMESTAMP, message = 'Cancelled'
+            WHERE id = ? AND status = 'queued'
+        ''', (job_id,))
+        if cursor.rowcount == 0:
+            cursor.execute('''
+                UPDATE jobs SET cancel_requested = 1, message = 'Cancelling...'
+                WHERE id = ? AND status = 'running'
+            ''', (job_id,))
+        conn.commit()
+        return cursor.rowcount > 0
+    finally:
+        conn.close()
+
+def _row_to_job(row):
+    keys = ('id', 'job_type', 'params', 'status', 'progress', 'message', 'result', 'error',
+            'attempts', 'max_attempts', 'created_by', 'created_at', 'started_at', 'finished_at')
+    job = dict(zip(keys, row))
+    job['params'] = json.loads(job['params']) if job['params'] else {}
+    job['result'] = json.loads(job['result']) if job['result'] else None
+    return job
+
+_JOB_COLUMNS = '''id, job_type, params, status, progress, message, result, error,
+    attempts, max_attempts, created_by, created_at, started_at, finished_at'''
+
+def get_job(job_id):
+    """Fetch one job as a dict"""
+    conn = get_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(f"SELECT {_JOB_COLUMNS} FROM jobs WHERE id = ?", (job_id,))
+        row = cursor.fetchone()
+        return _row_to_job(row) if row else None
+    finally:
+        conn.close()
+
+def get_jobs(created_by=None, job_types=None, limit=20):
+    """Most recent jobs, optionally for one user and/or job types"""
+    conditions, params = [], []
+    if created_by:
+        conditions.append("created_by = ?")
+        params.append(created_by)
+    if job_types:
+        conditions.append(f"job_type IN ({','.join('?' * len(job_types))})")
+        params.extend(job_types)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+
+    conn = get_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(f"SELECT {_JOB_COLUMNS} FROM jobs {where} ORDER BY id DESC LIMIT ?", params + [limit])
+        return [_row_to_job(row) for row in cursor.fetchall()]
+    finally:
+        conn.close()
+
+def _claim_next_job(worker_name):
+    """Atomically move the next due job to 'running'; returns (id, type, params, attempt)"""
+    conn = get_connection()
+    conn.isolation_level = None
+    try:
+        cursor = conn.cursor()
+        # IMMEDIATE takes the write lock up front so two workers never claim the same row
+        cursor.execute("BEGIN IMMEDIATE")
+        cursor.execute('''
+            SELECT id, job_type, params, attempts FROM jobs
+            WHERE status = 'queued' AND run_after <= ?
+            ORDER BY run_after, id LIMIT 1
+        ''', (int(time.time()),))
+        row = cursor.fetchone()
+        if row is None:
+            cursor.execute("COMMIT")
+            return None
+        job_id, job_type, params, attempts = row
+        cursor.execute('''
+            UPDATE jobs SET status = 'running', attempts = attempts + 1, worker = ?,
+                started_at = CURRENT_TIMESTAMP, heartbeat_ts = ?, progress = 0, error = NULL
+            WHERE id = ?
+        ''', (worker_name, int(time.time()), job_id))
+        cursor.execute("COMMIT")
+        return job_id, job_type, json.loads(params or '{}'), attempts + 1
+    except Exception:
+        if conn.in_transaction:
+            cursor.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
+
+def _finish_job(job_id, status, result=None, error=None, message=None):
+    conn = get_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute('''
+            UPDATE jobs SET status = ?, result = ?, error = ?, message = COALESCE(?, message),
+                progress = CASE WHEN ? = 'succeeded' THEN 1 ELSE progress END,
+                finished_at = CURRENT_TIMESTAMP
+            WHERE id = ?
+        ''', (status, json.dumps(result) if result is not None else None, error, message, status, job_id))
+        conn.commit()
+    finally:
+        conn.close()
+
+def _retry_job(job_id, attempt, error):
+    delay = Config.JOB_RETRY_BASE_DELAY * (2 ** (attempt - 1))
+    conn = get_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute('''
+            UPDATE jobs SET status = 'queued', run_after = ?, error = ?,
+                message = ?
+            WHERE id = ?
+        ''', (int(time.time()) + delay, error, f"Retrying in {delay}s (attempt {attempt} failed)", job_id))
+        conn.commit()
+    finally:
+        conn.close()
+
+def _run_job(job_id, job_type, params, attempt):
+    handler = _handlers.get(job_type)
+    if handler is None:
+        _finish_job(job_id, 'failed', error=f"No handler registered for {job_type}")
+        JOBS_FINISHED.inc(1, job_type, 'failed')
+        return
+
+    ctx = JobContext(job_id, job_type, attempt)
+    with _running_lock:
+        _running.add(job_id)
+    try:
+        result = handler(ctx, params)
+        _finish_job(job_id, 'succeeded', result=result, message='Completed')
+        JOBS_FINISHED.inc(1, job_type, 'succeeded')
+    except JobCancelled:
+        _finish_job(job_id, 'cancelled', message='Cancelled')
+        JOBS_FINISHED.inc(1, job_type, 'cancelled')
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+        job = get_job(job_id)
+        if not isinstance(e, JobFailed) and job and attempt < job['max_attempts']:
+            logger.warning("Job %s (%s) attempt %s failed, retrying: %s", job_id, job_type, attempt, error)
+            _retry_job(job_id, attempt, error)
+        else:
+            logger.exception("Job %s (%s) failed", job_id, job_type)
+            _finish_job(job_id, 'failed', error=error, message='Failed')
+            JOBS_FINISHED.inc(1, job_type, 'failed')
+    finally:
+        with _running_lock:
+            _running.discard(job_id)
+
+def _heartbeat():
+    """Refresh heartbeat_ts for jobs running in this process"""
+    with _running_lock:
+        job_ids = list(_running)
+    if not job_ids:
+        return
+    conn = get_connection()
+    try:
+        conn.execute(
+            f"UPDATE jobs SET heartbeat_ts = ? WHERE id IN ({','.join('?' * len(job_ids))})",
+            [int(time.time())] + job_ids
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+def recover_stale_jobs():
+    """Requeue running jobs whose process stopped sending heartbeats; jobs that have used all their
+    attempts fail instead. Returns the number requeued"""
+    stale_before = int(time.time()) - Config.JOB_STALE_AFTER
+    conn = get_connection()
+    conn.isolation_level = None
+    try:
+        cursor = conn.cursor()
+        cursor.execute("BEGIN IMMEDIATE")
+        try:
+            cursor.execute('''
+                SELECT job_type, COUNT(*) FROM jobs
+                WHERE status = 'running' AND heartbeat_ts < ? AND attempts >= max_attempts
+                GROUP BY job_type
+            ''', (stale_before,))
+            failed = cursor.fetchall()
+            cursor.execute('''
+                UPDATE jobs SET status = 'failed', error = 'Worker stopped during the last attempt',
+                    message = 'Failed', finished_at = CURRENT_TIMESTAMP
+                WHERE status = 'running' AND heartbeat_ts < ? AND attempts >= max_attempts
+            ''', (stale_before,))
+            cursor.execute('''
+                UPDATE jobs SET status = 'queued', message = 'Requeued after worker stopped'
+                WHERE status = 'running' AND heartbeat_ts < ?
+            ''', (stale_before,))
+            requeued = cursor.rowcount
+            cursor.execute("COMMIT")
+        except Exception:
+            cursor.execute("ROLLBACK")
+            raise
+    finally:
+        conn.close()
+    for job_type, count in failed:
+        JOBS_FINISHED.inc(count, job_type, 'failed')
+    return requeued
+
+def _maintenance_loop():
+    # On its own thread so a long job on a worker never holds up the heartbeats of this process
+    while True:
+        try:
+            _heartbeat()
+            recover_stale_jobs()
+        except Exception:
+            logger.exception("Job heartbeat error")
+        time.sleep(Config.JOB_HEARTBEAT_INTERVAL)
+
+def _worker_loop(worker_name):
+    while True:
+        try:
+            claimed = _claim_next_job(worker_name)
+        except Exception:
+            logger.exception("Job worker %s error", worker_name)
+            claimed = None
+        if claimed is None:
+            _wakeup.wait(Config.JOB_POLL_INTERVAL)
+            _wakeup.clear()
+            continue
+        _run_job(*claimed)
+
+def _load_handlers():
+    # Handlers live in utils.tasks; importing it registers them
+    import utils.tasks  # noqa: F401
+
+def start_job_workers(num_workers=None):
+    """Start the worker pool once per process"""
+    with _workers_lock:
+        if _workers:
+            return _workers
+        _load_handlers()
+        num_workers = num_workers or Config.JOB_WORKERS
+        for index in range(num_workers):
+            name = f"{os.getpid()}-{index}"
+            thread = threading.Thread(target=_worker_loop, args=(name,), name=f"job-worker-{index}", daemon=True)
+            thread.start()
+            _workers.append(thread)
+        thread = threading.Thread(target=_maintenance_loop, name='job-heartbeat', daemon=True)
+        thread.start()
+        _workers.append(thread)
+        return _workers
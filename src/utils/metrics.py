@@ -0,0 +1,275 @@
+"""
+In-process metrics registry for PenzFlow
+Counters, gauges and fixed-bucket histograms exported in Prometheus text format
+"""
+import bisect
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+# Default latency buckets in seconds (Prometheus client defaults)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SQL_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+
+def _escape(value):
+    """Escape a label value for the text format"""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_labels(label_names, label_values, extra=None):
+    """Render a label set as {name="value",...}"""
+    pairs = list(zip(label_names, label_values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    rendered = ','.join(f'{name}="{_escape(value)}"' for name, value in pairs)
+    return '{' + rendered + '}'
+
+def _format_value(value):
+    """Render a sample value the way Prometheus expects"""
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+class _Metric:
+    """Base class holding one value per label combination"""
+    metric_type = 'untyped'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels):
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {labels}")
+        return tuple(str(value) for value in labels)
+
+    def samples(self):
+        """Return (suffix, label values, extra label, value) tuples for export"""
+        with self._lock:
+            return [('', key, None, value) for key, value in self._values.items()]
+
+    def expose(self):
+        """Render this metric in Prometheus text exposition format"""
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.metric_type}",
+        ]
+        for suffix, key, extra, value in self.samples():
+            labels = _format_labels(self.labelnames, key, extra)
+            lines.append(f"{self.name}{suffix}{labels} {_format_value(value)}")
+        return '\n'.join(lines)
+
+class Counter(_Metric):
+    """Monotonically increasing counter"""
+    metric_type = 'counter'
+
+    def inc(self, amount=1, *labels):
+        if amount < 0:
+            raise ValueError("Counters can only increase")
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+class Gauge(_Metric):
+    """Value that can go up and down, optionally computed at scrape time"""
+    metric_type = 'gauge'
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._function = None
+
+    def set(self, value, *labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount=1, *labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, *labels):
+        self.inc(-amount, *labels)
+
+    def set_function(self, function):
+        """Compute the (unlabelled) value lazily when the registry is scraped"""
+        self._function = function
+
+    def samples(self):
+        if self._function is not None:
+            return [('', (), None, self._function())]
+        return super().samples()
+
+class Histogram(_Metric):
+    """Histogram with fixed upper bounds; cumulative counts are built at export time"""
+    metric_type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, *labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # Per-bucket counts (last slot is +Inf), sum, count
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, *labels):
+        """Observe the wall-clock duration of a block"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *labels)
+
+    def samples(self):
+        with self._lock:
+            snapshot = [(key, list(state[0]), state[1], state[2]) for key, state in self._values.items()]
+        samples = []
+        for key, counts, total, count in snapshot:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                samples.append(('_bucket', key, ('le', _format_value(float(bound))), cumulative))
+            samples.append(('_sum', key, None, total))
+            samples.append(('_count', key, None, count))
+        return samples
+
+class Registry:
+    """Collection of metrics rendered together"""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def expose(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return '\n'.join(metric.expose() for metric in metrics) + '\n'
+
+REGISTRY = Registry()
+
+def counter(name, documentation, labelnames=()):
+    """Create (or fetch) a counter in the default registry"""
+    return REGISTRY.register(Counter(name, documentation, labelnames))
+
+def gauge(name, documentation, labelnames=()):
+    """Create (or fetch) a gauge in the default registry"""
+    return REGISTRY.register(Gauge(name, documentation, labelnames))
+
+def histogram(name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+    """Create (or fetch) a histogram in the default registry"""
+    return REGISTRY.register(Histogram(name, documentation, labelnames, buckets))
+
+# Application metrics
+PAGE_RENDER_SECONDS = histogram(
+    'penzflow_page_render_seconds', 'Time spent rendering a page', ('page',))
+SQL_QUERY_SECONDS = histogram(
+    'penzflow_sql_query_seconds', 'SQLite statement execution time', ('operation',), SQL_BUCKETS)
+CACHE_REQUESTS = counter(
+    'penzflow_cache_requests_total', 'Cache lookups by cache name and result', ('cache', 'result'))
+LOGINS = counter(
+    'penzflow_logins_total', 'Login attempts by result', ('result',))
+ORDERS_CREATED = counter(
+    'penzflow_orders_created_total', 'Orders written by source', ('source',))
+CHECKINS = counter(
+    'penzflow_checkins_total', 'Attendance and visit check-ins', ('kind',))
+ACTIVE_SESSIONS = gauge(
+    'penzflow_active_sessions', 'Browser sessions seen within the session timeout')
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+_session_timeout = 3600
+
+def touch_session(session_id):
+    """Mark a browser session as active"""
+    now = time.monotonic()
+    with _sessions_lock:
+        _sessions[session_id] = now
+
+def end_session(session_id):
+    """Forget a session (e.g. on logout)"""
+    with _sessions_lock:
+        _sessions.pop(session_id, None)
+
+def _count_active_sessions():
+    cutoff = time.monotonic() - _session_timeout
+    with _sessions_lock:
+        for session_id in [sid for sid, seen in _sessions.items() if seen < cutoff]:
+            del _sessions[session_id]
+        return len(_sessions)
+
+ACTIVE_SESSIONS.set_function(_count_active_sessions)
+
+def record_cache(cache_name, hit):
+    """Count a cache hit or miss"""
+    CACHE_REQUESTS.inc(1, cache_name, 'hit' if hit else 'miss')
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    """Serve the registry on /metrics"""
+
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = REGISTRY.expose().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Scrapes every few seconds would flood the Streamlit log
+        pass
+
+_server = None
+_server_lock = threading.Lock()
+# Stored in _server when the port could not be bound, so Streamlit reruns do not retry it
+_BIND_FAILED = object()
+
+def start_metrics_server(host='127.0.0.1', port=9464, session_timeout=3600):
+    """Start the exporter once per process; later calls are no-ops (returns None if it could not bind)"""
+    global _server, _session_timeout
+    with _server_lock:
+        if _server is _BIND_FAILED:
+            return None
+        if _server is not None:
+            return _server
+        _session_timeout = session_timeout
+        try:
+            _server = ThreadingHTTPServer((host, port), _MetricsHandler)
+        except OSError as e:
+            # Port taken (e.g. a second app process); metrics stay in-process only
+            logger.warning("Metrics exporter could not bind %s:%s, not retrying in this process: %s", host, port, e)
+            _server = _BIND_FAILED
+            return None
+        _server.daemon_threads = True
+        thread = threading.Thread(target=_server.serve_forever, name='metrics-exporter', daemon=True)
+        thread.start()
+        return _server
@@ -0,0 +1,198 @@
+"""
+Bulk catalog price updates
+New prices come from a CSV (sku, price) and/or rules (category or
+supplier x percentage or amount). Both are resolved into a temporary
+staging table with set-based SQL, so the preview and the update are a few
+statements regardless of how many SKUs change. Applying writes the
+products, one price_history row per changed product and a price_updates
+record in a single transaction; the update key makes a retried job a
+no-op instead of a second increase.
+"""
+import io
+import os
+import time
+import uuid
+
+import pandas as pd
+
+from config import Config
+from database.init_db import get_connection
+from utils.pricing import invalidate_price_index
+
+RULE_FIELDS = ('category', 'supplier')
+RULE_KINDS = ('percent', 'amount')
+
+def read_price_csv(data):
+    """(sku, price) rows from CSV bytes or text; raises ValueError on a malformed file"""
+    if isinstance(data, bytes):
+        data = data.decode('utf-8-sig')
+    df = pd.read_csv(io.StringIO(data), dtype={'sku': str})
+    df.columns = [column.strip().lower() for column in df.columns]
+    missing = {'sku', 'price'} - set(df.columns)
+    if missing:
+        raise ValueError(f"CSV is missing column(s): {', '.join(sorted(missing))}")
+    df = df[['sku', 'price']].dropna(subset=['sku'])
+    df['sku'] = df['sku'].str.strip()
+    prices = pd.to_numeric(df['price'], errors='coerce')
+    invalid = df.loc[prices.isna() | (prices < 0), 'sku'].tolist()
+    if invalid:
+        raise ValueError(f"Invalid price for SKU(s): {', '.join(invalid[:10])}")
+    df['price'] = prices.round().astype(int)
+    return df.drop_duplicates('sku', keep='last')
+
+def save_upload(data):
+    """Keep an uploaded CSV for the background job; returns its path"""
+    os.makedirs(Config.PRICE_UPDATE_DIR, exist_ok=True)
+    path = os.path.join(Config.PRICE_UPDATE_DIR, f"prices_{time.strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}.csv")
+    with open(path, 'wb') as f:
+        f.write(data if isinstance(data, bytes) else data.encode('utf-8'))
+    return path
+
+def _stage(cursor, rules=(), csv_rows=None, round_to=1):
+    """Fill temp.price_update_stage with (product_id, old_price, new_price); returns SKUs not found"""
+    cursor.execute("DROP TABLE IF EXISTS temp.price_update_stage")
+    cursor.execute('''
+        CREATE TEMP TABLE price_update_stage (product_id INTEGER PRIMARY KEY, old_price INTEGER, new_price INTEGER)
+    ''')
+    cursor.execute("INSERT INTO temp.price_update_stage SELECT id, price, price FROM products")
+
+    # Rules apply in order, each on top of the previous result
+    for rule in rules:
+        field, kind, change = rule['field'], rule['kind'], float(rule['change'])
+        if field not in RULE_FIELDS or kind not in RULE_KINDS:
+            raise ValueError(f"Unsupported rule: {field} x {kind}")
+        expression = "new_price * (1 + ? / 100.0)" if kind == 'percent' else "new_price + ?"
+        cursor.execute(f'''
+            UPDATE temp.price_update_stage
+            SET new_price = MAX(0, CAST(ROUND(({expression}) / ?) * ? AS INTEGER))
+            WHERE product_id IN (SELECT id FROM products WHERE {field} = ?)
+        ''', (change, round_to, round_to, rule['value']))
+
+    unknown = []
+    if csv_rows is not None and len(csv_rows):
+        cursor.execute("CREATE TEMP TABLE IF NOT EXISTS price_update_csv (sku TEXT PRIMARY KEY, price INTEGER)")
+        cursor.execute("DELETE FROM temp.price_update_csv")
+        cursor.executemany("INSERT OR REPLACE INTO temp.price_update_csv VALUES (?, ?)",
+                           csv_rows[['sku', 'price']].itertuples(index=False, name=None))
+        # CSV prices are explicit and override any rule result
+        cursor.execute('''
+            UPDATE temp.price_update_stage
+            SET new_price = c.price
+            FROM temp.price_update_csv c JOIN products p ON p.sku = c.sku
+            WHERE p.id = price_update_stage.product_id
+        ''')
+        cursor.execute('''
+            SELECT c.sku FROM temp.price_update_csv c LEFT JOIN products p ON p.sku = c.sku WHERE p.id IS NULL
+        ''')
+        unknown = [row[0] for row in cursor.fetchall()]
+    return unknown
+
+def preview_price_update(rules=(), csv_rows=None, round_to=1, limit=None):
+    """Changed products with old and new price, plus SKUs from the CSV that do not exist"""
+    conn = get_connection()
+    try:
+        cursor = conn.cursor()
+        unknown = _stage(cursor, rules, csv_rows, round_to)
+        diff = pd.read_sql_query(f'''
+            SELECT p.id, p.sku, p.name, p.category, p.supplier, s.old_price, s.new_price,
+                   s.new_price - s.old_price AS difference,
+                   ROUND(100.0 * (s.new_price - s.old_price) / NULLIF(s.old_price, 0), 2) AS change_pct
+            FROM temp.price_update_stage s
+            JOIN products p ON p.id = s.product_id
+            WHERE s.new_price IS NOT s.old_price
+            ORDER BY p.sku
+            {'LIMIT ' + str(int(limit)) if limit else ''}
+        ''', conn)
+        cursor.execute('''
+            SELECT COUNT(*), SUM(new_price - old_price)
+            FROM temp.price_update_stage WHERE new_price IS NOT old_price
+        ''')
+        changed, total_difference = cursor.fetchone()
+        return diff, {'changed': changed, 'total_difference': total_difference or 0, 'unknown_skus': unknown}
+    finally:
+        conn.close()
+
+def _apply(cursor, update_key, rules, csv_rows, round_to, description, created_by):
+    """Stage and write one update on an open IMMEDIATE transaction; returns the summary"""
+    cursor.execute("SELECT id, products_changed FROM price_updates WHERE update_key = ?", (update_key,))
+    existing = cursor.fetchone()
+    if existing:
+        return {'update_id': existing[0], 'changed': existing[1], 'already_applied': True}
+
+    unknown = _stage(cursor, rules, csv_rows, round_to)
+    now = int(time.time())
+    cursor.execute('''
+        INSERT INTO price_updates (update_key, description, created_by, applied_ts) VALUES (?, ?, ?, ?)
+    ''', (update_key, description, created_by, now))
+    update_id = cursor.lastrowid
+    cursor.execute('''
+        INSERT INTO price_history (product_id, old_price, new_price, update_id, changed_by, changed_ts)
+        SELECT product_id, old_price, new_price, ?, ?, ?
+        FROM temp.price_update_stage WHERE new_price IS NOT old_price
+    ''', (update_id, created_by, now))
+    changed = cursor.rowcount
+    cursor.execute('''
+        UPDATE products
+        SET price = s.new_price, updated_at = CURRENT_TIMESTAMP
+        FROM temp.price_update_stage s
+        WHERE s.product_id = products.id AND s.new_price IS NOT s.old_price
+    ''')
+    cursor.execute("UPDATE price_updates SET products_changed = ? WHERE id = ?", (changed, update_id))
+    cursor.execute("DROP TABLE temp.price_update_stage")
+    return {'update_id': update_id, 'changed': changed, 'unknown_skus': unknown, 'already_applied': False}
+
+def apply_price_update(update_key, rules=(), csv_rows=None, round_to=1, description=None, created_by=None):
+    """Apply an update in one transaction and invalidate the price index once; returns the summary"""
+    conn = get_connection()
+    conn.isolation_level = None
+    try:
+        cursor = conn.cursor()
+        cursor.execute("BEGIN IMMEDIATE")
+        try:
+            result = _apply(cursor, update_key, rules, csv_rows, round_to, description, created_by)
+            cursor.execute("COMMIT")
+        except Exception:
+            cursor.execute("ROLLBACK")
+            raise
+    finally:
+        conn.close()
+    invalidate_price_index()
+    return result
+
+def describe_update(rules=(), csv_name=None, round_to=1):
+    """Short human-readable summary of an update, stored with its history"""
+    parts = [f"{r['field']} {r['value']} {float(r['change']):+g}{'%' if r['kind'] == 'percent' else ' IDR'}"
+             for r in rules]
+    if csv_name:
+        parts.append(f"CSV {csv_name}")
+    if round_to > 1:
+        parts.append(f"rounded to {round_to}")
+    return '; '.join(parts)
+
+def get_price_updates(limit=20):
+    """Recent bulk updates, newest first"""
+    conn = get_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT id, description, created_by, products_changed, applied_ts
+            FROM price_updates ORDER BY id DESC LIMIT ?
+        ''', (limit,))
+        keys = ('id', 'description', 'created_by', 'products_changed', 'applied_ts')
+        return [dict(zip(keys, row)) for row in cursor.fetchall()]
+    finally:
+        conn.close()
+
+def get_price_history(product_id, limit=50):
+    """Price changes of one product, newest first"""
+    conn = get_connection()
+    try:
+        return pd.read_sql_query('''
+            SELECT h.changed_ts, h.old_price, h.new_price, h.changed_by, u.description
+            FROM price_history h
+            LEFT JOIN price_updates u ON u.id = h.update_id
+            WHERE h.product_id = ?
+            ORDER BY h.id DESC LIMIT ?
+        ''', conn, params=(product_id, limit))
+    finally:
+        conn.close()
@@ -0,0 +1,293 @@
+"""
+Pricing engine shared by sales orders, mobile orders and the sync API
+Price lists hold quantity tiers, customer-group prices and effective dates.
+All active rules are compiled into an in-memory index: per product, the
+product's own rules followed by the catalog-wide ones, pre-sorted so the
+first matching rule wins. Pricing a cart or thousands of order lines is a
+handful of NumPy operations over that index instead of a Python loop per
+line. The index is rebuilt when price_index_version shows that product
+prices, products or price lists changed; stock writes do not count.
+
+Rule precedence: higher price-list priority, then product-specific over
+catalog-wide, then customer-group over any group, then the highest
+minimum quantity. A rule sets either a fixed price or a discount off the
+product's base price.
+"""
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from database.init_db import get_connection
+from database.repository import wib_date_key
+from utils.metrics import histogram, record_cache
+
+PRICING_SECONDS = histogram(
+    'penzflow_pricing_seconds', 'Time to price a batch of order lines', ('kind',))
+
+ANY_GROUP = -1
+NO_GROUP = -2
+OPEN_START, OPEN_END = 0, 99991231
+
+_index = None
+_index_version = None
+_index_lock = threading.Lock()
+
+class PriceIndex:
+    """Compiled price rules; get_price_index() builds it from the database"""
+
+    def __init__(self, products, rules):
+        # products: id, price; rules: id, product_id (NaN = all products), min_quantity, price,
+        # discount_percentage, valid_from, valid_to, customer_group, priority
+        products = products.sort_values('id')
+        self.product_ids = products['id'].to_numpy(dtype=np.int64)
+        self.base_prices = products['price'].fillna(0).to_numpy(dtype=np.float64)
+        self.groups = {group: code for code, group in enumerate(sorted(rules['customer_group'].dropna().unique()))}
+        count = len(self.product_ids)
+
+        rules = rules.assign(
+            specific=rules['product_id'].notna().astype(int),
+            grouped=rules['customer_group'].notna().astype(int),
+            group_code=rules['customer_group'].map(self.groups).fillna(ANY_GROUP).astype(np.int64),
+            valid_from=rules['valid_from'].fillna(OPEN_START).astype(np.int64),
+            valid_to=rules['valid_to'].fillna(OPEN_END).astype(np.int64),
+            priority=rules['priority'].fillna(0)
+        )
+        specific = rules[rules['specific'] == 1]
+        specific = specific.assign(pos=np.searchsorted(self.product_ids, specific['product_id'].to_numpy(np.int64)))
+        # Drop rules for products that no longer exist
+        known = specific['pos'].to_numpy() < count
+        known[known] = self.product_ids[specific['pos'].to_numpy()[known]] == specific['product_id'].to_numpy()[known]
+        specific = specific[known]
+        # Catalog-wide rules are repeated under every product so each product owns one contiguous slice
+        generic = rules[rules['specific'] == 0]
+        generic = generic.loc[generic.index.repeat(count)].assign(pos=np.tile(np.arange(count), len(generic)))
+        compiled = pd.concat([specific, generic], ignore_index=True).sort_values(
+            ['pos', 'priority', 'specific', 'grouped', 'min_quantity'],
+            ascending=[True, False, False, False, False], kind='stable')
+
+        positions = compiled['pos'].to_numpy(dtype=np.int64)
+        self.offsets = np.searchsorted(positions, np.arange(count + 1))
+        self.rule_ids = compiled['id'].to_numpy(dtype=np.int64)
+        self.min_quantity = compiled['min_quantity'].fillna(1).to_numpy(dtype=np.int64)
+        self.group_code = compiled['group_code'].to_numpy(dtype=np.int64)
+        self.valid_from = compiled['valid_from'].to_numpy(dtype=np.int64)
+        self.valid_to = compiled['valid_to'].to_numpy(dtype=np.int64)
+        self.fixed_price = compiled['price'].to_numpy(dtype=np.float64)
+        self.discount = compiled['discount_percentage'].fillna(0).to_numpy(dtype=np.float64)
+
+    def group_code_for(self, group):
+        """Index code for a customer group; customers without a group only match catalog-wide lists"""
+        if group is None:
+            return NO_GROUP
+        return self.groups.get(group, NO_GROUP)
+
+    def evaluate(self, product_ids, quantities, group_codes=NO_GROUP, date_keys=None):
+        """Unit prices for order lines; returns (unit prices, base prices, winning rule ids or -1)"""
+        product_ids = np.asarray(product_ids, dtype=np.int64)
+        quantities = np.asarray(quantities, dtype=np.int64)
+        lines = len(product_ids)
+        group_codes = np.broadcast_to(np.asarray(group_codes, dtype=np.int64), (lines,))
+        if date_keys is None:
+            date_keys = wib_date_key(time.time())
+        date_keys = np.broadcast_to(np.asarray(date_keys, dtype=np.int64), (lines,))
+
+        positions = np.searchsorted(self.product_ids, product_ids)
+        known = positions < len(self.product_ids)
+        known[known] = self.product_ids[positions[known]] == product_ids[known]
+        if not known.all():
+            raise KeyError(f"unknown products: {sorted(set(product_ids[~known].tolist()))}")
+
+        base = self.base_prices[positions]
+        starts = self.offsets[positions]
+        counts = self.offsets[positions + 1] - starts
+        # Expand every line into its candidate rules (line, rule) without a Python loop
+        line_of = np.repeat(np.arange(lines), counts)
+        rule_of = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts - starts, counts)
+
+        matches = (
+            (self.min_quantity[rule_of] <= quantities[line_of]) &
+            ((self.group_code[rule_of] == ANY_GROUP) | (self.group_code[rule_of] == group_codes[line_of])) &
+            (self.valid_from[rule_of] <= date_keys[line_of]) &
+            (self.valid_to[rule_of] >= date_keys[line_of])
+        )
+        hits = np.flatnonzero(matches)
+        # Candidates are sorted by precedence, so the first hit per line is the winner
+        priced_lines, first = np.unique(line_of[hits], return_index=True)
+        winners = rule_of[hits[first]]
+
+        prices = base.copy()
+        fixed = self.fixed_price[winners]
+        discounted = base[priced_lines] * (1 - self.discount[winners] / 100)
+        prices[priced_lines] = np.where(np.isnan(fixed), discounted, fixed)
+        rule_ids = np.full(lines, -1, dtype=np.int64)
+        rule_ids[priced_lines] = self.rule_ids[winners]
+        return np.floor(prices + 0.5).astype(np.int64), base.astype(np.int64), rule_ids
+
+def _load_frames(conn):
+    products = pd.read_sql_query("SELECT id, price FROM products", conn)
+    rules = pd.read_sql_query('''
+        SELECT i.id, i.product_id, i.min_quantity, i.price, i.discount_percentage,
+               COALESCE(i.valid_from, l.valid_from) AS valid_from,
+               COALESCE(i.valid_to, l.valid_to) AS valid_to,
+               l.customer_group, l.priority
+        FROM price_list_items i
+        JOIN price_lists l ON l.id = i.price_list_id
+        WHERE l.active = 1
+    ''', conn)
+    return products, rules
+
+def _rules_version(conn):
+    cursor = conn.cursor()
+    cursor.execute("SELECT version FROM price_index_version")
+    return cursor.fetchone()[0]
+
+def get_price_index():
+    """Compiled index for the current products and price lists, rebuilt only after they change"""
+    global _index, _index_version
+    conn = get_connection()
+    try:
+        version = _rules_version(conn)
+        with _index_lock:
+            if _index is not None and _index_version == version:
+                record_cache('price_index', True)
+                return _index
+            record_cache('price_index', False)
+            _index = PriceIndex(*_load_frames(conn))
+            _index_version = version
+            return _index
+    finally:
+        conn.close()
+
+def invalidate_price_index():
+    """Force the next lookup to rebuild the index"""
+    global _index
+    with _index_lock:
+        _index = None
+
+def get_customer_group(customer_id):
+    """Pricing group of a customer, or None"""
+    if customer_id is None:
+        return None
+    conn = get_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT customer_group FROM customers WHERE id = ?", (customer_id,))
+        row = cursor.fetchone()
+        return row[0] if row else None
+    finally:
+        conn.close()
+
+def price_lines(product_ids, quantities, customer_id=None, on_date=None):
+    """Unit prices for order lines of one customer; returns (unit prices, base prices, rule ids)"""
+    index = get_price_index()
+    with PRICING_SECONDS.time('cart'):
+        return index.evaluate(product_ids, quantities, index.group_code_for(get_customer_group(customer_id)),
+                              wib_date_key(on_date) if on_date is not None else None)
+
+def quote_price(product_id, quantity, customer_id=None, on_date=None):
+    """(unit price, base price) for a single line"""
+    unit_prices, base_prices, _ = price_lines([product_id], [quantity], customer_id, on_date)
+    return int(unit_prices[0]), int(base_prices[0])
+
+def get_price_rules():
+    """Price-list items with their list, product and effective window"""
+    conn = get_connection()
+    try:
+        return pd.read_sql_query('''
+            SELECT l.id AS price_list_id, l.name AS price_list, l.customer_group, l.priority, l.active,
+                   i.id, COALESCE(p.name, 'All products') AS product, i.min_quantity, i.price,
+                   i.discount_percentage,
+                   COALESCE(i.valid_from, l.valid_from) AS valid_from,
+                   COALESCE(i.valid_to, l.valid_to) AS valid_to
+            FROM price_list_items i
+            JOIN price_lists l ON l.id = i.price_list_id
+            LEFT JOIN products p ON p.id = i.product_id
+            ORDER BY l.priority DESC, l.name, product, i.min_quantity
+        ''', conn)
+    finally:
+        conn.close()
+
+def get_price_lists():
+    """Price lists as dicts"""
+    conn = get_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT id, name, customer_group, priority, valid_from, valid_to, active FROM price_lists ORDER BY name
+        ''')
+        keys = ('id', 'name', 'customer_group', 'priority', 'valid_from', 'valid_to', 'active')
+        return [dict(zip(keys, row)) for row in cursor.fetchall()]
+    finally:
+        conn.close()
+
+def save_price_list(name, customer_group=None, priority=0, valid_from=None, valid_to=None):
+    """Create a price list, or update the one with this name; returns its id"""
+    conn = get_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute('''
+            INSERT INTO price_lists (name, customer_group, priority, valid_from, valid_to)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT (name) DO UPDATE SET customer_group = excluded.customer_group, priority = excluded.priority,
+                valid_from = excluded.valid_from, valid_to = excluded.valid_to
+        ''', (name, customer_group or None, priority, wib_date_key(valid_from), wib_date_key(valid_to)))
+        cursor.execute("SELECT id FROM price_lists WHERE name = ?", (name,))
+        price_list_id = cursor.fetchone()[0]
+        conn.commit()
+        return price_list_id
+    finally:
+        conn.close()
+
+def add_price_rule(price_list_id, product_id=None, min_quantity=1, price=None, discount_percentage=None,
+                   valid_from=None, valid_to=None):
+    """Add a tier to a price list: a fixed price or a discount from min_quantity units; returns its id"""
+    if (price is None) == (discount_percentage is None):
+        raise ValueError("A price rule needs either a fixed price or a discount percentage")
+    conn = get_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute('''
+            INSERT INTO price_list_items (price_list_id, product_id, min_quantity, price, discount_percentage,
+                                          valid_from, valid_to)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', (price_list_id, product_id, min_quantity, price, discount_percentage,
+              wib_date_key(valid_from), wib_date_key(valid_to)))
+        conn.commit()
+        return cursor.lastrowid
+    finally:
+        conn.close()
+
+def delete_price_rule(rule_id):
+    """Remove a price-list item"""
+    conn = get_connection()
+    try:
+        conn.execute("DELETE FROM price_list_items WHERE id = ?", (rule_id,))
+        conn.commit()
+    finally:
+        conn.close()
+
+def set_customer_group(customer_id, customer_group):
+    """Assign a customer to a pricing group (None clears it)"""
+    conn = get_connection()
+    try:
+        conn.execute("UPDATE customers SET customer_group = ? WHERE id = ?", (customer_group or None, customer_id))
+        conn.commit()
+    finally:
+        conn.close()
+
+def get_customer_groups():
+    """Groups used by price lists or customers"""
+    conn = get_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT customer_group FROM price_lists WHERE customer_group IS NOT NULL
+            UNION
+            SELECT customer_group FROM customers WHERE customer_group IS NOT NULL
+            ORDER BY 1
+        ''')
+        return [row[0] for row in cursor.fetchall()]
+    finally:
+        conn.close()
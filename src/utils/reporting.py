@@ -0,0 +1,192 @@
+"""
+Report builders for PenzFlow
+Each report returns DataFrames plus a small JSON-serialisable summary. The
+scheduler precomputes them into Config.REPORTS_DIR so the Reports page can
+load the cached summary instead of re-running the aggregation.
+"""
+import json
+import os
+from datetime import datetime, timedelta
+
+import pandas as pd
+import pytz
+
+from config import Config
+from database.repository import wib_date_key
+from database.snapshot import get_snapshot_connection
+from utils.metrics import record_cache
+
+INDONESIA_TZ = pytz.timezone('Asia/Jakarta')
+
+REPORT_TITLES = {
+    'sales_daily': 'Daily Sales',
+    'sales_weekly': 'Weekly Sales',
+    'inventory': 'Inventory',
+    'customers': 'Customers'
+}
+
+def _today_wib():
+    return datetime.now(INDONESIA_TZ).date()
+
+def _sales_report(conn, start, end, as_of):
+    orders = pd.read_sql_query('''
+        SELECT so.order_number, so.order_date, c.name AS customer, so.sales_rep, so.status,
+               so.payment_method, so.total_amount
+        FROM sales_orders so
+        LEFT JOIN customers c ON c.id = so.customer_id
+        WHERE so.order_local_date >= ? AND so.order_local_date <= ?
+        ORDER BY so.order_local_date, so.id
+    ''', conn, params=(wib_date_key(start), wib_date_key(end)))
+
+    trend = pd.read_sql_query('''
+        SELECT MIN(date(order_date)) AS date, SUM(total_amount) AS revenue, COUNT(*) AS orders
+        FROM sales_orders
+        WHERE order_local_date >= ? AND order_local_date <= ? AND status != 'cancelled'
+        GROUP BY order_local_date
+        ORDER BY order_local_date
+    ''', conn, params=(wib_date_key(as_of - timedelta(days=30)), wib_date_key(end)))
+
+    valid = orders[orders['status'] != 'cancelled']
+    revenue = int(valid['total_amount'].sum()) if len(valid) else 0
+    summary = {
+        'period_start': str(start),
+        'period_end': str(end),
+        'revenue': revenue,
+        'orders': int(len(valid)),
+        'completed_orders': int((orders['status'] == 'completed').sum()),
+        'average_order_value': revenue / len(valid) if len(valid) else 0.0,
+        'trend': trend.to_dict('records')
+    }
+    return {'orders': orders, 'daily_trend': trend}, summary
+
+def _inventory_report(conn, as_of):
+    products = pd.read_sql_query('''
+        SELECT p.sku, p.name, p.category, p.supplier, p.stock_quantity, p.min_stock_level,
+               p.max_stock_level, p.price, p.cost, COALESCE(p.average_cost, p.cost, 0) AS average_cost,
+               CASE WHEN :fifo THEN COALESCE(layers.value, 0)
+                    ELSE p.stock_quantity * COALESCE(p.average_cost, p.cost, 0) END AS stock_value,
+               COALESCE(sold.quantity, 0) AS sold_30d,
+               COALESCE(issued.cogs, 0) AS cogs_30d
+        FROM products p
+        LEFT JOIN (
+            SELECT oi.product_id, SUM(oi.quantity) AS quantity
+            FROM order_items oi
+            JOIN sales_orders so ON so.id = oi.order_id
+            WHERE so.order_local_date >= :since AND so.status != 'cancelled'
+            GROUP BY oi.product_id
+        ) sold ON sold.product_id = p.id
+        LEFT JOIN (
+            SELECT product_id, SUM(-cost_amount) AS cogs FROM inventory_transactions
+            WHERE transaction_type = 'out' AND created_local_date >= :since
+            GROUP BY product_id
+        ) issued ON issued.product_id = p.id
+        LEFT JOIN (
+            SELECT product_id, SUM(remaining_quantity * unit_cost) AS value FROM cost_layers
+            WHERE remaining_quantity > 0 GROUP BY product_id
+        ) layers ON layers.product_id = p.id
+        ORDER BY p.sku
+    ''', conn, params={'since': wib_date_key(as_of - timedelta(days=30)), 'fifo': Config.COSTING_METHOD == 'fifo'})
+
+    # Monthly turnover: units sold in the last 30 days per unit currently held
+    products['turnover'] = (products['sold_30d'] / products['stock_quantity'].where(products['stock_quantity'] > 0)).fillna(0).round(2)
+    products['status'] = 'Good'
+    products.loc[products['stock_quantity'] <= products['min_stock_level'], 'status'] = 'Low'
+    products.loc[products['stock_quantity'] <= 0, 'status'] = 'Out of Stock'
+
+    summary = {
+        'total_products': int(len(products)),
+        'low_stock': int((products['status'] == 'Low').sum()),
+        'out_of_stock': int((products['status'] == 'Out of Stock').sum()),
+        'total_value': float(products['stock_value'].sum()),
+        'valuation_method': Config.COSTING_METHOD,
+        'cogs_30d': float(products['cogs_30d'].sum()),
+        'stock': products[['name', 'stock_quantity', 'min_stock_level', 'max_stock_level', 'status']].to_dict('records'),
+        'turnover': products.nlargest(10, 'turnover')[['name', 'turnover']].to_dict('records')
+    }
+    return {'products': products}, summary
+
+def _customers_report(conn, as_of):
+    customers = pd.read_sql_query('''
+        SELECT c.id, c.name, c.company,
+               COUNT(so.id) AS total_orders,
+               COALESCE(SUM(so.total_amount), 0) AS total_value,
+               MAX(so.order_date) AS last_order
+        FROM customers c
+        LEFT JOIN sales_orders so ON so.customer_id = c.id AND so.status != 'cancelled'
+        GROUP BY c.id
+        ORDER BY total_value DESC
+    ''', conn)
+
+    active_since = str(as_of - timedelta(days=90))
+    summary = {
+        'total_customers': int(len(customers)),
+        'active_customers': int((customers['last_order'].fillna('') >= active_since).sum()),
+        'top_customers': customers.head(10)[['name', 'total_orders', 'total_value', 'last_order']].to_dict('records')
+    }
+    return {'customers': customers}, summary
+
+def build_report(name, as_of=None, conn=None):
+    """Run one report's aggregation on the reporting snapshot; returns (frames, summary)"""
+    as_of = as_of or _today_wib()
+    yesterday = as_of - timedelta(days=1)
+    own_connection = conn is None
+    conn = conn or get_snapshot_connection()
+    try:
+        if name == 'sales_daily':
+            frames, summary = _sales_report(conn, yesterday, yesterday, as_of)
+        elif name == 'sales_weekly':
+            frames, summary = _sales_report(conn, as_of - timedelta(days=7), yesterday, as_of)
+        elif name == 'inventory':
+            frames, summary = _inventory_report(conn, as_of)
+        elif name == 'customers':
+            frames, summary = _customers_report(conn, as_of)
+        else:
+            raise ValueError(f"Unknown report: {name}")
+    finally:
+        if own_connection:
+            conn.close()
+
+    summary['report'] = name
+    summary['generated_at'] = datetime.now(INDONESIA_TZ).strftime('%d-%m-%Y %H:%M WIB')
+    return frames, summary
+
+def _summary_path(name):
+    return os.path.join(Config.REPORTS_DIR, f"summary_{name}.json")
+
+def write_report(name, frames, summary, formats=('parquet', 'xlsx'), as_of=None):
+    """Write report frames to REPORTS_DIR/<name>/ and refresh the cached summary"""
+    as_of = as_of or _today_wib()
+    directory = os.path.join(Config.REPORTS_DIR, name)
+    os.makedirs(directory, exist_ok=True)
+    stem = f"{name}_{as_of.strftime('%Y%m%d')}"
+
+    paths = []
+    if 'parquet' in formats:
+        for frame_name, df in frames.items():
+            path = os.path.join(directory, f"{stem}_{frame_name}.parquet")
+            df.to_parquet(path, index=False)
+            paths.append(path)
+    if 'xlsx' in formats:
+        path = os.path.join(directory, f"{stem}.xlsx")
+        with pd.ExcelWriter(path, engine='openpyxl') as writer:
+            for frame_name, df in frames.items():
+                df.to_excel(writer, sheet_name=frame_name[:31], index=False)
+        paths.append(path)
+
+    # Write to a temp file then rename so readers never see a half-written summary
+    summary_path = _summary_path(name)
+    with open(summary_path + '.tmp', 'w') as f:
+        json.dump(summary, f, default=str)
+    os.replace(summary_path + '.tmp', summary_path)
+    return paths
+
+def load_report_summary(name):
+    """Cached summary written by the last scheduled run, or None"""
+    try:
+        with open(_summary_path(name)) as f:
+            summary = json.load(f)
+    except (OSError, ValueError):
+        record_cache('report_summary', False)
+        return None
+    record_cache('report_summary', True)
+    return summary
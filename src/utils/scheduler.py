@@ -0,0 +1,210 @@
+"""
+Cron-style scheduler for background jobs
+Schedules live in the `scheduled_jobs` table (5-field cron specs evaluated
+in WIB). A scheduler thread enqueues due jobs through utils.jobs and records
+each run in `schedule_runs`, so run history is the jobs table itself.
+"""
+import json
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+
+import pytz
+
+from config import Config
+from database.init_db import get_connection
+from utils.jobs import enqueue_job
+
+logger = logging.getLogger(__name__)
+
+INDONESIA_TZ = pytz.timezone('Asia/Jakarta')
+
+# (name, minimum, maximum) for minute hour day-of-month month day-of-week
+CRON_FIELDS = (('minute', 0, 59), ('hour', 0, 23), ('day', 1, 31), ('month', 1, 12), ('weekday', 0, 7))
+
+_thread = None
+_thread_lock = threading.Lock()
+
+def _parse_field(expression, minimum, maximum):
+    """Expand one cron field ('*', '*/15', '1-5', '0,30', '8-18/2') to a set of ints"""
+    values = set()
+    for part in expression.split(','):
+        step = 1
+        if '/' in part:
+            part, step_text = part.split('/', 1)
+            step = int(step_text)
+            if step < 1:
+                raise ValueError(f"Invalid step in cron field: {expression}")
+        if part == '*':
+            start, end = minimum, maximum
+        elif '-' in part:
+            start, end = (int(value) for value in part.split('-', 1))
+        else:
+            start = int(part)
+            end = maximum if step > 1 else start
+        if start < minimum or end > maximum or start > end:
+            raise ValueError(f"Cron field out of range: {expression}")
+        values.update(range(start, end + 1, step))
+    return values
+
+def parse_cron(spec):
+    """Parse 'minute hour day month weekday' (weekday 0=Sunday, 7 also accepted)"""
+    parts = spec.split()
+    if len(parts) != 5:
+        raise ValueError(f"Cron spec needs 5 fields: {spec!r}")
+    fields = {name: _parse_field(part, lo, hi) for part, (name, lo, hi) in zip(parts, CRON_FIELDS)}
+    fields['weekday'] = {value % 7 for value in fields['weekday']}
+    # Standard cron: if both day-of-month and day-of-week are restricted, either may match
+    fields['day_restricted'] = parts[2] != '*'
+    fields['weekday_restricted'] = parts[4] != '*'
+    return fields
+
+def _day_matches(fields, day):
+    cron_weekday = (day.weekday() + 1) % 7  # Python Monday=0 -> cron Sunday=0
+    day_ok = day.day in fields['day']
+    weekday_ok = cron_weekday in fields['weekday']
+    if fields['day_restricted'] and fields['weekday_restricted']:
+        return day_ok or weekday_ok
+    return day_ok and weekday_ok
+
+def next_run_after(spec, after):
+    """Next naive WIB datetime strictly after `after` matching the cron spec"""
+    fields = parse_cron(spec)
+    start = after.replace(second=0, microsecond=0) + timedelta(minutes=1)
+    hours = sorted(fields['hour'])
+    minutes = sorted(fields['minute'])
+    for day_offset in range(0, 366 * 4 + 1):
+        day = (start + timedelta(days=day_offset)).replace(hour=0, minute=0)
+        if day.month not in fields['month'] or not _day_matches(fields, day):
+            continue
+        for hour in hours:
+            for minute in minutes:
+                candidate = day.replace(hour=hour, minute=minute)
+                if candidate >= start:
+                    return candidate
+    raise ValueError(f"Cron spec never fires: {spec!r}")
+
+def _now_wib():
+    return datetime.now(INDONESIA_TZ).replace(tzinfo=None)
+
+def _to_epoch(naive_wib):
+    return int(INDONESIA_TZ.localize(naive_wib).timestamp())
+
+def run_schedule_now(schedule_id, created_by=None):
+    """Enqueue a schedule's job immediately and record the run; returns the job id"""
+    conn = get_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT job_type, params FROM scheduled_jobs WHERE id = ?", (schedule_id,))
+        job_type, params = cursor.fetchone()
+    finally:
+        conn.close()
+
+    job_id = enqueue_job(job_type, json.loads(params or '{}'), created_by=created_by or 'scheduler')
+
+    conn = get_connection()
+    try:
+        conn.execute('''
+            INSERT INTO schedule_runs (schedule_id, job_id, scheduled_ts) VALUES (?, ?, ?)
+        ''', (schedule_id, job_id, int(time.time())))
+        conn.execute("UPDATE scheduled_jobs SET last_run_at = CURRENT_TIMESTAMP WHERE id = ?", (schedule_id,))
+        conn.commit()
+    finally:
+        conn.close()
+    return job_id
+
+def run_due_schedules():
+    """Enqueue every enabled schedule whose next run time has passed"""
+    now = _now_wib()
+    now_ts = _to_epoch(now)
+
+    conn = get_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT id, cron_spec, next_run_ts FROM scheduled_jobs
+            WHERE enabled = 1 AND (next_run_ts IS NULL OR next_run_ts <= ?)
+        ''', (now_ts,))
+        due = cursor.fetchall()
+
+        claimed = []
+        for schedule_id, cron_spec, next_run_ts in due:
+            following = _to_epoch(next_run_after(cron_spec, now))
+            # Compare-and-set so only one app process fires a given run
+            cursor.execute('''
+                UPDATE scheduled_jobs SET next_run_ts = ?
+                WHERE id = ? AND next_run_ts IS ?
+            ''', (following, schedule_id, next_run_ts))
+            if cursor.rowcount == 1 and next_run_ts is not None:
+                claimed.append(schedule_id)
+        conn.commit()
+    finally:
+        conn.close()
+
+    # A schedule seen for the first time only gets its next_run_ts computed
+    return [run_schedule_now(schedule_id) for schedule_id in claimed]
+
+def get_schedules():
+    """Schedules with their last successful run (finished_at of the job)"""
+    conn = get_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT s.id, s.name, s.job_type, s.params, s.cron_spec, s.enabled, s.next_run_ts, s.last_run_at,
+                   (SELECT MAX(j.finished_at) FROM schedule_runs r JOIN jobs j ON j.id = r.job_id
+                    WHERE r.schedule_id = s.id AND j.status = 'succeeded') AS last_success_at
+            FROM scheduled_jobs s
+            ORDER BY s.name
+        ''')
+        keys = ('id', 'name', 'job_type', 'params', 'cron_spec', 'enabled', 'next_run_ts',
+                'last_run_at', 'last_success_at')
+        return [dict(zip(keys, row)) for row in cursor.fetchall()]
+    finally:
+        conn.close()
+
+def get_schedule_runs(schedule_id=None, limit=20):
+    """Recent scheduled runs joined with their job status"""
+    conn = get_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(f'''
+            SELECT r.id, s.name, r.scheduled_ts, j.status, j.started_at, j.finished_at, j.error, j.result
+            FROM schedule_runs r
+            JOIN scheduled_jobs s ON s.id = r.schedule_id
+            LEFT JOIN jobs j ON j.id = r.job_id
+            {'WHERE r.schedule_id = ?' if schedule_id else ''}
+            ORDER BY r.id DESC LIMIT ?
+        ''', ([schedule_id] if schedule_id else []) + [limit])
+        keys = ('id', 'name', 'scheduled_ts', 'status', 'started_at', 'finished_at', 'error', 'result')
+        return [dict(zip(keys, row)) for row in cursor.fetchall()]
+    finally:
+        conn.close()
+
+def set_schedule_enabled(schedule_id, enabled):
+    """Enable or disable a schedule; re-enabling recomputes the next run"""
+    conn = get_connection()
+    try:
+        conn.execute('''
+            UPDATE scheduled_jobs SET enabled = ?, next_run_ts = NULL WHERE id = ?
+        ''', (1 if enabled else 0, schedule_id))
+        conn.commit()
+    finally:
+        conn.close()
+
+def _scheduler_loop():
+    while True:
+        try:
+            run_due_schedules()
+        except Exception:
+            logger.exception("Scheduler error")
+        time.sleep(Config.SCHEDULER_TICK)
+
+def start_scheduler():
+    """Start the scheduler thread once per process"""
+    global _thread
+    with _thread_lock:
+        if _thread is None:
+            _thread = threading.Thread(target=_scheduler_loop, name='scheduler', daemon=True)
+            _thread.start()
+    return _thread
@@ -0,0 +1,168 @@
+"""
+RFM customer segmentation
+Recency, frequency and monetary value come from one aggregation over sales
+orders and submitted mobile orders, grouped by customer and stored in
+customer_segments. Triggers on the order tables queue the customers whose
+orders were added or changed, so a refresh re-aggregates only those (a full
+refresh re-aggregates everyone). Scores are quintiles across all customers,
+ranked and bucketed with pandas/NumPy in one pass, and only customers whose
+scores or segment changed are written back with a new computed_ts.
+Orders moved to the cold archive keep counting through
+customer_archive_totals, as they do in customer_summary.
+"""
+import time
+
+import numpy as np
+import pandas as pd
+
+from config import Config
+from database.init_db import get_connection
+
+SEGMENTS = ('New', 'VIP', 'Regular', 'At Risk', 'Inactive')
+DAY = 86400
+
+# One row per customer; {only} restricts every order source to the queued customers
+_RFM_SQL = '''
+    SELECT customer_id, SUM(orders) AS frequency, SUM(amount) AS monetary,
+           MIN(first_ts) AS first_order_ts, MAX(last_ts) AS last_order_ts
+    FROM (
+        SELECT customer_id, 1 AS orders, COALESCE(total_amount, 0) AS amount, order_ts AS first_ts,
+               order_ts AS last_ts
+        FROM sales_orders
+        WHERE customer_id IS NOT NULL AND status != 'cancelled' {only}
+        UNION ALL
+        SELECT customer_id, 1, COALESCE(total_amount, 0), order_ts, order_ts FROM mobile_orders
+        WHERE customer_id IS NOT NULL AND status NOT IN ('draft', 'rejected', 'expired', 'cancelled', 'converted') {only}
+        UNION ALL
+        SELECT customer_id, order_count, order_value, first_order_ts, last_order_ts FROM customer_archive_totals
+        WHERE order_count > 0 {only}
+    )
+    GROUP BY customer_id
+'''
+_QUEUED = "AND customer_id IN (SELECT customer_id FROM customer_segment_queue)"
+
+def aggregate_rfm(cursor, full=False):
+    """Re-aggregate the queued customers (or all with full) into customer_segments and clear the
+    queue, on the caller's transaction; returns the number of customers aggregated"""
+    cursor.execute("DROP TABLE IF EXISTS temp.rfm_batch")
+    cursor.execute(f"CREATE TEMP TABLE rfm_batch AS {_RFM_SQL.format(only='' if full else _QUEUED)}")
+    cursor.execute('''
+        INSERT INTO customer_segments (customer_id, frequency, monetary, first_order_ts, last_order_ts)
+        SELECT customer_id, frequency, monetary, first_order_ts, last_order_ts FROM rfm_batch WHERE true
+        ON CONFLICT (customer_id) DO UPDATE SET
+            frequency = excluded.frequency, monetary = excluded.monetary,
+            first_order_ts = excluded.first_order_ts, last_order_ts = excluded.last_order_ts
+    ''')
+    # Customers left without a qualifying order (cancelled, rejected) drop out
+    cursor.execute(f'''
+        DELETE FROM customer_segments
+        WHERE customer_id NOT IN (SELECT customer_id FROM rfm_batch)
+        {'' if full else 'AND customer_id IN (SELECT customer_id FROM customer_segment_queue)'}
+    ''')
+    cursor.execute("DELETE FROM customer_segment_queue")
+    aggregated = cursor.execute("SELECT COUNT(*) FROM rfm_batch").fetchone()[0]
+    cursor.execute("DROP TABLE temp.rfm_batch")
+    return aggregated
+
+def _quintile(values):
+    """Scores 1-5 by percentile rank, ties sharing a score"""
+    return np.clip(np.ceil(values.rank(method='average', pct=True).to_numpy() * 5), 1, 5).astype(np.int64)
+
+def score_rfm(frame, now_ts=None):
+    """Vectorized recency/frequency/monetary scores and segment for an aggregate frame"""
+    now_ts = now_ts or int(time.time())
+    recency_days = (now_ts - frame['last_order_ts'].fillna(0).to_numpy()) // DAY
+    r = _quintile(frame['last_order_ts'].fillna(0))
+    f = _quintile(frame['frequency'])
+    m = _quintile(frame['monetary'])
+    first_days = (now_ts - frame['first_order_ts'].fillna(0).to_numpy()) // DAY
+    value = f + m
+    segment = np.select(
+        [recency_days > Config.SEGMENT_INACTIVE_DAYS,
+         first_days <= Config.SEGMENT_NEW_DAYS,
+         (value >= 9) & (r >= 3),
+         (value >= 7) & (r <= 2)],
+        ['Inactive', 'New', 'VIP', 'At Risk'], default='Regular')
+    return frame.assign(recency_days=recency_days, recency_score=r, frequency_score=f, monetary_score=m,
+                        segment=segment)
+
+def rescore(cursor, now_ts=None):
+    """Score every stored customer and write back the rows whose scores or segment changed;
+    returns the number written"""
+    now_ts = now_ts or int(time.time())
+    stored = pd.read_sql_query('''
+        SELECT customer_id, frequency, monetary, first_order_ts, last_order_ts,
+               recency_score AS old_r, frequency_score AS old_f, monetary_score AS old_m, segment AS old_segment
+        FROM customer_segments
+    ''', cursor.connection)
+    if stored.empty:
+        return 0
+    scored = score_rfm(stored, now_ts)
+    changed = scored[(scored['recency_score'] != scored['old_r']) | (scored['frequency_score'] != scored['old_f'])
+                     | (scored['monetary_score'] != scored['old_m']) | (scored['segment'] != scored['old_segment'])]
+    cursor.executemany('''
+        UPDATE customer_segments
+        SET recency_score = ?, frequency_score = ?, monetary_score = ?, segment = ?, computed_ts = ?
+        WHERE customer_id = ?
+    ''', zip(changed['recency_score'].tolist(), changed['frequency_score'].tolist(),
+             changed['monetary_score'].tolist(), changed['segment'].tolist(), [now_ts] * len(changed),
+             changed['customer_id'].tolist()))
+    return len(changed)
+
+def refresh_segments(full=False, progress=None):
+    """Re-aggregate customers with new or changed orders (everyone when full, or on the first run)
+    and rescore; returns a summary"""
+    started = time.perf_counter()
+    conn = get_connection()
+    conn.isolation_level = None
+    try:
+        cursor = conn.cursor()
+        cursor.execute("BEGIN IMMEDIATE")
+        try:
+            full = full or cursor.execute("SELECT NOT EXISTS (SELECT 1 FROM customer_segments)").fetchone()[0]
+            if progress:
+                progress(0.2, 'Aggregating all customers' if full else 'Aggregating customers with new orders')
+            aggregated = aggregate_rfm(cursor, full)
+            if progress:
+                progress(0.6, 'Scoring customers')
+            written = rescore(cursor)
+            cursor.execute("COMMIT")
+        except Exception:
+            cursor.execute("ROLLBACK")
+            raise
+    finally:
+        conn.close()
+    return {
+        'full': bool(full),
+        'customers_aggregated': aggregated,
+        'segments_written': written,
+        'seconds': round(time.perf_counter() - started, 2)
+    }
+
+def get_segment_counts():
+    """Customers per segment and when segments were last computed"""
+    conn = get_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT segment, COUNT(*) FROM customer_segments WHERE segment IS NOT NULL GROUP BY segment")
+        counts = dict.fromkeys(SEGMENTS, 0)
+        counts.update(cursor.fetchall())
+        cursor.execute("SELECT MAX(computed_ts), (SELECT COUNT(*) FROM customer_segment_queue) FROM customer_segments")
+        computed_ts, queued = cursor.fetchone()
+        return counts, computed_ts, queued
+    finally:
+        conn.close()
+
+def get_customer_segments(segment=None):
+    """Stored RFM values and scores per customer, best customers first"""
+    conn = get_connection()
+    try:
+        return pd.read_sql_query(f'''
+            SELECT c.id AS customer_id, c.name AS customer, c.company, s.segment, s.frequency, s.monetary,
+                   s.last_order_ts, s.recency_score, s.frequency_score, s.monetary_score, s.computed_ts
+            FROM customer_segments s JOIN customers c ON c.id = s.customer_id
+            {'WHERE s.segment = ?' if segment else ''}
+            ORDER BY s.monetary DESC
+        ''', conn, params=(segment,) if segment else ())
+    finally:
+        conn.close()
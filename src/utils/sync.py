@@ -0,0 +1,422 @@
+"""
+Offline-first sync API for the field sales app
+Devices queue orders, visits and activities while out of signal and push
+them in batches: every record carries a client-generated idempotency key,
+a batch is applied in one transaction, and re-sent records are answered
+with the ids assigned the first time. Catalog and customer data is pulled
+as a delta since a cursor into the trigger-maintained `change_log`.
+
+    POST /sync/push   {"device_id": ..., "visits": [...], "orders": [...], "activities": [...]}
+    GET  /sync/pull?since=<cursor>&entities=products,customers,price_lists,price_list_items
+"""
+import base64
+import json
+import sqlite3
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from config import Config
+from database.credit import invalidate_credit
+from database.init_db import get_connection
+from database.repository import insert_mobile_order, timestamp_columns
+from database.sequence import next_number
+from utils.audit import log_event
+from utils.metrics import ORDERS_CREATED, counter
+from utils.pricing import price_lines
+
+SYNC_REQUESTS = counter(
+    'penzflow_sync_requests_total', 'Sync API requests by endpoint and result', ('endpoint', 'result'))
+SYNC_RECORDS = counter(
+    'penzflow_sync_records_total', 'Pushed records by entity and outcome', ('entity', 'outcome'))
+
+MAX_BODY_BYTES = 5 * 1024 * 1024
+
+# Pushed entities in the order they are applied (orders may reference a visit from the same batch)
+PUSH_ENTITIES = ('visits', 'orders', 'activities')
+
+VISIT_FIELDS = ('visit_type', 'purpose', 'notes', 'result', 'follow_up_required', 'follow_up_date', 'location',
+                'latitude', 'longitude', 'duration', 'status')
+ACTIVITY_FIELDS = ('activity_type', 'subject', 'description', 'result', 'next_action', 'next_action_date',
+                   'priority', 'status')
+ORDER_FIELDS = ('payment_terms', 'special_instructions', 'discount_percentage', 'tax_percentage', 'delivery_date',
+                'total_amount', 'location_id')
+
+# Pullable entity: (table, columns sent to devices)
+SYNC_ENTITIES = {
+    'products': ('products', ('id', 'sku', 'name', 'description', 'category', 'price', 'stock_quantity')),
+    'customers': ('customers', ('id', 'name', 'email', 'phone', 'company', 'address', 'customer_group')),
+    'price_lists': ('price_lists', ('id', 'name', 'customer_group', 'priority', 'valid_from', 'valid_to', 'active')),
+    'price_list_items': ('price_list_items', ('id', 'price_list_id', 'product_id', 'min_quantity', 'price',
+                                              'discount_percentage', 'valid_from', 'valid_to'))
+}
+
+class SyncError(Exception):
+    """Request rejected as a whole, reported with an HTTP status"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+class _Conflict(Exception):
+    """A single record that cannot be applied; the rest of the batch still is"""
+
+def _exists(cursor, table, record_id):
+    cursor.execute(f"SELECT 1 FROM {table} WHERE id = ?", (record_id,))
+    return cursor.fetchone() is not None
+
+def _applied_keys(keys):
+    """Idempotency keys already applied, read before the write transaction"""
+    if not keys:
+        return set()
+    conn = get_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(f'''
+            SELECT idempotency_key FROM sync_idempotency WHERE idempotency_key IN ({','.join('?' * len(keys))})
+        ''', keys)
+        return {row[0] for row in cursor.fetchall()}
+    finally:
+        conn.close()
+
+def _check_customer(cursor, record):
+    customer_id = record.get('customer_id')
+    if customer_id is not None and not _exists(cursor, 'customers', customer_id):
+        raise _Conflict(f"unknown customer {customer_id}")
+    return customer_id
+
+def _insert_visit(cursor, user, record, numbers):
+    customer_id = _check_customer(cursor, record)
+    stored, visit_ts, local_date = timestamp_columns(record.get('visit_date'))
+    fields = [field for field in VISIT_FIELDS if field in record]
+    cursor.execute(f'''
+        INSERT INTO customer_visits (user_id, customer_id, visit_date, visit_ts, visit_local_date
+                                     {''.join(', ' + field for field in fields)})
+        VALUES (?, ?, ?, ?, ?{', ?' * len(fields)})
+    ''', [user['id'], customer_id, stored, visit_ts, local_date] + [record[field] for field in fields])
+    return cursor.lastrowid, None
+
+def _insert_activity(cursor, user, record, numbers):
+    customer_id = _check_customer(cursor, record)
+    stored, _, _ = timestamp_columns(record.get('activity_date'))
+    fields = [field for field in ACTIVITY_FIELDS if field in record]
+    cursor.execute(f'''
+        INSERT INTO sales_activities (user_id, customer_id, activity_date
+                                      {''.join(', ' + field for field in fields)})
+        VALUES (?, ?, ?{', ?' * len(fields)})
+    ''', [user['id'], customer_id, stored] + [record[field] for field in fields])
+    return cursor.lastrowid, None
+
+def _insert_order(cursor, user, record, numbers):
+    customer_id = _check_customer(cursor, record)
+    items = record.get('items') or []
+    if not items:
+        raise _Conflict("order has no items")
+    for item in items:
+        if not _exists(cursor, 'products', item.get('product_id')):
+            raise _Conflict(f"unknown product {item.get('product_id')}")
+        if not item.get('quantity') or item['quantity'] <= 0:
+            raise _Conflict(f"invalid quantity for product {item['product_id']}")
+    unpriced = [item for item in items if item.get('unit_price') is None]
+    if unpriced:
+        # Lines sent without a price get the price-list price for this customer and order date
+        prices, _, _ = price_lines([item['product_id'] for item in unpriced], [item['quantity'] for item in unpriced],
+                                   customer_id, record.get('order_date'))
+        for item, price in zip(unpriced, prices):
+            item['unit_price'] = int(price)
+
+    visit_id = record.get('visit_id')
+    if record.get('visit_key'):
+        cursor.execute('''
+            SELECT server_id FROM sync_idempotency WHERE idempotency_key = ? AND entity_type = 'visits'
+        ''', (record['visit_key'],))
+        row = cursor.fetchone()
+        if row is None:
+            raise _Conflict(f"unknown visit {record['visit_key']}")
+        visit_id = row[0]
+
+    order_number = numbers[record['key']]
+    order_id = insert_mobile_order(
+        cursor, order_number, user['id'], customer_id, items, status='submitted',
+        order_date=record.get('order_date'), visit_id=visit_id,
+        **{field: record[field] for field in ORDER_FIELDS if field in record})
+    return order_id, order_number
+
+INSERTERS = {
+    'visits': _insert_visit,
+    'orders': _insert_order,
+    'activities': _insert_activity
+}
+
+def _key(record):
+    """Idempotency key of a pushed record, or None when it has no usable one"""
+    key = record.get('key')
+    return key if isinstance(key, str) and key else None
+
+def apply_batch(user, batch):
+    """Apply a pushed batch in one transaction; returns per-record results and conflicts"""
+    device_id = batch.get('device_id')
+    for entity in PUSH_ENTITIES:
+        if not isinstance(batch.get(entity) or [], list):
+            raise SyncError(400, f"{entity} must be a list")
+    records = [(entity, record) for entity in PUSH_ENTITIES for record in batch.get(entity) or []]
+    if len(records) > Config.SYNC_MAX_BATCH_RECORDS:
+        raise SyncError(413, f"batch has {len(records)} records, the limit is {Config.SYNC_MAX_BATCH_RECORDS}")
+    # A malformed record is a conflict of its own, not a failed batch
+    conflicts = [{'entity': entity, 'key': None, 'reason': 'record is not an object'}
+                 for entity, record in records if not isinstance(record, dict)]
+    records = [(entity, record) for entity, record in records if isinstance(record, dict)]
+
+    applied = _applied_keys([_key(record) for _, record in records if _key(record)])
+    numbers = {record['key']: next_number('MO') for entity, record in records
+               if entity == 'orders' and _key(record) and record['key'] not in applied}
+
+    results = []
+    conn = get_connection()
+    conn.isolation_level = None
+    try:
+        cursor = conn.cursor()
+        cursor.execute("BEGIN IMMEDIATE")
+        try:
+            for entity, record in records:
+                key = _key(record)
+                if not key:
+                    conflicts.append({'entity': entity, 'key': None, 'reason': 'missing idempotency key'})
+                    continue
+                cursor.execute('''
+                    SELECT entity_type, server_id, server_number FROM sync_idempotency WHERE idempotency_key = ?
+                ''', (key,))
+                existing = cursor.fetchone()
+                if existing:
+                    if existing[0] != entity:
+                        conflicts.append({'entity': entity, 'key': key,
+                                          'reason': f"key already used for {existing[0]}"})
+                    else:
+                        results.append({'entity': entity, 'key': key, 'status': 'duplicate',
+                                        'id': existing[1], 'number': existing[2]})
+                    continue
+
+                cursor.execute("SAVEPOINT record")
+                try:
+                    server_id, number = INSERTERS[entity](cursor, user, record, numbers)
+                except (_Conflict, KeyError, TypeError, ValueError,
+                        sqlite3.IntegrityError, sqlite3.ProgrammingError) as e:
+                    cursor.execute("ROLLBACK TO record")
+                    cursor.execute("RELEASE record")
+                    conflicts.append({'entity': entity, 'key': key, 'reason': str(e)})
+                    continue
+                cursor.execute('''
+                    INSERT INTO sync_idempotency (idempotency_key, entity_type, server_id, server_number, user_id,
+                                                  device_id, received_ts)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                ''', (key, entity, server_id, number, user['id'], device_id, int(time.time())))
+                cursor.execute("RELEASE record")
+                results.append({'entity': entity, 'key': key, 'status': 'created', 'id': server_id, 'number': number})
+            cursor.execute("COMMIT")
+        except Exception:
+            cursor.execute("ROLLBACK")
+            raise
+    finally:
+        conn.close()
+        # Credit checks of orders rolled back to their savepoint were added to the cached exposure
+        if numbers:
+            invalidate_credit()
+
+    for result in results:
+        SYNC_RECORDS.inc(1, result['entity'], result['status'])
+    for conflict in conflicts:
+        SYNC_RECORDS.inc(1, conflict['entity'], 'conflict')
+    created_orders = sum(1 for r in results if r['entity'] == 'orders' and r['status'] == 'created')
+    if created_orders:
+        ORDERS_CREATED.inc(created_orders, 'mobile')
+    log_event('sync_push', user['username'], 'device', device_id,
+              f"{len(results)} applied, {len(conflicts)} conflicts")
+    return {'results': results, 'conflicts': conflicts}
+
+def pull_changes(since=0, entities=None):
+    """Rows changed since a change-log cursor; a full download when the cursor is 0 or was pruned"""
+    entities = entities or list(SYNC_ENTITIES)
+    unknown = [entity for entity in entities if entity not in SYNC_ENTITIES]
+    if unknown:
+        raise SyncError(400, f"unknown entities: {', '.join(unknown)}")
+
+    conn = get_connection()
+    conn.isolation_level = None
+    try:
+        cursor = conn.cursor()
+        # One read transaction so the cursor and the rows describe the same moment
+        cursor.execute("BEGIN")
+        cursor.execute("SELECT seq FROM sqlite_sequence WHERE name = 'change_log'")
+        row = cursor.fetchone()
+        latest = row[0] if row else 0
+        cursor.execute("SELECT MIN(id) FROM change_log")
+        oldest = cursor.fetchone()[0] or latest + 1
+        full = since <= 0 or since < oldest - 1
+
+        changes = {}
+        for entity in entities:
+            table, columns = SYNC_ENTITIES[entity]
+            select = ', '.join(f"t.{column}" for column in columns)
+            if full:
+                cursor.execute(f"SELECT t.id, {select} FROM {table} t ORDER BY t.id")
+            else:
+                cursor.execute(f'''
+                    SELECT c.record_id, {select}
+                    FROM (SELECT DISTINCT record_id FROM change_log
+                          WHERE entity = ? AND id > ? AND id <= ?) c
+                    LEFT JOIN {table} t ON t.id = c.record_id
+                    ORDER BY c.record_id
+                ''', (entity, since, latest))
+            upserts, deletes = [], []
+            for record_id, *values in cursor.fetchall():
+                if values[0] is None:
+                    deletes.append(record_id)
+                else:
+                    upserts.append(dict(zip(columns, values)))
+            changes[entity] = {'upserts': upserts, 'deletes': deletes}
+        cursor.execute("COMMIT")
+    finally:
+        conn.close()
+    return {'cursor': latest, 'full': full, 'changes': changes}
+
+def prune_change_log(retention_days=None):
+    """Delete change-log entries older than the retention; returns the number removed"""
+    retention_days = retention_days or Config.SYNC_CHANGE_RETENTION_DAYS
+    conn = get_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("DELETE FROM change_log WHERE changed_ts < ?", (int(time.time()) - retention_days * 86400,))
+        conn.commit()
+        return cursor.rowcount
+    finally:
+        conn.close()
+
+def get_sync_status(hours=24):
+    """Records received per entity in the last hours, devices seen and the current change cursor"""
+    conn = get_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT entity_type, COUNT(*), COUNT(DISTINCT device_id), MAX(received_ts)
+            FROM sync_idempotency
+            WHERE received_ts >= ?
+            GROUP BY entity_type
+            ORDER BY entity_type
+        ''', (int(time.time()) - hours * 3600,))
+        keys = ('entity', 'records', 'devices', 'last_received_ts')
+        received = [dict(zip(keys, row)) for row in cursor.fetchall()]
+        cursor.execute("SELECT seq FROM sqlite_sequence WHERE name = 'change_log'")
+        row = cursor.fetchone()
+        return {'received': received, 'cursor': row[0] if row else 0}
+    finally:
+        conn.close()
+
+def authenticate(header):
+    """User dict for an HTTP Basic Authorization header, or None"""
+    if not header or not header.startswith('Basic '):
+        return None
+    try:
+        username, _, password = base64.b64decode(header[6:]).decode('utf-8').partition(':')
+    except ValueError:
+        return None
+    conn = get_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT id, username, role FROM users WHERE username = ? AND password = ?",
+                       (username, password))
+        row = cursor.fetchone()
+    finally:
+        conn.close()
+    return dict(zip(('id', 'username', 'role'), row)) if row else None
+
+class _SyncHandler(BaseHTTPRequestHandler):
+    """JSON endpoints for /sync/push and /sync/pull"""
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload, default=str).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        if status == 401:
+            self.send_header('WWW-Authenticate', 'Basic realm="PenzFlow sync"')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _handle(self, endpoint, action):
+        user = authenticate(self.headers.get('Authorization'))
+        if user is None:
+            SYNC_REQUESTS.inc(1, endpoint, 'unauthorized')
+            self._send_json(401, {'error': 'authentication required'})
+            return
+        try:
+            payload = action(user)
+        except SyncError as e:
+            SYNC_REQUESTS.inc(1, endpoint, 'rejected')
+            self._send_json(e.status, {'error': str(e)})
+            return
+        except Exception as e:
+            SYNC_REQUESTS.inc(1, endpoint, 'error')
+            self._send_json(500, {'error': str(e)})
+            return
+        SYNC_REQUESTS.inc(1, endpoint, 'ok')
+        self._send_json(200, payload)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path != '/sync/pull':
+            self.send_error(404)
+            return
+
+        def pull(user):
+            query = parse_qs(url.query)
+            try:
+                since = int(query.get('since', ['0'])[0])
+            except ValueError:
+                raise SyncError(400, "since must be an integer cursor")
+            entities = query['entities'][0].split(',') if 'entities' in query else None
+            return pull_changes(since, entities)
+
+        self._handle('pull', pull)
+
+    def do_POST(self):
+        if urlparse(self.path).path != '/sync/push':
+            self.send_error(404)
+            return
+
+        def push(user):
+            length = int(self.headers.get('Content-Length') or 0)
+            if length > MAX_BODY_BYTES:
+                raise SyncError(413, "request body too large")
+            try:
+                batch = json.loads(self.rfile.read(length) or b'{}')
+            except ValueError:
+                raise SyncError(400, "body is not valid JSON")
+            if not isinstance(batch, dict):
+                raise SyncError(400, "body must be a JSON object")
+            return apply_batch(user, batch)
+
+        self._handle('push', push)
+
+    def log_message(self, format, *args):
+        # Requests are counted in the metrics registry instead of the Streamlit log
+        pass
+
+_server = None
+_server_lock = threading.Lock()
+
+def start_sync_server(host='127.0.0.1', port=9465):
+    """Start the sync API once per process; later calls are no-ops"""
+    global _server
+    with _server_lock:
+        if _server is not None:
+            return _server
+        try:
+            _server = ThreadingHTTPServer((host, port), _SyncHandler)
+        except OSError:
+            # Port taken by another app process, which serves the API instead
+            return None
+        _server.daemon_threads = True
+        thread = threading.Thread(target=_server.serve_forever, name='sync-api', daemon=True)
+        thread.start()
+        return _server
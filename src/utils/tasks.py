@@ -0,0 +1,233 @@
+"""
+Background job handlers
+Each handler receives a JobContext and the job params and returns a
+JSON-serialisable result (file paths, counts) shown in the jobs panel.
+"""
+import os
+import smtplib
+import sqlite3
+from datetime import datetime
+from email.message import EmailMessage
+
+import pandas as pd
+
+from config import Config
+from database.init_db import get_connection, get_db_path
+from utils.jobs import JobFailed, register_job
+from utils.reporting import build_report, write_report
+from utils.analytics import export_analytics as export_analytics_partitions
+from database.archive import archive_cold_data as archive_records
+from database.repository import wib_date_key
+from utils.sync import prune_change_log as prune_sync_changes
+from utils.price_updates import apply_price_update, read_price_csv
+from database.ledger import take_stock_snapshot
+from database.reservations import expire_reservations
+from utils.forecasting import refresh_forecasts
+from database.purchasing import generate_purchase_orders as create_purchase_orders
+from database.alerts import build_supplier_digests, mark_notified
+from utils.segmentation import refresh_segments
+
+def _output_path(directory, prefix, extension):
+    os.makedirs(directory, exist_ok=True)
+    return os.path.join(directory, f"{prefix}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{extension}")
+
+def _load_sales_orders(start_date=None, end_date=None):
+    conditions, params = [], []
+    if start_date:
+        conditions.append("so.order_local_date >= ?")
+        params.append(wib_date_key(start_date))
+    if end_date:
+        conditions.append("so.order_local_date <= ?")
+        params.append(wib_date_key(end_date))
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+
+    conn = get_connection()
+    try:
+        return pd.read_sql_query(f'''
+            SELECT so.order_number AS "Order #", so.order_date AS "Date", c.name AS "Customer",
+                   so.sales_rep AS "Salesman", so.status AS "Status",
+                   so.payment_method AS "Payment Method", so.total_amount AS "Total Amount"
+            FROM sales_orders so
+            LEFT JOIN customers c ON c.id = so.customer_id
+            {where}
+            ORDER BY so.order_local_date, so.id
+        ''', conn, params=params)
+    finally:
+        conn.close()
+
+def _write_sales_report(ctx, params):
+    ctx.progress(0.1, 'Loading sales orders')
+    df = _load_sales_orders(params.get('start_date'), params.get('end_date'))
+    ctx.progress(0.6, f'Writing {len(df)} orders')
+
+    file_format = params.get('format', 'xlsx')
+    path = _output_path(Config.REPORTS_DIR, 'sales_report', file_format)
+    if file_format == 'csv':
+        df.to_csv(path, index=False)
+    else:
+        with pd.ExcelWriter(path, engine='openpyxl') as writer:
+            df.to_excel(writer, sheet_name='Sales Orders', index=False)
+    return {'path': path, 'rows': len(df)}
+
+@register_job('export_sales_report')
+def export_sales_report(ctx, params):
+    """Export sales orders in a date range to REPORTS_DIR"""
+    result = _write_sales_report(ctx, params)
+    ctx.progress(1.0, f"Exported {result['rows']} orders")
+    return result
+
+@register_job('email_report')
+def email_report(ctx, params):
+    """Export the sales report and send it as an e-mail attachment"""
+    recipient = params.get('recipient') or Config.MAIL_USERNAME
+    if not Config.MAIL_USERNAME or not recipient:
+        raise JobFailed("E-mail is not configured (set MAIL_USERNAME/MAIL_PASSWORD in config.py)")
+
+    result = _write_sales_report(ctx, params)
+    ctx.progress(0.8, f'Sending to {recipient}')
+
+    message = EmailMessage()
+    message['Subject'] = f"PenzFlow Sales Report {datetime.now().strftime('%d-%m-%Y')}"
+    message['From'] = Config.MAIL_USERNAME
+    message['To'] = recipient
+    message.set_content(f"Attached: sales report with {result['rows']} orders.")
+    with open(result['path'], 'rb') as attachment:
+        message.add_attachment(
+            attachment.read(), maintype='application', subtype='octet-stream',
+            filename=os.path.basename(result['path'])
+        )
+
+    with smtplib.SMTP(Config.MAIL_SERVER, Config.MAIL_PORT, timeout=30) as smtp:
+        if Config.MAIL_USE_TLS:
+            smtp.starttls()
+        if Config.MAIL_PASSWORD:
+            smtp.login(Config.MAIL_USERNAME, Config.MAIL_PASSWORD)
+        smtp.send_message(message)
+
+    result['recipient'] = recipient
+    return result
+
+@register_job('backup_database')
+def backup_database(ctx, params):
+    """Copy the live database to BACKUP_DIR with SQLite's online backup API"""
+    path = _output_path(Config.BACKUP_DIR, 'penzflow', 'db')
+    source = sqlite3.connect(get_db_path())
+    target = sqlite3.connect(path)
+    try:
+        def report(status, remaining, total):
+            if total:
+                ctx.progress((total - remaining) / total, f'Copied {total - remaining}/{total} pages')
+
+        # Copy in chunks so writers are not blocked for the whole backup
+        source.backup(target, pages=256, progress=report)
+    finally:
+        target.close()
+        source.close()
+    return {'path': path, 'bytes': os.path.getsize(path)}
+
+@register_job('generate_purchase_orders')
+def generate_purchase_orders(ctx, params):
+    """Draft purchase orders per supplier for every product below its reorder point"""
+    ctx.progress(0.1, 'Computing reorder quantities')
+    summary = create_purchase_orders(params.get('created_by'), progress=ctx.progress)
+    ctx.progress(1.0, f"{len(summary['purchase_orders'])} purchase orders drafted")
+    return summary
+
+@register_job('generate_report')
+def generate_report(ctx, params):
+    """Precompute a report into REPORTS_DIR and refresh its cached summary"""
+    name = params['report']
+    ctx.progress(0.1, f'Aggregating {name}')
+    frames, summary = build_report(name)
+    ctx.progress(0.7, 'Writing files')
+    paths = write_report(name, frames, summary, formats=tuple(params.get('formats', ('parquet', 'xlsx'))))
+    xlsx = [path for path in paths if path.endswith('.xlsx')]
+    return {'path': xlsx[0] if xlsx else paths[0], 'files': paths}
+
+@register_job('export_analytics')
+def export_analytics(ctx, params):
+    """Export new fact rows to the Parquet analytics store"""
+    written = export_analytics_partitions(progress=ctx.progress)
+    ctx.progress(1.0, f"Wrote {sum(written.values())} partitions")
+    return {'partitions': written}
+
+@register_job('archive_cold_data')
+def archive_cold_data(ctx, params):
+    """Move closed records older than the archive horizon to Parquet"""
+    archived = archive_records(params.get('horizon_days'), progress=ctx.progress)
+    ctx.progress(1.0, f"Archived {sum(archived.values())} records")
+    return {'archived': archived}
+
+@register_job('prune_change_log')
+def prune_change_log(ctx, params):
+    """Drop sync change-log entries older than the retention period"""
+    removed = prune_sync_changes(params.get('retention_days'))
+    ctx.progress(1.0, f"Removed {removed} change-log entries")
+    return {'removed': removed}
+
+@register_job('bulk_price_update')
+def bulk_price_update(ctx, params):
+    """Apply a previewed bulk price update (rules and/or an uploaded CSV) in one transaction"""
+    csv_rows = None
+    if params.get('csv_path'):
+        ctx.progress(0.1, 'Reading price file')
+        with open(params['csv_path'], 'rb') as f:
+            csv_rows = read_price_csv(f.read())
+    ctx.progress(0.3, 'Updating prices')
+    result = apply_price_update(params['update_key'], params.get('rules', ()), csv_rows,
+                                params.get('round_to', 1), params.get('description'), params.get('created_by'))
+    ctx.progress(1.0, f"Updated {result['changed']} products")
+    return result
+
+@register_job('snapshot_stock_balances')
+def snapshot_stock_balances(ctx, params):
+    """Store each product's closing stock balance for a day (yesterday by default)"""
+    count = take_stock_snapshot(params.get('day'))
+    ctx.progress(1.0, f"Snapshotted {count} products")
+    return {'products': count}
+
+@register_job('expire_stock_reservations')
+def expire_stock_reservations(ctx, params):
+    """Release the stock held by draft orders whose reservation has expired"""
+    expired = expire_reservations()
+    ctx.progress(1.0, f"Expired {expired} draft orders")
+    return {'orders': expired}
+
+@register_job('forecast_demand')
+def forecast_demand(ctx, params):
+    """Refit demand forecasts for the whole catalog"""
+    ctx.progress(0.05, 'Loading daily demand')
+    summary = refresh_forecasts(progress=ctx.progress)
+    ctx.progress(1.0, f"Forecast {summary['products']} products")
+    return summary
+
+@register_job('send_alert_digest')
+def send_alert_digest(ctx, params):
+    """E-mail new stock alerts to purchasing, one digest per supplier"""
+    digests = build_supplier_digests(pending_only=not params.get('resend'))
+    recipient = params.get('recipient') or Config.ALERT_MAIL_TO
+    if not digests:
+        return {'suppliers': 0, 'alerts': 0}
+
+    sent = 0
+    with smtplib.SMTP(Config.ALERT_MAIL_SERVER, Config.ALERT_MAIL_PORT, timeout=30) as smtp:
+        for index, (supplier, lines, body) in enumerate(digests):
+            ctx.check_cancelled()
+            message = EmailMessage()
+            message['Subject'] = f"PenzFlow Stock Alerts: {supplier} ({len(lines)} products)"
+            message['From'] = Config.ALERT_MAIL_FROM
+            message['To'] = recipient
+            message.set_content(body)
+            smtp.send_message(message)
+            # Mark per supplier so a failure part-way only resends the unsent digests
+            mark_notified(lines['product_id'])
+            sent += len(lines)
+            ctx.progress((index + 1) / len(digests), f'Sent {supplier}')
+    return {'suppliers': len(digests), 'alerts': sent, 'recipient': recipient}
+
+@register_job('segment_customers')
+def segment_customers(ctx, params):
+    """Refresh RFM segments for customers with new or changed orders (all with full)"""
+    summary = refresh_segments(full=bool(params.get('full')), progress=ctx.progress)
+    ctx.progress(1.0, f"Segmented {summary['customers_aggregated']} customers")
+    return summary
@@ -0,0 +1,21 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, 'src')]
+
+from database import credit, init_db, sequence
+from utils import pricing
+
+@pytest.fixture
+def db_path(tmp_path, monkeypatch):
+    """Point get_connection() at a database file in a temporary directory"""
+    path = str(tmp_path / 'penzflow.db')
+    monkeypatch.setattr(init_db, 'get_db_path', lambda: path)
+    # Number blocks, credit figures and the price index are cached per process, not per database
+    monkeypatch.setattr(sequence, '_allocator', sequence.SequenceAllocator())
+    credit.invalidate_credit()
+    pricing.invalidate_price_index()
+    return path
@@ -0,0 +1,260 @@
+-- Database as created by the first release's init_database(), with its sample data
+BEGIN TRANSACTION;
+CREATE TABLE attendance (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            check_in_time TIMESTAMP,
+            check_out_time TIMESTAMP,
+            location TEXT,
+            latitude REAL,
+            longitude REAL,
+            notes TEXT,
+            status TEXT DEFAULT 'present', -- 'present', 'absent', 'late'
+            date DATE,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        );
+INSERT INTO "attendance" VALUES(1,3,'2026-10-19 08:30:00','2026-10-19 17:00:00','Jakarta Office',-6.2088,106.8456,'Regular attendance','present','2026-10-19','2026-10-19 12:53:47');
+INSERT INTO "attendance" VALUES(2,4,'2026-10-19 08:30:00','2026-10-19 17:00:00','Jakarta Office',-6.2088,106.8456,'Regular attendance','present','2026-10-19','2026-10-19 12:53:47');
+INSERT INTO "attendance" VALUES(3,3,'2026-10-18 08:30:00','2026-10-18 17:00:00','Jakarta Office',-6.2088,106.8456,'Regular attendance','present','2026-10-18','2026-10-19 12:53:47');
+INSERT INTO "attendance" VALUES(4,4,'2026-10-18 08:30:00','2026-10-18 17:00:00','Jakarta Office',-6.2088,106.8456,'Regular attendance','present','2026-10-18','2026-10-19 12:53:47');
+INSERT INTO "attendance" VALUES(5,3,'2026-10-17 08:30:00','2026-10-17 17:00:00','Jakarta Office',-6.2088,106.8456,'Regular attendance','present','2026-10-17','2026-10-19 12:53:47');
+INSERT INTO "attendance" VALUES(6,4,'2026-10-17 08:30:00','2026-10-17 17:00:00','Jakarta Office',-6.2088,106.8456,'Regular attendance','present','2026-10-17','2026-10-19 12:53:47');
+INSERT INTO "attendance" VALUES(7,3,'2026-10-16 08:30:00','2026-10-16 17:00:00','Jakarta Office',-6.2088,106.8456,'Regular attendance','present','2026-10-16','2026-10-19 12:53:47');
+INSERT INTO "attendance" VALUES(8,4,'2026-10-16 08:30:00','2026-10-16 17:00:00','Jakarta Office',-6.2088,106.8456,'Regular attendance','present','2026-10-16','2026-10-19 12:53:47');
+INSERT INTO "attendance" VALUES(9,3,'2026-10-15 08:30:00','2026-10-15 17:00:00','Jakarta Office',-6.2088,106.8456,'Regular attendance','present','2026-10-15','2026-10-19 12:53:47');
+INSERT INTO "attendance" VALUES(10,4,'2026-10-15 08:30:00','2026-10-15 17:00:00','Jakarta Office',-6.2088,106.8456,'Regular attendance','present','2026-10-15','2026-10-19 12:53:47');
+INSERT INTO "attendance" VALUES(11,3,'2026-10-14 08:30:00','2026-10-14 17:00:00','Jakarta Office',-6.2088,106.8456,'Regular attendance','present','2026-10-14','2026-10-19 12:53:47');
+INSERT INTO "attendance" VALUES(12,4,'2026-10-14 08:30:00','2026-10-14 17:00:00','Jakarta Office',-6.2088,106.8456,'Regular attendance','present','2026-10-14','2026-10-19 12:53:47');
+INSERT INTO "attendance" VALUES(13,3,'2026-10-13 08:30:00','2026-10-13 17:00:00','Jakarta Office',-6.2088,106.8456,'Regular attendance','present','2026-10-13','2026-10-19 12:53:47');
+INSERT INTO "attendance" VALUES(14,4,'2026-10-13 08:30:00','2026-10-13 17:00:00','Jakarta Office',-6.2088,106.8456,'Regular attendance','present','2026-10-13','2026-10-19 12:53:47');
+CREATE TABLE customer_visits (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            customer_id INTEGER,
+            visit_date TIMESTAMP,
+            visit_type TEXT, -- 'sales_call', 'delivery', 'follow_up', 'complaint'
+            purpose TEXT,
+            notes TEXT,
+            result TEXT,
+            follow_up_required BOOLEAN DEFAULT 0,
+            follow_up_date DATE,
+            location TEXT,
+            latitude REAL,
+            longitude REAL,
+            duration INTEGER, -- in minutes
+            status TEXT DEFAULT 'planned', -- 'planned', 'in_progress', 'completed', 'cancelled'
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users (id),
+            FOREIGN KEY (customer_id) REFERENCES customers (id)
+        );
+INSERT INTO "customer_visits" VALUES(1,3,1,'2026-10-19 10:53:47.321846','sales_call','Product demonstration','Showed new product line, customer interested','Customer will consider, follow up next week',1,'2026-10-26','PT. Teknologi Maju',-6.2297,106.8269,120,'completed','2026-10-19 12:53:47');
+INSERT INTO "customer_visits" VALUES(2,3,2,'2026-10-19 08:53:47.321852','follow_up','Follow up on previous order','Discussed delivery timeline','Order confirmed, delivery scheduled',0,NULL,'CV. Bisnis Sukses',-6.1944,106.8229,90,'completed','2026-10-19 12:53:47');
+INSERT INTO "customer_visits" VALUES(3,4,3,'2026-10-19 11:53:47.321854','delivery','Product delivery and setup','Delivered products, provided training','Customer satisfied, potential for future orders',1,'2026-11-02','UD. Perdagangan Jaya',-6.2615,106.7832,150,'completed','2026-10-19 12:53:47');
+CREATE TABLE customers (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            email TEXT,
+            phone TEXT,
+            company TEXT,
+            address TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+INSERT INTO "customers" VALUES(1,'Budi Santoso','budi.santoso@email.com','+62812-3456-7890','PT Teknologi Maju','Jl. Sudirman No. 123, Jakarta Pusat','2026-10-19 12:53:47','2026-10-19 12:53:47');
+INSERT INTO "customers" VALUES(2,'Sari Dewi','sari.dewi@email.com','+62813-4567-8901','CV Bisnis Mandiri','Jl. Thamrin No. 456, Jakarta Selatan','2026-10-19 12:53:47','2026-10-19 12:53:47');
+INSERT INTO "customers" VALUES(3,'Ahmad Rahman','ahmad.rahman@email.com','+62814-5678-9012','PT Layanan Prima','Jl. Gatot Subroto No. 789, Jakarta Timur','2026-10-19 12:53:47','2026-10-19 12:53:47');
+INSERT INTO "customers" VALUES(4,'Indira Putri','indira.putri@email.com','+62815-6789-0123','PT Solusi Digital','Jl. Kuningan No. 321, Jakarta Selatan','2026-10-19 12:53:47','2026-10-19 12:53:47');
+INSERT INTO "customers" VALUES(5,'Rizki Pratama','rizki.pratama@email.com','+62816-7890-1234','PT Usaha Bersama','Jl. Rasuna Said No. 654, Jakarta Selatan','2026-10-19 12:53:47','2026-10-19 12:53:47');
+CREATE TABLE expense_claims (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            claim_date DATE,
+            expense_type TEXT, -- 'travel', 'meal', 'accommodation', 'fuel', 'other'
+            amount DECIMAL(15,2),
+            description TEXT,
+            receipt_path TEXT,
+            status TEXT DEFAULT 'pending', -- 'pending', 'approved', 'rejected', 'paid'
+            approved_by INTEGER,
+            approved_date TIMESTAMP,
+            remarks TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users (id),
+            FOREIGN KEY (approved_by) REFERENCES users (id)
+        );
+CREATE TABLE gps_tracking (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            latitude REAL,
+            longitude REAL,
+            accuracy REAL,
+            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            activity TEXT, -- 'traveling', 'at_customer', 'break', 'office'
+            battery_level INTEGER,
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        );
+CREATE TABLE inventory_transactions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            product_id INTEGER,
+            transaction_type TEXT, -- 'in', 'out', 'adjustment'
+            quantity INTEGER,
+            reference_type TEXT, -- 'purchase', 'sale', 'adjustment'
+            reference_id INTEGER,
+            notes TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (product_id) REFERENCES products (id)
+        );
+CREATE TABLE mobile_order_items (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            mobile_order_id INTEGER,
+            product_id INTEGER,
+            quantity INTEGER,
+            unit_price DECIMAL(15,2),
+            discount_percentage DECIMAL(5,2) DEFAULT 0,
+            total_price DECIMAL(15,2),
+            notes TEXT,
+            FOREIGN KEY (mobile_order_id) REFERENCES mobile_orders (id),
+            FOREIGN KEY (product_id) REFERENCES products (id)
+        );
+CREATE TABLE mobile_orders (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            customer_id INTEGER,
+            visit_id INTEGER,
+            order_number TEXT UNIQUE,
+            order_date TIMESTAMP,
+            total_amount DECIMAL(15,2),
+            status TEXT DEFAULT 'draft', -- 'draft', 'submitted', 'approved', 'rejected'
+            payment_terms TEXT,
+            delivery_date DATE,
+            special_instructions TEXT,
+            discount_percentage DECIMAL(5,2) DEFAULT 0,
+            tax_percentage DECIMAL(5,2) DEFAULT 11,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users (id),
+            FOREIGN KEY (customer_id) REFERENCES customers (id),
+            FOREIGN KEY (visit_id) REFERENCES customer_visits (id)
+        );
+CREATE TABLE order_items (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            order_id INTEGER,
+            product_id INTEGER,
+            quantity INTEGER,
+            unit_price DECIMAL(10,2),
+            total_price DECIMAL(10,2),
+            FOREIGN KEY (order_id) REFERENCES sales_orders (id),
+            FOREIGN KEY (product_id) REFERENCES products (id)
+        );
+CREATE TABLE products (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            sku TEXT UNIQUE NOT NULL,
+            name TEXT NOT NULL,
+            description TEXT,
+            category TEXT,
+            price DECIMAL(10,2),
+            cost DECIMAL(10,2),
+            stock_quantity INTEGER DEFAULT 0,
+            min_stock_level INTEGER DEFAULT 0,
+            max_stock_level INTEGER DEFAULT 1000,
+            supplier TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+INSERT INTO "products" VALUES(1,'PRD001','Laptop Pro','High-performance laptop for professionals','Electronics',14999000,11250000,25,10,100,'TechSupplier Inc','2026-10-19 12:53:47','2026-10-19 12:53:47');
+INSERT INTO "products" VALUES(2,'PRD002','Wireless Mouse','Ergonomic wireless mouse with long battery life','Accessories',449000,225000,150,50,300,'AccessoryHub','2026-10-19 12:53:47','2026-10-19 12:53:47');
+INSERT INTO "products" VALUES(3,'PRD003','USB Cable','High-speed USB-C cable 6ft','Cables',149000,60000,200,100,500,'CableCorp','2026-10-19 12:53:47','2026-10-19 12:53:47');
+INSERT INTO "products" VALUES(4,'PRD004','Monitor Stand','Adjustable monitor stand for better ergonomics','Furniture',749000,375000,45,20,100,'OfficeSupply Ltd','2026-10-19 12:53:47','2026-10-19 12:53:47');
+INSERT INTO "products" VALUES(5,'PRD005','Keyboard','Mechanical keyboard with RGB backlighting','Input Devices',1199000,675000,80,30,150,'KeyboardMaker','2026-10-19 12:53:47','2026-10-19 12:53:47');
+CREATE TABLE sales_activities (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            customer_id INTEGER,
+            activity_type TEXT, -- 'call', 'email', 'meeting', 'demo', 'proposal'
+            activity_date TIMESTAMP,
+            subject TEXT,
+            description TEXT,
+            result TEXT,
+            next_action TEXT,
+            next_action_date DATE,
+            priority TEXT DEFAULT 'medium', -- 'low', 'medium', 'high'
+            status TEXT DEFAULT 'pending', -- 'pending', 'completed', 'cancelled'
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users (id),
+            FOREIGN KEY (customer_id) REFERENCES customers (id)
+        );
+INSERT INTO "sales_activities" VALUES(1,3,1,'call','2026-10-19 09:53:47.321951','Follow up call','Called to check on product satisfaction','Customer happy with purchase','Schedule maintenance visit','2026-11-18','medium','completed','2026-10-19 12:53:47');
+INSERT INTO "sales_activities" VALUES(2,3,2,'email','2026-10-19 06:53:47.321954','Product catalog','Sent new product catalog via email','Email delivered','Wait for customer response','2026-10-22','low','completed','2026-10-19 12:53:47');
+INSERT INTO "sales_activities" VALUES(3,4,3,'meeting','2026-10-19 14:53:47.321957','Contract negotiation','Discuss terms for bulk order','','Prepare contract proposal','2026-10-20','high','pending','2026-10-19 12:53:47');
+CREATE TABLE sales_orders (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            order_number TEXT UNIQUE NOT NULL,
+            customer_id INTEGER,
+            order_date DATE,
+            total_amount DECIMAL(10,2),
+            status TEXT DEFAULT 'pending',
+            payment_method TEXT,
+            sales_rep TEXT,
+            notes TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (customer_id) REFERENCES customers (id)
+        );
+INSERT INTO "sales_orders" VALUES(1,'ORD001',1,'2024-01-15',19500000,'completed','Credit Card','John Sales','First order','2026-10-19 12:53:47','2026-10-19 12:53:47');
+INSERT INTO "sales_orders" VALUES(2,'ORD002',2,'2024-01-16',1350000,'pending','Cash','Jane Sales','Rush order','2026-10-19 12:53:47','2026-10-19 12:53:47');
+INSERT INTO "sales_orders" VALUES(3,'ORD003',3,'2024-01-17',37500000,'shipped','Bank Transfer','Bob Sales','Bulk order','2026-10-19 12:53:47','2026-10-19 12:53:47');
+INSERT INTO "sales_orders" VALUES(4,'ORD004',4,'2024-01-18',9000000,'processing','Credit Card','Alice Sales','Regular order','2026-10-19 12:53:47','2026-10-19 12:53:47');
+INSERT INTO "sales_orders" VALUES(5,'ORD005',5,'2024-01-19',3000000,'completed','Cash','Charlie Sales','Quick sale','2026-10-19 12:53:47','2026-10-19 12:53:47');
+CREATE TABLE sales_routes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            route_name TEXT,
+            day_of_week INTEGER, -- 0=Monday, 6=Sunday
+            customers TEXT, -- JSON array of customer IDs
+            estimated_duration INTEGER, -- in minutes
+            status TEXT DEFAULT 'active', -- 'active', 'inactive'
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        );
+CREATE TABLE sales_targets (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            target_period TEXT, -- 'monthly', 'quarterly', 'yearly'
+            start_date DATE,
+            end_date DATE,
+            target_amount DECIMAL(15,2),
+            achieved_amount DECIMAL(15,2) DEFAULT 0,
+            target_visits INTEGER,
+            achieved_visits INTEGER DEFAULT 0,
+            target_customers INTEGER,
+            achieved_customers INTEGER DEFAULT 0,
+            status TEXT DEFAULT 'active', -- 'active', 'completed', 'paused'
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        );
+INSERT INTO "sales_targets" VALUES(1,3,'monthly','2026-10-01','2026-10-31',50000000,35000000,20,15,10,8,'active','2026-10-19 12:53:47');
+INSERT INTO "sales_targets" VALUES(2,4,'monthly','2026-10-01','2026-10-31',50000000,35000000,20,15,10,8,'active','2026-10-19 12:53:47');
+CREATE TABLE users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT UNIQUE NOT NULL,
+            password TEXT NOT NULL,
+            email TEXT,
+            role TEXT DEFAULT 'user',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            last_login TIMESTAMP
+        );
+INSERT INTO "users" VALUES(1,'admin','admin123','admin@penzflow.com','administrator','2026-10-19 12:53:47',NULL);
+INSERT INTO "users" VALUES(2,'demo','demo','demo@penzflow.com','user','2026-10-19 12:53:47',NULL);
+INSERT INTO "users" VALUES(3,'salesman1','sales123','budi.santoso@penzflow.com','salesman','2026-10-19 12:53:47',NULL);
+INSERT INTO "users" VALUES(4,'salesman2','sales123','sari.wulandari@penzflow.com','salesman','2026-10-19 12:53:47',NULL);
+INSERT INTO "users" VALUES(5,'manager1','manager123','ahmad.manager@penzflow.com','sales_manager','2026-10-19 12:53:47',NULL);
+DELETE FROM "sqlite_sequence";
+INSERT INTO "sqlite_sequence" VALUES('users',5);
+INSERT INTO "sqlite_sequence" VALUES('customers',5);
+INSERT INTO "sqlite_sequence" VALUES('products',5);
+INSERT INTO "sqlite_sequence" VALUES('sales_orders',5);
+INSERT INTO "sqlite_sequence" VALUES('attendance',14);
+INSERT INTO "sqlite_sequence" VALUES('customer_visits',3);
+INSERT INTO "sqlite_sequence" VALUES('sales_targets',2);
+INSERT INTO "sqlite_sequence" VALUES('sales_activities',3);
+COMMIT;
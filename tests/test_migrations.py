@@ -0,0 +1,68 @@
+"""Upgrading databases created by older releases"""
+import os
+import sqlite3
+
+from database import init_db
+from database.migrations import MIGRATIONS
+
+FIXTURES = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+def _load_baseline(path):
+    """Create a database file as the first release left it"""
+    conn = sqlite3.connect(path)
+    try:
+        with open(os.path.join(FIXTURES, 'baseline.sql')) as f:
+            conn.executescript(f.read())
+    finally:
+        conn.close()
+
+def _schema(path):
+    """Tables with their columns, indexes and triggers of a database file"""
+    conn = sqlite3.connect(path)
+    try:
+        objects = {(kind, name) for kind, name in conn.execute(
+            "SELECT type, name FROM sqlite_master WHERE type IN ('table', 'index', 'trigger')")}
+        columns = {name: sorted(row[1] for row in conn.execute(f"PRAGMA table_info({name})"))
+                   for kind, name in objects if kind == 'table'}
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+    finally:
+        conn.close()
+    return objects, columns, version
+
+def test_baseline_database_upgrades_to_the_current_schema(db_path, tmp_path, monkeypatch):
+    _load_baseline(db_path)
+    init_db.init_database()
+    # A second start finds nothing left to do
+    init_db.init_database()
+
+    fresh_path = str(tmp_path / 'fresh.db')
+    monkeypatch.setattr(init_db, 'get_db_path', lambda: fresh_path)
+    init_db.init_database()
+
+    upgraded, fresh = _schema(db_path), _schema(fresh_path)
+    assert upgraded[2] == fresh[2] == MIGRATIONS[-1][0]
+    assert upgraded[0] == fresh[0]
+    assert upgraded[1] == fresh[1]
+
+def test_upgraded_customer_summary_matches_the_orders(db_path):
+    _load_baseline(db_path)
+    init_db.init_database()
+
+    conn = sqlite3.connect(db_path)
+    try:
+        expected = dict(conn.execute(f'''
+            SELECT customer_id, COUNT(*) FROM (
+                SELECT customer_id FROM sales_orders o WHERE {init_db.counted_order_sql('sales_orders', 'o')}
+                UNION ALL
+                SELECT customer_id FROM mobile_orders o WHERE {init_db.counted_order_sql('mobile_orders', 'o')})
+            GROUP BY customer_id
+        ''').fetchall())
+        summary = dict(conn.execute("SELECT customer_id, order_count FROM customer_summary WHERE order_count > 0"))
+        # New orders keep the summary in step through the triggers
+        conn.execute("INSERT INTO sales_orders (order_number, customer_id, total_amount, status) "
+                     "VALUES ('ORD-TEST', 1, 1000, 'pending')")
+        after = conn.execute("SELECT order_count FROM customer_summary WHERE customer_id = 1").fetchone()[0]
+    finally:
+        conn.close()
+    assert summary == expected
+    assert after == expected.get(1, 0) + 1
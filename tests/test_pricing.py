@@ -0,0 +1,21 @@
+"""Price index caching"""
+import sqlite3
+
+from database import init_db
+from database.repository import create_sales_order, get_products
+from utils.pricing import get_price_index
+
+def test_orders_keep_the_price_index(db_path):
+    init_db.init_database()
+    product_id = int(get_products()['id'].iloc[0])
+    index = get_price_index()
+    create_sales_order(None, [{'product_id': product_id, 'quantity': 1, 'unit_price': 10000}])
+    assert get_price_index() is index
+
+    conn = sqlite3.connect(db_path)
+    try:
+        conn.execute("UPDATE products SET price = price + 1000 WHERE id = ?", (product_id,))
+        conn.commit()
+    finally:
+        conn.close()
+    assert get_price_index() is not index
@@ -0,0 +1,83 @@
+"""Stock reservations on the schema init_database() creates"""
+import sqlite3
+import threading
+
+import pytest
+
+from database import init_db
+from database.ledger import InsufficientStockError
+from database.repository import create_sales_order
+
+STOCK = 40
+
+def _add_product(path, stock):
+    conn = sqlite3.connect(path)
+    try:
+        cursor = conn.execute('''
+            INSERT INTO products (sku, name, category, price, cost, stock_quantity, min_stock_level, max_stock_level)
+            VALUES ('TEST-RESERVE', 'Reservation test product', 'Test', 10000, 8000, ?, 0, 100)
+        ''', (stock,))
+        conn.commit()
+        return cursor.lastrowid
+    finally:
+        conn.close()
+
+def _state(path, product_id):
+    """(stock, reserved, active reservation units, sales orders with a line for the product)"""
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute('''
+            SELECT p.stock_quantity, p.reserved_quantity,
+                   (SELECT COALESCE(SUM(quantity), 0) FROM stock_reservations
+                    WHERE product_id = p.id AND status = 'active'),
+                   (SELECT COUNT(DISTINCT order_id) FROM order_items WHERE product_id = p.id)
+            FROM products p WHERE p.id = ?
+        ''', (product_id,)).fetchone()
+    finally:
+        conn.close()
+
+def test_concurrent_orders_never_oversell(db_path):
+    init_db.init_database()
+    product_id = _add_product(db_path, STOCK)
+    threads, orders_per_thread = 8, 10
+    outcomes = {'reserved': 0, 'insufficient': 0}
+    errors = []
+    lock = threading.Lock()
+
+    def work():
+        for _ in range(orders_per_thread):
+            try:
+                create_sales_order(None, [{'product_id': product_id, 'quantity': 1, 'unit_price': 10000}],
+                                   sales_rep='test')
+                result = 'reserved'
+            except InsufficientStockError:
+                result = 'insufficient'
+            except Exception as e:
+                with lock:
+                    errors.append(e)
+                continue
+            with lock:
+                outcomes[result] += 1
+
+    workers = [threading.Thread(target=work) for _ in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    stock, reserved, reservation_units, orders = _state(db_path, product_id)
+    assert errors == []
+    assert outcomes == {'reserved': STOCK, 'insufficient': threads * orders_per_thread - STOCK}
+    assert reserved == reservation_units == orders == STOCK
+    assert stock - reserved == 0
+
+def test_short_order_rolls_back_entirely(db_path):
+    init_db.init_database()
+    product_id = _add_product(db_path, 3)
+    create_sales_order(None, [{'product_id': product_id, 'quantity': 2, 'unit_price': 10000}])
+
+    with pytest.raises(InsufficientStockError) as raised:
+        create_sales_order(None, [{'product_id': product_id, 'quantity': 2, 'unit_price': 10000}])
+
+    assert raised.value.shortages == [(product_id, 2, 1)]
+    assert _state(db_path, product_id) == (3, 2, 2, 1)
@@ -0,0 +1,18 @@
+"""Pushing offline records through the sync API"""
+from database import init_db
+from utils.sync import apply_batch
+
+USER = {'id': 1, 'username': 'sync-test'}
+
+def test_malformed_records_are_conflicts_not_failed_batches(db_path):
+    init_db.init_database()
+    result = apply_batch(USER, {
+        'device_id': 'test-device',
+        'visits': [{'key': 'visit-1', 'customer_id': 1, 'notes': 'ok'},
+                   {'key': 'visit-2', 'customer_id': 1, 'notes': ['not', 'a', 'value']}],
+        'orders': ['x', {'key': ['not', 'a', 'key']}]
+    })
+
+    assert [(r['key'], r['status']) for r in result['results']] == [('visit-1', 'created')]
+    assert sorted((c['entity'], c['key']) for c in result['conflicts']) == [
+        ('orders', None), ('orders', None), ('visits', 'visit-2')]